@@ -0,0 +1,112 @@
+"""
+Simulate a shift change: every employee clocks in at once (each punch sent
+twice, like a double tap), concurrently from several threads, then clocks out.
+Checks that each employee has exactly one attendance row and that the
+AttendanceMonth roll-up matches, then deletes the synthetic employees.
+
+Threads need committed data and their own connections, so nothing is rolled
+back: run it against a scratch or staging database (PostgreSQL for realistic
+concurrency; SQLite serialises the writers).
+
+Usage:
+    python manage.py clock_load_test                          # 300 employees, 8 threads
+    python manage.py clock_load_test --employees 1000 --threads 16 --batch 50
+"""
+import statistics
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import Count
+from django.utils import timezone
+
+from attendance.models import Attendance
+from attendance.services import AttendanceRollupService, ClockService
+from hr.models import Employee
+
+
+class Command(BaseCommand):
+    help = 'Load-test concurrent clock-in/out for a shift change (creates and removes synthetic employees)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--employees', type=int, default=300)
+        parser.add_argument('--threads', type=int, default=8)
+        parser.add_argument('--batch', type=int, default=1,
+                            help='Events per request: 1 = one phone each, more = kiosk batches')
+
+    def handle(self, *args, **options):
+        prefix = f'clock-load-{uuid.uuid4().hex[:8]}'
+        self.stdout.write(f"Seeding {options['employees']} employees...")
+        codes = self.seed(prefix, options['employees'])
+        try:
+            for kind in ('IN', 'OUT'):
+                self.burst(kind, codes, options['threads'], options['batch'])
+            self.check(codes)
+        finally:
+            User.objects.filter(username__startswith=prefix).delete()
+
+    def seed(self, prefix, size):
+        users = User.objects.bulk_create([User(username=f'{prefix}-{i}') for i in range(size)], batch_size=1000)
+        employees = Employee.objects.bulk_create([
+            Employee(user=user, employee_id=f'{prefix}-{i}', pin_code=f'{i:06d}', role='Technician',
+                     date_joined=date(2024, 1, 1))
+            for i, user in enumerate(users)
+        ], batch_size=1000)
+        return [employee.employee_id for employee in employees]
+
+    def burst(self, kind, codes, threads, batch):
+        now = timezone.now().isoformat()
+        # Every punch is sent twice; the second copy must come back as a duplicate
+        events = [{'type': kind, 'employee': code, 'timestamp': now} for code in codes for _ in range(2)]
+        requests = [events[start:start + batch] for start in range(0, len(events), batch)]
+
+        def send(request_events):
+            queries = []
+
+            def count(execute, sql, params, many, context):
+                queries.append(1)
+                return execute(sql, params, many, context)
+
+            try:
+                with connection.execute_wrapper(count):
+                    started = time.perf_counter()
+                    results = ClockService.record(request_events, kiosk=True)
+                    return time.perf_counter() - started, len(queries), results
+            finally:
+                connection.close()
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=threads) as pool:
+            timings = list(pool.map(send, requests))
+        elapsed = time.perf_counter() - started
+
+        latencies = sorted(timing for timing, _, _ in timings)
+        outcomes = [result['status'] for _, _, results in timings for result in results]
+        p95 = latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))]
+        self.stdout.write(
+            f"  {kind:<3} {len(events)} events in {len(requests)} requests: {elapsed:.2f}s "
+            f"({len(events) / elapsed:.0f} events/s), p50 {statistics.median(latencies) * 1000:.1f} ms, "
+            f"p95 {p95 * 1000:.1f} ms, {sum(queries for _, queries, _ in timings)} queries"
+        )
+        recorded, duplicates = outcomes.count('recorded'), outcomes.count('duplicate')
+        if recorded != len(codes) or duplicates != len(codes):
+            raise CommandError(
+                f"{kind}: expected {len(codes)} recorded and {len(codes)} duplicates, "
+                f"got {recorded} recorded, {duplicates} duplicates, {outcomes.count('rejected')} rejected."
+            )
+
+    def check(self, codes):
+        rows = Attendance.objects.filter(employee__employee_id__in=codes)
+        per_employee = rows.values('employee_id').annotate(n=Count('id')).filter(n__gt=1).count()
+        if rows.count() != len(codes) or per_employee:
+            raise CommandError(f"Expected one attendance row per employee, found {rows.count()} rows.")
+        if rows.filter(check_out_time__isnull=True).exists():
+            raise CommandError("Some clock-outs were lost.")
+        drifted = AttendanceRollupService.verify()
+        if drifted:
+            raise CommandError(f"{len(drifted)} AttendanceMonth rows drifted from their attendance records.")
+        self.stdout.write(self.style.SUCCESS(f'✅ {len(codes)} employees: one row each, roll-up consistent.'))
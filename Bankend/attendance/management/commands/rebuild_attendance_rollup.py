@@ -0,0 +1,39 @@
+"""
+Rebuild or verify the AttendanceMonth roll-up against attendance_attendance.
+
+Usage:
+    python manage.py rebuild_attendance_rollup            # full rebuild
+    python manage.py rebuild_attendance_rollup --verify   # report drift only
+"""
+from django.core.management.base import BaseCommand, CommandError
+from attendance.services import AttendanceRollupService
+
+
+class Command(BaseCommand):
+    help = 'Rebuild or verify per-employee, per-month attendance totals'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verify',
+            action='store_true',
+            help='Compare the roll-up with a full recompute without writing',
+        )
+
+    def handle(self, *args, **options):
+        if options['verify']:
+            mismatches = AttendanceRollupService.verify()
+            if not mismatches:
+                self.stdout.write(self.style.SUCCESS('✅ Attendance roll-up matches a full recompute.'))
+                return
+
+            for (employee_id, period), expected, actual in sorted(mismatches, key=str):
+                self.stdout.write(
+                    f"  employee={employee_id} period={period:%Y-%m}: "
+                    f"expected {expected[0]} present / {expected[1]} late / {expected[2]} h / {expected[3]} OT, "
+                    f"found {actual[0]} / {actual[1]} / {actual[2]} h / {actual[3]} OT"
+                )
+            raise CommandError(f'{len(mismatches)} attendance roll-up rows are out of date. Run without --verify to rebuild.')
+
+        self.stdout.write('Rebuilding attendance roll-up...')
+        rows = AttendanceRollupService.rebuild()
+        self.stdout.write(self.style.SUCCESS(f'✅ Rebuilt {rows} attendance roll-up rows.'))
@@ -0,0 +1,54 @@
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, Q, Sum
+from django.db.models.functions import TruncMonth
+
+PRESENT_STATUSES = ('PRESENT', 'LATE', 'HALF_DAY')
+
+
+def populate_attendance_months(apps, schema_editor):
+    Attendance = apps.get_model('attendance', 'Attendance')
+    AttendanceMonth = apps.get_model('attendance', 'AttendanceMonth')
+
+    rows = Attendance.objects.annotate(period=TruncMonth('date')).values('employee_id', 'period').annotate(
+        days_present=Count('id', filter=Q(status__in=PRESENT_STATUSES)),
+        days_late=Count('id', filter=Q(is_late=True)),
+        total=Sum('total_hours'),
+        overtime=Sum('overtime_hours'),
+    ).order_by()
+    AttendanceMonth.objects.bulk_create([
+        AttendanceMonth(
+            employee_id=row['employee_id'], period=row['period'], days_present=row['days_present'],
+            days_late=row['days_late'], total_hours=row['total'] or 0, overtime_hours=row['overtime'] or 0,
+        )
+        for row in rows
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('attendance', '0002_alter_attendance_options_alter_attendance_status'),
+        ('hr', '0021_deductiontype_maritalstatus_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AttendanceMonth',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.DateField(help_text='First day of the month')),
+                ('days_present', models.IntegerField(default=0)),
+                ('days_late', models.IntegerField(default=0)),
+                ('total_hours', models.DecimalField(decimal_places=2, default=0.0, max_digits=8)),
+                ('overtime_hours', models.DecimalField(decimal_places=2, default=0.0, max_digits=8)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('employee', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='attendance_months', to='hr.employee')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['period', 'employee'], name='attendance__period_62a6aa_idx')],
+                'unique_together': {('employee', 'period')},
+            },
+        ),
+        migrations.RunPython(populate_attendance_months, migrations.RunPython.noop),
+    ]
@@ -1,12 +1,17 @@
-from django.db import models
+from django.db import models, transaction
+from core.models import NoAudit, TrackedFieldsMixin
 from hr.models import Employee
 from datetime import datetime, timedelta
 
-class Attendance(models.Model):
+class Attendance(TrackedFieldsMixin, models.Model):
     """
     Attendance record for employees.
     Critical for salary calculation - tracks time worked.
+    Every save keeps the employee's AttendanceMonth roll-up current.
     """
+    # The fields AttendanceMonth is derived from
+    tracked_fields = ('employee', 'date', 'status', 'is_late', 'total_hours', 'overtime_hours')
+
     STATUS_CHOICES = [
         ('PRESENT', 'Present'),
         ('ABSENT', 'Absent'),
@@ -41,6 +46,16 @@ class Attendance(models.Model):
         ordering = ['-date', '-check_in_time']
 
     def save(self, *args, **kwargs):
+        self.apply_roster()
+
+        from .services import AttendanceRollupService
+        previous = None if self.pk is None else AttendanceRollupService.contribution(**self.rollup_values(previous=True))
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            AttendanceRollupService.apply_change(previous, AttendanceRollupService.contribution(**self.rollup_values()))
+
+    def apply_roster(self):
+        """Sets the late flag, status, total hours and overtime from the clock times (also used by bulk clock events)."""
         # Shift Configuration
         ROSTER_START_HOUR = 9  # 9 AM
         ROSTER_SHIFT_HOURS = 10  # 10 hour shift
@@ -71,8 +86,37 @@ class Attendance(models.Model):
                 self.overtime_hours = round(self.total_hours - ROSTER_SHIFT_HOURS, 2)
             else:
                 self.overtime_hours = 0
-                
-        super().save(*args, **kwargs)
+
+    def rollup_values(self, previous=False):
+        """The fields AttendanceMonth counts, as last saved (previous=True) or as they are now."""
+        return {
+            field: self.previous(field) if previous else getattr(self, self._meta.get_field(field).attname)
+            for field in self.tracked_fields
+        }
 
     def __str__(self):
         return f"{self.employee} - {self.date} ({self.status})"
+
+
+class AttendanceMonth(NoAudit):
+    """
+    Attendance totals per employee and month: days present, late arrivals,
+    hours and overtime. Maintained incrementally by Attendance.save and the
+    delete signal; rebuild with `manage.py rebuild_attendance_rollup`.
+    """
+    employee = models.ForeignKey(Employee, on_delete=models.CASCADE, related_name='attendance_months')
+    period = models.DateField(help_text="First day of the month")
+    days_present = models.IntegerField(default=0)
+    days_late = models.IntegerField(default=0)
+    total_hours = models.DecimalField(max_digits=8, decimal_places=2, default=0.00)
+    overtime_hours = models.DecimalField(max_digits=8, decimal_places=2, default=0.00)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('employee', 'period')
+        indexes = [
+            models.Index(fields=['period', 'employee']),
+        ]
+
+    def __str__(self):
+        return f"{self.employee_id} @ {self.period:%Y-%m}: {self.days_present} days, {self.total_hours} h"
@@ -0,0 +1,443 @@
+from collections import namedtuple
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Case, Count, F, Q, Sum, Value, When
+from django.db.models.functions import TruncMonth
+
+from .models import Attendance, AttendanceMonth
+
+PRESENT_STATUSES = ('PRESENT', 'LATE', 'HALF_DAY')
+ZERO = Decimal('0.00')
+
+# One attendance record's share of its (employee, period) roll-up row
+Contribution = namedtuple('Contribution', 'employee_id period days_present days_late total_hours overtime_hours')
+
+
+def month_start(day):
+    return date(day.year, day.month, 1)
+
+
+def _decimal(value):
+    return Decimal(str(value or 0)).quantize(Decimal('0.01'))
+
+
+class AttendanceRollupService:
+    """
+    Keeps AttendanceMonth in step with Attendance. Attendance.save applies the
+    difference between a record's old and new contribution with F() updates,
+    so concurrent clock-ins never lose increments; deletes reverse it
+    (attendance.signals). queryset.update()/bulk_create bypass both:
+    `manage.py rebuild_attendance_rollup` repairs drift.
+    """
+    TOTAL_FIELDS = ('days_present', 'days_late', 'total_hours', 'overtime_hours')
+
+    @staticmethod
+    def contribution(employee, date, status, is_late, total_hours, overtime_hours):
+        """The record's Contribution (employee is the id); None for a record without an employee or date."""
+        if employee is None or date is None:
+            return None
+        return Contribution(
+            employee, month_start(date), int(status in PRESENT_STATUSES), int(bool(is_late)),
+            _decimal(total_hours), _decimal(overtime_hours),
+        )
+
+    @staticmethod
+    def apply(contribution, sign=1):
+        """Add (sign=1) or reverse (sign=-1) a contribution on its roll-up row."""
+        if contribution is None:
+            return
+        deltas = {field: getattr(contribution, field) * sign for field in AttendanceRollupService.TOTAL_FIELDS}
+        if not any(deltas.values()):
+            return
+        updates = {field: F(field) + delta for field, delta in deltas.items() if delta}
+        with transaction.atomic():
+            row = AttendanceMonth.objects.filter(employee_id=contribution.employee_id, period=contribution.period)
+            # Reversals never create rows: the employee's rows may be mid cascade-delete
+            if row.update(**updates) or sign < 0:
+                return
+            try:
+                with transaction.atomic():
+                    AttendanceMonth.objects.create(
+                        employee_id=contribution.employee_id, period=contribution.period, **deltas
+                    )
+            except IntegrityError:
+                # Lost the race to create the row; it exists now
+                row.update(**updates)
+
+    @staticmethod
+    def apply_change(previous, current):
+        """Moves a saved record from its previous contribution to its current one, in one update when possible."""
+        if previous == current:
+            return
+        if previous is not None and current is not None and previous[:2] == current[:2]:
+            AttendanceRollupService.apply(current._replace(**{
+                field: getattr(current, field) - getattr(previous, field)
+                for field in AttendanceRollupService.TOTAL_FIELDS
+            }))
+            return
+        AttendanceRollupService.apply(previous, sign=-1)
+        AttendanceRollupService.apply(current)
+
+    @staticmethod
+    def apply_many(changes):
+        """
+        apply_change() for a batch of (previous, current) pairs in two queries:
+        one INSERT creating missing rows, one UPDATE adding every row's deltas.
+        """
+        deltas = {}
+        for previous, current in changes:
+            for contribution, sign in ((previous, -1), (current, 1)):
+                if contribution is None:
+                    continue
+                totals = deltas.setdefault(contribution[:2], dict.fromkeys(AttendanceRollupService.TOTAL_FIELDS, 0))
+                for field in AttendanceRollupService.TOTAL_FIELDS:
+                    totals[field] += getattr(contribution, field) * sign
+        deltas = {key: totals for key, totals in deltas.items() if any(totals.values())}
+        if not deltas:
+            return
+
+        with transaction.atomic():
+            # Rows are created and locked in key order so concurrent batches cannot deadlock
+            AttendanceMonth.objects.bulk_create(
+                [AttendanceMonth(employee_id=employee_id, period=period) for employee_id, period in sorted(deltas)],
+                ignore_conflicts=True,
+            )
+            rows = AttendanceMonth.objects.filter(
+                employee_id__in={employee_id for employee_id, _ in deltas}, period__in={period for _, period in deltas},
+            )
+            if len(deltas) > 1 and connection.features.has_select_for_update:
+                list(rows.select_for_update().order_by('pk').values_list('pk', flat=True))
+            updates = {}
+            for field in AttendanceRollupService.TOTAL_FIELDS:
+                output = AttendanceMonth._meta.get_field(field)
+                whens = [
+                    When(employee_id=employee_id, period=period, then=Value(totals[field], output_field=output))
+                    for (employee_id, period), totals in deltas.items() if totals[field]
+                ]
+                if whens:
+                    updates[field] = F(field) + Case(*whens, default=Value(0, output_field=output), output_field=output)
+            rows.update(**updates)
+
+    @staticmethod
+    def month_totals(period, employee_ids=None):
+        """{employee_id: AttendanceMonth} for the month starting at `period`."""
+        rows = AttendanceMonth.objects.filter(period=period)
+        if employee_ids is not None:
+            rows = rows.filter(employee_id__in=employee_ids)
+        return {row.employee_id: row for row in rows}
+
+    @staticmethod
+    def expected_rollups():
+        """Full recompute from attendance_attendance: {(employee_id, period): (present, late, hours, overtime)}."""
+        rows = Attendance.objects.annotate(period=TruncMonth('date')).values('employee_id', 'period').annotate(
+            days_present=Count('id', filter=Q(status__in=PRESENT_STATUSES)),
+            days_late=Count('id', filter=Q(is_late=True)),
+            total=Sum('total_hours'),
+            overtime=Sum('overtime_hours'),
+        ).order_by()
+        return {
+            (row['employee_id'], row['period']): (
+                row['days_present'], row['days_late'], row['total'] or ZERO, row['overtime'] or ZERO,
+            )
+            for row in rows
+        }
+
+    @staticmethod
+    def verify():
+        """
+        Compare AttendanceMonth against a full recompute.
+        Returns a list of (key, expected, actual) tuples for every mismatch.
+        """
+        expected = AttendanceRollupService.expected_rollups()
+        actual = {
+            (row.employee_id, row.period): (row.days_present, row.days_late, row.total_hours, row.overtime_hours)
+            for row in AttendanceMonth.objects.all()
+        }
+        empty = (0, 0, ZERO, ZERO)
+        return [
+            (key, expected.get(key, empty), actual.get(key, empty))
+            for key in set(expected) | set(actual)
+            if expected.get(key, empty) != actual.get(key, empty)
+        ]
+
+    @staticmethod
+    def rebuild():
+        """Replace AttendanceMonth with a full recompute. Returns rows written."""
+        expected = AttendanceRollupService.expected_rollups()
+        with transaction.atomic():
+            AttendanceMonth.objects.all().delete()
+            AttendanceMonth.objects.bulk_create([
+                AttendanceMonth(employee_id=employee_id, period=period, days_present=present, days_late=late,
+                                total_hours=hours, overtime_hours=overtime)
+                for (employee_id, period), (present, late, hours, overtime) in expected.items()
+            ], batch_size=1000)
+        return len(expected)
+
+
+class ClockService:
+    """
+    Idempotent clock-in/out for shift-change bursts and offline kiosk queues.
+
+    An event is {'type': 'IN' | 'OUT', 'timestamp': ISO datetime (default: now),
+    'employee': Employee.employee_id (kiosk punches only)}. A batch costs a fixed
+    number of queries whatever its size (up to the backend's bulk batch size):
+    clock-ins are one INSERT ... ON CONFLICT (employee_id, date) DO NOTHING, so a repeated or
+    racing punch is reported as a duplicate instead of an IntegrityError;
+    clock-outs are one locked read and one bulk_update; AttendanceMonth takes
+    two statements (AttendanceRollupService.apply_many). The user -> employee
+    mapping is cached for ATTENDANCE_EMPLOYEE_CACHE_SECONDS and dropped when
+    the Employee is saved or deleted (attendance.signals). Neither statement
+    sends signals, so the rows' audit events are recorded here, coalesced
+    like any other (core.audit).
+
+    Only kiosk callers are trusted with the clock time of a past punch: a
+    self-punch timestamped earlier than the clock skew allows is still
+    accepted (the mobile app queues punches offline), but its row's notes say
+    it was self-reported and when the server received it, so HR can tell it
+    from a live punch.
+    """
+    TYPES = ('IN', 'OUT')
+    NO_EMPLOYEE = 0
+    CHECK_IN_FIELDS = ('employee_id', 'date', 'check_in_time', 'status', 'is_late', 'total_hours',
+                       'overtime_hours', 'notes', 'created_at', 'updated_at')
+    CHECK_OUT_FIELDS = ['check_out_time', 'status', 'is_late', 'total_hours', 'overtime_hours', 'notes', 'updated_at']
+
+    @staticmethod
+    def cache_key(user_id):
+        return f"attendance:employee:{user_id}"
+
+    @staticmethod
+    def employee_id_for(user):
+        """The user's Employee id (None without a profile), cached."""
+        from django.core.cache import cache
+        from hr.models import Employee
+
+        key = ClockService.cache_key(user.pk)
+        employee_id = cache.get(key)
+        if employee_id is None:
+            employee_id = Employee.objects.filter(user_id=user.pk).values_list('pk', flat=True).first() \
+                or ClockService.NO_EMPLOYEE
+            cache.set(key, employee_id, _setting('ATTENDANCE_EMPLOYEE_CACHE_SECONDS', 3600))
+        return employee_id or None
+
+    @staticmethod
+    def forget(user_id):
+        from django.core.cache import cache
+        if user_id:
+            cache.delete(ClockService.cache_key(user_id))
+
+    @staticmethod
+    def parse(events, employee_id, kiosk=False, now=None):
+        """
+        Validates raw events. Returns ([(index, type, employee id, local datetime, note)], {index: error}).
+        Only kiosk callers may punch for other employees (by their employee code); note marks a
+        backdated self-punch ('' otherwise).
+        """
+        from django.utils import timezone
+        from django.utils.dateparse import parse_datetime
+        from hr.models import Employee
+
+        now = now or timezone.now()
+        oldest = now - timedelta(days=_setting('ATTENDANCE_OFFLINE_MAX_DAYS', 7))
+        skew = timedelta(seconds=_setting('ATTENDANCE_CLOCK_SKEW_SECONDS', 300))
+        newest = now + skew
+        codes = {str(event['employee']) for event in events if isinstance(event, dict) and event.get('employee')}
+        employee_ids = dict(Employee.objects.filter(employee_id__in=codes).values_list('employee_id', 'pk')) \
+            if codes and kiosk else {}
+
+        parsed, errors = [], {}
+        for index, event in enumerate(events):
+            if not isinstance(event, dict):
+                errors[index] = 'Event must be an object'
+                continue
+            kind = str(event.get('type', '')).upper()
+            if kind not in ClockService.TYPES:
+                errors[index] = "type must be IN or OUT"
+                continue
+            if event.get('employee'):
+                if not kiosk:
+                    errors[index] = 'Only kiosk accounts can punch for other employees'
+                    continue
+                target = employee_ids.get(str(event['employee']))
+            else:
+                target = employee_id
+            if target is None:
+                errors[index] = 'No employee profile found'
+                continue
+            at = parse_datetime(str(event['timestamp'])) if event.get('timestamp') else now
+            if at is None:
+                errors[index] = 'timestamp must be an ISO 8601 datetime'
+                continue
+            if timezone.is_naive(at):
+                at = timezone.make_aware(at)
+            if not oldest <= at <= newest:
+                errors[index] = 'timestamp is outside the accepted window'
+                continue
+            at = timezone.localtime(at)
+            note = ''
+            if not kiosk and at < now - skew:
+                note = (f"Self-reported {'clock-in' if kind == 'IN' else 'clock-out'} for "
+                        f"{at:%Y-%m-%d %H:%M}, received {timezone.localtime(now):%Y-%m-%d %H:%M}")
+            parsed.append((index, kind, target, at, note))
+        return parsed, errors
+
+    @staticmethod
+    def record(events, employee_id=None, kiosk=False, now=None):
+        """
+        Applies a batch of events; returns one result per event, in order:
+        {'status': 'recorded' | 'duplicate' | 'rejected', 'attendance': id, 'error': ...}.
+        Within a batch the earliest IN and the latest OUT of an employee's day count.
+        """
+        parsed, errors = ClockService.parse(events, employee_id, kiosk, now)
+        results = [None] * len(events)
+        for index, error in errors.items():
+            results[index] = {'status': 'rejected', 'error': error}
+
+        check_ins, check_outs = {}, {}
+        for index, kind, target, at, note in sorted(parsed, key=lambda event: event[3]):
+            key = (target, at.date())
+            if kind == 'IN':
+                # Later INs of the same day are duplicates of the first
+                if key in check_ins:
+                    results[index] = {'status': 'duplicate'}
+                else:
+                    check_ins[key] = (index, at, note)
+            else:
+                # Only the last OUT of the day counts
+                if key in check_outs:
+                    results[check_outs[key][0]] = {'status': 'duplicate'}
+                check_outs[key] = (index, at, note)
+
+        with transaction.atomic():
+            inserted = ClockService.insert_check_ins(check_ins)
+            for key, (index, _, _) in check_ins.items():
+                results[index] = {'status': 'recorded', 'attendance': inserted[key]} if key in inserted \
+                    else {'status': 'duplicate'}
+            for key, result in ClockService.apply_check_outs(check_outs).items():
+                results[check_outs[key][0]] = result
+        return results
+
+    @staticmethod
+    def insert_check_ins(check_ins):
+        """Inserts {(employee id, date): (index, local datetime, note)} check-ins; returns {key: id} of the rows created."""
+        from django.utils import timezone
+
+        if not check_ins:
+            return {}
+        now = timezone.now()
+        records = []
+        for (employee_id, day), (_, at, note) in sorted(check_ins.items()):
+            record = Attendance(employee_id=employee_id, date=day, check_in_time=at.time().replace(tzinfo=None),
+                                notes=note, created_at=now, updated_at=now)
+            record.apply_roster()
+            records.append(record)
+
+        fields = [Attendance._meta.get_field(name) for name in ClockService.CHECK_IN_FIELDS]
+        row_sql = '(%s)' % ', '.join(['%s'] * len(fields))
+        params = [field.get_db_prep_save(getattr(record, field.attname), connection)
+                  for record in records for field in fields]
+        qn = connection.ops.quote_name
+        columns = ', '.join(qn(field.column) for field in fields)
+        table = qn(Attendance._meta.db_table)
+
+        inserted = {}
+        with connection.cursor() as cursor:
+            width = len(fields)
+            if connection.vendor in ('postgresql', 'sqlite') and connection.features.can_return_rows_from_bulk_insert:
+                # One statement per batch the backend accepts (all rows on PostgreSQL)
+                batch = max(connection.ops.bulk_batch_size(fields, records), 1)
+                for start in range(0, len(records), batch):
+                    rows = len(records[start:start + batch])
+                    cursor.execute(
+                        f"INSERT INTO {table} ({columns}) VALUES {', '.join([row_sql] * rows)} "
+                        f"ON CONFLICT ({qn('employee_id')}, {qn('date')}) DO NOTHING "
+                        f"RETURNING {qn('id')}, {qn('employee_id')}, {qn('date')}",
+                        params[start * width:(start + rows) * width],
+                    )
+                    for pk, employee_id, day in cursor.fetchall():
+                        inserted[(employee_id, day if isinstance(day, date) else date.fromisoformat(day))] = pk
+            else:
+                # No ON CONFLICT ... RETURNING: one savepointed INSERT per row
+                for offset, record in enumerate(records):
+                    try:
+                        with transaction.atomic():
+                            cursor.execute(f"INSERT INTO {table} ({columns}) VALUES {row_sql}",
+                                           params[offset * width:(offset + 1) * width])
+                    except IntegrityError:
+                        continue
+                    pk = connection.ops.last_insert_id(cursor, Attendance._meta.db_table, 'id')
+                    inserted[(record.employee_id, record.date)] = pk
+
+        created = [record for record in records if (record.employee_id, record.date) in inserted]
+        AttendanceRollupService.apply_many([
+            (None, AttendanceRollupService.contribution(**record.rollup_values())) for record in created
+        ])
+        for record in created:
+            record.pk = inserted[(record.employee_id, record.date)]
+            record._state.adding = False
+        ClockService.audit(created, 'CREATE')
+        return inserted
+
+    @staticmethod
+    def apply_check_outs(check_outs):
+        """Sets {(employee id, date): (index, local datetime, note)} check-outs; returns {key: result}."""
+        from django.utils import timezone
+
+        if not check_outs:
+            return {}
+        records = {
+            (record.employee_id, record.date): record
+            for record in Attendance.objects.select_for_update().filter(
+                employee_id__in={employee_id for employee_id, _ in check_outs},
+                date__in={day for _, day in check_outs},
+            )
+        }
+        now = timezone.now()
+        results, changed, changes = {}, [], []
+        for key, (_, at, note) in check_outs.items():
+            record = records.get(key)
+            if record is None:
+                results[key] = {'status': 'rejected', 'error': 'No clock-in found for that day'}
+                continue
+            if record.check_out_time:
+                results[key] = {'status': 'duplicate', 'attendance': record.pk}
+                continue
+            previous = AttendanceRollupService.contribution(**record.rollup_values(previous=True))
+            record.check_out_time = at.time().replace(tzinfo=None)
+            record.apply_roster()
+            if note:
+                record.notes = '\n'.join(filter(None, [record.notes, note]))
+            record.updated_at = now
+            changed.append(record)
+            changes.append((previous, AttendanceRollupService.contribution(**record.rollup_values())))
+            results[key] = {'status': 'recorded', 'attendance': record.pk}
+
+        if changed:
+            Attendance.objects.bulk_update(changed, ClockService.CHECK_OUT_FIELDS)
+            AttendanceRollupService.apply_many(changes)
+            ClockService.audit(changed, 'UPDATE')
+        return results
+
+    @staticmethod
+    def audit(records, action):
+        """Records the audit events post_save would have sent (raw INSERT and bulk_update send none)."""
+        from core import audit
+        from core.signals import build_event, is_audited
+        from hr.models import Employee
+
+        if not records or not is_audited(Attendance):
+            return
+        # object_repr names the employee: load them all at once instead of once per row
+        employees = Employee.objects.select_related('user').in_bulk({record.employee_id for record in records})
+        for record in records:
+            record.employee = employees[record.employee_id]
+            changes = audit.field_changes(record) if action == 'UPDATE' else None
+            audit.record_event(build_event(record, action, changes))
+            audit.take_snapshot(record)
+
+
+def _setting(name, default):
+    from django.conf import settings
+    return getattr(settings, name, default)
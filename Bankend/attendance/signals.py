@@ -0,0 +1,29 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from .models import Attendance
+from .services import AttendanceRollupService, ClockService
+
+# Attendance.save keeps AttendanceMonth current; deletes (including cascades) are reversed here.
+# Note: queryset.update()/bulk_create bypass both; `manage.py rebuild_attendance_rollup` repairs drift.
+
+@receiver(post_delete, sender=Attendance)
+def reverse_attendance(sender, instance, **kwargs):
+    AttendanceRollupService.apply(
+        AttendanceRollupService.contribution(**instance.rollup_values(previous=True)), sign=-1
+    )
+
+
+# Clock events cache the user -> employee mapping; a reassigned profile must
+# stop resolving for the user it was taken from as well
+def forget_employee_mapping(sender, instance, created=False, **kwargs):
+    user_ids = {instance.user_id} if created else {instance.user_id, instance.previous('user')}
+
+    def forget():
+        for user_id in user_ids:
+            ClockService.forget(user_id)
+    transaction.on_commit(forget)
+
+
+post_save.connect(forget_employee_mapping, sender='hr.Employee', dispatch_uid='attendance-employee-save')
+post_delete.connect(forget_employee_mapping, sender='hr.Employee', dispatch_uid='attendance-employee-delete')
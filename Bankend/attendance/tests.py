@@ -1,3 +1,288 @@
-from django.test import TestCase
+import threading
+from datetime import date, datetime, time, timedelta
+from decimal import Decimal
+from io import StringIO
 
-# Create your tests here.
+from django.contrib.auth.models import User
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings, skipUnlessDBFeature
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from core.models import AuditLog
+from core.testing import AppQueriesMixin
+from hr.models import Employee, ModulePermission
+from .models import Attendance, AttendanceMonth
+from .services import AttendanceRollupService, ClockService
+
+
+class AttendanceFixtureMixin:
+    def make_employee(self, n, superuser=False, modules=()):
+        make_user = User.objects.create_superuser if superuser else User.objects.create_user
+        user = make_user(f'attendance-{n}', first_name='Staff', last_name=str(n))
+        employee = Employee.objects.create(
+            user=user, employee_id=f'A-{n}', pin_code=f'{n:06d}', role='Technician', date_joined=date(2024, 1, 1),
+        )
+        for module in modules:
+            ModulePermission.objects.create(employee=employee, module_name=module, can_view=True, can_create=True)
+        return employee
+
+    def rollup(self, employee, period=None):
+        period = period or timezone.now().date().replace(day=1)
+        return AttendanceMonth.objects.filter(employee=employee, period=period).values_list(
+            'days_present', 'days_late', 'total_hours', 'overtime_hours',
+        ).first()
+
+
+class AttendanceRollupTests(AttendanceFixtureMixin, AppQueriesMixin, TestCase):
+    def setUp(self):
+        self.employee = self.make_employee(1, superuser=True)
+
+    def test_saves_and_deletes_keep_the_month_current(self):
+        record = Attendance.objects.create(employee=self.employee, check_in_time=time(10, 30))
+        self.assertEqual(self.rollup(self.employee), (1, 1, Decimal('0'), Decimal('0')))
+
+        record.check_out_time = time(21, 0)
+        record.save()
+        self.assertEqual(self.rollup(self.employee), (1, 1, Decimal('10.50'), Decimal('0.50')))
+
+        # Moving the record to another month moves its totals
+        record.date = date(2025, 1, 15)
+        record.save()
+        self.assertEqual(self.rollup(self.employee), (0, 0, Decimal('0'), Decimal('0')))
+        self.assertEqual(self.rollup(self.employee, date(2025, 1, 1)), (1, 1, Decimal('10.50'), Decimal('0.50')))
+
+        absent = Attendance.objects.create(employee=self.employee, status='ABSENT')
+        self.assertEqual(self.rollup(self.employee), (0, 0, Decimal('0'), Decimal('0')))
+        absent.status = 'HALF_DAY'
+        absent.save()
+        self.assertEqual(self.rollup(self.employee), (1, 0, Decimal('0'), Decimal('0')))
+
+        Attendance.objects.get(pk=record.pk).delete()
+        self.assertEqual(self.rollup(self.employee, date(2025, 1, 1)), (0, 0, Decimal('0'), Decimal('0')))
+        self.assertEqual(AttendanceRollupService.verify(), [])
+
+    def test_summary_reads_the_rollup(self):
+        Attendance.objects.create(employee=self.employee, check_in_time=time(8, 0), check_out_time=time(19, 0))
+        client = APIClient()
+        client.force_authenticate(self.employee.user)
+        with self.assertNumAppQueries(2):
+            body = client.get('/api/attendance/summary/').json()
+        self.assertEqual((body['days_worked'], body['days_late']), (1, 0))
+        self.assertEqual((body['total_hours'], body['overtime_hours'], body['regular_hours']), (11.0, 1.0, 10.0))
+
+    def test_rebuild_and_verify_command(self):
+        record = Attendance.objects.create(employee=self.employee, check_in_time=time(10, 0))
+        Attendance.objects.filter(pk=record.pk).update(total_hours=Decimal('7.25'))
+        with self.assertRaises(CommandError):
+            call_command('rebuild_attendance_rollup', '--verify', stdout=StringIO())
+
+        call_command('rebuild_attendance_rollup', stdout=StringIO())
+        call_command('rebuild_attendance_rollup', '--verify', stdout=StringIO())
+        self.assertEqual(self.rollup(self.employee), (1, 1, Decimal('7.25'), Decimal('0')))
+
+
+class DailyReportTests(AttendanceFixtureMixin, TestCase):
+    def report_queries(self, headcount):
+        for n in range(headcount):
+            employee = self.make_employee(100 * headcount + n)
+            if n % 2:
+                Attendance.objects.create(employee=employee, check_in_time=time(10, 15))
+        with CaptureQueriesContext(connection) as queries:
+            call_command('send_daily_report', stdout=StringIO())
+        return len(queries)
+
+    def test_queries_do_not_grow_with_headcount(self):
+        self.assertEqual(self.report_queries(4), self.report_queries(12))
+
+
+def punches(employees, kind, at):
+    return [{'type': kind, 'employee': employee.employee_id, 'timestamp': at.isoformat()} for employee in employees]
+
+
+class ClockEventTests(AttendanceFixtureMixin, AppQueriesMixin, TestCase):
+    def setUp(self):
+        cache.clear()  # permission matrices cached for users of earlier tests with the same pk
+        self.now = timezone.make_aware(datetime.combine(timezone.localdate(), time(8, 55)))
+        # The audit trail looks content types up once per process; keep that out of the counts
+        ContentType.objects.get_for_model(Attendance)
+
+    def clock(self, employees, kind, at):
+        with CaptureQueriesContext(connection) as queries:
+            results = ClockService.record(punches(employees, kind, at), kiosk=True, now=at)
+        return [result['status'] for result in results], len(queries)
+
+    def test_shift_change_batch_is_idempotent_and_constant_query(self):
+        small = [self.make_employee(1000 + n) for n in range(3)]
+        crowd = [self.make_employee(2000 + n) for n in range(300)]
+
+        # Compared below SQLite's bulk batch size, where PostgreSQL and SQLite both use one statement each
+        _, small_queries = self.clock(small, 'IN', self.now)
+        _, batch_queries = self.clock(crowd[:60], 'IN', self.now)
+        self.assertEqual(small_queries, batch_queries)
+        statuses, _ = self.clock(crowd, 'IN', self.now)
+        self.assertEqual(statuses, ['duplicate'] * 60 + ['recorded'] * 240)
+
+        # Replaying the queue (or a double tap) changes nothing
+        statuses, _ = self.clock(crowd, 'IN', self.now + timedelta(minutes=2))
+        self.assertEqual(statuses, ['duplicate'] * 300)
+        self.assertEqual(Attendance.objects.filter(employee__in=crowd).count(), 300)
+
+        _, small_queries = self.clock(small, 'OUT', self.now + timedelta(hours=10))
+        _, batch_queries = self.clock(crowd[:60], 'OUT', self.now + timedelta(hours=10))
+        self.assertEqual(small_queries, batch_queries)
+        statuses, _ = self.clock(crowd, 'OUT', self.now + timedelta(hours=10))
+        self.assertEqual(statuses, ['duplicate'] * 60 + ['recorded'] * 240)
+        self.assertEqual(self.clock(crowd, 'OUT', self.now + timedelta(hours=11))[0], ['duplicate'] * 300)
+
+        self.assertEqual(self.rollup(crowd[0]), (1, 0, Decimal('10.00'), Decimal('0')))
+        self.assertEqual(AttendanceRollupService.verify(), [])
+
+    def test_offline_queue_lands_on_the_punch_day(self):
+        employee = self.make_employee(1)
+        yesterday = timezone.localdate() - timedelta(days=1)
+        at = lambda day, hour, minute=0: timezone.make_aware(datetime.combine(day, time(hour, minute)))
+        events = [
+            {'type': 'OUT', 'timestamp': at(yesterday, 19, 30).isoformat()},
+            {'type': 'IN', 'timestamp': at(yesterday, 9, 45).isoformat()},
+            {'type': 'IN', 'timestamp': at(yesterday, 10, 5).isoformat()},
+            {'type': 'IN', 'timestamp': self.now.isoformat()},
+        ]
+        results = ClockService.record(events, employee.pk, now=self.now)
+        self.assertEqual([result['status'] for result in results], ['recorded', 'recorded', 'duplicate', 'recorded'])
+
+        record = Attendance.objects.get(employee=employee, date=yesterday)
+        self.assertEqual((record.check_in_time, record.check_out_time), (time(9, 45), time(19, 30)))
+        self.assertEqual((record.is_late, record.total_hours, record.overtime_hours), (False, Decimal('9.75'), Decimal('0')))
+        self.assertEqual(Attendance.objects.get(employee=employee, date=self.now.date()).check_in_time, time(8, 55))
+        self.assertEqual(AttendanceRollupService.verify(), [])
+
+        # A self-punch is trusted with its own clock time only if it is live; queued ones are flagged for HR
+        self.assertEqual(record.notes.count('Self-reported'), 2)
+        self.assertIn(f'received {self.now:%Y-%m-%d %H:%M}', record.notes)
+        self.assertEqual(Attendance.objects.get(employee=employee, date=self.now.date()).notes, '')
+
+    def test_kiosk_punches_are_not_flagged(self):
+        employee = self.make_employee(1)
+        ClockService.record(punches([employee], 'IN', self.now - timedelta(days=1)), kiosk=True, now=self.now)
+        self.assertEqual(Attendance.objects.get(employee=employee).notes, '')
+
+    @override_settings(AUDIT_ASYNC=False)
+    def test_clock_events_are_audited(self):
+        employees = [self.make_employee(n) for n in range(3)]
+        with self.captureOnCommitCallbacks(execute=True):
+            self.clock(employees, 'IN', self.now)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.clock(employees, 'OUT', self.now + timedelta(hours=9))
+
+        logs = AuditLog.objects.filter(content_type=ContentType.objects.get_for_model(Attendance))
+        self.assertEqual(logs.filter(action='CREATE').count(), 3)
+        update = logs.get(action='UPDATE', object_id=str(Attendance.objects.get(employee=employees[0]).pk))
+        self.assertEqual(update.field_changes['check_out_time'], {'before': 'None', 'after': '17:55:00'})
+        self.assertIn(employees[0].employee_id, update.object_repr)
+
+    def test_invalid_events_are_rejected_individually(self):
+        employee, other = self.make_employee(1), self.make_employee(2)
+        events = [
+            {'type': 'BREAK'},
+            {'type': 'IN', 'timestamp': 'yesterday'},
+            {'type': 'IN', 'timestamp': (self.now - timedelta(days=30)).isoformat()},
+            {'type': 'IN', 'timestamp': (self.now + timedelta(hours=1)).isoformat()},
+            {'type': 'IN', 'employee': other.employee_id},
+            {'type': 'OUT', 'timestamp': (self.now - timedelta(days=1)).isoformat()},
+            {'type': 'IN', 'timestamp': self.now.isoformat()},
+        ]
+        results = ClockService.record(events, employee.pk, now=self.now)
+        self.assertEqual([result['status'] for result in results], ['rejected'] * 6 + ['recorded'])
+        self.assertFalse(Attendance.objects.filter(employee=other).exists())
+
+    def test_check_in_and_out_endpoints_are_idempotent(self):
+        employee = self.make_employee(1, modules=['Attendance'])
+        client = APIClient()
+        client.force_authenticate(employee.user)
+
+        self.assertEqual(client.post('/api/attendance/check-in/').status_code, 201)
+        self.assertEqual(client.post('/api/attendance/check-in/').status_code, 200)
+        self.assertEqual(client.post('/api/attendance/check-out/').status_code, 200)
+        self.assertEqual(client.post('/api/attendance/check-out/').status_code, 400)
+        self.assertEqual(client.post('/api/attendance/check-in/').status_code, 400)
+        self.assertEqual(Attendance.objects.filter(employee=employee).count(), 1)
+
+        # The cached user -> employee mapping skips the profile lookup
+        with self.assertNumAppQueries(1):
+            client.get('/api/attendance/today/')
+
+    def test_reassigned_profile_stops_resolving_for_the_old_user(self):
+        employee = Employee.objects.get(pk=self.make_employee(1).pk)
+        old_user, new_user = employee.user, User.objects.create_user('attendance-new')
+        self.assertEqual(ClockService.employee_id_for(old_user), employee.pk)
+        self.assertIsNone(ClockService.employee_id_for(new_user))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            employee.user = new_user
+            employee.save()
+        self.assertIsNone(ClockService.employee_id_for(old_user))
+        self.assertEqual(ClockService.employee_id_for(new_user), employee.pk)
+        results = ClockService.record([{'type': 'IN'}], ClockService.employee_id_for(old_user))
+        self.assertEqual(results[0]['status'], 'rejected')
+
+    def test_clock_endpoint_accepts_batches_from_kiosks_only(self):
+        from .views import KIOSK_MODULE
+        kiosk = self.make_employee(1, modules=['Attendance', KIOSK_MODULE])
+        employee = self.make_employee(2, modules=['Attendance'])
+        client = APIClient()
+        client.force_authenticate(employee.user)
+        body = client.post('/api/attendance/clock/', {'events': punches([kiosk], 'IN', timezone.now())}, format='json').json()
+        self.assertEqual(body['rejected'], 1)
+
+        # Being staff alone does not make an account a kiosk
+        employee.user.is_staff = True
+        employee.user.save()
+        body = client.post('/api/attendance/clock/', {'events': punches([kiosk], 'IN', timezone.now())}, format='json').json()
+        self.assertEqual(body['rejected'], 1)
+
+        client.force_authenticate(kiosk.user)
+        events = punches([employee, employee], 'IN', timezone.now())
+        body = client.post('/api/attendance/clock/', {'events': events}, format='json').json()
+        self.assertEqual((body['recorded'], body['duplicate'], body['rejected']), (1, 1, 0))
+
+        with self.settings(ATTENDANCE_MAX_BATCH_EVENTS=1):
+            self.assertEqual(client.post('/api/attendance/clock/', {'events': events}, format='json').status_code, 400)
+
+
+@skipUnlessDBFeature('has_select_for_update')
+class ClockConcurrencyTests(AttendanceFixtureMixin, TransactionTestCase):
+    def test_parallel_shift_change(self):
+        employees = [self.make_employee(3000 + n) for n in range(300)]
+        today = timezone.localdate()
+        shift = {kind: timezone.make_aware(datetime.combine(today, time(hour))) for kind, hour in (('IN', 8), ('OUT', 18))}
+        start = threading.Barrier(8)
+        outcomes = []
+
+        def punch(kind, slice_):
+            start.wait()
+            try:
+                for n in range(0, len(slice_), 25):
+                    outcomes.extend(result['status'] for result in ClockService.record(
+                        punches(slice_[n:n + 25], kind, shift[kind]), kiosk=True, now=shift['OUT'],
+                    ))
+            finally:
+                connection.close()
+
+        # Two threads per slice: every employee clocks in (then out) twice, concurrently
+        for kind in ('IN', 'OUT'):
+            threads = [threading.Thread(target=punch, args=(kind, employees[n::4])) for n in list(range(4)) * 2]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            start.reset()
+
+        self.assertEqual((outcomes.count('recorded'), outcomes.count('duplicate')), (600, 600))
+        self.assertEqual(Attendance.objects.filter(check_out_time__isnull=False).count(), 300)
+        self.assertEqual(AttendanceRollupService.verify(), [])
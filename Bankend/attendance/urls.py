@@ -10,6 +10,7 @@ urlpatterns = [
     # Explicit endpoints for clock in/out
     path('check-in/', views.AttendanceViewSet.as_view({'post': 'check_in'}), name='attendance-check-in'),
     path('check-out/', views.AttendanceViewSet.as_view({'post': 'check_out'}), name='attendance-check-out'),
+    path('clock/', views.AttendanceViewSet.as_view({'post': 'clock'}), name='attendance-clock'),
     path('today/', views.AttendanceViewSet.as_view({'get': 'today'}), name='attendance-today'),
     path('summary/', views.AttendanceViewSet.as_view({'get': 'summary'}), name='attendance-summary'),
 ]
@@ -3,11 +3,25 @@ from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.permissions import IsAuthenticated
 from django.utils import timezone
-from .models import Attendance
+from django.conf import settings
+from core.permission_matrix import CREATE, matrix_for
+from core.permissions import is_elite_user
+from .models import Attendance, AttendanceMonth
 from .serializers import AttendanceSerializer
+from .services import ClockService
 from hr.models import Employee
 
 
+# ModulePermission granting kiosk mode (punching for other employees) when it allows create
+KIOSK_MODULE = 'Attendance Kiosk'
+
+
+def is_kiosk(request):
+    if is_elite_user(request.user):
+        return True
+    return bool(matrix_for(request).get('modules', {}).get(KIOSK_MODULE, 0) & CREATE)
+
+
 class AttendanceViewSet(viewsets.ModelViewSet):
     """
     Attendance API ViewSet.
@@ -39,104 +53,99 @@ class AttendanceViewSet(viewsets.ModelViewSet):
             
         return queryset.order_by('-date', '-check_in_time')
 
+    NO_PROFILE = {'error': 'No employee profile found. Contact HR.'}
+
+    def todays_record(self, employee_id):
+        return Attendance.objects.select_related('employee__user').filter(
+            employee_id=employee_id, date=timezone.localdate()
+        ).first()
+
     @action(detail=False, methods=['post'], url_path='check-in')
     def check_in(self, request):
         """Clock in for today."""
-        user = request.user
-        
-        # Get employee profile
-        try:
-            employee = Employee.objects.get(user=user)
-        except Employee.DoesNotExist:
+        employee_id = ClockService.employee_id_for(request.user)
+        if employee_id is None:
+            return Response(self.NO_PROFILE, status=status.HTTP_400_BAD_REQUEST)
+
+        # Idempotent insert: a double tap or a racing request is a duplicate, not an IntegrityError
+        [result] = ClockService.record([{'type': 'IN'}], employee_id)
+        attendance = self.todays_record(employee_id)
+        if result['status'] == 'recorded':
+            return Response({
+                'message': 'Clocked in successfully',
+                'data': AttendanceSerializer(attendance).data
+            }, status=status.HTTP_201_CREATED)
+
+        if attendance.check_out_time:
             return Response(
-                {'error': 'No employee profile found. Contact HR.'},
+                {'error': 'Already completed shift for today.'},
                 status=status.HTTP_400_BAD_REQUEST
             )
-        
-        today = timezone.now().date()
-        now_time = timezone.now().time()
-        
-        # Check if already clocked in today
-        existing = Attendance.objects.filter(employee=employee, date=today).first()
-        
-        if existing:
-            if existing.check_out_time:
-                return Response(
-                    {'error': 'Already completed shift for today.'},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
-            return Response(
-                {'message': 'Already clocked in', 'data': AttendanceSerializer(existing).data},
-                status=status.HTTP_200_OK
-            )
-        
-        # Create new attendance record
-        attendance = Attendance.objects.create(
-            employee=employee,
-            check_in_time=now_time,
-            status='PRESENT'
+        return Response(
+            {'message': 'Already clocked in', 'data': AttendanceSerializer(attendance).data},
+            status=status.HTTP_200_OK
         )
-        
-        return Response({
-            'message': 'Clocked in successfully',
-            'data': AttendanceSerializer(attendance).data
-        }, status=status.HTTP_201_CREATED)
 
     @action(detail=False, methods=['post'], url_path='check-out')
     def check_out(self, request):
         """Clock out for today."""
-        user = request.user
-        
-        try:
-            employee = Employee.objects.get(user=user)
-        except Employee.DoesNotExist:
-            return Response(
-                {'error': 'No employee profile found. Contact HR.'},
-                status=status.HTTP_400_BAD_REQUEST
-            )
-        
-        today = timezone.now().date()
-        now_time = timezone.now().time()
-        
-        # Find today's attendance
-        try:
-            attendance = Attendance.objects.get(employee=employee, date=today)
-        except Attendance.DoesNotExist:
+        employee_id = ClockService.employee_id_for(request.user)
+        if employee_id is None:
+            return Response(self.NO_PROFILE, status=status.HTTP_400_BAD_REQUEST)
+
+        [result] = ClockService.record([{'type': 'OUT'}], employee_id)
+        if result['status'] == 'rejected':
             return Response(
                 {'error': 'No clock-in found for today. Please clock in first.'},
                 status=status.HTTP_400_BAD_REQUEST
             )
-        
-        if attendance.check_out_time:
+        if result['status'] == 'duplicate':
             return Response(
                 {'error': 'Already clocked out today.'},
                 status=status.HTTP_400_BAD_REQUEST
             )
-        
-        # Update checkout time
-        attendance.check_out_time = now_time
-        attendance.save()  # This triggers total_hours calculation
-        
+
         return Response({
             'message': 'Clocked out successfully',
-            'data': AttendanceSerializer(attendance).data
+            'data': AttendanceSerializer(self.todays_record(employee_id)).data
         }, status=status.HTTP_200_OK)
 
+    @action(detail=False, methods=['post'], url_path='clock')
+    def clock(self, request):
+        """
+        Idempotent clock events, one or a batch (queued offline punches from the kiosk/mobile app):
+        {"type": "IN" | "OUT", "timestamp": ISO datetime}, or a list of them as {"events": [...]} or the body itself.
+        Kiosk accounts (a create permission on the KIOSK_MODULE) may add "employee": <employee code>
+        to punch for others.
+        """
+        if isinstance(request.data, list):
+            events = request.data
+        else:
+            events = request.data.get('events') if 'events' in request.data else [request.data]
+        if not isinstance(events, list) or not events:
+            return Response({'error': 'events must be a non-empty list'}, status=status.HTTP_400_BAD_REQUEST)
+        limit = getattr(settings, 'ATTENDANCE_MAX_BATCH_EVENTS', 500)
+        if len(events) > limit:
+            return Response({'error': f'At most {limit} events per request'}, status=status.HTTP_400_BAD_REQUEST)
+
+        results = ClockService.record(
+            events, ClockService.employee_id_for(request.user), kiosk=is_kiosk(request),
+        )
+        counts = {outcome: sum(result['status'] == outcome for result in results)
+                  for outcome in ('recorded', 'duplicate', 'rejected')}
+        return Response({'results': results, **counts}, status=status.HTTP_200_OK)
+
     @action(detail=False, methods=['get'], url_path='today')
     def today(self, request):
         """Get today's attendance for current user."""
-        user = request.user
-        
-        try:
-            employee = Employee.objects.get(user=user)
-        except Employee.DoesNotExist:
+        employee_id = ClockService.employee_id_for(request.user)
+        if employee_id is None:
             return Response(
                 {'error': 'No employee profile found.'},
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        today = timezone.now().date()
-        attendance = Attendance.objects.filter(employee=employee, date=today).first()
+        attendance = self.todays_record(employee_id)
         
         if attendance:
             return Response(AttendanceSerializer(attendance).data)
@@ -152,20 +161,15 @@ class AttendanceViewSet(viewsets.ModelViewSet):
         except Employee.DoesNotExist:
             return Response({'error': 'No employee profile found.'}, status=status.HTTP_400_BAD_REQUEST)
         
-        # Get this month's attendance
+        # This month's totals from the roll-up maintained by Attendance.save
         today = timezone.now().date()
         first_day = today.replace(day=1)
-        
-        records = Attendance.objects.filter(
-            employee=employee,
-            date__gte=first_day,
-            date__lte=today
-        )
-        
-        total_hours = sum(float(r.total_hours or 0) for r in records)
-        overtime_hours = sum(float(r.overtime_hours or 0) for r in records)
-        days_worked = records.count()
-        days_late = records.filter(is_late=True).count()
+        month = AttendanceMonth.objects.filter(employee=employee, period=first_day).first() or AttendanceMonth()
+
+        total_hours = float(month.total_hours)
+        overtime_hours = float(month.overtime_hours)
+        days_worked = month.days_present
+        days_late = month.days_late
         
         return Response({
             'employee': employee.employee_id,
@@ -2,9 +2,13 @@ from rest_framework_simplejwt.authentication import JWTAuthentication
 from rest_framework.exceptions import AuthenticationFailed
 from django.conf import settings
 
+from core.permission_matrix import REQUEST_ATTR
+from . import principal
+
 class SecureJWTAuthentication(JWTAuthentication):
     """
     Extends JWTAuthentication to enforce IP binding.
+    The user is resolved from the cached principal (authentication/principal.py).
     """
     def authenticate(self, request):
         header = self.get_header(request)
@@ -32,7 +36,11 @@ class SecureJWTAuthentication(JWTAuthentication):
                 # raise AuthenticationFailed('Session IP Mismatch. Please login again.')
                 pass # Un-comment to enforce strictly once serializer is updated
 
-        return self.get_user(validated_token), validated_token
+        user, matrix = principal.resolve(validated_token)
+        if matrix is not None:
+            # Fetched with the principal; spares the permission classes a cache read
+            setattr(request, REQUEST_ATTR, matrix)
+        return user, validated_token
 
     def get_client_ip(self, request):
         x_forwarded_for = request.META.get('HTTP_X_FORWARDED_FOR')
@@ -8,6 +8,8 @@ class UserProfile(models.Model):
     email_verified = models.BooleanField(default=False)
     verification_token = models.UUIDField(default=uuid.uuid4, editable=False, unique=True)
     token_created_at = models.DateTimeField(auto_now_add=True)
+    # Bumped to revoke every JWT issued to the user (authentication/principal.py)
+    token_version = models.PositiveIntegerField(default=0)
 
     def __str__(self):
         return f"{self.user.username} - Verified: {self.email_verified}"
@@ -0,0 +1,103 @@
+"""
+Cached principals for JWT authentication.
+
+Tokens carry the user's token version (the `ver` claim, from
+UserProfile.token_version). SecureJWTAuthentication resolves a token to its
+User from the cache key auth_principal:<user_id>:<version>, fetched in the
+same round trip as the user's permission matrix (core.permission_matrix,
+which holds the employee's role and module bits), so a warm request is
+authenticated without touching the database.
+
+The cache holds only PRINCIPAL_FIELDS, never the password hash or the
+Employee profile: the User is rebuilt from them with the other fields
+deferred, so anything else (hr_profile, last_login, ...) loads on access.
+
+revoke() bumps the version, which rejects every token issued before it; a
+password change revokes. Any other User save only drops the cached
+principal. Entries otherwise live for AUTH_PRINCIPAL_TIMEOUT, and other
+workers' in-process cache tier may serve one for up to its FRONT_TIMEOUT.
+"""
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models import F
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework_simplejwt.exceptions import InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from core import permission_matrix
+from .models import UserProfile
+
+VERSION_CLAIM = 'ver'
+PRINCIPAL_FIELDS = ('id', 'username', 'first_name', 'last_name', 'is_staff', 'is_superuser', 'is_active')
+
+
+def cache_key(user_id, version):
+    return f"auth_principal:{user_id}:{version}"
+
+
+def current_version(user_id):
+    return UserProfile.objects.filter(user_id=user_id).values_list('token_version', flat=True).first() or 0
+
+
+class VersionedRefreshToken(RefreshToken):
+    """A refresh token (and the access tokens made from it) stamped with the user's token version."""
+
+    @classmethod
+    def for_user(cls, user):
+        token = super().for_user(user)
+        token[VERSION_CLAIM] = current_version(user.pk)
+        return token
+
+
+def load_principal(user_id, version):
+    """The cacheable PRINCIPAL_FIELDS of an active user whose token version matches, as a tuple."""
+    row = User.objects.filter(pk=user_id).values_list(*PRINCIPAL_FIELDS, 'profile__token_version').first()
+    if row is None:
+        raise AuthenticationFailed('User not found', code='user_not_found')
+    *principal, current = row
+    if not principal[PRINCIPAL_FIELDS.index('is_active')]:
+        raise AuthenticationFailed('User is inactive', code='user_inactive')
+    if version != (current or 0):
+        raise AuthenticationFailed('Token has been revoked. Please login again.', code='token_revoked')
+    return tuple(principal)
+
+
+def user_for(principal):
+    """A User built from cached PRINCIPAL_FIELDS; its other fields are deferred."""
+    values = dict(zip(PRINCIPAL_FIELDS, principal))
+    # from_db() takes the loaded values in model field order
+    loaded = [field.attname for field in User._meta.concrete_fields if field.attname in values]
+    return User.from_db(DEFAULT_DB_ALIAS, loaded, [values[name] for name in loaded])
+
+
+def resolve(validated_token):
+    """(user, cached permission matrix or None) for a validated token."""
+    try:
+        user_id = validated_token[api_settings.USER_ID_CLAIM]
+    except KeyError:
+        raise InvalidToken('Token contained no recognizable user identification')
+    key = cache_key(user_id, validated_token.get(VERSION_CLAIM, 0))
+    cached = cache.get_many([key, permission_matrix.cache_key(user_id)])
+    principal = cached.get(key)
+    if principal is None:
+        principal = load_principal(user_id, validated_token.get(VERSION_CLAIM, 0))
+        cache.set(key, principal, getattr(settings, 'AUTH_PRINCIPAL_TIMEOUT', 300))
+    return user_for(principal), cached.get(permission_matrix.cache_key(user_id))
+
+
+def forget(user_id, version):
+    cache.delete(cache_key(user_id, version))
+
+
+def invalidate(user_id):
+    forget(user_id, current_version(user_id))
+
+
+def revoke(user_id):
+    """Rejects every token issued to the user so far."""
+    profile, _ = UserProfile.objects.get_or_create(user_id=user_id)
+    UserProfile.objects.filter(pk=profile.pk).update(token_version=F('token_version') + 1)
+    forget(user_id, profile.token_version)
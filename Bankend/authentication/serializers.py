@@ -1,6 +1,13 @@
 from django.contrib.auth.models import User
 from rest_framework import serializers
 from guardian.shortcuts import get_objects_for_user
+from rest_framework_simplejwt.serializers import TokenObtainPairSerializer
+from .principal import VersionedRefreshToken
+
+
+class VersionedTokenObtainPairSerializer(TokenObtainPairSerializer):
+    """Login tokens carry the user's token version, so revoking it logs them out."""
+    token_class = VersionedRefreshToken
 
 class UserSerializer(serializers.ModelSerializer):
     password = serializers.CharField(write_only=True)
@@ -74,6 +81,14 @@ class UserSerializer(serializers.ModelSerializer):
         return profile.accent_color if profile else "#b08d57"
 
     def _can_view_financials(self, obj):
+        # Asked by three fields; the guardian check runs once per user
+        if not hasattr(self, '_financials_allowed'):
+            self._financials_allowed = {}
+        if obj.pk not in self._financials_allowed:
+            self._financials_allowed[obj.pk] = self._check_financials(obj)
+        return self._financials_allowed[obj.pk]
+
+    def _check_financials(self, obj):
         request = self.context.get('request')
         if not request or not request.user.is_authenticated:
             return False
@@ -90,6 +105,17 @@ class UserSerializer(serializers.ModelSerializer):
             
         return False
 
+    def _mistakes_this_month(self, profile):
+        # One query serves both net_earnings and mistakes_this_month
+        if not hasattr(self, '_cached_mistakes'):
+            self._cached_mistakes = {}
+        if profile.pk not in self._cached_mistakes:
+            from django.utils import timezone
+            current_month = timezone.now().month
+            current_year = timezone.now().year
+            self._cached_mistakes[profile.pk] = list(profile.mistakes.filter(date__month=current_month, date__year=current_year))
+        return self._cached_mistakes[profile.pk]
+
     def get_basic_salary(self, obj):
         if not self._can_view_financials(obj):
             return 0
@@ -102,13 +128,8 @@ class UserSerializer(serializers.ModelSerializer):
         profile = self._get_profile(obj)
         if not profile: return 0
         try:
-            from django.utils import timezone
-            from django.db.models import Sum
-            current_month = timezone.now().month
-            current_year = timezone.now().year
-            
             basic = profile.basic_salary
-            mistakes = profile.mistakes.filter(date__month=current_month, date__year=current_year).aggregate(total=Sum('amount'))['total'] or 0
+            mistakes = sum(mistake.amount for mistake in self._mistakes_this_month(profile))
             return basic - mistakes
         except:
             return 0
@@ -119,12 +140,8 @@ class UserSerializer(serializers.ModelSerializer):
         profile = self._get_profile(obj)
         if not profile: return []
         try:
-            from django.utils import timezone
             from hr.serializers import MistakeSerializer 
-            current_month = timezone.now().month
-            current_year = timezone.now().year
-            mistakes = profile.mistakes.filter(date__month=current_month, date__year=current_year)
-            return MistakeSerializer(mistakes, many=True).data
+            return MistakeSerializer(self._mistakes_this_month(profile), many=True).data
         except:
             return []
 
@@ -1,14 +1,14 @@
 from django.contrib.auth import authenticate
-from rest_framework_simplejwt.tokens import RefreshToken
 from django.conf import settings
 from django.core.mail import send_mail
 from .serializers import UserSerializer
 from .models import UserProfile
+from .principal import VersionedRefreshToken
 
 class AuthService:
     @staticmethod
     def get_tokens_for_user(user):
-        refresh = RefreshToken.for_user(user)
+        refresh = VersionedRefreshToken.for_user(user)
         return {
             'refresh': str(refresh),
             'access': str(refresh.access_token),
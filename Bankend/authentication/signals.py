@@ -1,10 +1,29 @@
-from django.db.models.signals import post_save
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
 from django.dispatch import receiver
 from django.contrib.auth.models import User
 from .models import UserProfile
+from . import principal
 
 @receiver(post_save, sender=User)
 def create_user_profile(sender, instance, created, **kwargs):
     """Ensure every user has a profile for verification tracking."""
     if created:
         UserProfile.objects.create(user=instance)
+
+@receiver(pre_save, sender=User)
+def revoke_tokens_on_password_change(sender, instance, **kwargs):
+    """set_password() leaves the raw password on the instance until it is saved."""
+    if instance.pk and getattr(instance, '_password', None) is not None:
+        transaction.on_commit(lambda: principal.revoke(instance.pk))
+
+@receiver(post_save, sender=User)
+@receiver(post_delete, sender=User)
+def invalidate_user_principal(sender, instance, created=False, **kwargs):
+    if not created:
+        transaction.on_commit(lambda: principal.invalidate(instance.pk))
+
+@receiver(post_delete, sender=UserProfile)
+def invalidate_deleted_principal(sender, instance, **kwargs):
+    # The profile (and its token version) goes before its user when a user is deleted
+    transaction.on_commit(lambda: principal.forget(instance.user_id, instance.token_version))
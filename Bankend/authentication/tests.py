@@ -0,0 +1,98 @@
+from datetime import date
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase
+from rest_framework.exceptions import AuthenticationFailed
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
+from rest_framework_simplejwt.tokens import RefreshToken
+
+from core.permission_matrix import REQUEST_ATTR
+from core.testing import AppQueriesMixin
+from .authentication import SecureJWTAuthentication
+from .principal import VersionedRefreshToken, revoke
+
+
+class CachedPrincipalTests(AppQueriesMixin, TestCase):
+    def setUp(self):
+        from hr.models import Employee
+        from locations.models import Branch
+        cache.clear()
+        self.user = User.objects.create_user('advisor', password='old-secret')
+        self.branch = Branch.objects.create(name='Main', code='MAIN')
+        Employee.objects.create(user=self.user, employee_id='E-1', pin_code='200001', role='Service Advisor',
+                                branch=self.branch, date_joined=date(2024, 1, 1))
+
+    def authenticate(self, token):
+        request = Request(APIRequestFactory().get('/', HTTP_AUTHORIZATION=f'Bearer {token}'))
+        user, _ = SecureJWTAuthentication().authenticate(request)
+        request.user = user  # as Request._authenticate does with the result
+        return user, request
+
+    def test_warm_cache_authenticates_without_queries(self):
+        token = VersionedRefreshToken.for_user(self.user).access_token
+        self.authenticate(token)
+        with self.assertNumAppQueries(0):
+            user, request = self.authenticate(token)
+            self.assertEqual((user.pk, user.username, user.is_active), (self.user.pk, 'advisor', True))
+        # The profile is not cached with the principal; it loads when used
+        self.assertEqual(user.hr_profile.branch.name, 'Main')
+
+        # Nothing but the principal's own fields reaches the shared cache
+        from .principal import PRINCIPAL_FIELDS, cache_key
+        cached = cache.get(cache_key(self.user.pk, 0))
+        self.assertEqual(len(cached), len(PRINCIPAL_FIELDS))
+        self.assertNotIn(self.user.password, cached)
+        self.assertTrue(user.check_password('old-secret'))  # the hash is read from the database on demand
+
+        # The permission matrix comes back in the same cache round trip once it exists
+        from core.permissions import IsAdminOrOwner
+        self.assertTrue(IsAdminOrOwner().has_permission(request, None))
+        with self.assertNumAppQueries(0):
+            _, request = self.authenticate(token)
+            self.assertTrue(hasattr(request, REQUEST_ATTR))
+            self.assertTrue(IsAdminOrOwner().has_permission(request, None))
+
+    def test_tokens_without_a_version_claim_still_work(self):
+        user, _ = self.authenticate(RefreshToken.for_user(self.user).access_token)
+        self.assertEqual(user.pk, self.user.pk)
+
+    def test_revocation_rejects_earlier_tokens(self):
+        old = VersionedRefreshToken.for_user(self.user).access_token
+        self.authenticate(old)
+        revoke(self.user.pk)
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate(old)
+        user, _ = self.authenticate(VersionedRefreshToken.for_user(self.user).access_token)
+        self.assertEqual(user.pk, self.user.pk)
+
+    def test_password_change_and_deactivation_invalidate(self):
+        old = VersionedRefreshToken.for_user(self.user).access_token
+        self.authenticate(old)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.set_password('new-secret')
+            self.user.save()
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate(old)
+
+        token = VersionedRefreshToken.for_user(self.user).access_token
+        self.authenticate(token)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.is_active = False
+            self.user.save()
+        with self.assertRaises(AuthenticationFailed):
+            self.authenticate(token)
+
+    def test_login_and_revoke_endpoints(self):
+        client = APIClient()
+        response = client.post('/api/auth/login/', {'username': 'advisor', 'password': 'old-secret'}, format='json')
+        self.assertEqual(response.status_code, 200)
+        client.credentials(HTTP_AUTHORIZATION=f"Bearer {response.json()['access']}")
+
+        profile = client.get('/api/auth/profile/')
+        self.assertEqual(profile.status_code, 200)
+        self.assertEqual(profile.json()['hr_profile']['branch'], 'Main')
+
+        self.assertEqual(client.post('/api/auth/tokens/revoke/').status_code, 200)
+        self.assertEqual(client.get('/api/auth/profile/').status_code, 401)
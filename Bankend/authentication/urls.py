@@ -15,5 +15,6 @@ urlpatterns = [
     path('token/refresh/', TokenRefreshView.as_view(), name='token_refresh'),
     path('profile/', UserProfileView.as_view(), name='profile'),
     path('users/', UserListView.as_view(), name='user-list'),
+    path('tokens/revoke/', views.RevokeTokensView.as_view(), name='token-revoke'),
     path('logout/', views.logout_view, name='logout'),
 ]
@@ -14,6 +14,7 @@ from rest_framework_simplejwt.tokens import RefreshToken
 from .serializers import UserSerializer
 from .models import UserProfile
 from .services import AuthService
+from . import principal
 
 class RegisterView(APIView):
     permission_classes = [AllowAny]
@@ -79,12 +80,12 @@ class PasswordResetConfirmView(APIView):
 class UserProfileView(APIView):
     def get(self, request):
         try:
-            # Use prefetch_related for all relationships to be safe (avoids Inner Join issues on reverse relations)
-            user = User.objects.prefetch_related(
-                'hr_profile',
+            # select_related joins the reverse one-to-one with a LEFT OUTER JOIN, so users without a profile load too
+            user = User.objects.select_related(
                 'hr_profile__department',
                 'hr_profile__company',
-                'hr_profile__branch',
+                'hr_profile__branch'
+            ).prefetch_related(
                 'hr_profile__module_permissions'
             ).get(id=request.user.id)
         except User.DoesNotExist:
@@ -93,6 +94,12 @@ class UserProfileView(APIView):
         serializer = UserSerializer(user, context={'request': request})
         return Response(serializer.data)
 
+class RevokeTokensView(APIView):
+    """Signs the user out everywhere: every token issued so far stops working."""
+    def post(self, request):
+        principal.revoke(request.user.pk)
+        return Response({'detail': 'All sessions have been signed out.'})
+
 class UserListView(APIView):
     def get(self, request):
         users = User.objects.all().select_related(
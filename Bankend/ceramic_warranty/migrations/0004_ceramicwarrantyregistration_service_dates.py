@@ -0,0 +1,23 @@
+# Generated by Django 5.1.15 on 2026-10-18 19:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ceramic_warranty', '0003_ceramicwarrantyregistration_signature_data'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ceramicwarrantyregistration',
+            name='last_service_date',
+            field=models.DateField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='ceramicwarrantyregistration',
+            name='next_due_date',
+            field=models.DateField(blank=True, db_index=True, editable=False, null=True),
+        ),
+    ]
@@ -0,0 +1,48 @@
+from datetime import timedelta
+
+from django.db import migrations, models
+
+# Frozen copy of the ServiceScheduleMixin rules at the time of this migration
+VISIT_FIELDS = ('m1_date', 'm2_date', 'm3_date', 'm4_date')
+SERVICE_INTERVAL_DAYS = 180
+RETENTION_SCHEDULE = (('m1_date', 365), ('m2_date', 730), ('m3_date', 1095))
+COLUMNS = ('last_service_date', 'next_due_date', 'retention_due_date')
+
+
+def populate_service_dates(apps, schema_editor):
+    Registration = apps.get_model('ceramic_warranty', 'CeramicWarrantyRegistration')
+
+    changed = []
+    for reg in Registration.objects.only('pk', 'installation_date', *VISIT_FIELDS).iterator(chunk_size=1000):
+        installed = reg.installation_date
+        if not installed:
+            continue
+        last = max([d for d in (getattr(reg, f) for f in VISIT_FIELDS) if d], default=installed)
+        reg.last_service_date = last
+        reg.next_due_date = last + timedelta(days=SERVICE_INTERVAL_DAYS)
+        reg.retention_due_date = next(
+            (installed + timedelta(days=days) for field, days in RETENTION_SCHEDULE if not getattr(reg, field)),
+            None,
+        )
+        changed.append(reg)
+        if len(changed) >= 1000:
+            Registration.objects.bulk_update(changed, COLUMNS)
+            changed = []
+    if changed:
+        Registration.objects.bulk_update(changed, COLUMNS)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ceramic_warranty', '0004_ceramicwarrantyregistration_service_dates'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ceramicwarrantyregistration',
+            name='retention_due_date',
+            field=models.DateField(blank=True, db_index=True, editable=False, null=True),
+        ),
+        migrations.RunPython(populate_service_dates, migrations.RunPython.noop),
+    ]
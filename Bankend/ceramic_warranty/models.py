@@ -1,7 +1,11 @@
 from django.db import models
 from invoices.models import Invoice
+from core.models import ServiceScheduleMixin
+
+class CeramicWarrantyRegistration(ServiceScheduleMixin, models.Model):
+    service_date_fields = ('m1_date', 'm2_date', 'm3_date', 'm4_date')
+    retention_schedule = (('m1_date', 365), ('m2_date', 730), ('m3_date', 1095))
 
-class CeramicWarrantyRegistration(models.Model):
     BRANCH_CHOICES = [
         ('DXB', 'Dubai'),
         ('AUH', 'Abu Dhabi'),
@@ -44,6 +48,11 @@ class CeramicWarrantyRegistration(models.Model):
     m3_notes = models.TextField(null=True, blank=True)
     m4_date = models.DateField(null=True, blank=True, verbose_name="4th Maintenance Date")
     m4_notes = models.TextField(null=True, blank=True)
+
+    # Derived from the maintenance dates (ServiceScheduleMixin)
+    last_service_date = models.DateField(null=True, blank=True, editable=False)
+    next_due_date = models.DateField(null=True, blank=True, editable=False, db_index=True)
+    retention_due_date = models.DateField(null=True, blank=True, editable=False, db_index=True)
     
     signature_data = models.TextField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
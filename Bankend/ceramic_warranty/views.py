@@ -7,6 +7,7 @@ from rest_framework.response import Response
 from .models import CeramicWarrantyRegistration
 from .forms import CeramicWarrantyRegistrationForm
 from .serializers import CeramicWarrantySerializer
+from core.pagination import DueDatePagination
 
 def ceramic_warranty_create(request):
     if request.method == 'POST':
@@ -85,27 +86,26 @@ class CeramicWarrantyViewSet(viewsets.ModelViewSet):
 
     @action(detail=False, methods=['get'])
     def due_for_maintenance(self, request):
-        """Get warranties due for maintenance (no maintenance in last 6 months)"""
-        from datetime import timedelta
-        six_months_ago = timezone.now().date() - timedelta(days=180)
+        """Get warranties due for maintenance (no maintenance in last 6 months); ?page_size= pages the list"""
+        today = timezone.now().date()
+        due = self.queryset.filter(next_due_date__lt=today).order_by('next_due_date', 'id').only(
+            'id', 'full_name', 'contact_number', 'vehicle_brand', 'vehicle_model', 'license_plate',
+            'coating_type', 'last_service_date', 'next_due_date',
+        )
+        paginator = DueDatePagination()
+        page = paginator.paginate_queryset(due, request, view=self)
 
-        due_list = []
-        for warranty in self.queryset:
-            # Find the latest maintenance date
-            maintenance_dates = [warranty.m1_date, warranty.m2_date, warranty.m3_date, warranty.m4_date]
-            valid_dates = [d for d in maintenance_dates if d]
-            last_maintenance = max(valid_dates) if valid_dates else warranty.installation_date
-
-            if last_maintenance and last_maintenance < six_months_ago:
-                due_list.append({
-                    'id': warranty.id,
-                    'customer': warranty.full_name,
-                    'contact': warranty.contact_number,
-                    'vehicle': f'{warranty.vehicle_brand} {warranty.vehicle_model}',
-                    'license_plate': warranty.license_plate,
-                    'coating_type': warranty.coating_type,
-                    'last_maintenance': last_maintenance,
-                    'days_overdue': (timezone.now().date() - last_maintenance).days - 180
-                })
+        due_list = [{
+            'id': warranty.id,
+            'customer': warranty.full_name,
+            'contact': warranty.contact_number,
+            'vehicle': f'{warranty.vehicle_brand} {warranty.vehicle_model}',
+            'license_plate': warranty.license_plate,
+            'coating_type': warranty.coating_type,
+            'last_maintenance': warranty.last_service_date,
+            'days_overdue': (today - warranty.next_due_date).days
+        } for warranty in (due if page is None else page)]
 
+        if page is not None:
+            return paginator.get_paginated_response(due_list)
         return Response(due_list)
@@ -6,3 +6,7 @@ class CoreConfig(AppConfig):
 
     def ready(self):
         import core.signals
+        from . import pdf, permission_matrix, search
+        pdf.connect_signals()
+        permission_matrix.connect_signals()
+        search.connect_signals()
@@ -0,0 +1,150 @@
+"""
+Coalesced audit pipeline.
+
+Model signals call record_event(); events are buffered and written as one
+AuditLog bulk insert:
+
+* inside a transaction, the batch is flushed from transaction.on_commit, one
+  batch per savepoint level (events from a rolled-back transaction or
+  savepoint are dropped with it);
+* otherwise, inside a request, the batch is flushed by AuditMiddleware when the
+  response is ready;
+* otherwise (shell, commands, tasks outside a transaction) the event is flushed
+  immediately.
+
+A flush hands the batch to the log_audit_events Celery task as a single message.
+If the broker cannot accept it (or AUDIT_ASYNC is False) the batch is written
+in-process instead.
+
+Old values for UPDATE diffs come from a snapshot taken when the instance is
+loaded (post_init) and refreshed after each save, so no extra SELECT is made.
+"""
+import copy
+import logging
+import threading
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+logger = logging.getLogger(__name__)
+
+SNAPSHOT_ATTR = '_audit_snapshot'
+
+_local = threading.local()
+_attnames = {}
+
+
+# ---- snapshots ----
+
+def _concrete_attnames(model):
+    names = _attnames.get(model)
+    if names is None:
+        names = _attnames[model] = [(f.name, f.attname) for f in model._meta.concrete_fields]
+    return names
+
+
+def take_snapshot(instance):
+    values = instance.__dict__
+    snapshot = {}
+    for _, attname in _concrete_attnames(type(instance)):
+        if attname in values:  # deferred fields are not tracked
+            value = values[attname]
+            snapshot[attname] = copy.deepcopy(value) if isinstance(value, (dict, list)) else value
+    setattr(instance, SNAPSHOT_ATTR, snapshot)
+
+
+def field_changes(instance):
+    """{field: {'before', 'after'}} against the last snapshot, or None."""
+    snapshot = getattr(instance, SNAPSHOT_ATTR, None)
+    if snapshot is None:
+        return None
+    values = instance.__dict__
+    changes = {}
+    for name, attname in _concrete_attnames(type(instance)):
+        if attname not in snapshot or attname not in values:
+            continue
+        before, after = snapshot[attname], values[attname]
+        if before != after:
+            changes[name] = {'before': str(before), 'after': str(after)}
+    return changes or None
+
+
+# ---- buffering ----
+
+class _Batch:
+    """Events recorded at one savepoint level, flushed by that level's on_commit hook."""
+
+    def __init__(self, pending, level):
+        self.events = []
+        self.pending, self.level = pending, level
+
+    def flush(self):
+        # Later events at this level need a new hook: this one has run
+        if self.pending.get(self.level) is self:
+            del self.pending[self.level]
+        events, self.events = self.events, []
+        dispatch(events)
+
+
+def _pending_batch(connection, using):
+    # Django drops the on_commit hooks registered inside a savepoint that rolls
+    # back, so each savepoint level gets its own batch and hook: rolled-back
+    # events go with it. connection.run_on_commit is replaced on commit and on
+    # any rollback, so identity tells us whether the known hooks are pending.
+    state = getattr(_local, 'batches', None)
+    if state is None or state[0] is not connection.run_on_commit:
+        state = _local.batches = (connection.run_on_commit, {})
+    level = tuple(connection.savepoint_ids)
+    batch = state[1].get(level)
+    if batch is None:
+        batch = state[1][level] = _Batch(state[1], level)
+        transaction.on_commit(batch.flush, using=using)
+    return batch
+
+
+def begin_request():
+    _local.request_events = []
+
+
+def end_request():
+    events = getattr(_local, 'request_events', None)
+    _local.request_events = None
+    if events:
+        dispatch(events)
+
+
+def record_event(event, using=DEFAULT_DB_ALIAS):
+    connection = connections[using]
+    if connection.in_atomic_block:
+        _pending_batch(connection, using).events.append(event)
+        return
+
+    request_events = getattr(_local, 'request_events', None)
+    if request_events is not None:
+        request_events.append(event)
+    else:
+        dispatch([event])
+
+
+# ---- sinks ----
+
+def write_events(events):
+    """Local sink: one bulk INSERT."""
+    from .models import AuditLog
+    AuditLog.objects.bulk_create([AuditLog(**event) for event in events], batch_size=500)
+
+
+def dispatch(events):
+    if not events:
+        return
+    if getattr(settings, 'AUDIT_ASYNC', True):
+        from .tasks import log_audit_events
+        try:
+            log_audit_events.apply_async(args=[events], retry=False)
+            return
+        except Exception as e:
+            logger.warning(f"Audit broker unavailable, writing {len(events)} events locally: {e}")
+    try:
+        write_events(events)
+    except Exception as e:
+        logger.error(f"Failed to write {len(events)} audit events: {e}")
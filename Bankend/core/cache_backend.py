@@ -1,73 +1,379 @@
 """
-Custom cache backend that stores in database
+Cache backends.
+
+DatabaseCache: shared tier stored in core.CacheEntry. Reads filter out expired
+rows in SQL (no per-read deletes), get_many/set_many are single bulk statements,
+and expired rows are removed in batches by sweep_expired_entries(). Integers
+are stored as plain digits and incr() adds to them in one UPDATE, so
+concurrent increments are not lost.
+
+TieredCache: bounded in-process LRU in front of a shared tier (DatabaseCache by
+default, or any configured cache alias such as Redis), with hit/miss counters.
+Front entries live for at most FRONT_TIMEOUT seconds, which bounds how stale a
+worker can be after another worker writes or deletes a key.
 """
-from django.core.cache.backends.base import BaseCache
+import base64
+import pickle
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone as dt_timezone
+
+from django.core.cache.backends.base import BaseCache, DEFAULT_TIMEOUT
+from django.db import transaction
+from django.db.models import BigIntegerField, F, TextField
+from django.db.models.functions import Cast
 from django.utils import timezone
-from datetime import timedelta
-import json
+
+# Stored for timeout=None ("never expires")
+NEVER_EXPIRES = datetime(9999, 12, 31, tzinfo=dt_timezone.utc)
+
+
+def _cache_entry_model():
+    from core.models import CacheEntry
+    return CacheEntry
+
+
+def _delete_rows(column=None, values=None):
+    """
+    DELETE FROM core_cacheentry [WHERE column IN values] in plain SQL. A
+    queryset delete() would go through the collector, which fetches and
+    signals every row because the audit post_delete receiver listens globally.
+    """
+    from django.db import connection
+
+    CacheEntry = _cache_entry_model()
+    qn = connection.ops.quote_name
+    sql = f"DELETE FROM {qn(CacheEntry._meta.db_table)}"
+    values = list(values or [])
+    if column is not None:
+        if not values:
+            return 0
+        sql += f" WHERE {qn(CacheEntry._meta.get_field(column).column)} IN ({', '.join(['%s'] * len(values))})"
+    with connection.cursor() as cursor:
+        cursor.execute(sql, values)
+        return cursor.rowcount
+
+
+def _insert_if_absent(key, **fields):
+    """
+    INSERT ... ON CONFLICT DO NOTHING (PostgreSQL, SQLite); False when the key
+    is already taken. Unlike catching IntegrityError, it needs no savepoint.
+    """
+    from django.db import connection
+
+    CacheEntry = _cache_entry_model()
+    qn = connection.ops.quote_name
+    columns = {CacheEntry._meta.get_field('key').column: key}
+    for name, value in fields.items():
+        field = CacheEntry._meta.get_field(name)
+        columns[field.column] = field.get_db_prep_save(value, connection)
+    sql = (
+        f"INSERT INTO {qn(CacheEntry._meta.db_table)} ({', '.join(qn(c) for c in columns)}) "
+        f"VALUES ({', '.join(['%s'] * len(columns))}) ON CONFLICT DO NOTHING"
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, list(columns.values()))
+        return cursor.rowcount == 1
+
+
+def sweep_expired_entries(batch_size=1000):
+    """Delete expired CacheEntry rows in primary-key batches. Returns rows deleted."""
+    CacheEntry = _cache_entry_model()
+    now = timezone.now()
+    deleted = 0
+    while True:
+        ids = list(
+            CacheEntry.objects.filter(expires_at__lte=now).order_by().values_list('pk', flat=True)[:batch_size]
+        )
+        if not ids:
+            return deleted
+        deleted += _delete_rows('id', ids)
+
 
 class DatabaseCache(BaseCache):
     def __init__(self, location, params):
         super().__init__(params)
         self.location = location
-    
+
     def get_model(self):
-        from core.models import CacheEntry
-        return CacheEntry
-    
+        return _cache_entry_model()
+
+    def _expires_at(self, timeout):
+        expiry = self.get_backend_timeout(timeout)
+        if expiry is None:
+            return NEVER_EXPIRES
+        return datetime.fromtimestamp(expiry, tz=dt_timezone.utc)
+
+    @staticmethod
+    def _encode(value):
+        # Integers are stored as plain digits so incr() can add to them in SQL
+        if type(value) is int:
+            return str(value)
+        return base64.b64encode(pickle.dumps(value, pickle.HIGHEST_PROTOCOL)).decode('ascii')
+
+    @staticmethod
+    def _decode(raw):
+        if raw.lstrip('-').isdigit():
+            return int(raw)
+        return pickle.loads(base64.b64decode(raw.encode('ascii')))
+
+    def _live(self):
+        return self.get_model().objects.filter(expires_at__gt=timezone.now()).order_by()
+
+    def _fetch(self, keys):
+        """{made_key: value} for unexpired keys; undecodable legacy rows count as misses."""
+        found = {}
+        for key, raw in self._live().filter(key__in=keys).values_list('key', 'value'):
+            try:
+                found[key] = self._decode(raw)
+            except Exception:
+                continue
+        return found
+
     def get(self, key, default=None, version=None):
-        key = self.make_key(key, version=version)
-        self.validate_key(key)
-        
-        CacheEntry = self.get_model()
-        try:
-            entry = CacheEntry.objects.get(key=key)
-            if entry.is_expired:
-                entry.delete()
-                return default
-            return json.loads(entry.value)
-        except CacheEntry.DoesNotExist:
-            return default
-    
-    def set(self, key, value, timeout=None, version=None):
-        key = self.make_key(key, version=version)
-        self.validate_key(key)
-        
-        if timeout is None:
-            timeout = self.default_timeout
-        
+        key = self.make_and_validate_key(key, version=version)
+        return self._fetch([key]).get(key, default)
+
+    def get_many(self, keys, version=None):
+        key_map = {self.make_and_validate_key(key, version=version): key for key in keys}
+        if not key_map:
+            return {}
+        return {key_map[made]: value for made, value in self._fetch(list(key_map)).items()}
+
+    def _write(self, data, timeout):
         CacheEntry = self.get_model()
-        expires_at = timezone.now() + timedelta(seconds=timeout)
-        
-        CacheEntry.objects.update_or_create(
-            key=key,
-            defaults={
-                'value': json.dumps(value),
-                'expires_at': expires_at
-            }
+        if timeout is not DEFAULT_TIMEOUT and timeout is not None and timeout <= 0:
+            _delete_rows('key', data)
+            return
+        expires_at = self._expires_at(timeout)
+        now = timezone.now()
+        CacheEntry.objects.bulk_create(
+            [
+                CacheEntry(key=key, value=self._encode(value), expires_at=expires_at, created_at=now, updated_at=now)
+                for key, value in data.items()
+            ],
+            update_conflicts=True,
+            unique_fields=['key'],
+            update_fields=['value', 'expires_at', 'updated_at'],
         )
-    
-    def delete(self, key, version=None):
-        key = self.make_key(key, version=version)
-        self.validate_key(key)
-        
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        self._write({key: value}, timeout)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        made = {self.make_and_validate_key(key, version=version): value for key, value in data.items()}
+        if made:
+            self._write(made, timeout)
+        return []
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        """Claims the key in one statement, so concurrent adds have a single winner (cache.add locks)."""
         CacheEntry = self.get_model()
-        CacheEntry.objects.filter(key=key).delete()
-    
+        made = self.make_and_validate_key(key, version=version)
+        now = timezone.now()
+        fields = {'value': self._encode(value), 'expires_at': self._expires_at(timeout), 'updated_at': now}
+        # An expired row still holds the key: take it over only while it is expired
+        if CacheEntry.objects.filter(key=made, expires_at__lte=now).update(**fields):
+            return True
+        return _insert_if_absent(made, created_at=now, **fields)
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        return bool(self._live().filter(key=key).update(expires_at=self._expires_at(timeout)))
+
+    def incr(self, key, delta=1, version=None):
+        """Adds delta in one UPDATE ... SET value = value + delta, so concurrent increments are never lost."""
+        made = self.make_and_validate_key(key, version=version)
+        with transaction.atomic():
+            updated = self._live().filter(key=made, value__regex=r'^-?[0-9]+$').update(
+                value=Cast(Cast(F('value'), BigIntegerField()) + delta, TextField()),
+                updated_at=timezone.now(),
+            )
+            if not updated:
+                if self.has_key(key, version=version):
+                    raise TypeError(f"Cache value of {key!r} is not an integer")
+                raise ValueError(f"Key {key!r} not found")
+            return int(self._live().filter(key=made).values_list('value', flat=True).get())
+
+    def delete(self, key, version=None):
+        key = self.make_and_validate_key(key, version=version)
+        return bool(_delete_rows('key', [key]))
+
+    def delete_many(self, keys, version=None):
+        made = [self.make_and_validate_key(key, version=version) for key in keys]
+        if made:
+            _delete_rows('key', made)
+
     def clear(self):
-        CacheEntry = self.get_model()
-        CacheEntry.objects.all().delete()
-    
+        _delete_rows()
+
     def has_key(self, key, version=None):
-        key = self.make_key(key, version=version)
-        self.validate_key(key)
-        
-        CacheEntry = self.get_model()
-        try:
-            entry = CacheEntry.objects.get(key=key)
-            if entry.is_expired:
-                entry.delete()
-                return False
+        key = self.make_and_validate_key(key, version=version)
+        return self._live().filter(key=key).exists()
+
+    def sweep_expired(self, batch_size=1000):
+        return sweep_expired_entries(batch_size)
+
+
+class TieredCache(BaseCache):
+    """
+    OPTIONS:
+        FRONT_MAX_ENTRIES  LRU size per process (default 1000)
+        FRONT_TIMEOUT      max seconds a value is served from the front (default 5)
+        SHARED             alias of the shared cache in CACHES (default: DatabaseCache)
+    """
+
+    def __init__(self, location, params):
+        super().__init__(params)
+        options = params.get('OPTIONS', {})
+        self._front = OrderedDict()
+        self._lock = threading.Lock()
+        self._front_max = int(options.get('FRONT_MAX_ENTRIES', 1000))
+        self._front_timeout = float(options.get('FRONT_TIMEOUT', 5))
+        self._shared_alias = options.get('SHARED')
+        self._shared_cache = None if self._shared_alias else DatabaseCache(location, params)
+        self.front_hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+
+    @property
+    def _shared(self):
+        if self._shared_cache is None:
+            from django.core.cache import caches
+            self._shared_cache = caches[self._shared_alias]
+        return self._shared_cache
+
+    # ---- front tier ----
+
+    def _front_get(self, made_key):
+        with self._lock:
+            entry = self._front.get(made_key)
+            if entry is None:
+                return None
+            pickled, expires = entry
+            if expires <= time.monotonic():
+                del self._front[made_key]
+                return None
+            self._front.move_to_end(made_key)
+        return pickled
+
+    def _front_set(self, made_key, value, timeout):
+        ttl = self._front_timeout
+        backend_timeout = self.get_backend_timeout(timeout)
+        if backend_timeout is not None:
+            ttl = min(ttl, backend_timeout - time.time())
+        if ttl <= 0:
+            self._front_drop(made_key)
+            return
+        pickled = pickle.dumps(value, pickle.HIGHEST_PROTOCOL)
+        with self._lock:
+            self._front[made_key] = (pickled, time.monotonic() + ttl)
+            self._front.move_to_end(made_key)
+            while len(self._front) > self._front_max:
+                self._front.popitem(last=False)
+
+    def _front_drop(self, made_key):
+        with self._lock:
+            self._front.pop(made_key, None)
+
+    # ---- cache API ----
+
+    def get(self, key, default=None, version=None):
+        made = self.make_and_validate_key(key, version=version)
+        pickled = self._front_get(made)
+        if pickled is not None:
+            self.front_hits += 1
+            return pickle.loads(pickled)
+
+        sentinel = object()
+        value = self._shared.get(key, sentinel, version=version)
+        if value is sentinel:
+            self.misses += 1
+            return default
+        self.shared_hits += 1
+        self._front_set(made, value, self._front_timeout)
+        return value
+
+    def get_many(self, keys, version=None):
+        found, missing = {}, []
+        for key in keys:
+            pickled = self._front_get(self.make_and_validate_key(key, version=version))
+            if pickled is None:
+                missing.append(key)
+            else:
+                found[key] = pickle.loads(pickled)
+        self.front_hits += len(found)
+
+        if missing:
+            shared = self._shared.get_many(missing, version=version)
+            self.shared_hits += len(shared)
+            self.misses += len(missing) - len(shared)
+            for key, value in shared.items():
+                self._front_set(self.make_and_validate_key(key, version=version), value, self._front_timeout)
+            found.update(shared)
+        return found
+
+    def set(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        self._shared.set(key, value, timeout, version=version)
+        self._front_set(self.make_and_validate_key(key, version=version), value, timeout)
+
+    def set_many(self, data, timeout=DEFAULT_TIMEOUT, version=None):
+        failed = self._shared.set_many(data, timeout, version=version) or []
+        for key, value in data.items():
+            if key not in failed:
+                self._front_set(self.make_and_validate_key(key, version=version), value, timeout)
+        return failed
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        added = self._shared.add(key, value, timeout, version=version)
+        if added:
+            self._front_set(self.make_and_validate_key(key, version=version), value, timeout)
+        return added
+
+    def touch(self, key, timeout=DEFAULT_TIMEOUT, version=None):
+        self._front_drop(self.make_and_validate_key(key, version=version))
+        return self._shared.touch(key, timeout, version=version)
+
+    def incr(self, key, delta=1, version=None):
+        self._front_drop(self.make_and_validate_key(key, version=version))
+        return self._shared.incr(key, delta, version=version)
+
+    def delete(self, key, version=None):
+        self._front_drop(self.make_and_validate_key(key, version=version))
+        return self._shared.delete(key, version=version)
+
+    def delete_many(self, keys, version=None):
+        for key in keys:
+            self._front_drop(self.make_and_validate_key(key, version=version))
+        self._shared.delete_many(keys, version=version)
+
+    def has_key(self, key, version=None):
+        if self._front_get(self.make_and_validate_key(key, version=version)) is not None:
             return True
-        except CacheEntry.DoesNotExist:
-            return False
+        return self._shared.has_key(key, version=version)
+
+    def clear(self):
+        with self._lock:
+            self._front.clear()
+        self._shared.clear()
+
+    def sweep_expired(self, batch_size=1000):
+        with self._lock:
+            now = time.monotonic()
+            for made_key in [k for k, (_, expires) in self._front.items() if expires <= now]:
+                del self._front[made_key]
+        sweep = getattr(self._shared, 'sweep_expired', None)
+        return sweep(batch_size) if sweep else 0
+
+    def stats(self):
+        lookups = self.front_hits + self.shared_hits + self.misses
+        return {
+            'front_hits': self.front_hits,
+            'shared_hits': self.shared_hits,
+            'misses': self.misses,
+            'hit_rate': round((self.front_hits + self.shared_hits) / lookups, 4) if lookups else None,
+            'front_entries': len(self._front),
+            'front_max_entries': self._front_max,
+        }
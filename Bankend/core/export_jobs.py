@@ -0,0 +1,192 @@
+"""
+Background report exports.
+
+request_export() turns (report, format, params) into an ExportJob keyed by a
+hash of all three. A request matching a pending, running or still-fresh job
+gets that job back, so identical requests share one computation; each
+requester is added to the job's `requesters`, who may poll it. New jobs are
+handed to the run_export_job Celery task; if the broker cannot accept it (or
+EXPORT_JOBS_ASYNC is False) the export runs in-process instead.
+
+run_job() writes the file under MEDIA_ROOT/exports/ chunk by chunk, recording
+rows_written after each chunk for progress polling. Finished files are served
+through signed, expiring download tokens (download_token / resolve_token) and
+removed by purge_expired_exports once EXPORT_JOB_TTL_SECONDS has passed.
+
+Reports are registered in EXPORT_REPORTS as dotted paths to a builder taking
+the params dict and returning (filename, columns, queryset); see core.exports.
+EXPORT_SOURCE_VIEWS names the view showing the same rows on screen, whose
+permissions decide who may export them.
+"""
+import hashlib
+import json
+import logging
+import os
+from datetime import timedelta
+
+from django.conf import settings
+from django.core import signing
+from django.db import transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .exports import FORMATS, write_export
+from .models import ExportJob
+
+logger = logging.getLogger(__name__)
+
+EXPORT_REPORTS = {
+    'workshop_diary': 'reports.exports.workshop_diary_export',
+    'invoice_book': 'reports.exports.invoice_book_export',
+    'payroll': 'reports.exports.payroll_export',
+    'general_ledger': 'finance.services.general_ledger_export',
+}
+EXPORT_SOURCE_VIEWS = {
+    'workshop_diary': 'reports.views.WorkshopDiaryReportView',
+    'invoice_book': 'reports.views.InvoiceBookReportView',
+    'payroll': 'reports.views.PayrollExportView',
+    'general_ledger': 'finance.views.VoucherViewSet',
+}
+EXPORT_DIR = 'exports'
+TOKEN_SALT = 'core.export_jobs.download'
+
+
+def setting(name, default):
+    return getattr(settings, name, default)
+
+
+def job_key(report, fmt, params):
+    payload = json.dumps([report, fmt, params], sort_keys=True, separators=(',', ':'))
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def normalize_params(params):
+    """Drops empty values and stringifies the rest so equivalent requests hash alike."""
+    return {str(k): str(v) for k, v in (params or {}).items() if v not in (None, '')}
+
+
+def is_reusable(job, now=None):
+    """True if a new request with the same key should share this job."""
+    now = now or timezone.now()
+    if job.status == 'PENDING':
+        return True
+    if job.status == 'RUNNING':
+        return job.started_at is None or now - job.started_at < timedelta(seconds=setting('EXPORT_JOB_TIMEOUT_SECONDS', 3600))
+    if job.status == 'DONE':
+        fresh = now - job.finished_at < timedelta(seconds=setting('EXPORT_JOB_TTL_SECONDS', 3600))
+        return fresh and os.path.exists(absolute_path(job))
+    return False  # FAILED: retry
+
+
+def check_report(report):
+    """Raises ValueError for a report that is not registered."""
+    if report not in EXPORT_REPORTS:
+        raise ValueError(f"Unknown report {report!r}; expected one of {', '.join(EXPORT_REPORTS)}")
+
+
+def request_export(report, fmt, params=None, user=None):
+    """The ExportJob serving this request; raises ValueError for an unknown report, format or params."""
+    check_report(report)
+    if fmt not in FORMATS:
+        raise ValueError(f"Unknown export format {fmt!r}; expected one of {', '.join(FORMATS)}")
+    params = normalize_params(params)
+    # Builders only assemble lazy querysets, so bad params are rejected here instead of failing the job
+    import_string(EXPORT_REPORTS[report])(params)
+    key = job_key(report, fmt, params)
+
+    with transaction.atomic():
+        job, created = ExportJob.objects.select_for_update().get_or_create(
+            key=key, defaults={'report': report, 'export_format': fmt, 'params': params, 'requested_by': user},
+        )
+        if not created and not is_reusable(job):
+            remove_file(job)
+            job.status = 'PENDING'
+            job.rows_written = 0
+            job.total_rows = None
+            job.file_path = job.filename = job.error = ''
+            job.started_at = job.finished_at = None
+            job.requested_by = user
+            job.save()
+            created = True
+        if user is not None:
+            job.requesters.add(user)
+
+    if created:
+        dispatch(job)
+    return job
+
+
+def dispatch(job):
+    if setting('EXPORT_JOBS_ASYNC', True):
+        from .tasks import run_export_job
+        try:
+            run_export_job.apply_async(args=[job.pk], retry=False)
+            return
+        except Exception as e:
+            logger.warning(f"Export broker unavailable, running export {job.pk} in-process: {e}")
+    run_job(job.pk)
+    job.refresh_from_db()
+
+
+def run_job(job_id):
+    # Claiming PENDING -> RUNNING in one UPDATE makes duplicate task deliveries no-ops
+    if not ExportJob.objects.filter(pk=job_id, status='PENDING').update(status='RUNNING', started_at=timezone.now()):
+        return
+    job = ExportJob.objects.get(pk=job_id)
+    relative = os.path.join(EXPORT_DIR, f"{job.key}.{job.export_format}")
+    final_path = os.path.join(settings.MEDIA_ROOT, relative)
+    partial_path = final_path + '.part'
+
+    try:
+        filename, columns, queryset = import_string(EXPORT_REPORTS[job.report])(job.params)
+        ExportJob.objects.filter(pk=job_id).update(total_rows=queryset.count())
+
+        def progress(rows):
+            ExportJob.objects.filter(pk=job_id).update(rows_written=rows)
+
+        os.makedirs(os.path.dirname(final_path), exist_ok=True)
+        with open(partial_path, 'wb') as target:
+            write_export(job.export_format, columns, queryset, target, title=filename, progress=progress)
+        os.replace(partial_path, final_path)
+    except Exception as e:
+        logger.exception(f"Export {job_id} ({job.report}) failed")
+        if os.path.exists(partial_path):
+            os.remove(partial_path)
+        ExportJob.objects.filter(pk=job_id).update(status='FAILED', error=str(e), finished_at=timezone.now())
+        return
+
+    ExportJob.objects.filter(pk=job_id).update(
+        status='DONE', file_path=relative, filename=f"{filename}.{job.export_format}", finished_at=timezone.now(),
+    )
+
+
+def absolute_path(job):
+    return os.path.join(settings.MEDIA_ROOT, job.file_path) if job.file_path else ''
+
+
+def remove_file(job):
+    path = absolute_path(job)
+    if path and os.path.exists(path):
+        os.remove(path)
+
+
+def download_token(job):
+    return signing.dumps({'job': job.pk}, salt=TOKEN_SALT)
+
+
+def resolve_token(token):
+    """The finished ExportJob a download token points to; raises signing.BadSignature if invalid or expired."""
+    data = signing.loads(token, salt=TOKEN_SALT, max_age=setting('EXPORT_LINK_MAX_AGE', 900))
+    job = ExportJob.objects.filter(pk=data['job'], status='DONE').first()
+    if job is None or not os.path.exists(absolute_path(job)):
+        raise signing.BadSignature('Export is no longer available')
+    return job
+
+
+def purge_expired_exports():
+    """Deletes finished jobs (and their files) older than EXPORT_JOB_TTL_SECONDS."""
+    cutoff = timezone.now() - timedelta(seconds=setting('EXPORT_JOB_TTL_SECONDS', 3600))
+    expired = ExportJob.objects.filter(status__in=['DONE', 'FAILED'], finished_at__lt=cutoff)
+    for job in expired.only('pk', 'file_path').iterator():
+        remove_file(job)
+    return expired.delete()[0]
@@ -0,0 +1,119 @@
+"""
+Streaming tabular exports.
+
+An export is a list of Column(header, value) applied to a queryset read with
+.iterator(), so memory stays flat regardless of row count. Callers add
+select_related() for every relation a column touches.
+
+    columns = [Column('Number', lambda job: job.job_card_number), ...]
+    return export_response('csv', 'workshop_diary', columns, jobs)
+
+Formats:
+    csv   streamed CSV
+    xls   streamed HTML table (the legacy WorkShopDiaryReport.xls format Excel opens)
+    xlsx  openpyxl write-only workbook, spooled to a temporary file
+"""
+import csv
+import tempfile
+from collections import namedtuple
+from datetime import date, datetime, time
+from decimal import Decimal
+from html import escape
+
+from django.http import FileResponse, StreamingHttpResponse
+from django.utils import timezone
+
+Column = namedtuple('Column', 'header value')
+
+FORMATS = ('csv', 'xls', 'xlsx')
+CHUNK_SIZE = 2000
+CONTENT_TYPES = {
+    'csv': 'text/csv',
+    'xls': 'application/vnd.ms-excel',
+    'xlsx': 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet',
+}
+LEGACY_HEADER_STYLE = 'background-color:#5cb85c; color:white;'
+
+
+class _EchoBuffer:
+    """File-like object whose write() hands the line back, for csv.writer streaming."""
+    def write(self, value):
+        return value
+
+
+def iter_rows(columns, queryset, chunk_size=CHUNK_SIZE, progress=None):
+    """Rows as lists; progress(rows_so_far) is called after every chunk and at the end."""
+    count = 0
+    for obj in queryset.iterator(chunk_size=chunk_size):
+        yield [column.value(obj) for column in columns]
+        count += 1
+        if progress and count % chunk_size == 0:
+            progress(count)
+    if progress:
+        progress(count)
+
+
+def stream_csv(columns, queryset, progress=None):
+    writer = csv.writer(_EchoBuffer())
+    yield writer.writerow([column.header for column in columns])
+    for row in iter_rows(columns, queryset, progress=progress):
+        yield writer.writerow(row)
+
+
+def stream_legacy_xls(columns, queryset, progress=None):
+    yield "<table border='1'>\n<tr>"
+    yield ''.join(f"<th style='{LEGACY_HEADER_STYLE}'>{escape(column.header)}</th>" for column in columns)
+    yield "</tr>\n"
+    for row in iter_rows(columns, queryset, progress=progress):
+        yield '<tr>' + ''.join(f"<td>{escape('' if value is None else str(value))}</td>" for value in row) + '</tr>\n'
+    yield "</table>"
+
+
+def _xlsx_value(value):
+    if isinstance(value, datetime) and timezone.is_aware(value):
+        # Excel has no time zones
+        return timezone.localtime(value).replace(tzinfo=None)
+    if value is None or isinstance(value, (str, int, float, Decimal, date, time)):
+        return value
+    return str(value)
+
+
+def write_xlsx(columns, queryset, target, title='Export', progress=None):
+    """Writes the workbook to the binary file object `target`."""
+    from openpyxl import Workbook
+
+    workbook = Workbook(write_only=True)
+    sheet = workbook.create_sheet(title[:31])
+    sheet.append([column.header for column in columns])
+    for row in iter_rows(columns, queryset, progress=progress):
+        sheet.append([_xlsx_value(value) for value in row])
+    workbook.save(target)
+
+
+def write_export(fmt, columns, queryset, target, title='Export', progress=None):
+    """Writes `queryset` in `fmt` to the binary file object `target`."""
+    if fmt == 'xlsx':
+        write_xlsx(columns, queryset, target, title, progress)
+        return
+    streams = {'csv': stream_csv, 'xls': stream_legacy_xls}
+    if fmt not in streams:
+        raise ValueError(f"Unknown export format {fmt!r}; expected one of {', '.join(FORMATS)}")
+    for chunk in streams[fmt](columns, queryset, progress):
+        target.write(chunk.encode())
+
+
+def export_response(fmt, filename, columns, queryset, title=None):
+    """HTTP download of `queryset` in `fmt`; raises ValueError for an unknown format."""
+    if fmt == 'csv':
+        response = StreamingHttpResponse(stream_csv(columns, queryset), content_type=CONTENT_TYPES[fmt])
+    elif fmt == 'xls':
+        response = StreamingHttpResponse(stream_legacy_xls(columns, queryset), content_type=CONTENT_TYPES[fmt])
+    elif fmt == 'xlsx':
+        spool = tempfile.TemporaryFile()
+        write_xlsx(columns, queryset, spool, title or filename)
+        spool.seek(0)
+        response = FileResponse(spool, content_type=CONTENT_TYPES[fmt])
+    else:
+        raise ValueError(f"Unknown export format {fmt!r}; expected one of {', '.join(FORMATS)}")
+    response['Content-Disposition'] = f'attachment; filename="{filename}.{fmt}"'
+    return response
@@ -0,0 +1,67 @@
+"""
+Time PDF rendering cold (fresh WeasyPrint fonts and stylesheet), warm but
+uncached, served from the PDF cache, and as a parallel batch, using existing
+documents.
+
+Usage:
+    python manage.py benchmark_pdf                          # 20 invoices
+    python manage.py benchmark_pdf --doc-type jobcard --count 50 --workers 1 4
+"""
+import time
+
+from django.core.cache import cache
+from django.core.management.base import BaseCommand, CommandError
+from django.test import override_settings
+
+from core import pdf
+
+
+class Command(BaseCommand):
+    help = 'Compare cold, warm, cached and batch PDF render times'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--doc-type', default='invoice', choices=list(pdf.DOCUMENTS))
+        parser.add_argument('--count', type=int, default=20)
+        parser.add_argument('--workers', type=int, nargs='+', default=[1, 4],
+                            help='Batch pool sizes to time')
+
+    def handle(self, *args, **options):
+        doc_type = options['doc_type']
+        documents = list(pdf.model_for(doc_type)._default_manager.order_by('-pk')[:options['count']])
+        if not documents:
+            raise CommandError(f'No {doc_type} documents to render')
+        count = len(documents)
+
+        def clear():
+            for obj in documents:
+                pdf.invalidate(doc_type, obj.pk)
+                cache.delete(pdf.content_key(doc_type, obj.pk, pdf.render_html(doc_type, obj)))
+
+        pdf._weasyprint = None
+        cold = self.timed(lambda: pdf.render_document(doc_type, documents[0], use_cache=False))
+        self.report('cold (first render in process)', cold, 1)
+
+        warm = self.timed(lambda: [pdf.render_document(doc_type, obj, use_cache=False) for obj in documents])
+        self.report('warm, uncached', warm, count)
+
+        clear()
+        for obj in documents:
+            pdf.render_document(doc_type, obj)
+        cached = self.timed(lambda: [pdf.render_document(doc_type, obj) for obj in documents])
+        self.report('warm, cached', cached, count)
+
+        ids = [obj.pk for obj in documents]
+        for workers in options['workers']:
+            clear()
+            with override_settings(PDF_BATCH_WORKERS=workers):
+                elapsed = self.timed(lambda: pdf.render_batch(doc_type, ids, 'zip'))
+            self.report(f'batch zip, {workers} worker(s)', elapsed, count)
+        clear()
+
+    def timed(self, fn):
+        started = time.perf_counter()
+        fn()
+        return time.perf_counter() - started
+
+    def report(self, label, elapsed, count):
+        self.stdout.write(f'  {label:<32} {elapsed:8.3f}s  {elapsed / count * 1000:8.1f} ms/document')
@@ -0,0 +1,48 @@
+"""
+Dump the per-endpoint profile published by ProfilingMiddleware (all workers).
+
+Usage:
+    python manage.py endpoint_profile [--minutes 15] [--sort p95|p99|queries|sql|requests] [--limit 25] [--json]
+"""
+import json
+
+from django.core.management.base import BaseCommand
+
+from core.profiling import report
+
+
+class Command(BaseCommand):
+    help = 'Show the slowest and most query-heavy endpoints'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--minutes', type=int, default=None, help='Window to report (default: whole rolling window)')
+        parser.add_argument('--sort', default='p95', choices=['p95', 'p99', 'queries', 'sql', 'requests'])
+        parser.add_argument('--limit', type=int, default=25)
+        parser.add_argument('--json', action='store_true', help='Print raw rows as JSON')
+
+    def handle(self, *args, **options):
+        rows = report(minutes=options['minutes'], sort=options['sort'], limit=options['limit'])
+        if options['json']:
+            self.stdout.write(json.dumps(rows, indent=2))
+            return
+        if not rows:
+            self.stdout.write('No profiling data published yet.')
+            return
+
+        self.stdout.write(
+            f"{'route':<55} {'reqs':>6} {'p50':>6} {'p95':>6} {'p99':>6} {'q/req':>6} {'maxq':>5} {'sql ms':>7} {'dup%':>5}"
+        )
+        for row in rows:
+            self.stdout.write(
+                f"{row['route'][:55]:<55} {row['requests']:>6} {row['p50_ms']:>6} {row['p95_ms']:>6} {row['p99_ms']:>6} "
+                f"{_fmt(row['queries_per_request']):>6} {_fmt(row['max_queries']):>5} "
+                f"{_fmt(row['sql_ms_per_request']):>7} {_fmt(row['duplicate_query_rate'], pct=True):>5}"
+            )
+            for dup in row['top_duplicates'][:2]:
+                self.stdout.write(f"    x{dup['repeats']:<4} {dup['sql'][:100]}")
+
+
+def _fmt(value, pct=False):
+    if value is None:
+        return '-'
+    return f"{value * 100:.0f}" if pct else str(value)
@@ -0,0 +1,22 @@
+"""
+Re-index job cards, customers, vehicles and leads for /api/search/ (core.search).
+Saves keep the index current; run this after bulk imports or queryset updates.
+
+Usage:
+    python manage.py rebuild_search_index
+    python manage.py rebuild_search_index --kind jobcard --kind lead
+"""
+from django.core.management.base import BaseCommand
+
+from core import search
+
+
+class Command(BaseCommand):
+    help = 'Rebuild the search index'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--kind', action='append', choices=list(search.ENTITIES), help='Only this kind (repeatable)')
+
+    def handle(self, *args, **options):
+        indexed = search.rebuild(options['kind'])
+        self.stdout.write(f'{indexed} documents indexed')
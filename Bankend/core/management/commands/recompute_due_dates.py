@@ -0,0 +1,20 @@
+"""
+Recompute warranty last_service_date/next_due_date/retention_due_date columns.
+Runs nightly via Celery beat (core.tasks.recompute_service_due_dates); the
+migrations backfill existing warranties, run this to repair rows written with
+queryset.update().
+
+Usage:
+    python manage.py recompute_due_dates
+"""
+from django.core.management.base import BaseCommand
+
+from core.tasks import recompute_service_due_dates
+
+
+class Command(BaseCommand):
+    help = 'Recompute the service schedule columns for all warranties'
+
+    def handle(self, *args, **options):
+        for label, updated in recompute_service_due_dates().items():
+            self.stdout.write(f'{label}: {updated} rows updated')
@@ -6,6 +6,7 @@ import traceback
 from django.utils import timezone
 from django.http import JsonResponse
 from core.models import ErrorLog
+from core import audit
 
 
 class ErrorHandlingMiddleware:
@@ -127,5 +128,10 @@ class AuditMiddleware:
         request.audit_endpoint = request.path
         request.audit_method = request.method
         
-        response = self.get_response(request)
+        # Autocommit saves made while handling the request are written as one batch
+        audit.begin_request()
+        try:
+            response = self.get_response(request)
+        finally:
+            audit.end_request()
         return response
@@ -0,0 +1,188 @@
+import re
+
+from django.db import migrations, models
+
+FTS_TABLE = 'core_searchdocument_fts'
+
+SQLITE_FTS = [
+    f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5(body, content='core_searchdocument', content_rowid='id', tokenize='trigram')",
+    f"""CREATE TRIGGER core_searchdocument_fts_insert AFTER INSERT ON core_searchdocument BEGIN
+        INSERT INTO {FTS_TABLE}(rowid, body) VALUES (new.id, new.body);
+    END""",
+    f"""CREATE TRIGGER core_searchdocument_fts_delete AFTER DELETE ON core_searchdocument BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, body) VALUES ('delete', old.id, old.body);
+    END""",
+    f"""CREATE TRIGGER core_searchdocument_fts_update AFTER UPDATE ON core_searchdocument BEGIN
+        INSERT INTO {FTS_TABLE}({FTS_TABLE}, rowid, body) VALUES ('delete', old.id, old.body);
+        INSERT INTO {FTS_TABLE}(rowid, body) VALUES (new.id, new.body);
+    END""",
+]
+
+POSTGRES_TRIGRAM = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX core_searchdocument_body_trgm ON core_searchdocument USING gin (body gin_trgm_ops)",
+]
+
+
+def create_text_indexes(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == 'postgresql':
+        statements = POSTGRES_TRIGRAM
+    elif connection.vendor == 'sqlite':
+        import sqlite3
+        # The trigram tokenizer needs SQLite 3.34; without it search scans the table
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT sqlite_compileoption_used('ENABLE_FTS5')")
+            has_fts5 = cursor.fetchone()[0]
+        if not has_fts5 or sqlite3.sqlite_version_info < (3, 34):
+            return
+        statements = SQLITE_FTS
+    else:
+        return
+    for statement in statements:
+        schema_editor.execute(statement)
+
+
+def drop_text_indexes(apps, schema_editor):
+    connection = schema_editor.connection
+    if connection.vendor == 'postgresql':
+        schema_editor.execute("DROP INDEX IF EXISTS core_searchdocument_body_trgm")
+    elif connection.vendor == 'sqlite':
+        for trigger in ('insert', 'delete', 'update'):
+            schema_editor.execute(f"DROP TRIGGER IF EXISTS core_searchdocument_fts_{trigger}")
+        schema_editor.execute(f"DROP TABLE IF EXISTS {FTS_TABLE}")
+
+
+# Frozen copy of the core.search tokenization at the time of this migration
+TOKEN_RE = re.compile(r'[^\w]+')
+
+
+def compact(value):
+    return TOKEN_RE.sub('', str(value).lower())
+
+
+def phone_forms(phone):
+    digits = re.sub(r'\D', '', phone or '')
+    if digits.startswith('00'):
+        digits = digits[2:]
+    if not digits:
+        return []
+    forms = [digits]
+    if digits.startswith('971'):
+        forms.append('0' + digits[3:])
+    elif digits.startswith('0'):
+        forms.append('971' + digits[1:])
+    return forms
+
+
+def plate_forms(code, number):
+    number = compact(number or '')
+    if not number:
+        return []
+    return [number, compact(code or '') + number] if code else [number]
+
+
+def join(*parts):
+    return ' '.join(str(part) for part in parts if part)
+
+
+# kind: (model, title, subtitle, branch, text, phones, plates)
+ENTITIES = {
+    'jobcard': (
+        'job_cards.JobCard',
+        lambda obj: obj.job_card_number,
+        lambda obj: join(obj.customer_name, '·', obj.brand, obj.model, obj.registration_number),
+        lambda obj: obj.branch_id,
+        lambda obj: [obj.job_card_number, obj.customer_name, obj.brand, obj.model, obj.vin,
+                     obj.registration_number, obj.plate_emirate],
+        lambda obj: [obj.phone],
+        lambda obj: [(obj.plate_code, obj.registration_number)],
+    ),
+    'customer': (
+        'customers.Customer',
+        lambda obj: obj.name,
+        lambda obj: obj.phone,
+        lambda obj: None,
+        lambda obj: [obj.name, obj.email],
+        lambda obj: [obj.phone],
+        lambda obj: [],
+    ),
+    'vehicle': (
+        'masters.Vehicle',
+        lambda obj: join(obj.brand, obj.model) or obj.registration_number,
+        lambda obj: join(obj.plate_emirate, obj.plate_code, obj.registration_number),
+        lambda obj: None,
+        lambda obj: [obj.vin, obj.chassis_number, obj.registration_number, obj.brand, obj.model,
+                     obj.color, obj.plate_emirate],
+        lambda obj: [],
+        lambda obj: [(obj.plate_code, obj.registration_number)],
+    ),
+    'lead': (
+        'leads.Lead',
+        lambda obj: obj.customer_name,
+        lambda obj: join(obj.get_status_display(), '·', obj.interested_service),
+        lambda obj: obj.branch_id,
+        lambda obj: [obj.customer_name, obj.email, obj.interested_service],
+        lambda obj: [obj.phone],
+        lambda obj: [],
+    ),
+}
+
+
+def build_index(apps, schema_editor):
+    SearchDocument = apps.get_model('core', 'SearchDocument')
+
+    def upsert(documents):
+        SearchDocument.objects.bulk_create(
+            documents, batch_size=500, update_conflicts=True, unique_fields=['kind', 'object_id'],
+            update_fields=['title', 'subtitle', 'branch_id', 'body', 'updated_at'],
+        )
+
+    for kind, (label, title, subtitle, branch, text, phones, plates) in ENTITIES.items():
+        batch = []
+        for obj in apps.get_model(label)._base_manager.order_by('pk').iterator(chunk_size=2000):
+            tokens = [compact(word) for value in text(obj) for word in str(value or '').split()]
+            tokens += [form for phone in phones(obj) for form in phone_forms(phone)]
+            tokens += [form for code, number in plates(obj) for form in plate_forms(code, number)]
+            batch.append(SearchDocument(
+                kind=kind, object_id=obj.pk,
+                title=str(title(obj) or '')[:255], subtitle=str(subtitle(obj) or '')[:255],
+                branch_id=branch(obj), body=' '.join(dict.fromkeys(token for token in tokens if token)),
+            ))
+            if len(batch) >= 2000:
+                upsert(batch)
+                batch = []
+        if batch:
+            upsert(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_exportjob'),
+        ('customers', '0003_customer_stripe_customer_id'),
+        ('job_cards', '0025_jobboardevent'),
+        ('leads', '0009_lead_vehicle_node'),
+        ('masters', '0004_vehicletype_alter_vehicle_brand_alter_vehicle_model_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SearchDocument',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(max_length=20)),
+                ('object_id', models.PositiveBigIntegerField()),
+                ('title', models.CharField(max_length=255)),
+                ('subtitle', models.CharField(blank=True, max_length=255)),
+                ('branch_id', models.PositiveBigIntegerField(blank=True, null=True)),
+                ('body', models.TextField(help_text='Normalized lowercase tokens')),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'constraints': [models.UniqueConstraint(fields=('kind', 'object_id'), name='search_document_unique_object')],
+            },
+        ),
+        migrations.RunPython(create_text_indexes, drop_text_indexes),
+        migrations.RunPython(build_index, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.1.15 on 2026-10-18 20:41
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0007_searchdocument'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='exportjob',
+            name='key',
+            field=models.CharField(help_text='SHA-256 of report, format, params and requester', max_length=64, unique=True),
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.1.15 on 2026-10-18 21:52
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def add_original_requesters(apps, schema_editor):
+    # Jobs still in flight stay pollable by the user who started them
+    ExportJob = apps.get_model('core', 'ExportJob')
+    ExportJob.requesters.through.objects.bulk_create([
+        ExportJob.requesters.through(exportjob_id=job_id, user_id=user_id)
+        for job_id, user_id in ExportJob.objects.filter(requested_by__isnull=False).values_list('pk', 'requested_by_id')
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0008_exportjob_key_help_text'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='exportjob',
+            name='requesters',
+            field=models.ManyToManyField(blank=True, related_name='joined_export_jobs', to=settings.AUTH_USER_MODEL),
+        ),
+        migrations.AlterField(
+            model_name='exportjob',
+            name='key',
+            field=models.CharField(help_text='SHA-256 of report, format and params', max_length=64, unique=True),
+        ),
+        migrations.RunPython(add_original_requesters, migrations.RunPython.noop),
+    ]
@@ -1,9 +1,154 @@
+from datetime import timedelta
+
 from django.db import models
 from django.utils import timezone
 from django.contrib.contenttypes.fields import GenericForeignKey
 from django.contrib.contenttypes.models import ContentType
 
-class CacheEntry(models.Model):
+class NoAudit(models.Model):
+    """Inherit this model to skip audit logging for specific data"""
+    class Meta:
+        abstract = True
+
+
+class TrackedFieldsMixin:
+    """
+    Remembers the database values of `tracked_fields` so save() can detect
+    transitions without re-fetching the row. Values are recorded in from_db(),
+    refresh_from_db() and after every save().
+
+    Put it before models.Model in the bases:
+        class JobCard(TrackedFieldsMixin, models.Model):
+            tracked_fields = ('status',)
+    """
+    tracked_fields = ()
+
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        instance._record_tracked()
+        return instance
+
+    def _record_tracked(self, fields=None):
+        loaded = self.__dict__.setdefault('_tracked_values', {})
+        for name in fields or self.tracked_fields:
+            attname = self._meta.get_field(name).attname
+            if attname in self.__dict__:  # skip deferred fields
+                loaded[name] = self.__dict__[attname]
+
+    def previous(self, field):
+        """The field's value as last loaded/saved; None for unsaved objects."""
+        loaded = self.__dict__.get('_tracked_values', {})
+        if field in loaded:
+            return loaded[field]
+        if self.pk is None:
+            return None
+        # Deferred at load time or built without from_db(): fall back to the database
+        return type(self)._base_manager.filter(pk=self.pk).values_list(field, flat=True).first()
+
+    def has_changed(self, field):
+        return getattr(self, self._meta.get_field(field).attname) != self.previous(field)
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self._record_tracked()
+
+    def refresh_from_db(self, using=None, fields=None, **kwargs):
+        super().refresh_from_db(using=using, fields=fields, **kwargs)
+        self._record_tracked([f for f in (fields or self.tracked_fields) if f in self.tracked_fields])
+
+
+class ServiceScheduleMixin:
+    """
+    Keeps indexed schedule columns (declared on the model) in step with the
+    visit dates, so due lists are range queries. Refreshed on every save() and
+    nightly by core.tasks.recompute_service_due_dates.
+
+    last_service_date / next_due_date: latest visit in `service_date_fields`
+    (installation if none) and service_interval_days after it, the due lists'
+    "no visit in 6 months" rule.
+
+    retention_due_date (only on models with a `retention_schedule`): the
+    retention calls' annual schedule, installation + days for the first visit
+    still missing; None once every scheduled visit is recorded.
+
+        class CeramicWarrantyRegistration(ServiceScheduleMixin, models.Model):
+            service_date_fields = ('m1_date', 'm2_date', 'm3_date', 'm4_date')
+            retention_schedule = (('m1_date', 365), ('m2_date', 730), ('m3_date', 1095))
+    """
+    service_date_fields = ()
+    service_interval_days = 180
+    retention_schedule = ()
+
+    @classmethod
+    def service_schedule_inputs(cls):
+        """Columns the schedule is derived from."""
+        return ('installation_date',) + tuple(cls.service_date_fields)
+
+    @classmethod
+    def service_schedule_columns(cls):
+        """Columns the schedule is stored in."""
+        columns = ('last_service_date', 'next_due_date')
+        return columns + ('retention_due_date',) if cls.retention_schedule else columns
+
+    def service_date(self, name):
+        # Views assign raw request strings to the date columns before save()
+        return self._meta.get_field(name).to_python(getattr(self, name))
+
+    def service_dates(self):
+        """(last_service_date, next_due_date); no visits yet counts from installation."""
+        visits = [d for d in (self.service_date(f) for f in self.service_date_fields) if d]
+        last = max(visits, default=self.service_date('installation_date'))
+        if not last:
+            return None, None
+        return last, last + timedelta(days=self.service_interval_days)
+
+    def retention_due(self):
+        """Installation + days of the first scheduled visit not yet recorded."""
+        installed = self.service_date('installation_date')
+        if not installed:
+            return None
+        for field, days in self.retention_schedule:
+            if not self.service_date(field):
+                return installed + timedelta(days=days)
+        return None
+
+    def refresh_service_dates(self):
+        """Recomputes the schedule columns in memory; True if any changed."""
+        values = self.service_dates()
+        if self.retention_schedule:
+            values += (self.retention_due(),)
+        columns = self.service_schedule_columns()
+        changed = values != tuple(getattr(self, column) for column in columns)
+        for column, value in zip(columns, values):
+            setattr(self, column, value)
+        return changed
+
+    def save(self, *args, **kwargs):
+        self.refresh_service_dates()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and set(update_fields) & set(self.service_schedule_inputs()):
+            kwargs['update_fields'] = set(update_fields) | set(self.service_schedule_columns())
+        super().save(*args, **kwargs)
+
+    @classmethod
+    def recompute_service_dates(cls, batch_size=1000):
+        """Re-derives the columns for every row, writing only those that moved."""
+        columns = cls.service_schedule_columns()
+        fields = ('pk',) + columns + cls.service_schedule_inputs()
+        changed, updated = [], 0
+        for obj in cls._base_manager.only(*fields).iterator(chunk_size=batch_size):
+            if obj.refresh_service_dates():
+                changed.append(obj)
+            if len(changed) >= batch_size:
+                updated += cls._base_manager.bulk_update(changed, columns)
+                changed = []
+        if changed:
+            updated += cls._base_manager.bulk_update(changed, columns)
+        return updated
+
+
+class CacheEntry(NoAudit):
     """Store cache data in database for persistence"""
     key = models.CharField(max_length=255, unique=True, db_index=True)
     value = models.TextField()
@@ -147,11 +292,6 @@ class AuditLog(models.Model):
     def __str__(self):
         return f"{self.user} - {self.action} {self.object_repr or self.object_id} at {self.timestamp}"
 
-class NoAudit(models.Model):
-    """Inherit this model to skip audit logging for specific data"""
-    class Meta:
-        abstract = True
-
 
 class LoginHistory(models.Model):
     """Track user login/logout activity"""
@@ -240,3 +380,63 @@ class SystemChangeLog(models.Model):
     def __str__(self):
         return f"{self.change_category} - {self.timestamp.strftime('%Y-%m-%d %H:%M')}"
 
+
+
+class ExportJob(NoAudit):
+    """
+    A report rendered to MEDIA_ROOT in the background (core.export_jobs).
+    One row per distinct (report, format, params), so identical requests share it;
+    `requesters` are the users who asked for it and may poll it.
+    """
+    STATUS_CHOICES = [
+        ('PENDING', 'Pending'),
+        ('RUNNING', 'Running'),
+        ('DONE', 'Done'),
+        ('FAILED', 'Failed'),
+    ]
+
+    key = models.CharField(max_length=64, unique=True, help_text="SHA-256 of report, format and params")
+    report = models.CharField(max_length=50)
+    export_format = models.CharField(max_length=10)
+    params = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='PENDING')
+
+    rows_written = models.PositiveIntegerField(default=0)
+    total_rows = models.PositiveIntegerField(null=True, blank=True)
+    file_path = models.CharField(max_length=255, blank=True, help_text="Relative to MEDIA_ROOT")
+    filename = models.CharField(max_length=255, blank=True)
+    error = models.TextField(blank=True)
+
+    requested_by = models.ForeignKey('auth.User', on_delete=models.SET_NULL, null=True, blank=True, related_name='export_jobs')
+    requesters = models.ManyToManyField('auth.User', blank=True, related_name='joined_export_jobs')
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    finished_at = models.DateTimeField(null=True, blank=True, db_index=True)
+
+    class Meta:
+        ordering = ['-created_at']
+
+    def __str__(self):
+        return f"Export {self.report}.{self.export_format} ({self.status})"
+
+
+class SearchDocument(NoAudit):
+    """
+    The search index entry of one job card, customer, vehicle or lead (core.search).
+    Vendor-specific text indexes on `body` are created by the migration.
+    """
+    kind = models.CharField(max_length=20)
+    object_id = models.PositiveBigIntegerField()
+    title = models.CharField(max_length=255)
+    subtitle = models.CharField(max_length=255, blank=True)
+    branch_id = models.PositiveBigIntegerField(null=True, blank=True)
+    body = models.TextField(help_text="Normalized lowercase tokens")
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['kind', 'object_id'], name='search_document_unique_object'),
+        ]
+
+    def __str__(self):
+        return f"{self.kind} {self.object_id}: {self.title}"
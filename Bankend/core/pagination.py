@@ -0,0 +1,28 @@
+"""
+Pagination shared across apps.
+
+OptInCursorPagination started as the job card list's own paginator and moved
+here when the warranty due lists needed the same opt-in keyset pages.
+"""
+from rest_framework.pagination import CursorPagination
+
+
+class OptInCursorPagination(CursorPagination):
+    """
+    Keyset pages only when ?cursor= or ?page_size= is passed, so existing
+    callers keep receiving a plain array. Subclasses set `ordering`.
+    """
+    page_size = 100
+    page_size_query_param = 'page_size'
+    max_page_size = 1000
+
+    def paginate_queryset(self, queryset, request, view=None):
+        params = request.query_params
+        if self.cursor_query_param not in params and self.page_size_query_param not in params:
+            return None
+        return super().paginate_queryset(queryset, request, view)
+
+
+class DueDatePagination(OptInCursorPagination):
+    """Due lists over ServiceScheduleMixin models, most overdue first."""
+    ordering = ('next_due_date', 'id')
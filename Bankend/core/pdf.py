@@ -0,0 +1,207 @@
+"""
+PDF rendering for job cards and invoices.
+
+render_document() renders the document's template and hashes the HTML. The
+PDF is cached under (doc_type, pk, hash), so an unchanged document is served
+without running WeasyPrint and any change that shows on paper gets a new key.
+A paid invoice can no longer change, so a cached copy is returned without
+rendering the template at all: final documents keep a pointer to their last
+render, which saving or deleting a final document drops after commit
+(invalidate(), connected by connect_signals() from CoreConfig.ready). Other saves touch no cache.
+
+WeasyPrint's font configuration and the shared print stylesheet
+(forms/pdf/base_pdf.css) are built once per process by warm_up(); core.wsgi
+calls it when a web worker boots, anything else warms up on its first render.
+
+render_batch() turns many documents of one type into a ZIP or a single merged
+PDF. Cache misses are rendered by a pool of PDF_BATCH_WORKERS processes.
+"""
+import hashlib
+import io
+import logging
+import threading
+import zipfile
+from collections import namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+from django.apps import apps
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.template.loader import get_template, render_to_string
+
+logger = logging.getLogger(__name__)
+
+# model: app label, context_name: template variable besides `object`,
+# is_final(obj): True once the printed document can no longer change
+Document = namedtuple('Document', 'model template context_name filename is_final')
+
+DOCUMENTS = {
+    'jobcard': Document(
+        'job_cards.JobCard', 'forms/pdf/job_card_pdf.html', 'job_card',
+        lambda obj: f"job_card_{obj.job_card_number}.pdf", lambda obj: False,
+    ),
+    'invoice': Document(
+        'invoices.Invoice', 'forms/pdf/invoice_pdf.html', 'invoice',
+        lambda obj: f"invoice_{obj.invoice_number}.pdf", lambda obj: obj.payment_status == 'PAID',
+    ),
+}
+STYLESHEET = 'forms/pdf/base_pdf.css'
+BATCH_OUTPUTS = ('zip', 'pdf')
+
+_warm_lock = threading.Lock()
+_weasyprint = None  # (FontConfiguration, [CSS]) once warmed up
+
+
+def setting(name, default):
+    return getattr(settings, name, default)
+
+
+def model_for(doc_type):
+    return apps.get_model(DOCUMENTS[doc_type].model)
+
+
+def doc_type_for(model):
+    return next((doc_type for doc_type, document in DOCUMENTS.items() if document.model == model._meta.label), None)
+
+
+def warm_up():
+    """Builds the font configuration and stylesheet and compiles the PDF templates, once per process."""
+    global _weasyprint
+    if _weasyprint is None:
+        with _warm_lock:
+            if _weasyprint is None:
+                from weasyprint import CSS
+                from weasyprint.text.fonts import FontConfiguration
+
+                font_config = FontConfiguration()
+                stylesheet = CSS(string=render_to_string(STYLESHEET), font_config=font_config)
+                # Fills the cached template loader so requests skip parsing
+                for document in DOCUMENTS.values():
+                    get_template(document.template)
+                _weasyprint = font_config, [stylesheet]
+    return _weasyprint
+
+
+def html_to_pdf(html, base_url=None):
+    from weasyprint import HTML
+
+    font_config, stylesheets = warm_up()
+    return HTML(string=html, base_url=base_url).write_pdf(stylesheets=stylesheets, font_config=font_config)
+
+
+def render_html(doc_type, obj):
+    document = DOCUMENTS[doc_type]
+    return render_to_string(document.template, {'object': obj, document.context_name: obj})
+
+
+def latest_key(doc_type, pk):
+    """Points at the cache key of the most recently rendered PDF of the document."""
+    return f"pdf:{doc_type}:{pk}"
+
+
+def content_key(doc_type, pk, html, base_url=None):
+    digest = hashlib.sha256(f"{base_url}\n{html}".encode()).hexdigest()
+    return f"pdf:{doc_type}:{pk}:{digest}"
+
+
+def store(doc_type, obj, key, pdf):
+    entries = {key: pdf}
+    if DOCUMENTS[doc_type].is_final(obj):
+        entries[latest_key(doc_type, obj.pk)] = key
+    cache.set_many(entries, setting('PDF_CACHE_TIMEOUT', 7 * 24 * 3600))
+
+
+def invalidate(doc_type, pk):
+    latest = latest_key(doc_type, pk)
+    cache.delete_many([key for key in (latest, cache.get(latest)) if key])
+
+
+def invalidate_cached_pdf(sender, instance, **kwargs):
+    # Content-hashed renders go stale by themselves; only final documents keep a pointer
+    doc_type, pk = doc_type_for(sender), instance.pk
+    if DOCUMENTS[doc_type].is_final(instance):
+        transaction.on_commit(lambda: invalidate(doc_type, pk))
+
+
+def connect_signals():
+    for document in DOCUMENTS.values():
+        post_save.connect(invalidate_cached_pdf, sender=document.model, dispatch_uid=f'pdf-save-{document.model}')
+        post_delete.connect(invalidate_cached_pdf, sender=document.model, dispatch_uid=f'pdf-delete-{document.model}')
+
+
+def lookup(doc_type, obj, base_url=None):
+    """(pdf, None, None) on a cache hit, else (None, html, key) to render and store."""
+    if DOCUMENTS[doc_type].is_final(obj):
+        key = cache.get(latest_key(doc_type, obj.pk))
+        pdf = cache.get(key) if key else None
+        if pdf is not None:
+            return pdf, None, None
+    html = render_html(doc_type, obj)
+    key = content_key(doc_type, obj.pk, html, base_url)
+    return cache.get(key), html, key
+
+
+def render_document(doc_type, obj, base_url=None, use_cache=True):
+    """PDF bytes for `obj`; raises KeyError for an unknown doc_type."""
+    if not use_cache:
+        return html_to_pdf(render_html(doc_type, obj), base_url)
+    pdf, html, key = lookup(doc_type, obj, base_url)
+    if pdf is None:
+        pdf = html_to_pdf(html, base_url)
+        store(doc_type, obj, key, pdf)
+    return pdf
+
+
+def render_many(htmls, base_url=None):
+    """PDFs for `htmls` in order, rendered in parallel when there is more than one."""
+    workers = min(setting('PDF_BATCH_WORKERS', 4), len(htmls))
+    if workers <= 1:
+        return [html_to_pdf(html, base_url) for html in htmls]
+    # WeasyPrint layout is pure Python, so processes rather than threads
+    with ProcessPoolExecutor(max_workers=workers, initializer=warm_up) as pool:
+        return list(pool.map(html_to_pdf, htmls, [base_url] * len(htmls), chunksize=4))
+
+
+def render_batch(doc_type, ids, output='zip', base_url=None):
+    """
+    (content, filename) for the documents `ids` in the order given, as a ZIP
+    or one merged PDF. Ids that do not exist are skipped; raises ValueError
+    for an unknown doc_type or output.
+    """
+    if doc_type not in DOCUMENTS:
+        raise ValueError(f"Unknown document type {doc_type!r}; expected one of {', '.join(DOCUMENTS)}")
+    if output not in BATCH_OUTPUTS:
+        raise ValueError(f"Unknown batch output {output!r}; expected one of {', '.join(BATCH_OUTPUTS)}")
+
+    objects = model_for(doc_type)._default_manager.in_bulk(ids)
+    documents = [objects[pk] for pk in dict.fromkeys(ids) if pk in objects]
+
+    pdfs, misses = {}, {}
+    for obj in documents:
+        pdf, html, key = lookup(doc_type, obj, base_url)
+        if pdf is None:
+            misses[obj.pk] = html, key
+        else:
+            pdfs[obj.pk] = pdf
+    rendered = render_many([html for html, _ in misses.values()], base_url)
+    for (pk, (_, key)), pdf in zip(misses.items(), rendered):
+        store(doc_type, objects[pk], key, pdf)
+        pdfs[pk] = pdf
+
+    buffer = io.BytesIO()
+    if output == 'zip':
+        # PDFs are already compressed
+        with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_STORED) as archive:
+            for obj in documents:
+                archive.writestr(DOCUMENTS[doc_type].filename(obj), pdfs[obj.pk])
+    else:
+        from pypdf import PdfWriter
+
+        writer = PdfWriter()
+        for obj in documents:
+            writer.append(io.BytesIO(pdfs[obj.pk]))
+        writer.write(buffer)
+    logger.info(f"Rendered {len(documents)} {doc_type} PDFs ({len(misses)} cache misses) as {output}")
+    return buffer.getvalue(), f"{doc_type}s.{output}"
@@ -0,0 +1,111 @@
+"""
+Compiled per-user permission matrix for the DRF permission classes.
+
+Everything core.permissions needs about a user's Employee profile (role,
+ModulePermission rows as CRUD bits, the legacy permissions_config JSON) is
+loaded in two queries, cached under perm_matrix:<user_id> for
+PERMISSION_MATRIX_TIMEOUT and kept on the request, so permission checks are
+dictionary lookups. Saving or deleting an Employee or ModulePermission drops
+the user's entry once the transaction commits (connect_signals(), called
+from CoreConfig.ready);
+other workers' in-process cache tier may serve the old matrix for up to
+its FRONT_TIMEOUT.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from rest_framework.permissions import SAFE_METHODS
+
+VIEW, CREATE, EDIT, DELETE = 1, 2, 4, 8
+METHOD_BITS = {'POST': CREATE, 'PUT': EDIT, 'PATCH': EDIT, 'DELETE': DELETE}
+INVALID = 'invalid'  # a config value the legacy checks could not read: always denies
+NO_PROFILE = {'employee': False}
+REQUEST_ATTR = '_permission_matrix'
+
+
+def cache_key(user_id):
+    return f"perm_matrix:{user_id}"
+
+
+def method_bit(method):
+    """The CRUD bit a request method needs; 0 for methods outside CRUD."""
+    return VIEW if method in SAFE_METHODS else METHOD_BITS.get(method, 0)
+
+
+def module_bits(perm):
+    return ((VIEW if perm.can_view else 0) | (CREATE if perm.can_create else 0)
+            | (EDIT if perm.can_edit else 0) | (DELETE if perm.can_delete else 0))
+
+
+def compile_config(config):
+    """permissions_config as {module: (denied, can_view, can_edit, can_delete)}."""
+    if not config:
+        return {}
+    if not isinstance(config, dict):
+        return INVALID
+    compiled = {}
+    for module, module_cfg in config.items():
+        if not module_cfg:
+            continue
+        if not isinstance(module_cfg, dict):
+            compiled[module] = INVALID
+        else:
+            compiled[module] = tuple(bool(module_cfg.get(key)) for key in ('denied', 'can_view', 'can_edit', 'can_delete'))
+    return compiled
+
+
+def compile_matrix(user_id):
+    from hr.models import Employee, ModulePermission
+
+    employee = Employee.objects.filter(user_id=user_id).only('id', 'role', 'permissions_config').first()
+    if employee is None:
+        return NO_PROFILE
+    return {
+        'employee': True,
+        'role': employee.role.lower(),
+        'modules': {perm.module_name: module_bits(perm) for perm in ModulePermission.objects.filter(employee_id=employee.pk)},
+        'config': compile_config(employee.permissions_config),
+    }
+
+
+def matrix_for(request):
+    """The request user's matrix (computed at most once per request)."""
+    if not request.user or not request.user.is_authenticated:
+        return NO_PROFILE
+    matrix = getattr(request, REQUEST_ATTR, None)
+    if matrix is None:
+        key = cache_key(request.user.pk)
+        matrix = cache.get(key)
+        if matrix is None:
+            matrix = compile_matrix(request.user.pk)
+            cache.set(key, matrix, getattr(settings, 'PERMISSION_MATRIX_TIMEOUT', 3600))
+        setattr(request, REQUEST_ATTR, matrix)
+    return matrix
+
+
+def invalidate(user_id):
+    if user_id:
+        cache.delete(cache_key(user_id))
+
+
+def invalidate_employee_permissions(sender, instance, **kwargs):
+    # After commit, so a concurrent request cannot re-cache the old matrix
+    transaction.on_commit(lambda: invalidate(instance.user_id))
+
+
+def invalidate_module_permissions(sender, instance, **kwargs):
+    from hr.models import Employee
+    user_id = Employee.objects.filter(pk=instance.employee_id).values_list('user_id', flat=True).first()
+    transaction.on_commit(lambda: invalidate(user_id))
+
+
+def connect_signals():
+    post_save.connect(invalidate_employee_permissions, sender='hr.Employee', dispatch_uid='perm-matrix-save-employee')
+    post_delete.connect(invalidate_employee_permissions, sender='hr.Employee', dispatch_uid='perm-matrix-delete-employee')
+    post_save.connect(invalidate_module_permissions, sender='hr.ModulePermission', dispatch_uid='perm-matrix-save-module')
+    post_delete.connect(invalidate_module_permissions, sender='hr.ModulePermission', dispatch_uid='perm-matrix-delete-module')
+
+
+def role_matches(matrix, allowed):
+    return matrix['employee'] and any(r in matrix['role'] for r in allowed)
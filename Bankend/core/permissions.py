@@ -1,5 +1,7 @@
 from rest_framework import permissions
 
+from .permission_matrix import CREATE, DELETE, EDIT, INVALID, VIEW, matrix_for, method_bit, role_matches
+
 ELITE_USERNAMES = ['radhir', 'ruchika', 'afsar', 'ravit', 'ankit']
 
 def is_elite_user(user):
@@ -11,55 +13,48 @@ class IsAdminOrOwner(permissions.BasePermission):
     """
     Custom permission to only allow Owners, Admins, Service Advisors, and Managers to edit.
     Now supports dynamic module-level overrides via Employee.permissions_config.
+    Reads the cached permission matrix (core.permission_matrix).
     """
     def has_permission(self, request, view):
         user = request.user
         if is_elite_user(user):
             return True
 
-        try:
-            profile = user.hr_profile
-            
-            # 0. Check ModulePermission (Relational RBAC)
-            module_name = getattr(view, 'module_name', None)
-            if module_name:
-                perm = profile.module_permissions.filter(module_name=module_name).first()
-                if perm:
-                    if request.method in permissions.SAFE_METHODS:
-                        if not perm.can_view: return False
-                    elif request.method == 'POST':
-                        if not perm.can_create: return False
-                    elif request.method in ['PUT', 'PATCH']:
-                        if not perm.can_edit: return False
-                    elif request.method == 'DELETE':
-                        if not perm.can_delete: return False
-                    # If specific permission is granted (or not denied above), we permit. 
-                    # Actually, if record exists, we should probably return True if check passed.
-                    # But the logic above only returns False on failure. 
-                    # Let's trust the granular permission:
-                    return True
+        matrix = matrix_for(request)
+        if not matrix['employee']:
+            return False
+        bit = method_bit(request.method)
+
+        # 0. Check ModulePermission (Relational RBAC)
+        module_name = getattr(view, 'module_name', None)
+        if module_name:
+            bits = matrix['modules'].get(module_name)
+            if bits is not None:
+                # A record decides on its own; methods outside CRUD are let through
+                return not bit or bool(bits & bit)
 
-            # 1. Dynamic Override Check (Legacy JSON Config)
-            if module_name and profile.permissions_config:
-                module_cfg = profile.permissions_config.get(module_name)
-                if module_cfg:
-                    # If explicitly denied, return False
-                    if module_cfg.get('denied'): return False
-                    
-                    # Logic for specific methods
-                    if request.method in permissions.SAFE_METHODS and module_cfg.get('can_view'):
-                        return True
-                    if request.method in ['POST', 'PUT', 'PATCH'] and module_cfg.get('can_edit'):
-                        return True
-                    if request.method == 'DELETE' and module_cfg.get('can_delete'):
-                        return True
+        # 1. Dynamic Override Check (Legacy JSON Config)
+        if module_name and matrix['config']:
+            if matrix['config'] == INVALID:
+                return False
+            module_cfg = matrix['config'].get(module_name)
+            if module_cfg == INVALID:
+                return False
+            if module_cfg:
+                denied, can_view, can_edit, can_delete = module_cfg
+                # If explicitly denied, return False
+                if denied: return False
 
-            # 2. Legacy Role-based Fallback
-            role = profile.role.lower()
-            allowed = ['owner', 'admin', 'managing director', 'manager', 'advisor', 'reception', 'supervisor']
-            return any(r in role for r in allowed)
-        except:
-            return False
+                # Logic for specific methods
+                if bit == VIEW and can_view:
+                    return True
+                if bit in (CREATE, EDIT) and can_edit:
+                    return True
+                if bit == DELETE and can_delete:
+                    return True
+
+        # 2. Legacy Role-based Fallback
+        return role_matches(matrix, ['owner', 'admin', 'managing director', 'manager', 'advisor', 'reception', 'supervisor'])
 
 class IsManager(permissions.BasePermission):
     """
@@ -68,12 +63,7 @@ class IsManager(permissions.BasePermission):
     def has_permission(self, request, view):
         if is_elite_user(request.user):
             return True
-        try:
-            role = request.user.hr_profile.role.lower()
-            allowed = ['manager', 'head', 'lead', 'incharge', 'director', 'admin', 'owner']
-            return any(r in role for r in allowed)
-        except:
-            return False
+        return role_matches(matrix_for(request), ['manager', 'head', 'lead', 'incharge', 'director', 'admin', 'owner'])
 
 class IsEliteAdmin(permissions.BasePermission):
     """
@@ -111,12 +101,7 @@ class IsFinanceUser(permissions.BasePermission):
     def has_permission(self, request, view):
         if is_elite_user(request.user):
             return True
-        try:
-            role = request.user.hr_profile.role.lower()
-            allowed = ['finance', 'accountant', 'owner', 'admin']
-            return any(r in role for r in allowed)
-        except:
-            return False
+        return role_matches(matrix_for(request), ['finance', 'accountant', 'owner', 'admin'])
 
 class HasModulePermission(permissions.BasePermission):
     """
@@ -134,31 +119,7 @@ class HasModulePermission(permissions.BasePermission):
             # For safety, we deny unless it matches IsAdminOrOwner logic which is usually comprised
             return False 
             
-        try:
-            profile = request.user.hr_profile
-            # Check for ModulePermission entry
-            # Note: We use .filter().first() to avoid errors if multiple or none exist
-            perm = profile.module_permissions.filter(module_name=module_name).first()
-            
-            if not perm:
-                # If no explicit permission record exists, deny access
-                # (Unless we want a default open policy, but security dictates default closed)
-                return False
-                
-            if request.method in permissions.SAFE_METHODS:
-                return perm.can_view
-            
-            if request.method == 'POST':
-                return perm.can_create
-                
-            if request.method in ['PUT', 'PATCH']:
-                return perm.can_edit
-                
-            if request.method == 'DELETE':
-                return perm.can_delete
-                
-            return False
-        except Exception as e:
-            # Log error if needed
-            print(f"RBAC Error: {e}")
-            return False
+        matrix = matrix_for(request)
+        # No profile or no explicit permission record: deny (security dictates default closed)
+        bits = matrix['modules'].get(module_name) if matrix['employee'] else None
+        return bool(bits and bits & method_bit(request.method))
@@ -0,0 +1,296 @@
+"""
+Per-endpoint request profiling.
+
+ProfilingMiddleware times every request and, for a sampled fraction
+(PROFILING_SAMPLE_RATE), also counts SQL queries, SQL time and repeated query
+fingerprints. Results go into per-minute, per-route histograms held in process
+memory; every PROFILING_PUBLISH_SECONDS a worker publishes its recent minutes
+to the shared cache so the diagnostics view and the endpoint_profile command
+can merge all workers.
+
+Each worker's snapshot is its own cache key and expires with the window. The
+registry listing the workers is only rewritten under a cache.add lock, so
+workers publishing together never drop each other's entries.
+"""
+import hashlib
+import os
+import random
+import re
+import socket
+import threading
+import time
+from collections import Counter
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import connections
+
+# Upper bounds (ms) of the latency histogram buckets; the last bucket is open-ended
+LATENCY_BUCKETS_MS = (5, 10, 25, 50, 75, 100, 150, 250, 400, 600, 1000, 1500, 2500, 4000, 6000, 10000)
+REGISTRY_KEY = 'profiling:workers'
+REGISTRY_LOCK_KEY = 'profiling:workers:lock'
+REGISTRY_LOCK_SECONDS = 10
+WORKER_KEY = 'profiling:worker:{}'
+TOP_DUPLICATES = 5
+
+_IN_LIST = re.compile(r'IN \((?:%s, )*%s\)')
+_NUMBER = re.compile(r'\b\d+\b')
+_REGEX_GROUP = re.compile(r'\(\?P<(\w+)>[^)]*\)')
+FINGERPRINT_LENGTH = 300
+
+
+def fingerprint(sql):
+    """
+    Shape of a statement: placeholder lists collapsed, inlined numbers removed.
+    Long statements are shortened for display with a digest of the whole shape,
+    so statements that only differ after the cut (usually the WHERE clause)
+    stay apart.
+    """
+    shape = _NUMBER.sub('N', _IN_LIST.sub('IN (...)', sql))
+    if len(shape) <= FINGERPRINT_LENGTH:
+        return shape
+    digest = hashlib.sha1(shape.encode()).hexdigest()[:10]
+    return f"{shape[:FINGERPRINT_LENGTH - 16]}... [{digest}]"
+
+
+def route_name(match):
+    """URL pattern of a resolved request; DRF router regexes become 'jobs/<pk>/'."""
+    return _REGEX_GROUP.sub(r'<\1>', match.route).replace('^', '').replace('$', '')
+
+
+def setting(name, default):
+    return getattr(settings, name, default)
+
+
+def percentile(histogram, fraction):
+    """Upper bound (ms) of the bucket holding the given fraction of requests."""
+    total = sum(histogram)
+    if not total:
+        return None
+    threshold = total * fraction
+    running = 0
+    for i, count in enumerate(histogram):
+        running += count
+        if running >= threshold:
+            break
+    # The open-ended last bucket is reported as its lower bound
+    return LATENCY_BUCKETS_MS[min(i, len(LATENCY_BUCKETS_MS) - 1)]
+
+
+def empty_stats():
+    return {
+        'requests': 0,
+        'errors': 0,
+        'latency': [0] * (len(LATENCY_BUCKETS_MS) + 1),
+        'total_ms': 0.0,
+        'response_bytes': 0,
+        # Sampled requests only
+        'sampled': 0,
+        'queries': 0,
+        'max_queries': 0,
+        'sql_ms': 0.0,
+        'python_ms': 0.0,
+        'duplicate_requests': 0,
+        'duplicates': {},  # fingerprint -> highest repeat count seen in one request
+    }
+
+
+def merge_stats(into, other):
+    for key in ('requests', 'errors', 'total_ms', 'response_bytes', 'sampled', 'queries',
+                'sql_ms', 'python_ms', 'duplicate_requests'):
+        into[key] += other[key]
+    into['max_queries'] = max(into['max_queries'], other['max_queries'])
+    into['latency'] = [a + b for a, b in zip(into['latency'], other['latency'])]
+    merge_duplicates(into, other['duplicates'])
+    return into
+
+
+def merge_duplicates(stats, duplicates):
+    """Keeps the TOP_DUPLICATES fingerprints with the most repeats in a single request."""
+    for sql, repeats in duplicates.items():
+        stats['duplicates'][sql] = max(stats['duplicates'].get(sql, 0), repeats)
+    if len(stats['duplicates']) > TOP_DUPLICATES:
+        top = sorted(stats['duplicates'].items(), key=lambda item: -item[1])[:TOP_DUPLICATES]
+        stats['duplicates'] = dict(top)
+
+
+class QueryRecorder:
+    """execute_wrapper that counts statements, SQL time and repeated fingerprints."""
+
+    def __init__(self):
+        self.count = 0
+        self.seconds = 0.0
+        self.shapes = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.seconds += time.perf_counter() - started
+            self.count += 1
+            self.shapes[fingerprint(sql)] += 1
+
+    def duplicates(self):
+        return {sql: n for sql, n in self.shapes.most_common(TOP_DUPLICATES) if n > 1}
+
+
+class EndpointProfiler:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._minutes = {}  # epoch minute -> {route: stats}
+        self._last_publish = time.monotonic()
+        self.worker_id = f'{socket.gethostname()}:{os.getpid()}'
+
+    def window_minutes(self):
+        return int(setting('PROFILING_WINDOW_MINUTES', 60))
+
+    def record(self, route, status_code, total_seconds, response_bytes, recorder=None):
+        minute = int(time.time() // 60)
+        total_ms = total_seconds * 1000
+        bucket = next((i for i, bound in enumerate(LATENCY_BUCKETS_MS) if total_ms <= bound), len(LATENCY_BUCKETS_MS))
+        with self._lock:
+            stats = self._minutes.setdefault(minute, {}).get(route)
+            if stats is None:
+                stats = self._minutes[minute][route] = empty_stats()
+            stats['requests'] += 1
+            stats['errors'] += status_code >= 500
+            stats['latency'][bucket] += 1
+            stats['total_ms'] += total_ms
+            stats['response_bytes'] += response_bytes or 0
+            if recorder is not None:
+                sql_ms = recorder.seconds * 1000
+                duplicates = recorder.duplicates()
+                stats['sampled'] += 1
+                stats['queries'] += recorder.count
+                stats['max_queries'] = max(stats['max_queries'], recorder.count)
+                stats['sql_ms'] += sql_ms
+                stats['python_ms'] += max(total_ms - sql_ms, 0)
+                if duplicates:
+                    stats['duplicate_requests'] += 1
+                    merge_duplicates(stats, duplicates)
+            self._prune(minute)
+        self.maybe_publish()
+
+    def _prune(self, now_minute):
+        oldest = now_minute - self.window_minutes()
+        for minute in [m for m in self._minutes if m <= oldest]:
+            del self._minutes[minute]
+
+    def snapshot(self):
+        with self._lock:
+            return {minute: {route: dict(stats, latency=list(stats['latency']), duplicates=dict(stats['duplicates']))
+                             for route, stats in routes.items()}
+                    for minute, routes in self._minutes.items()}
+
+    def maybe_publish(self, force=False):
+        interval = float(setting('PROFILING_PUBLISH_SECONDS', 30))
+        if not force and time.monotonic() - self._last_publish < interval:
+            return
+        self._last_publish = time.monotonic()
+        timeout = self.window_minutes() * 60
+        try:
+            cache.set(WORKER_KEY.format(self.worker_id), self.snapshot(), timeout)
+            self.register()
+        except Exception:
+            pass  # diagnostics must never break requests
+
+    def register(self):
+        """
+        Adds this worker to the registry and drops workers whose snapshot has
+        expired. Skipped while another worker holds the lock; the next publish
+        retries.
+        """
+        if not cache.add(REGISTRY_LOCK_KEY, self.worker_id, REGISTRY_LOCK_SECONDS):
+            return False
+        try:
+            workers = set(cache.get(REGISTRY_KEY) or ()) | {self.worker_id}
+            live = cache.get_many([WORKER_KEY.format(worker) for worker in workers])
+            cache.set(REGISTRY_KEY, sorted(w for w in workers if WORKER_KEY.format(w) in live), None)
+        finally:
+            cache.delete(REGISTRY_LOCK_KEY)
+        return True
+
+    def reset(self):
+        with self._lock:
+            self._minutes.clear()
+
+
+profiler = EndpointProfiler()
+
+
+def collect(minutes=None):
+    """Per-route stats merged across all published workers for the last `minutes`."""
+    minutes = minutes or profiler.window_minutes()
+    oldest = int(time.time() // 60) - minutes
+    registry = cache.get(REGISTRY_KEY) or {}
+    snapshots = cache.get_many([WORKER_KEY.format(worker) for worker in registry])
+    merged = {}
+    for snapshot in snapshots.values():
+        for minute, routes in snapshot.items():
+            if int(minute) <= oldest:
+                continue
+            for route, stats in routes.items():
+                merge_stats(merged.setdefault(route, empty_stats()), stats)
+    return merged
+
+
+def report(minutes=None, sort='p95', limit=25):
+    """Worst routes first, with latency percentiles and per-request query costs."""
+    rows = []
+    for route, stats in collect(minutes).items():
+        sampled = stats['sampled']
+        rows.append({
+            'route': route,
+            'requests': stats['requests'],
+            'errors': stats['errors'],
+            'p50_ms': percentile(stats['latency'], 0.50),
+            'p95_ms': percentile(stats['latency'], 0.95),
+            'p99_ms': percentile(stats['latency'], 0.99),
+            'avg_ms': round(stats['total_ms'] / stats['requests'], 1),
+            'avg_response_bytes': round(stats['response_bytes'] / stats['requests']),
+            'sampled': sampled,
+            'queries_per_request': round(stats['queries'] / sampled, 1) if sampled else None,
+            'max_queries': stats['max_queries'] if sampled else None,
+            'sql_ms_per_request': round(stats['sql_ms'] / sampled, 1) if sampled else None,
+            'python_ms_per_request': round(stats['python_ms'] / sampled, 1) if sampled else None,
+            'duplicate_query_rate': round(stats['duplicate_requests'] / sampled, 2) if sampled else None,
+            'top_duplicates': [
+                {'sql': sql, 'repeats': repeats}
+                for sql, repeats in sorted(stats['duplicates'].items(), key=lambda item: -item[1])
+            ],
+        })
+
+    sort_keys = {
+        'p95': lambda r: r['p95_ms'] or 0,
+        'p99': lambda r: r['p99_ms'] or 0,
+        'queries': lambda r: r['queries_per_request'] or 0,
+        'requests': lambda r: r['requests'],
+        'sql': lambda r: r['sql_ms_per_request'] or 0,
+    }
+    rows.sort(key=sort_keys.get(sort, sort_keys['p95']), reverse=True)
+    return rows[:limit]
+
+
+class ProfilingMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not setting('PROFILING_ENABLED', True):
+            return self.get_response(request)
+
+        recorder = QueryRecorder() if random.random() < float(setting('PROFILING_SAMPLE_RATE', 0.1)) else None
+        started = time.perf_counter()
+        if recorder is None:
+            response = self.get_response(request)
+        else:
+            with connections['default'].execute_wrapper(recorder):
+                response = self.get_response(request)
+        elapsed = time.perf_counter() - started
+
+        match = getattr(request, 'resolver_match', None)
+        route = f"{request.method} /{route_name(match)}" if match and match.route else f"{request.method} <unresolved>"
+        size = None if getattr(response, 'streaming', False) else len(response.content)
+        profiler.record(route, response.status_code, elapsed, size, recorder)
+        return response
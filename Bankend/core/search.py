@@ -0,0 +1,250 @@
+"""
+Unified search over job cards, customers, vehicles and leads.
+
+Every indexed object has one SearchDocument: its display title/subtitle, its
+branch and `body`, a lowercase string of normalized tokens. Tokens have
+punctuation removed ("A-12345" -> "a12345"), and phone numbers are also
+stored as bare digits in local (050...) and international (97150...) form,
+so "+971 50 123 4567", "0501234567" and "050-123" all find the same customer.
+A query matches a document when each of its terms (normalized the same way)
+occurs in the body.
+
+Indexes are vendor specific (migration core.0007): PostgreSQL gets a pg_trgm
+GIN index, which serves the substring filters and the similarity ranking;
+SQLite gets an FTS5 trigram table kept in sync by triggers, ranked by bm25.
+Other databases (or SQLite builds without FTS5) scan.
+
+Saving or deleting an indexed model updates its document after the
+transaction commits (connect_signals(), called from CoreConfig.ready). Queryset.update() and
+bulk_create() bypass signals; `manage.py rebuild_search_index` re-indexes.
+"""
+import re
+from collections import namedtuple
+
+from django.apps import apps
+from django.db import connection, transaction
+from django.db.models.signals import post_delete, post_save
+from django.db.models import FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+
+from .models import SearchDocument
+
+FTS_TABLE = 'core_searchdocument_fts'
+# Trigram indexes only help with terms at least this long
+MIN_INDEXED_TERM = 3
+
+_TOKEN_RE = re.compile(r'[^\w]+')
+_PHONE_RE = re.compile(r'^[+(]?[\d\s()./-]{6,}$')
+
+
+def compact(value):
+    return _TOKEN_RE.sub('', str(value).lower())
+
+
+def phone_forms(phone):
+    """Bare digits of a phone number in the forms people type it (UAE numbers: 05x... and 9715x...)."""
+    digits = re.sub(r'\D', '', phone or '')
+    if digits.startswith('00'):
+        digits = digits[2:]
+    if not digits:
+        return []
+    forms = [digits]
+    if digits.startswith('971'):
+        forms.append('0' + digits[3:])
+    elif digits.startswith('0'):
+        forms.append('971' + digits[1:])
+    return forms
+
+
+def plate_forms(code, number):
+    number = compact(number or '')
+    if not number:
+        return []
+    return [number, compact(code or '') + number] if code else [number]
+
+
+# title/subtitle(obj): display strings; branch(obj): branch id or None;
+# text(obj): free-text values; phones(obj) and plates(obj) get the normalized forms above
+Entity = namedtuple('Entity', 'model title subtitle branch text phones plates')
+
+
+def _join(*parts):
+    return ' '.join(str(part) for part in parts if part)
+
+
+ENTITIES = {
+    'jobcard': Entity(
+        'job_cards.JobCard',
+        title=lambda obj: obj.job_card_number,
+        subtitle=lambda obj: _join(obj.customer_name, '·', obj.brand, obj.model, obj.registration_number),
+        branch=lambda obj: obj.branch_id,
+        text=lambda obj: [obj.job_card_number, obj.customer_name, obj.brand, obj.model, obj.vin,
+                          obj.registration_number, obj.plate_emirate],
+        phones=lambda obj: [obj.phone],
+        plates=lambda obj: [(obj.plate_code, obj.registration_number)],
+    ),
+    'customer': Entity(
+        'customers.Customer',
+        title=lambda obj: obj.name,
+        subtitle=lambda obj: obj.phone,
+        branch=lambda obj: None,
+        text=lambda obj: [obj.name, obj.email],
+        phones=lambda obj: [obj.phone],
+        plates=lambda obj: [],
+    ),
+    'vehicle': Entity(
+        'masters.Vehicle',
+        title=lambda obj: _join(obj.brand, obj.model) or obj.registration_number,
+        subtitle=lambda obj: _join(obj.plate_emirate, obj.plate_code, obj.registration_number),
+        branch=lambda obj: None,
+        text=lambda obj: [obj.vin, obj.chassis_number, obj.registration_number, obj.brand, obj.model,
+                          obj.color, obj.plate_emirate],
+        phones=lambda obj: [],
+        plates=lambda obj: [(obj.plate_code, obj.registration_number)],
+    ),
+    'lead': Entity(
+        'leads.Lead',
+        title=lambda obj: obj.customer_name,
+        subtitle=lambda obj: _join(obj.get_status_display(), '·', obj.interested_service),
+        branch=lambda obj: obj.branch_id,
+        text=lambda obj: [obj.customer_name, obj.email, obj.interested_service],
+        phones=lambda obj: [obj.phone],
+        plates=lambda obj: [],
+    ),
+}
+
+
+def kind_for(model):
+    label = model._meta.label
+    return next(kind for kind, entity in ENTITIES.items() if entity.model == label)
+
+
+def body_for(entity, obj):
+    tokens = []
+    for value in entity.text(obj):
+        tokens.extend(compact(word) for word in str(value or '').split())
+    for phone in entity.phones(obj):
+        tokens.extend(phone_forms(phone))
+    for code, number in entity.plates(obj):
+        tokens.extend(plate_forms(code, number))
+    # Unique, in order: the first tokens are the most telling
+    return ' '.join(dict.fromkeys(token for token in tokens if token))
+
+
+def document_for(kind, obj):
+    entity = ENTITIES[kind]
+    return SearchDocument(
+        kind=kind, object_id=obj.pk,
+        title=str(entity.title(obj) or '')[:255], subtitle=str(entity.subtitle(obj) or '')[:255],
+        branch_id=entity.branch(obj), body=body_for(entity, obj),
+    )
+
+
+def index(documents):
+    """Upserts documents in one statement per batch."""
+    return SearchDocument.objects.bulk_create(
+        documents, batch_size=500, update_conflicts=True, unique_fields=['kind', 'object_id'],
+        update_fields=['title', 'subtitle', 'branch_id', 'body', 'updated_at'],
+    )
+
+
+def object_changed(obj):
+    """post_save hook: re-indexes the object once the transaction commits."""
+    kind = kind_for(type(obj))
+    transaction.on_commit(lambda: index([document_for(kind, obj)]))
+
+
+def object_deleted(obj):
+    kind, pk = kind_for(type(obj)), obj.pk
+    transaction.on_commit(lambda: SearchDocument.objects.filter(kind=kind, object_id=pk).delete())
+
+
+def index_search_document(sender, instance, **kwargs):
+    object_changed(instance)
+
+
+def drop_search_document(sender, instance, **kwargs):
+    object_deleted(instance)
+
+
+def connect_signals():
+    for entity in ENTITIES.values():
+        post_save.connect(index_search_document, sender=entity.model, dispatch_uid=f'search-save-{entity.model}')
+        post_delete.connect(drop_search_document, sender=entity.model, dispatch_uid=f'search-delete-{entity.model}')
+
+
+def rebuild(kinds=None, batch_size=2000):
+    """Re-indexes every object of `kinds` (default: all) and drops documents of deleted ones; returns the count."""
+    total = 0
+    for kind in kinds or ENTITIES:
+        model = apps.get_model(ENTITIES[kind].model)
+        batch = []
+        for obj in model._base_manager.order_by('pk').iterator(chunk_size=batch_size):
+            batch.append(document_for(kind, obj))
+            if len(batch) >= batch_size:
+                total += len(index(batch))
+                batch = []
+        if batch:
+            total += len(index(batch))
+        SearchDocument.objects.filter(kind=kind).exclude(
+            object_id__in=model._base_manager.values('pk'),
+        ).delete()
+    return total
+
+
+def query_terms(query):
+    """The normalized terms of a query; a phone number typed with spaces stays one term."""
+    query = (query or '').strip()
+    if _PHONE_RE.match(query):
+        return phone_forms(query)[:1]
+    return list(dict.fromkeys(term for term in (compact(word) for word in query.split()) if term))
+
+
+def fts_available():
+    if connection.vendor != 'sqlite':
+        return False
+    if not hasattr(connection, '_search_fts'):
+        connection._search_fts = FTS_TABLE in connection.introspection.table_names()
+    return connection._search_fts
+
+
+def matching(query, kinds=None, branch_id=None):
+    """SearchDocuments matching every term of `query`, best first (empty for a blank query)."""
+    terms = query_terms(query)
+    documents = SearchDocument.objects.all()
+    if not terms:
+        return documents.none()
+    if kinds:
+        documents = documents.filter(kind__in=kinds)
+    if branch_id:
+        documents = documents.filter(Q(branch_id=branch_id) | Q(branch_id__isnull=True))
+
+    indexed = [term for term in terms if len(term) >= MIN_INDEXED_TERM]
+    if connection.vendor == 'postgresql':
+        from django.contrib.postgres.search import TrigramWordSimilarity
+        for term in terms:
+            documents = documents.filter(body__contains=term)
+        return documents.annotate(score=TrigramWordSimilarity(' '.join(terms), 'body')).order_by('-score', '-updated_at')
+
+    if indexed and fts_available():
+        match = ' AND '.join(f'"{term}"' for term in indexed)
+        documents = documents.filter(pk__in=RawSQL(f'SELECT rowid FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s', [match]))
+        for term in terms:
+            if len(term) < MIN_INDEXED_TERM:
+                documents = documents.filter(body__contains=term)
+        # bm25 rank: lower is better
+        rank = RawSQL(
+            f'SELECT -rank FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s AND rowid = {SearchDocument._meta.db_table}.id',
+            [match],
+        )
+        return documents.annotate(score=rank).order_by('-score', '-updated_at')
+
+    for term in terms:
+        documents = documents.filter(body__contains=term)
+    return documents.annotate(score=Value(0.0, output_field=FloatField())).order_by('-updated_at')
+
+
+def filter_queryset(queryset, query):
+    """Narrows a queryset of an indexed model to the objects matching `query`."""
+    kind = kind_for(queryset.model)
+    return queryset.filter(pk__in=matching(query, [kind]).order_by().values('object_id'))
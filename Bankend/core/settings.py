@@ -89,6 +89,8 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     'corsheaders.middleware.CorsMiddleware',
+    # Per-endpoint latency/query profiling (see core/profiling.py)
+    'core.profiling.ProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
@@ -263,6 +265,7 @@ SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(minutes=60),
     'REFRESH_TOKEN_LIFETIME': timedelta(days=1),
     'AUTH_HEADER_TYPES': ('Bearer',),
+    'TOKEN_OBTAIN_SERIALIZER': 'authentication.serializers.VersionedTokenObtainPairSerializer',
 }
 
 # CORS Configuration - use environment variable for production
@@ -310,17 +313,33 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 # WeasyPrint configuration (for PDF generation)
 WEASYPRINT_BASEURL = '/'
 
-# Cache Configuration (Database Backend)
+# Cache Configuration
+# Two tiers: a small per-process LRU in front of a store shared by all gunicorn
+# workers: Redis when USE_REDIS is on (Django's own backend, only needs the
+# redis package); otherwise the core.CacheEntry table.
+USE_REDIS = os.environ.get('USE_REDIS', 'False').lower() == 'true'
+
 CACHES = {
     'default': {
-        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
-        'LOCATION': 'unique-snowflake',
+        'BACKEND': 'core.cache_backend.TieredCache',
+        'LOCATION': 'default',
+        'TIMEOUT': 300,
+        'OPTIONS': {
+            'FRONT_MAX_ENTRIES': 2000,
+            'FRONT_TIMEOUT': 5,  # Max staleness of a worker's local copy (seconds)
+        },
     }
 }
+if USE_REDIS:
+    CACHES['shared'] = {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': os.environ.get('REDIS_URL', 'redis://redis:6379/0'),
+    }
+    CACHES['default']['OPTIONS']['SHARED'] = 'shared'
 
 # Cache Collector Schedule
-# Runs on: 1st, 8th, 15th, 22nd of each month
-# Command: python manage.py clear_expired_cache
+# Expired CacheEntry rows are swept in batches hourly (core.tasks.sweep_expired_cache).
+# Manual run: python manage.py clear_expired_cache
 
 # Stripe Configuration
 STRIPE_SECRET_KEY = 'sk_test_placeholder'
@@ -328,7 +347,7 @@ STRIPE_PUBLISHABLE_KEY = 'pk_test_placeholder'
 STRIPE_WEBHOOK_SECRET = 'whsec_placeholder'
 
 # Channels (Disabled locally if no Redis)
-if os.environ.get('USE_REDIS', 'False').lower() == 'true':
+if USE_REDIS:
     CHANNEL_LAYERS = {
         'default': {
             'BACKEND': 'channels_redis.core.RedisChannelLayer',
@@ -352,6 +371,64 @@ CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = TIME_ZONE
 
+# Audit batches go to the log_audit_events task; False writes them in-process
+# (the same local sink used when the broker is unreachable)
+AUDIT_ASYNC = os.environ.get('AUDIT_ASYNC', 'True').lower() == 'true'
+
+# Background exports (core/export_jobs.py): run on Celery, or in-process when False
+EXPORT_JOBS_ASYNC = os.environ.get('EXPORT_JOBS_ASYNC', 'True').lower() == 'true'
+EXPORT_JOB_TTL_SECONDS = 3600        # finished files are shared and kept this long
+EXPORT_JOB_TIMEOUT_SECONDS = 3600    # a RUNNING job older than this is presumed dead
+EXPORT_LINK_MAX_AGE = 900            # signed download links expire after 15 minutes
+
+# Notification outbox (notifications/outbox.py): drained on Celery, or in-process when False
+NOTIFICATIONS_ASYNC = os.environ.get('NOTIFICATIONS_ASYNC', 'True').lower() == 'true'
+NOTIFICATION_TRANSPORT = os.environ.get('NOTIFICATION_TRANSPORT', 'notifications.transports.TwilioTransport')
+NOTIFICATION_RATE_LIMITS = {'WHATSAPP': 60, 'SMS': 60, 'EMAIL': 120}  # messages per minute, all workers
+NOTIFICATION_BATCH_SIZE = 50
+NOTIFICATION_MAX_ATTEMPTS = 5
+NOTIFICATION_RETRY_BASE_SECONDS = 60      # doubles after every failed attempt
+NOTIFICATION_DRAIN_DELAY_SECONDS = 5      # messages queued within this window share one drain task
+
+# Websocket chat (dashboard/chat.py): messages are broadcast, then stored in batches
+CHAT_FLUSH_INTERVAL_MS = 250
+CHAT_FLUSH_BATCH_SIZE = 200
+
+# Job board WebSocket (job_cards/board.py)
+JOB_BOARD_EVENT_TTL_HOURS = 24       # how far back reconnecting clients can resume
+JOB_BOARD_REPLAY_LIMIT = 500         # a longer gap makes the client reload instead
+
+# PDF rendering (core/pdf.py)
+PDF_CACHE_TIMEOUT = 7 * 24 * 3600    # rendered PDFs are also dropped whenever the document is saved
+PDF_BATCH_WORKERS = int(os.environ.get('PDF_BATCH_WORKERS', '4'))
+PDF_BATCH_MAX_DOCUMENTS = 200
+
+# Compiled per-user permission matrix (core/permission_matrix.py); dropped on Employee/ModulePermission saves
+PERMISSION_MATRIX_TIMEOUT = 3600
+
+# Cached JWT principals (authentication/principal.py); dropped on User saves, revoked on password change
+AUTH_PRINCIPAL_TIMEOUT = 300
+
+# Stock forecasting and reorder planning (stock/forecasting.py)
+STOCK_FORECAST_LOOKBACK_DAYS = 90
+STOCK_FORECAST_CACHE_SECONDS = 3600   # daily consumption per branch; today's usage only counts from tomorrow
+STOCK_SMOOTHING_ALPHA = 0.3           # method=ewma: weight of the most recent day
+STOCK_LEAD_TIME_DAYS = 7
+STOCK_COVER_DAYS = 30                 # an order covers this many days beyond the lead time
+STOCK_SERVICE_LEVEL_Z = 1.65          # safety stock z-score (~95% service level)
+
+# Clock-in/out events (attendance/services.py ClockService)
+ATTENDANCE_EMPLOYEE_CACHE_SECONDS = 3600   # user -> employee mapping; dropped when the Employee changes
+ATTENDANCE_MAX_BATCH_EVENTS = 500          # events per POST /api/attendance/clock/
+ATTENDANCE_OFFLINE_MAX_DAYS = 7            # oldest queued offline punch accepted
+ATTENDANCE_CLOCK_SKEW_SECONDS = 300        # device clocks may run this far ahead
+
+# Endpoint profiling: all requests are timed, a sample also has its SQL recorded
+PROFILING_ENABLED = os.environ.get('PROFILING_ENABLED', 'True').lower() == 'true'
+PROFILING_SAMPLE_RATE = float(os.environ.get('PROFILING_SAMPLE_RATE', '0.1'))
+PROFILING_WINDOW_MINUTES = 60
+PROFILING_PUBLISH_SECONDS = 30
+
 # Celery Beat Schedule
 from celery.schedules import crontab
 CELERY_BEAT_SCHEDULE = {
@@ -363,6 +440,30 @@ CELERY_BEAT_SCHEDULE = {
         'task': 'notifications.tasks.check_low_stock',
         'schedule': crontab(hour=8, minute=0), # 8 AM daily
     },
+    'refresh-dashboard-metrics': {
+        'task': 'dashboard.tasks.refresh_dashboard_metrics',
+        'schedule': crontab(minute='*/5'), # Every 5 minutes
+    },
+    'sweep-expired-cache-hourly': {
+        'task': 'core.tasks.sweep_expired_cache',
+        'schedule': crontab(minute=30), # Every hour
+    },
+    'purge-expired-exports-hourly': {
+        'task': 'core.tasks.purge_expired_exports',
+        'schedule': crontab(minute=45), # Every hour
+    },
+    'drain-notification-outbox': {
+        'task': 'notifications.tasks.drain_notification_outbox',
+        'schedule': crontab(), # Every minute: retries and anything a lost task missed
+    },
+    'prune-job-board-events-hourly': {
+        'task': 'job_cards.tasks.prune_job_board_events',
+        'schedule': crontab(minute=50), # Every hour
+    },
+    'recompute-service-due-dates-nightly': {
+        'task': 'core.tasks.recompute_service_due_dates',
+        'schedule': crontab(hour=2, minute=15), # 2:15 AM daily
+    },
 }
 
 # Sentry Configuration
@@ -1,13 +1,32 @@
-from django.db.models.signals import post_save, post_delete
+from django.db.models.signals import post_init, post_save, post_delete
 from django.dispatch import receiver
 from django.contrib.contenttypes.models import ContentType
 from crum import get_current_request
 from .models import AuditLog, NoAudit
-from .tasks import log_audit_event
+from . import audit
 import sys
 
 # Disable auditing during migrations to prevent transaction errors
 IS_MIGRATING = 'migrate' in sys.argv or 'makemigrations' in sys.argv
+
+EXCLUDED_MODELS = ('AuditLog', 'CacheEntry', 'ErrorLog', 'LoginHistory', 'CacheCollectorLog', 'SystemChangeLog', 'DataAccessLog')
+EXCLUDED_APPS = ('admin', 'contenttypes', 'sessions', 'auth')
+
+_audited = {}
+
+
+def is_audited(sender):
+    result = _audited.get(sender)
+    if result is None:
+        result = _audited[sender] = not (
+            sender.__name__ in EXCLUDED_MODELS
+            or sender == AuditLog
+            or issubclass(sender, NoAudit)
+            or getattr(sender._meta, 'app_label', '') in EXCLUDED_APPS
+        )
+    return result
+
+
 def get_request_metadata():
     request = get_current_request()
     if request:
@@ -20,83 +39,50 @@ def get_request_metadata():
         }
     return {}
 
-def get_field_changes(instance, created):
-    if created:
-        return None
-    try:
-        old_instance = instance.__class__.objects.get(pk=instance.pk)
-        changes = {}
-        for field in instance._meta.fields:
-            name = field.name
-            old_val = getattr(old_instance, name)
-            new_val = getattr(instance, name)
-            if old_val != new_val:
-                changes[name] = {
-                    'before': str(old_val),
-                    'after': str(new_val)
-                }
-        return changes or None
-    except:
-        return None
+
+def build_event(instance, action, changes=None):
+    meta = get_request_metadata()
+    return {
+        'user_id': meta['user'].id if meta.get('user') else None,
+        'content_type_id': ContentType.objects.get_for_model(instance).id,
+        'object_id': str(instance.pk),
+        'object_repr': str(instance)[:255],
+        'action': action,
+        'field_changes': changes,
+        'ip_address': meta.get('ip'),
+        'user_agent': meta.get('ua', ''),
+        'endpoint': meta.get('endpoint', ''),
+        'method': meta.get('method', ''),
+    }
+
+
+@receiver(post_init)
+def audit_snapshot(sender, instance, **kwargs):
+    # Runs for objects built by from_db() too: the loaded values are the "before" state
+    if not IS_MIGRATING and is_audited(sender):
+        audit.take_snapshot(instance)
+
 
 @receiver(post_save)
-def audit_post_save(sender, instance, created, **kwargs):
-    if IS_MIGRATING:
-        return
-    if sender.__name__ in ('AuditLog', 'CacheEntry', 'ErrorLog', 'LoginHistory', 'CacheCollectorLog', 'SystemChangeLog', 'DataAccessLog'):
-        return
-    if sender == AuditLog or issubclass(sender, NoAudit):
-        return
-    if getattr(sender._meta, 'app_label', '') in ('admin', 'contenttypes', 'sessions', 'auth'):
+def audit_post_save(sender, instance, created, using=None, **kwargs):
+    if IS_MIGRATING or not is_audited(sender):
         return
 
-    meta = get_request_metadata()
-    action = 'CREATE' if created else 'UPDATE'
-    changes = None if created else get_field_changes(instance, created)
-
     try:
-        content_type = ContentType.objects.get_for_model(instance)
-        # Offload to Celery background task
-        log_audit_event.delay(
-            user_id=meta.get('user').id if meta.get('user') else None,
-            content_type_id=content_type.id,
-            object_id=str(instance.pk),
-            object_repr=str(instance)[:255],
-            action=action,
-            field_changes=changes,
-            ip_address=meta.get('ip'),
-            user_agent=meta.get('ua', ''),
-            endpoint=meta.get('endpoint', ''),
-            method=meta.get('method', ''),
-        )
+        changes = None if created else audit.field_changes(instance)
+        audit.record_event(build_event(instance, 'CREATE' if created else 'UPDATE', changes), using=using)
     except Exception as e:
         sys.stderr.write(f"Audit triggering failed for {instance}: {e}\n")
+    audit.take_snapshot(instance)
+
 
 @receiver(post_delete)
-def audit_post_delete(sender, instance, **kwargs):
-    if IS_MIGRATING:
-        return
-    if sender.__name__ in ('AuditLog', 'CacheEntry', 'ErrorLog', 'LoginHistory', 'CacheCollectorLog', 'SystemChangeLog', 'DataAccessLog'):
-        return
-    if sender == AuditLog or issubclass(sender, NoAudit):
-        return
-    if getattr(sender._meta, 'app_label', '') in ('admin', 'contenttypes', 'sessions', 'auth'):
+def audit_post_delete(sender, instance, using=None, **kwargs):
+    if IS_MIGRATING or not is_audited(sender):
         return
 
-    meta = get_request_metadata()
     try:
-        content_type = ContentType.objects.get_for_model(instance)
-        log_audit_event.delay(
-            user_id=meta.get('user').id if meta.get('user') else None,
-            content_type_id=content_type.id,
-            object_id=str(instance.pk),
-            object_repr=str(instance)[:255],
-            action='DELETE',
-            field_changes=None,
-            ip_address=meta.get('ip'),
-            user_agent=meta.get('ua', ''),
-            endpoint=meta.get('endpoint', ''),
-            method=meta.get('method', ''),
-        )
+        audit.record_event(build_event(instance, 'DELETE'), using=using)
     except Exception as e:
         print(f"Audit delete triggering failed: {e}")
+
@@ -29,3 +29,65 @@ def log_audit_event(user_id, content_type_id, object_id, object_repr, action, fi
         )
     except Exception as e:
         logger.error(f"Failed to log background audit event: {e}")
+
+@shared_task(ignore_result=True)
+def log_audit_events(events):
+    """
+    Writes a batch of audit events (dicts of AuditLog field values) in one INSERT.
+    """
+    from .audit import write_events
+    try:
+        write_events(events)
+    except Exception as e:
+        logger.error(f"Failed to log {len(events)} background audit events: {e}")
+
+@shared_task
+def sweep_expired_cache(batch_size=1000):
+    """
+    Hourly batched removal of expired CacheEntry rows.
+    """
+    import time
+    from .cache_backend import sweep_expired_entries
+    from .models import CacheEntry, CacheCollectorLog
+
+    start_time = time.time()
+    deleted = sweep_expired_entries(batch_size)
+    if deleted:
+        CacheCollectorLog.objects.create(
+            entries_deleted=deleted,
+            entries_kept=CacheEntry.objects.count(),
+            execution_time_ms=int((time.time() - start_time) * 1000),
+            notes="Scheduled hourly sweep"
+        )
+    return deleted
+
+@shared_task
+def recompute_service_due_dates():
+    """
+    Nightly refresh of last_service_date/next_due_date on every ServiceScheduleMixin
+    model (backfills new rows and rolls anniversary-based schedules forward).
+    """
+    from django.apps import apps
+    from .models import ServiceScheduleMixin
+
+    updated = {}
+    for model in apps.get_models():
+        if issubclass(model, ServiceScheduleMixin):
+            updated[model._meta.label] = model.recompute_service_dates()
+    return updated
+
+@shared_task(ignore_result=True)
+def run_export_job(job_id):
+    """
+    Renders one ExportJob to MEDIA_ROOT (see core.export_jobs).
+    """
+    from .export_jobs import run_job
+    run_job(job_id)
+
+@shared_task
+def purge_expired_exports():
+    """
+    Hourly removal of export files and jobs past EXPORT_JOB_TTL_SECONDS.
+    """
+    from .export_jobs import purge_expired_exports as purge
+    return purge()
@@ -0,0 +1,14 @@
+"""
+Settings for the test suite (manage.py test, pytest): the real settings, with
+the real cache backend, minus what needs infrastructure a test run lacks.
+Tests of those features override them back.
+"""
+from .settings import *  # noqa: F401,F403
+
+# No broker: audit batches, exports and notification drains run in-process
+AUDIT_ASYNC = False
+EXPORT_JOBS_ASYNC = False
+NOTIFICATIONS_ASYNC = False
+
+# Keeps profiling samples out of query counts
+PROFILING_ENABLED = False
@@ -0,0 +1,30 @@
+"""
+Test helpers shared by the apps' tests.
+
+Tests run against the real cache backend, whose shared tier is the
+core.CacheEntry table (unless USE_REDIS is on), so throttles and cache misses
+show up in captured queries. Query budgets of application code are asserted
+without them.
+"""
+from contextlib import contextmanager
+
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from .models import CacheEntry
+
+
+def app_queries(context):
+    """The captured queries other than the shared cache tier's."""
+    table = CacheEntry._meta.db_table
+    return [query for query in context.captured_queries if table not in query['sql']]
+
+
+class AppQueriesMixin:
+    @contextmanager
+    def assertNumAppQueries(self, num):
+        """assertNumQueries, not counting the shared cache tier."""
+        with CaptureQueriesContext(connection) as context:
+            yield context
+        queries = app_queries(context)
+        self.assertEqual(len(queries), num, '\n'.join(query['sql'] for query in queries))
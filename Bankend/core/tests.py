@@ -0,0 +1,832 @@
+import hashlib
+from datetime import timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import mock
+
+from django.core.management import call_command
+
+from django.db import connection, transaction
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from core.testing import AppQueriesMixin
+from .cache_backend import DatabaseCache, TieredCache, sweep_expired_entries
+from .models import CacheEntry
+
+
+class DatabaseCacheTests(TestCase):
+    def setUp(self):
+        self.cache = DatabaseCache('test', {})
+
+    def test_round_trip_keeps_python_types(self):
+        self.cache.set('report', {'total': Decimal('10.50'), 'day': timezone.now().date()})
+        self.assertEqual(self.cache.get('report')['total'], Decimal('10.50'))
+
+    def test_bulk_operations_are_single_statements(self):
+        with self.assertNumQueries(1):
+            self.cache.set_many({f'k{i}': i for i in range(50)})
+        with self.assertNumQueries(1):
+            values = self.cache.get_many([f'k{i}' for i in range(60)])
+        self.assertEqual(len(values), 50)
+        with self.assertNumQueries(1):
+            self.cache.set_many({'k1': 'updated'})
+        self.assertEqual(self.cache.get('k1'), 'updated')
+
+    def test_expired_reads_do_not_delete(self):
+        self.cache.set('stale', 1)
+        CacheEntry.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        with self.assertNumQueries(1):
+            self.assertIsNone(self.cache.get('stale'))
+        self.assertFalse(self.cache.has_key('stale'))
+        self.assertEqual(CacheEntry.objects.count(), 1)
+        self.assertTrue(self.cache.add('stale', 2))
+        self.assertEqual(self.cache.get('stale'), 2)
+
+    def test_sweep_removes_only_expired_rows_in_batches(self):
+        self.cache.set_many({f'old{i}': i for i in range(25)})
+        self.cache.set('fresh', 1)
+        CacheEntry.objects.filter(key__contains='old').update(expires_at=timezone.now() - timedelta(minutes=1))
+        self.assertEqual(sweep_expired_entries(batch_size=10), 25)
+        self.assertEqual(self.cache.get('fresh'), 1)
+
+    def test_none_timeout_never_expires(self):
+        self.cache.set('forever', 'x', timeout=None)
+        self.assertEqual(CacheEntry.objects.get().expires_at.year, 9999)
+
+    def test_add_has_one_winner(self):
+        other_worker = DatabaseCache('test', {})
+        self.assertTrue(self.cache.add('lock', 'a'))
+        self.assertFalse(other_worker.add('lock', 'b'))
+        self.assertEqual(self.cache.get('lock'), 'a')
+
+    def test_incr_adds_in_the_database(self):
+        self.assertTrue(self.cache.add('hits', 0))
+        self.assertEqual(self.cache.incr('hits', 5), 5)
+        # Another worker's increment lands on the stored value, not on a stale read
+        DatabaseCache('test', {}).incr('hits')
+        self.assertEqual(self.cache.decr('hits'), 5)
+        self.assertEqual(self.cache.get('hits'), 5)
+        with self.assertRaises(ValueError):
+            self.cache.incr('missing')
+        self.cache.set('label', 'x')
+        with self.assertRaises(TypeError):
+            self.cache.incr('label')
+
+    def test_deletes_are_single_statements(self):
+        self.cache.set_many({f'k{i}': i for i in range(5)})
+        with self.assertNumQueries(1):
+            self.cache.delete_many([f'k{i}' for i in range(5)])
+        with self.assertNumQueries(1):
+            self.assertFalse(self.cache.delete('k1'))
+
+
+class TieredCacheTests(TestCase):
+    def setUp(self):
+        self.cache = TieredCache('test', {'OPTIONS': {'FRONT_MAX_ENTRIES': 3, 'FRONT_TIMEOUT': 60}})
+
+    def test_front_serves_repeat_reads_without_queries(self):
+        self.cache.set('a', [1, 2])
+        with self.assertNumQueries(0):
+            self.assertEqual(self.cache.get('a'), [1, 2])
+        self.assertEqual(self.cache.stats()['front_hits'], 1)
+
+    def test_front_returns_copies(self):
+        self.cache.set('a', [1])
+        self.cache.get('a').append(2)
+        self.assertEqual(self.cache.get('a'), [1])
+
+    def test_shared_tier_is_visible_to_other_processes(self):
+        other_worker = TieredCache('test', {})
+        self.cache.set('shared', 'value')
+        self.assertEqual(other_worker.get('shared'), 'value')
+        self.assertEqual(other_worker.stats()['shared_hits'], 1)
+        self.assertIsNone(other_worker.get('missing'))
+        self.assertEqual(other_worker.stats()['misses'], 1)
+
+    def test_front_is_bounded_lru(self):
+        for key in 'abcd':
+            self.cache.set(key, key)
+        self.assertEqual(self.cache.stats()['front_entries'], 3)
+        with self.assertNumQueries(1):
+            self.assertEqual(self.cache.get('a'), 'a')  # evicted, refetched from shared
+
+    def test_get_many_only_queries_front_misses(self):
+        self.cache.set_many({'x': 1, 'y': 2})
+        self.cache.delete('x')
+        with self.assertNumQueries(1):
+            self.assertEqual(self.cache.get_many(['x', 'y', 'z']), {'y': 2})
+
+    def test_delete_invalidates_both_tiers(self):
+        self.cache.set('a', 1)
+        self.cache.delete('a')
+        self.assertIsNone(self.cache.get('a'))
+        self.assertFalse(CacheEntry.objects.exists())
+
+
+class AuditPipelineTests(TestCase):
+    def setUp(self):
+        from hr.models import Department
+        self.Department = Department
+
+    def audit_rows(self, action=None):
+        from .models import AuditLog
+        rows = AuditLog.objects.filter(content_type__model='department')
+        return rows.filter(action=action) if action else rows
+
+    @override_settings(AUDIT_ASYNC=False)
+    def test_update_diff_uses_snapshot_without_extra_select(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            dept = self.Department.objects.create(name='Paint', description='Old')
+        dept = self.Department.objects.get(pk=dept.pk)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            dept.description = 'New'
+            with self.assertNumQueries(1):  # the UPDATE itself
+                dept.save()
+            dept.name = 'Paint Shop'
+            dept.save()
+
+        first, second = self.audit_rows('UPDATE').order_by('pk')
+        self.assertEqual(first.field_changes, {'description': {'before': 'Old', 'after': 'New'}})
+        self.assertEqual(second.field_changes, {'name': {'before': 'Paint', 'after': 'Paint Shop'}})
+
+    @override_settings(AUDIT_ASYNC=False)
+    def test_transaction_events_are_written_in_one_insert_on_commit(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            for i in range(20):
+                self.Department.objects.create(name=f'Dept {i}')
+        self.assertEqual(len(callbacks), 1)
+        self.assertFalse(self.audit_rows().exists())
+
+        with CaptureQueriesContext(connection) as ctx:
+            callbacks[0]()
+        inserts = [q for q in ctx.captured_queries if q['sql'].startswith('INSERT INTO "core_auditlog"')]
+        self.assertEqual(len(inserts), 1)
+        self.assertEqual(self.audit_rows('CREATE').count(), 20)
+
+    @override_settings(AUDIT_ASYNC=False)
+    def test_rolled_back_work_is_not_audited(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            try:
+                with transaction.atomic():
+                    self.Department.objects.create(name='Ghost')
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+            self.Department.objects.create(name='Real')
+
+        self.assertEqual(list(self.audit_rows().values_list('object_repr', flat=True)), ['Real'])
+
+    @override_settings(AUDIT_ASYNC=False)
+    def test_savepoint_rolled_back_after_outer_events_is_not_audited(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.Department.objects.create(name='Before')
+            try:
+                with transaction.atomic():
+                    self.Department.objects.create(name='Ghost')
+                    raise RuntimeError
+            except RuntimeError:
+                pass
+            with transaction.atomic():
+                self.Department.objects.create(name='Nested')
+            self.Department.objects.create(name='After')
+
+        self.assertEqual(
+            sorted(self.audit_rows().values_list('object_repr', flat=True)), ['After', 'Before', 'Nested']
+        )
+
+    @override_settings(AUDIT_ASYNC=True)
+    def test_falls_back_to_local_sink_when_broker_is_down(self):
+        with mock.patch('core.tasks.log_audit_events.apply_async', side_effect=ConnectionError('broker down')) as send:
+            with self.captureOnCommitCallbacks(execute=True):
+                self.Department.objects.create(name='Body')
+                self.Department.objects.create(name='Glass')
+        send.assert_called_once()
+        self.assertEqual(len(send.call_args.kwargs['args'][0]), 2)
+        self.assertEqual(self.audit_rows('CREATE').count(), 2)
+
+
+class TrackedFieldsMixinTests(TestCase):
+    def setUp(self):
+        from datetime import date
+        from job_cards.models import JobCard
+        self.JobCard = JobCard
+        self.job = JobCard.objects.create(job_card_number='JC-T1', date=date(2025, 1, 1), customer_name='A', phone='1')
+
+    def test_loaded_values_answer_without_queries(self):
+        job = self.JobCard.objects.get(pk=self.job.pk)
+        job.status = 'IN_PROGRESS'
+        with self.assertNumQueries(0):
+            self.assertEqual(job.previous('status'), 'RECEIVED')
+            self.assertTrue(job.has_changed('status'))
+
+    def test_save_and_refresh_reset_the_baseline(self):
+        self.job.status = 'IN_PROGRESS'
+        self.job.save()
+        self.assertEqual(self.job.previous('status'), 'IN_PROGRESS')
+        self.assertFalse(self.job.has_changed('status'))
+
+        self.JobCard.objects.filter(pk=self.job.pk).update(status='READY')
+        self.job.refresh_from_db()
+        self.assertEqual(self.job.previous('status'), 'READY')
+
+    def test_deferred_field_falls_back_to_database(self):
+        job = self.JobCard.objects.only('pk').get(pk=self.job.pk)
+        with self.assertNumQueries(1):
+            self.assertEqual(job.previous('status'), 'RECEIVED')
+        self.assertIsNone(self.JobCard(job_card_number='new').previous('status'))
+
+
+class ServiceScheduleMixinTests(AppQueriesMixin, TestCase):
+    def setUp(self):
+        from ceramic_warranty.models import CeramicWarrantyRegistration
+        self.Ceramic = CeramicWarrantyRegistration
+        self.today = timezone.now().date()
+
+    def make(self, installed_days_ago, **dates):
+        return self.Ceramic.objects.create(
+            full_name='Lee', contact_number='050', email='lee@example.com', vehicle_brand='BMW',
+            vehicle_model='X5', vehicle_year=2024, vehicle_color='Black', license_plate='A 1', vin='V',
+            installation_date=self.today - timedelta(days=installed_days_ago), branch_location='DXB',
+            coating_brand='Gyeon', coating_type='CERAMIC', warranty_period='2 years', **dates,
+        )
+
+    def test_due_dates_follow_latest_visit(self):
+        fresh = self.make(30)
+        self.assertEqual(fresh.next_due_date, self.today + timedelta(days=150))
+
+        # Request payloads assign strings; the latest visit wins regardless of slot
+        visited = self.make(400, m1_date=str(self.today - timedelta(days=200)))
+        visited.m2_date = str(self.today - timedelta(days=300))
+        visited.save()
+        visited.refresh_from_db()
+        self.assertEqual(visited.last_service_date, self.today - timedelta(days=200))
+        self.assertEqual(visited.next_due_date, self.today - timedelta(days=20))
+
+    def test_due_list_and_retention_are_range_queries(self):
+        from django.contrib.auth.models import User
+        from rest_framework.test import APIClient
+        from leads.services_retention import RetentionService
+
+        self.make(30)
+        overdue = [self.make(days) for days in (400, 250, 190)]
+        self.make(160)
+
+        client = APIClient()
+        client.force_authenticate(User.objects.create_user('crm'))
+        with self.assertNumAppQueries(1):
+            rows = client.get('/api/ceramic/api/warranties/due_for_maintenance/').json()
+        self.assertEqual([r['id'] for r in rows], [w.id for w in overdue])
+        self.assertEqual(rows[0]['days_overdue'], 220)
+
+        page = client.get('/api/ceramic/api/warranties/due_for_maintenance/', {'page_size': 2}).json()
+        self.assertEqual([r['id'] for r in page['results']], [w.id for w in overdue[:2]])
+
+        # Retention calls follow the annual schedule from installation instead
+        visit = str(self.today - timedelta(days=100))
+        second_year = self.make(800, m1_date=visit)
+        self.make(1200, m1_date=visit, m2_date=visit, m3_date=visit)  # schedule complete
+        upcoming = self.make(340)  # due within the lookahead, not yet overdue
+
+        with self.assertNumAppQueries(2):
+            candidates = RetentionService.get_retention_candidates()
+        self.assertEqual([c['id'] for c in candidates],
+                         [f'CER-{w.id}' for w in (second_year, overdue[0], upcoming)])
+        self.assertEqual([c['due_date'] for c in candidates],
+                         [self.today + timedelta(days=d) for d in (-70, -35, 25)])
+        self.assertEqual([c['is_overdue'] for c in candidates], [True, True, False])
+
+    def test_nightly_recompute_backfills(self):
+        from .tasks import recompute_service_due_dates
+        warranty = self.make(400)
+        self.Ceramic.objects.filter(pk=warranty.pk).update(
+            last_service_date=None, next_due_date=None, retention_due_date=None)
+
+        self.assertEqual(recompute_service_due_dates()['ceramic_warranty.CeramicWarrantyRegistration'], 1)
+        warranty.refresh_from_db()
+        self.assertEqual(warranty.next_due_date, self.today - timedelta(days=220))
+        self.assertEqual(warranty.retention_due_date, self.today - timedelta(days=35))
+        self.assertEqual(recompute_service_due_dates()['ceramic_warranty.CeramicWarrantyRegistration'], 0)
+
+    def test_warranty_book_inspects_on_anniversaries(self):
+        from warranty_book.models import WarrantyRegistration
+        installed = self.today - timedelta(days=400)
+        warranty = WarrantyRegistration(installation_date=installed, duration_years=5, status='ACTIVE',
+                                        expiry_date=installed + timedelta(days=365 * 5))
+        self.assertEqual(warranty.service_dates(), (installed, installed + timedelta(days=730)))
+        warranty.status = 'CANCELLED'
+        self.assertEqual(warranty.service_dates(), (installed, None))
+
+
+@override_settings(EXPORT_JOBS_ASYNC=True)
+class ExportJobTests(TestCase):
+    url = '/api/exports/'
+
+    def setUp(self):
+        import tempfile
+        from datetime import date
+        from django.contrib.auth.models import User
+        from django.core.cache import cache
+        from rest_framework.test import APIClient
+        from job_cards.models import JobCard
+
+        cache.clear()  # permission matrices of earlier tests' users with the same pk
+        media = tempfile.TemporaryDirectory()
+        self.addCleanup(media.cleanup)
+        media_root = override_settings(MEDIA_ROOT=media.name)
+        media_root.enable()
+        self.addCleanup(media_root.disable)
+        for n in range(1, 4):
+            JobCard.objects.create(job_card_number=f'JC-{n}', date=date(2025, 3, n), customer_name='A', phone='')
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user('manager'))
+        self.apply_async = mock.patch('core.tasks.run_export_job.apply_async').start()
+        self.addCleanup(mock.patch.stopall)
+
+    def request_export(self, **params):
+        body = {'report': 'workshop_diary', 'format': 'csv', 'params': {'start_date': '2025-03-01', 'end_date': '2025-03-31', **params}}
+        response = self.client.post(self.url, body, format='json')
+        self.assertEqual(response.status_code, 202)
+        return response.json()
+
+    def test_identical_requests_share_one_job(self):
+        from .export_jobs import run_job
+
+        first = self.request_export()
+        second = self.request_export(status='')  # empty filters don't change the key
+        self.assertEqual(first['id'], second['id'])
+        self.assertEqual(second['status'], 'PENDING')
+        self.apply_async.assert_called_once_with(args=[first['id']], retry=False)
+
+        run_job(first['id'])
+        run_job(first['id'])  # duplicate delivery is a no-op
+        status = self.client.get(f"{self.url}{first['id']}/").json()
+        self.assertEqual((status['status'], status['rows_written'], status['total_rows']), ('DONE', 3, 3))
+
+        # A finished job is served to later requests without recomputing
+        self.assertEqual(self.request_export()['status'], 'DONE')
+        self.assertEqual(self.apply_async.call_count, 1)
+        self.assertNotEqual(self.request_export(status='CLOSED')['id'], first['id'])
+
+        self.client.force_authenticate(None)
+        response = self.client.get(status['download_url'])
+        self.assertEqual(response.status_code, 200)
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual([line.split(',')[0] for line in lines], ['Number', 'JC-3', 'JC-2', 'JC-1'])
+        self.assertEqual(self.client.get(status['download_url'][:-2] + 'xx/').status_code, 404)
+
+        # A file removed after the token was checked is a 404 too, not a 500
+        with mock.patch('builtins.open', side_effect=FileNotFoundError):
+            self.assertEqual(self.client.get(status['download_url']).status_code, 404)
+
+    @override_settings(EXPORT_LINK_MAX_AGE=-1)
+    def test_links_expire_and_failures_are_retried(self):
+        self.apply_async.side_effect = OSError('broker down')
+        job = self.request_export()  # runs in-process
+        self.assertEqual(job['status'], 'DONE')
+        self.assertEqual(self.client.get(job['download_url']).status_code, 404)
+
+        from .models import ExportJob
+        ExportJob.objects.filter(pk=job['id']).update(status='FAILED')
+        self.assertEqual(self.request_export()['status'], 'DONE')
+
+        response = self.client.post(self.url, {'report': 'nope'}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_exports_follow_source_view_permissions_and_are_shared_by_requesters(self):
+        from datetime import date
+        from django.contrib.auth.models import User
+        from hr.models import Employee, ModulePermission
+        from .models import ExportJob
+
+        diary = self.request_export()
+        for report in ('general_ledger', 'payroll'):
+            response = self.client.post(self.url, {'report': report, 'params': {'type': 'slips'}}, format='json')
+            self.assertEqual(response.status_code, 403)
+
+        accountant = User.objects.create_user('accountant')
+        employee = Employee.objects.create(user=accountant, employee_id='E-9', pin_code='100009',
+                                           role='Technician', date_joined=date(2024, 1, 1))
+        ModulePermission.objects.create(employee=employee, module_name='Finance', can_view=True)
+        self.client.force_authenticate(accountant)
+        ledger = self.client.post(self.url, {'report': 'general_ledger'}, format='json')
+        self.assertEqual(ledger.status_code, 202)
+
+        # A second permitted user joins the same job (one run) and may poll it
+        self.assertEqual(self.request_export()['id'], diary['id'])
+        self.assertEqual(self.apply_async.call_count, 2)
+        self.assertEqual(self.client.get(f"{self.url}{diary['id']}/").status_code, 200)
+
+        # Users who never asked for a job cannot poll it
+        self.client.force_authenticate(User.objects.get(username='manager'))
+        self.assertEqual(self.client.get(f"{self.url}{ledger.json()['id']}/").status_code, 404)
+
+        # Payroll rows cover every employee: a role the HR screens admit is not enough
+        reception = User.objects.create_user('reception')
+        Employee.objects.create(user=reception, employee_id='E-10', pin_code='100010',
+                                role='Reception', date_joined=date(2024, 1, 1))
+        self.client.force_authenticate(reception)
+        response = self.client.post(self.url, {'report': 'payroll', 'params': {'type': 'bank'}}, format='json')
+        self.assertEqual(response.status_code, 403)
+
+        self.client.force_authenticate(User.objects.create_superuser('owner'))
+        response = self.client.post(self.url, {'report': 'payroll', 'params': {'type': 'bonus'}}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(ExportJob.objects.filter(report='payroll').exists())
+
+
+@override_settings(PDF_BATCH_WORKERS=1)
+class PDFRenderingTests(TestCase):
+    def setUp(self):
+        from datetime import date
+        from django.contrib.auth.models import User
+        from rest_framework.test import APIClient
+        from django.core.cache import cache
+        from invoices.models import Invoice
+        from . import pdf
+
+        cache.clear()  # renders are keyed by content, which repeats across tests
+        self.invoices = [
+            Invoice.objects.create(invoice_number=f'INV-{n}', date=date(2025, 3, n), customer_name='Sam',
+                                   items='Polish', total_amount=100, vat_amount=5, grand_total=105)
+            for n in (1, 2)
+        ]
+        # WeasyPrint output stands in as the HTML's digest
+        self.html_to_pdf = mock.patch('core.pdf.html_to_pdf', side_effect=lambda html, base_url=None: (
+            b'%PDF-' + hashlib.sha256(html.encode()).hexdigest().encode()
+        )).start()
+        self.render_html = mock.patch('core.pdf.render_html', wraps=pdf.render_html).start()
+        self.addCleanup(mock.patch.stopall)
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user('cashier'))
+
+    def get_pdf(self, invoice):
+        response = self.client.get(f'/generate-pdf/invoice/{invoice.pk}/')
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(f'invoice_{invoice.invoice_number}.pdf', response['Content-Disposition'])
+        return response.content
+
+    def test_pdfs_are_cached_until_the_document_changes(self):
+        invoice = self.invoices[0]
+        first = self.get_pdf(invoice)
+        self.assertEqual(self.get_pdf(invoice), first)
+        self.assertEqual(self.html_to_pdf.call_count, 1)
+
+        invoice.customer_name = 'Samira'
+        invoice.save()
+        self.assertNotEqual(self.get_pdf(invoice), first)
+        self.assertEqual(self.html_to_pdf.call_count, 2)
+
+        # A paid invoice is final: served without rendering the template again
+        invoice.payment_status = 'PAID'
+        with mock.patch('invoices.models.Invoice.record_revenue_transaction'):
+            invoice.save()
+        paid = self.get_pdf(invoice)
+        renders = self.render_html.call_count
+        self.assertEqual(self.get_pdf(invoice), paid)
+        self.assertEqual(self.render_html.call_count, renders)
+        self.assertEqual(self.html_to_pdf.call_count, 3)
+
+        # Correcting a paid invoice drops the pointer once the change commits
+        invoice.customer_name = 'Samira K'
+        with self.captureOnCommitCallbacks(execute=True), \
+                mock.patch('invoices.models.Invoice.record_revenue_transaction'):
+            invoice.save()
+        self.assertNotEqual(self.get_pdf(invoice), paid)
+        self.assertEqual(self.html_to_pdf.call_count, 4)
+
+        self.assertEqual(self.client.get('/generate-pdf/booking/1/').status_code, 400)
+
+    def test_batch_zip_keeps_request_order_and_reuses_cache(self):
+        import io
+        import zipfile
+
+        first, second = self.invoices
+        cached = self.get_pdf(first)
+        response = self.client.post('/api/pdf/batch/', {'doc_type': 'invoice', 'ids': [second.pk, first.pk, 999]},
+                                    format='json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/zip')
+        archive = zipfile.ZipFile(io.BytesIO(response.content))
+        self.assertEqual(archive.namelist(), ['invoice_INV-2.pdf', 'invoice_INV-1.pdf'])
+        self.assertEqual(archive.read('invoice_INV-1.pdf'), cached)
+        self.assertEqual(self.html_to_pdf.call_count, 2)
+
+        for body in ({'doc_type': 'invoice', 'ids': []},
+                     {'doc_type': 'invoice', 'ids': [first.pk], 'output': 'tar'},
+                     {'doc_type': 'booking', 'ids': [first.pk]}):
+            self.assertEqual(self.client.post('/api/pdf/batch/', body, format='json').status_code, 400)
+
+
+@override_settings(PROFILING_ENABLED=True, PROFILING_SAMPLE_RATE=1.0, PROFILING_PUBLISH_SECONDS=0)
+class EndpointProfilingTests(TestCase):
+    url = '/api/diagnostics/endpoints/'
+
+    def setUp(self):
+        from django.contrib.auth.models import User
+        from django.core.cache import cache
+        from rest_framework.test import APIClient
+        from .profiling import profiler
+        cache.clear()
+        profiler.reset()
+        self.client = APIClient()
+        self.staff = User.objects.create_user('ops', is_staff=True)
+        self.user = User.objects.create_user('clerk')
+
+    def test_duplicate_fingerprints_are_detected(self):
+        from django.contrib.auth.models import User
+        from .profiling import QueryRecorder
+        recorder = QueryRecorder()
+        with connection.execute_wrapper(recorder):
+            for pk in (1, 2, 3):
+                list(User.objects.filter(pk=pk))
+            list(User.objects.filter(pk__in=[1, 2]))
+            list(User.objects.filter(pk__in=[1, 2, 3]))
+        self.assertEqual(recorder.count, 5)
+        self.assertEqual(sorted(recorder.duplicates().values()), [2, 3])
+
+    def test_report_lists_routes_for_staff_only(self):
+        self.client.force_authenticate(self.user)
+        self.client.get('/api/health/')
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+
+        self.client.force_authenticate(self.staff)
+        for _ in range(3):
+            self.client.get('/api/finance/reports/trial_balance/')
+        body = self.client.get(self.url, {'sort': 'queries'}).json()
+
+        rows = {row['route']: row for row in body['endpoints']}
+        row = rows['GET /api/finance/reports/trial_balance/']
+        self.assertEqual(row['requests'], 3)
+        self.assertEqual(row['sampled'], 3)
+        self.assertGreater(row['queries_per_request'], 0)
+        self.assertIsNotNone(row['p95_ms'])
+        self.assertIn('GET /api/health/', rows)
+
+        out = StringIO()
+        call_command('endpoint_profile', '--sort', 'p95', stdout=out)
+        self.assertIn('/api/finance/reports/trial_balance/', out.getvalue())
+
+
+    def test_workers_publishing_together_keep_each_other_registered(self):
+        from django.core.cache import cache
+        from .profiling import REGISTRY_KEY, REGISTRY_LOCK_KEY, EndpointProfiler, collect
+        workers = []
+        for worker_id in ('web-1:10', 'web-2:11'):
+            worker = EndpointProfiler()
+            worker.worker_id = worker_id
+            worker.record(f'GET /{worker_id}/', 200, 0.01, 10)
+            workers.append(worker)
+        self.assertEqual(sorted(cache.get(REGISTRY_KEY)), ['web-1:10', 'web-2:11'])
+
+        # While another worker rewrites the registry, publishing leaves it alone
+        cache.add(REGISTRY_LOCK_KEY, 'web-9:99', 10)
+        late = EndpointProfiler()
+        late.worker_id = 'web-3:12'
+        late.record('GET /late/', 200, 0.01, 10)
+        self.assertNotIn('web-3:12', cache.get(REGISTRY_KEY))
+        cache.delete(REGISTRY_LOCK_KEY)
+        late.maybe_publish(force=True)
+        self.assertEqual(set(collect()), {'GET /web-1:10/', 'GET /web-2:11/', 'GET /late/'})
+
+def legacy_is_admin_or_owner(request, view):
+    """IsAdminOrOwner as it read before the permission matrix (reference for equivalence)."""
+    from rest_framework import permissions
+    from .permissions import is_elite_user
+    if is_elite_user(request.user):
+        return True
+    try:
+        profile = request.user.hr_profile
+        module_name = getattr(view, 'module_name', None)
+        if module_name:
+            perm = profile.module_permissions.filter(module_name=module_name).first()
+            if perm:
+                if request.method in permissions.SAFE_METHODS:
+                    if not perm.can_view: return False
+                elif request.method == 'POST':
+                    if not perm.can_create: return False
+                elif request.method in ['PUT', 'PATCH']:
+                    if not perm.can_edit: return False
+                elif request.method == 'DELETE':
+                    if not perm.can_delete: return False
+                return True
+        if module_name and profile.permissions_config:
+            module_cfg = profile.permissions_config.get(module_name)
+            if module_cfg:
+                if module_cfg.get('denied'): return False
+                if request.method in permissions.SAFE_METHODS and module_cfg.get('can_view'):
+                    return True
+                if request.method in ['POST', 'PUT', 'PATCH'] and module_cfg.get('can_edit'):
+                    return True
+                if request.method == 'DELETE' and module_cfg.get('can_delete'):
+                    return True
+        role = profile.role.lower()
+        allowed = ['owner', 'admin', 'managing director', 'manager', 'advisor', 'reception', 'supervisor']
+        return any(r in role for r in allowed)
+    except:
+        return False
+
+
+def legacy_has_module_permission(request, view):
+    """HasModulePermission as it read before the permission matrix."""
+    from rest_framework import permissions
+    from .permissions import is_elite_user
+    if is_elite_user(request.user):
+        return True
+    module_name = getattr(view, 'module_name', None)
+    if not module_name:
+        return False
+    try:
+        perm = request.user.hr_profile.module_permissions.filter(module_name=module_name).first()
+        if not perm:
+            return False
+        if request.method in permissions.SAFE_METHODS:
+            return perm.can_view
+        if request.method == 'POST':
+            return perm.can_create
+        if request.method in ['PUT', 'PATCH']:
+            return perm.can_edit
+        if request.method == 'DELETE':
+            return perm.can_delete
+        return False
+    except Exception:
+        return False
+
+
+def legacy_role_check(allowed):
+    def check(request, view):
+        from .permissions import is_elite_user
+        if is_elite_user(request.user):
+            return True
+        try:
+            role = request.user.hr_profile.role.lower()
+            return any(r in role for r in allowed)
+        except:
+            return False
+    return check
+
+
+class PermissionMatrixTests(TestCase):
+    METHODS = ('GET', 'HEAD', 'OPTIONS', 'POST', 'PUT', 'PATCH', 'DELETE', 'TRACE')
+
+    def setUp(self):
+        from datetime import date
+        from django.contrib.auth.models import User
+        from django.core.cache import cache
+        from hr.models import Employee
+        cache.clear()
+        self.user = User.objects.create_user('advisor')
+        self.employee = Employee.objects.create(user=self.user, employee_id='E-1', pin_code='100001',
+                                                role='Technician', date_joined=date(2024, 1, 1))
+
+    def request(self, user, method='GET'):
+        from types import SimpleNamespace
+        return SimpleNamespace(user=user, method=method)
+
+    def checks(self):
+        from . import permissions
+        return [
+            (permissions.IsAdminOrOwner(), legacy_is_admin_or_owner),
+            (permissions.HasModulePermission(), legacy_has_module_permission),
+            (permissions.IsManager(), legacy_role_check(['manager', 'head', 'lead', 'incharge', 'director', 'admin', 'owner'])),
+            (permissions.IsFinanceUser(), legacy_role_check(['finance', 'accountant', 'owner', 'admin'])),
+        ]
+
+    def assertSameDecisions(self, user, label):
+        from types import SimpleNamespace
+        from django.contrib.auth.models import AnonymousUser, User
+        views = [SimpleNamespace(module_name='jobs'), SimpleNamespace(module_name='stock'), SimpleNamespace()]
+        for permission, legacy in self.checks():
+            for view in views:
+                for method in self.METHODS:
+                    # A fresh user each time: the legacy checks cache hr_profile on it
+                    fresh = User.objects.get(pk=user.pk) if isinstance(user, User) else AnonymousUser()
+                    expected = legacy(self.request(fresh, method), view)
+                    actual = permission.has_permission(self.request(fresh, method), view)
+                    self.assertEqual(bool(actual), bool(expected),
+                                     f'{label}: {type(permission).__name__} {method} {vars(view)}')
+
+    def test_decisions_match_the_legacy_checks(self):
+        from django.contrib.auth.models import AnonymousUser, User
+        from hr.models import ModulePermission
+
+        roles = ['Technician', 'Service Manager', 'Owner', 'Finance Accountant']
+        records = [None, {}, {'can_view': False}, {'can_view': False, 'can_create': True},
+                   {'can_edit': True, 'can_delete': True}]
+        configs = [{}, {'jobs': {'denied': True}}, {'jobs': {'can_view': True, 'can_edit': True}},
+                   {'jobs': {'can_delete': True}, 'stock': {}}, {'jobs': 'yes'}, ['jobs']]
+        for role in roles:
+            for record in records:
+                for config in configs:
+                    with self.captureOnCommitCallbacks(execute=True):
+                        self.employee.role, self.employee.permissions_config = role, config
+                        self.employee.save()
+                        ModulePermission.objects.filter(employee=self.employee).delete()
+                        if record is not None:
+                            ModulePermission.objects.create(employee=self.employee, module_name='jobs', **record)
+                    self.assertSameDecisions(self.user, f'{role} / {record} / {config}')
+
+        self.assertSameDecisions(User.objects.create_user('no-profile'), 'no profile')
+        self.assertSameDecisions(AnonymousUser(), 'anonymous')
+        self.assertSameDecisions(User.objects.create_user('ravit'), 'elite')
+
+    def test_warm_checks_run_no_queries_and_changes_invalidate(self):
+        from types import SimpleNamespace
+        from hr.models import ModulePermission
+        from .permissions import HasModulePermission, IsAdminOrOwner
+        view = SimpleNamespace(module_name='jobs')
+
+        self.assertFalse(HasModulePermission().has_permission(self.request(self.user), view))
+        with self.assertNumQueries(0):
+            for method in self.METHODS:
+                request = self.request(self.user, method)
+                IsAdminOrOwner().has_permission(request, view)
+                HasModulePermission().has_permission(request, view)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            perm = ModulePermission.objects.create(employee=self.employee, module_name='jobs', can_view=True)
+        self.assertTrue(HasModulePermission().has_permission(self.request(self.user), view))
+        self.assertFalse(IsAdminOrOwner().has_permission(self.request(self.user, 'POST'), view))
+
+        with self.captureOnCommitCallbacks(execute=True):
+            perm.delete()
+            self.employee.role = 'Branch Manager'
+            self.employee.save()
+        self.assertFalse(HasModulePermission().has_permission(self.request(self.user), view))
+        self.assertTrue(IsAdminOrOwner().has_permission(self.request(self.user, 'POST'), view))
+
+
+class SearchIndexTests(TestCase):
+    def setUp(self):
+        from datetime import date
+        from django.contrib.auth.models import User
+        from rest_framework.test import APIClient
+        from customers.models import Customer
+        from job_cards.models import JobCard
+        from leads.models import Lead
+        from locations.models import Branch
+        from masters.models import Vehicle
+
+        self.branches = [Branch.objects.create(name=name, code=name) for name in ('DXB', 'SHJ')]
+        with self.captureOnCommitCallbacks(execute=True):
+            self.customer = Customer.objects.create(name="Omar O'Neil", phone='+971 50 123 4567')
+            self.vehicle = Vehicle.objects.create(vin='WDB1234567', registration_number='12345', plate_code='A',
+                                                  brand='Nissan', model='Patrol')
+            self.job = JobCard.objects.create(job_card_number='JC-2001', date=date(2025, 3, 1), customer_name="Omar O'Neil",
+                                              phone='0501234567', registration_number='12345', plate_code='A',
+                                              brand='Nissan', model='Patrol', branch=self.branches[0])
+            self.lead = Lead.objects.create(customer_name='Priya Nair', phone='055 765 4321', source='WALKIN',
+                                            interested_service='Ceramic coating', branch=self.branches[1])
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user('desk'))
+
+    def search(self, q, **params):
+        response = self.client.get('/api/search/', {'q': q, **params})
+        self.assertEqual(response.status_code, 200)
+        return [(row['type'], row['id']) for row in response.json()['results']]
+
+    def test_phone_and_plate_formats_normalize(self):
+        customer, job = ('customer', self.customer.pk), ('jobcard', self.job.pk)
+        for q in ('0501234567', '+971 50 123 4567', '050-123', '00971501234567'):
+            self.assertEqual(set(self.search(q)), {customer, job}, q)
+        for q in ('A-12345', 'a12345', '12345'):
+            self.assertIn(('vehicle', self.vehicle.pk), self.search(q), q)
+            self.assertIn(job, self.search(q), q)
+        self.assertEqual(self.search('oneil omar', types='customer'), [customer])
+        self.assertEqual(self.search('ceram'), [('lead', self.lead.pk)])
+        self.assertEqual(self.search(''), [])
+        self.assertEqual(self.client.get('/api/search/', {'q': 'x', 'types': 'invoice'}).status_code, 400)
+
+    def test_branch_scoping_keeps_unbranched_results(self):
+        response = self.client.get('/api/search/', {'q': 'a12345'}, HTTP_X_BRANCH_ID=str(self.branches[1].pk))
+        results = [(row['type'], row['id']) for row in response.json()['results']]
+        self.assertEqual(results, [('vehicle', self.vehicle.pk)])
+
+    def test_saves_and_deletes_maintain_the_index(self):
+        from .models import SearchDocument
+        with self.captureOnCommitCallbacks(execute=True):
+            self.job.customer_name = 'Karim Haddad'
+            self.job.save()
+        self.assertEqual(self.search('haddad'), [('jobcard', self.job.pk)])
+        self.assertEqual(SearchDocument.objects.filter(kind='jobcard').count(), 1)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.lead.delete()
+        self.assertEqual(self.search('priya'), [])
+
+        SearchDocument.objects.all().delete()
+        out = StringIO()
+        call_command('rebuild_search_index', stdout=out)
+        self.assertIn('3 documents indexed', out.getvalue())
+        self.assertEqual(self.search('patrol', types='vehicle'), [('vehicle', self.vehicle.pk)])
+
+    def test_job_card_list_and_workshop_diary_use_the_index(self):
+        response = self.client.get('/api/job-cards/api/jobs/', {'q': '050 123 4567'})
+        self.assertEqual([row['id'] for row in response.json()], [self.job.pk])
+        self.assertEqual(self.client.get('/api/job-cards/api/jobs/', {'q': 'priya'}).json(), [])
+
+        from reports.exports import workshop_diary_queryset
+        self.assertEqual(list(workshop_diary_queryset({'search': 'wdb'})), [])
+        self.assertEqual(list(workshop_diary_queryset({'search': 'A 12345'})), [self.job])
@@ -7,9 +7,9 @@ logger = logging.getLogger(__name__)
 def get_twilio_client():
     return Client(settings.TWILIO_ACCOUNT_SID, settings.TWILIO_AUTH_TOKEN)
 
-def send_sms(to, body):
+def send_sms(to, body, client=None):
     try:
-        client = get_twilio_client()
+        client = client or get_twilio_client()
         message = client.messages.create(
             from_=settings.TWILIO_SMS_NUMBER,
             to=to,
@@ -20,9 +20,9 @@ def send_sms(to, body):
         logger.error(f"Failed to send SMS: {e}")
         return None
 
-def send_whatsapp(to, body):
+def send_whatsapp(to, body, client=None):
     try:
-        client = get_twilio_client()
+        client = client or get_twilio_client()
         # Ensure 'to' number is prefixed with 'whatsapp:'
         whatsapp_to = f"whatsapp:{to}" if not to.startswith('whatsapp:') else to
         message = client.messages.create(
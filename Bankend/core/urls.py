@@ -20,17 +20,23 @@ from django.shortcuts import redirect
 from django.conf import settings
 from django.conf.urls.static import static
 from django.http import JsonResponse
-from .views import MaintenanceView, generate_pdf
+from .views import MaintenanceView, EndpointDiagnosticsView, ExportJobView, ExportDownloadView, PDFBatchView, SearchView, generate_pdf
 from drf_spectacular.views import SpectacularAPIView, SpectacularRedocView, SpectacularSwaggerView
 
 urlpatterns = [
     path('', lambda request: redirect('admin:index', permanent=False)),
     path('admin/', admin.site.urls),
     path('generate-pdf/<str:doc_type>/<int:pk>/', generate_pdf, name='generate_pdf'),
+    path('api/pdf/batch/', PDFBatchView.as_view(), name='pdf-batch'),
     path('api/health/', lambda request: JsonResponse({"status": "ok"}), name='health-check'),
     path('api/auth/', include('authentication.urls')),
     path('api/dashboard/', include('dashboard.urls')),
     path('api/maintenance/', MaintenanceView.as_view(), name='maintenance'),
+    path('api/diagnostics/endpoints/', EndpointDiagnosticsView.as_view(), name='diagnostics-endpoints'),
+    path('api/search/', SearchView.as_view(), name='search'),
+    path('api/exports/', ExportJobView.as_view(), name='export-jobs'),
+    path('api/exports/<int:pk>/', ExportJobView.as_view(), name='export-job-status'),
+    path('api/exports/download/<str:token>/', ExportDownloadView.as_view(), name='export-download'),
     path('api/ppf/', include('ppf_warranty.urls')),
     path('api/ceramic/', include('ceramic_warranty.urls')),
     path('api/job-cards/', include('job_cards.urls')),
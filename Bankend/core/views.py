@@ -3,7 +3,6 @@ from rest_framework.response import Response
 from rest_framework import permissions
 from django.shortcuts import get_object_or_404, render
 from django.http import HttpResponse
-from django.template.loader import render_to_string
 from django.conf import settings
 import os
 
@@ -13,47 +12,187 @@ from .permissions import IsAdminOrOwner
 class MaintenanceView(APIView):
     permission_classes = [permissions.IsAuthenticated, IsAdminOrOwner]
 
+    def get(self, request):
+        """Hit/miss counters of this worker's cache tiers."""
+        from django.core.cache import cache
+        stats = cache.stats() if hasattr(cache, 'stats') else None
+        return Response({"cache": stats})
+
     def post(self, request):
         result = perform_cache_maintenance()
         return Response({"status": result})
 
+class EndpointDiagnosticsView(APIView):
+    """Slowest / most query-heavy routes across all workers (staff only)."""
+    permission_classes = [permissions.IsAdminUser]
+
+    def get(self, request):
+        from .profiling import report
+        try:
+            minutes = int(request.query_params['minutes']) if 'minutes' in request.query_params else None
+            limit = int(request.query_params.get('limit', 25))
+        except ValueError:
+            return Response({"error": "minutes and limit must be integers"}, status=400)
+        sort = request.query_params.get('sort', 'p95')
+        return Response({
+            "sort": sort,
+            "sample_rate": getattr(settings, 'PROFILING_SAMPLE_RATE', None),
+            "endpoints": report(minutes=minutes, sort=sort, limit=limit),
+        })
+
+def _export_job_status(request, job):
+    from django.urls import reverse
+    from .export_jobs import download_token
+
+    data = {
+        "id": job.id,
+        "report": job.report,
+        "format": job.export_format,
+        "params": job.params,
+        "status": job.status,
+        "rows_written": job.rows_written,
+        "total_rows": job.total_rows,
+        "progress": round(job.rows_written / job.total_rows, 3) if job.total_rows else None,
+        "error": job.error or None,
+        "download_url": None,
+    }
+    if job.status == 'DONE':
+        data["progress"] = 1.0
+        data["download_url"] = request.build_absolute_uri(reverse('export-download', args=[download_token(job)]))
+    return data
+
+def _may_export(request, report):
+    """True if the user could read the report's rows in its source view."""
+    from django.utils.module_loading import import_string
+    from rest_framework.request import clone_request
+    from .export_jobs import EXPORT_SOURCE_VIEWS
+
+    view_class = import_string(EXPORT_SOURCE_VIEWS[report])
+    view, probe = view_class(), clone_request(request, 'GET')
+    return all(permission().has_permission(probe, view) for permission in view_class.permission_classes)
+
+class ExportJobView(APIView):
+    """
+    POST {"report", "format", "params"} queues a background export (or joins an
+    identical one already queued/finished); poll GET <id>/ until status is DONE.
+    Exporting a report needs read access to the view it comes from; a job can be
+    polled by everyone who requested it.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request):
+        from .export_jobs import check_report, request_export
+        report = request.data.get('report')
+        params = request.data.get('params') or {}
+        if not isinstance(params, dict):
+            return Response({"error": "params must be an object"}, status=400)
+        try:
+            check_report(report)
+            if not _may_export(request, report):
+                return Response({"error": f"You do not have permission to export {report}"}, status=403)
+            job = request_export(report, request.data.get('format', 'csv'), params, request.user)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=400)
+        return Response(_export_job_status(request, job), status=202)
+
+    def get(self, request, pk):
+        from .models import ExportJob
+        return Response(_export_job_status(request, get_object_or_404(ExportJob, pk=pk, requesters=request.user)))
+
+class ExportDownloadView(APIView):
+    """The signed token is the credential, so the link works from a plain browser tab."""
+    authentication_classes = []
+    permission_classes = [permissions.AllowAny]
+
+    def get(self, request, token):
+        from django.core import signing
+        from django.http import FileResponse
+        from .export_jobs import absolute_path, resolve_token
+        try:
+            job = resolve_token(token)
+            # The file can be purged or regenerated between the check and the open
+            export = open(absolute_path(job), 'rb')
+        except (signing.BadSignature, OSError):
+            return Response({"error": "Download link is invalid or has expired"}, status=404)
+        return FileResponse(export, as_attachment=True, filename=job.filename)
+
+class SearchView(APIView):
+    """
+    GET ?q=<text>[&types=jobcard,customer,vehicle,lead][&limit=20]: ranked, typed
+    matches from the search index (core.search), scoped to X-Branch-ID when sent.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def get(self, request):
+        from .search import ENTITIES, matching
+        query = request.query_params.get('q', '').strip()
+        kinds = [kind for kind in request.query_params.get('types', '').split(',') if kind]
+        unknown = [kind for kind in kinds if kind not in ENTITIES]
+        if unknown:
+            return Response({"error": f"Unknown types: {', '.join(unknown)}. Choose from {', '.join(ENTITIES)}"}, status=400)
+        try:
+            limit = min(max(int(request.query_params.get('limit', 20)), 1), 50)
+        except ValueError:
+            return Response({"error": "limit must be a number"}, status=400)
+
+        branch_id = request.headers.get('X-Branch-ID')
+        if branch_id in ('undefined', 'null') or not (branch_id or '').isdigit():
+            branch_id = None
+        documents = matching(query, kinds, branch_id)[:limit]
+        return Response({
+            "query": query,
+            "results": [{
+                "type": doc.kind,
+                "id": doc.object_id,
+                "title": doc.title,
+                "subtitle": doc.subtitle,
+                "branch": doc.branch_id,
+                "score": doc.score,
+            } for doc in documents],
+        })
+
 def generate_pdf(request, doc_type, pk):
     """
-    Generic PDF generation view for Job Cards and Invoices.
-    """
-    from job_cards.models import JobCard
-    from invoices.models import Invoice
-    
-    context = {}
-    template_name = ""
-    filename = ""
-    
-    if doc_type == 'jobcard':
-        obj = get_object_or_404(JobCard, pk=pk)
-        context = {'job_card': obj}
-        template_name = 'forms/pdf/job_card_pdf.html'
-        filename = f"job_card_{obj.job_card_number}.pdf"
-    elif doc_type == 'invoice':
-        obj = get_object_or_404(Invoice, pk=pk)
-        context = {'invoice': obj}
-        template_name = 'forms/pdf/invoice_pdf.html'
-        filename = f"invoice_{obj.invoice_number}.pdf"
-    else:
+    Generic PDF generation view for Job Cards and Invoices (cached, see core.pdf).
+    """
+    from .pdf import DOCUMENTS, model_for, render_document
+
+    if doc_type not in DOCUMENTS:
         return HttpResponse("Invalid document type", status=400)
+    obj = get_object_or_404(model_for(doc_type), pk=pk)
 
-    # Check if specific templates exist, otherwise use their detail templates or a generic one
-    # For now, let's assume we use the detail templates if PDF specific ones aren't found
-    # Actually, we should probably just use the ones we found or generic ones.
-    
     try:
-        html_string = render_to_string(template_name, context)
-        
-        from weasyprint import HTML
-        html = HTML(string=html_string, base_url=request.build_absolute_uri('/'))
-        pdf = html.write_pdf()
-        
-        response = HttpResponse(pdf, content_type='application/pdf')
-        response['Content-Disposition'] = f'inline; filename="{filename}"'
-        return response
+        pdf = render_document(doc_type, obj, base_url=request.build_absolute_uri('/'))
     except Exception as e:
         return HttpResponse(f"Error generating PDF: {str(e)}", status=500)
+
+    response = HttpResponse(pdf, content_type='application/pdf')
+    response['Content-Disposition'] = f'inline; filename="{DOCUMENTS[doc_type].filename(obj)}"'
+    return response
+
+class PDFBatchView(APIView):
+    """
+    POST {"doc_type": "invoice"|"jobcard", "ids": [...], "output": "zip"|"pdf"}
+    downloads the documents as one ZIP (default) or one merged PDF.
+    """
+    permission_classes = [permissions.IsAuthenticated]
+
+    def post(self, request):
+        from .pdf import render_batch
+
+        ids = request.data.get('ids')
+        max_documents = getattr(settings, 'PDF_BATCH_MAX_DOCUMENTS', 200)
+        if not isinstance(ids, list) or not ids or not all(isinstance(pk, int) for pk in ids):
+            return Response({"error": "ids must be a non-empty list of integers"}, status=400)
+        if len(ids) > max_documents:
+            return Response({"error": f"At most {max_documents} documents per batch"}, status=400)
+        output = request.data.get('output', 'zip')
+        try:
+            content, filename = render_batch(request.data.get('doc_type'), ids, output,
+                                             base_url=request.build_absolute_uri('/'))
+        except ValueError as e:
+            return Response({"error": str(e)}, status=400)
+
+        response = HttpResponse(content, content_type='application/zip' if output == 'zip' else 'application/pdf')
+        response['Content-Disposition'] = f'attachment; filename="{filename}"'
+        return response
@@ -14,3 +14,12 @@ from django.core.wsgi import get_wsgi_application
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
 
 application = get_wsgi_application()
+
+# Build WeasyPrint's fonts and stylesheet now rather than on the first PDF request
+if os.environ.get('PDF_PREWARM', 'True').lower() == 'true':
+    try:
+        from core.pdf import warm_up
+        warm_up()
+    except Exception as e:
+        import logging
+        logging.getLogger(__name__).warning(f"PDF renderer warm-up failed: {e}")
@@ -0,0 +1,129 @@
+"""
+Chat pipeline for the websocket consumers.
+
+A message is broadcast as soon as it is received and handed to the event
+loop's ChatWriter, which persists messages with one bulk_create per
+CHAT_FLUSH_INTERVAL_MS (or sooner, once CHAT_FLUSH_BATCH_SIZE are waiting).
+The hot path therefore costs no query and no thread-pool hop. A message
+carries its uid and created_at from the moment it is received, so the
+broadcast and the stored row (served by the chat history API) match.
+
+If the batch insert fails, the batch is stored row by row so a bad message
+(say, for a trip deleted while its chat was open) is dropped alone. Messages
+hit by a transient database error (connection lost, database unavailable)
+go back to the buffer for the next flush. Messages still buffered when a
+worker dies are lost, at most one flush interval's worth.
+"""
+import asyncio
+import logging
+import uuid
+import weakref
+
+from channels.db import database_sync_to_async
+from django.conf import settings
+from django.db import DatabaseError, InterfaceError, OperationalError, transaction
+from django.utils import timezone
+
+from .models import ChatMessage
+
+logger = logging.getLogger(__name__)
+
+TRANSIENT_ERRORS = (OperationalError, InterfaceError)
+
+
+def display_name(user):
+    return user.get_full_name() or user.username
+
+
+def build_message(user, text, trip_id=None):
+    """The unsaved ChatMessage and the event broadcast for it."""
+    message = ChatMessage(sender=user, text=text, trip_id=trip_id, uid=uuid.uuid4(), created_at=timezone.now())
+    event = {
+        'type': 'chat_message',
+        'uid': str(message.uid),
+        'message': message.text,
+        'sender': user.username,
+        'sender_name': display_name(user),
+        'timestamp': message.created_at.isoformat(),
+    }
+    return message, event
+
+
+def can_access_trip(user, trip_id):
+    """Staff, or the trip's driver."""
+    from pick_and_drop.models import PickAndDrop
+
+    trip = PickAndDrop.objects.filter(id=trip_id).values('driver__user_id').first()
+    if trip is None:
+        return False
+    return user.is_staff or user.is_superuser or trip['driver__user_id'] == user.id
+
+
+def write_messages(messages):
+    """Stores the messages; returns those to retry after a transient error. Rows that cannot be stored are dropped."""
+    try:
+        with transaction.atomic():
+            ChatMessage.objects.bulk_create(messages, batch_size=500)
+        return []
+    except TRANSIENT_ERRORS as e:
+        logger.warning(f"Chat messages kept for retry, {len(messages)} waiting: {e}")
+        return messages
+    except DatabaseError:
+        pass  # one bad row fails the whole insert: find it
+
+    retry = []
+    for message in messages:
+        try:
+            with transaction.atomic():
+                ChatMessage.objects.bulk_create([message])
+        except TRANSIENT_ERRORS:
+            retry.append(message)
+        except DatabaseError as e:
+            logger.error(f"Dropped chat message {message.uid} from {message.sender_id}: {e}")
+    return retry
+
+
+class ChatWriter:
+    """Buffers messages and writes them in batches; one per event loop (see writer())."""
+
+    def __init__(self):
+        self.pending = []
+        self.timer = None
+        self.flushes = 0
+
+    async def add(self, message):
+        self.pending.append(message)
+        if len(self.pending) >= getattr(settings, 'CHAT_FLUSH_BATCH_SIZE', 200):
+            await self.flush()
+        elif self.timer is None:
+            self.timer = asyncio.get_running_loop().create_task(self.flush_later())
+
+    async def flush_later(self):
+        await asyncio.sleep(getattr(settings, 'CHAT_FLUSH_INTERVAL_MS', 250) / 1000)
+        self.timer = None
+        await self.flush()
+
+    async def flush(self):
+        batch, self.pending = self.pending, []
+        if not batch:
+            return
+        try:
+            retry = await database_sync_to_async(write_messages)(batch)
+        except Exception as e:
+            logger.error(f"Failed to store {len(batch)} chat messages: {e}")
+            return
+        self.flushes += 1
+        if retry:
+            self.pending = retry + self.pending
+            if self.timer is None:
+                self.timer = asyncio.get_running_loop().create_task(self.flush_later())
+
+
+_writers = weakref.WeakKeyDictionary()
+
+
+def writer():
+    loop = asyncio.get_running_loop()
+    if loop not in _writers:
+        _writers[loop] = ChatWriter()
+    return _writers[loop]
@@ -1,9 +1,8 @@
 import json
 from channels.generic.websocket import AsyncWebsocketConsumer
 from channels.db import database_sync_to_async
-from django.contrib.auth.models import User
-from dashboard.models import ChatMessage
-from pick_and_drop.models import PickAndDrop
+from dashboard import chat
+from job_cards import board
 
 class GlobalChatConsumer(AsyncWebsocketConsumer):
     async def connect(self):
@@ -24,41 +23,24 @@ class GlobalChatConsumer(AsyncWebsocketConsumer):
         if not user.is_authenticated:
             return
 
-        chat_msg = await self.save_global_message(user, message)
-
-        await self.channel_layer.group_send(
-            self.room_group_name,
-            {
-                'type': 'chat_message',
-                'id': chat_msg.id,
-                'message': chat_msg.text,
-                'sender': chat_msg.sender.username,
-                'sender_name': chat_msg.sender.get_full_name() or chat_msg.sender.username,
-                'timestamp': chat_msg.created_at.isoformat(),
-            }
-        )
+        # Broadcast first; the message is stored with the next batch (dashboard.chat)
+        chat_msg, event = chat.build_message(user, message)
+        await self.channel_layer.group_send(self.room_group_name, event)
+        await chat.writer().add(chat_msg)
 
     async def chat_message(self, event):
         await self.send(text_data=json.dumps(event))
 
-    @database_sync_to_async
-    def save_global_message(self, user, text):
-        return ChatMessage.objects.create(
-            sender=user,
-            text=text,
-            is_system=False
-        )
-
 
 class TripChatConsumer(AsyncWebsocketConsumer):
     async def connect(self):
-        self.trip_id = self.scope['url_route']['kwargs']['trip_id']
+        self.trip_id = int(self.scope['url_route']['kwargs']['trip_id'])
         self.room_group_name = f'trip_{self.trip_id}'
 
         if not self.scope['user'].is_authenticated:
             await self.close()
         else:
-            # Verify user has access to this trip (driver or dispatcher)
+            # Verify user has access to this trip (driver or dispatcher), once per connection
             has_access = await self.check_trip_access(self.scope['user'], self.trip_id)
             if not has_access:
                 await self.close()
@@ -75,43 +57,62 @@ class TripChatConsumer(AsyncWebsocketConsumer):
         if not message:
             return
             
-        user = self.scope['user']
-
-        chat_msg = await self.save_trip_message(user, message, self.trip_id)
-
-        await self.channel_layer.group_send(
-            self.room_group_name,
-            {
-                'type': 'chat_message',
-                'id': chat_msg.id,
-                'message': chat_msg.text,
-                'sender': chat_msg.sender.username,
-                'sender_name': chat_msg.sender.get_full_name() or chat_msg.sender.username,
-                'timestamp': chat_msg.created_at.isoformat(),
-            }
-        )
+        chat_msg, event = chat.build_message(self.scope['user'], message, trip_id=self.trip_id)
+        await self.channel_layer.group_send(self.room_group_name, event)
+        await chat.writer().add(chat_msg)
 
     async def chat_message(self, event):
         await self.send(text_data=json.dumps(event))
 
-    @database_sync_to_async
-    def save_trip_message(self, user, text, trip_id):
-        trip = PickAndDrop.objects.get(id=trip_id)
-        return ChatMessage.objects.create(
-            sender=user,
-            text=text,
-            trip=trip,
-            is_system=False
-        )
-
     @database_sync_to_async
     def check_trip_access(self, user, trip_id):
+        return chat.can_access_trip(user, trip_id)
+
+
+class JobBoardConsumer(AsyncWebsocketConsumer):
+    """
+    ws/jobs/ (all branches) or ws/jobs/<branch_id>/: job card deltas pushed as
+    they commit, with resume-from-sequence (see job_cards.board).
+    """
+    async def connect(self):
+        if not self.scope['user'].is_authenticated:
+            await self.close()
+            return
+        branch_id = self.scope['url_route']['kwargs'].get('branch_id')
+        self.branch_id = int(branch_id) if branch_id else None
+        self.group_name = board.group_name(self.branch_id)
+        # Join before reading the sequence so nothing falls between the two
+        await self.channel_layer.group_add(self.group_name, self.channel_name)
+        await self.accept()
+        await self.send(text_data=json.dumps({'type': 'hello', 'seq': await self.latest_seq()}))
+
+    async def disconnect(self, close_code):
+        if hasattr(self, 'group_name'):
+            await self.channel_layer.group_discard(self.group_name, self.channel_name)
+
+    async def receive(self, text_data):
         try:
-            trip = PickAndDrop.objects.get(id=trip_id)
-            if user.is_staff or user.is_superuser:
-                return True
-            if trip.driver and trip.driver.user == user:
-                return True
-            return False
-        except PickAndDrop.DoesNotExist:
-            return False
+            data = json.loads(text_data)
+            seq = int(data.get('seq'))
+        except (AttributeError, TypeError, ValueError):
+            return
+        if data.get('action') != 'resume':
+            return
+
+        events = await self.replay(seq)
+        if events is None:
+            await self.send(text_data=json.dumps({'type': 'reset', 'seq': await self.latest_seq()}))
+            return
+        for event in events:
+            await self.send(text_data=json.dumps(event))
+
+    async def job_event(self, message):
+        await self.send(text_data=json.dumps(message['event']))
+
+    @database_sync_to_async
+    def latest_seq(self):
+        return board.latest_seq()
+
+    @database_sync_to_async
+    def replay(self, seq):
+        return board.replay(self.branch_id, seq)
@@ -0,0 +1,101 @@
+"""
+Drive many concurrent websocket clients through the global chat consumer
+in-process and report throughput, broadcast latency and how the writes were
+batched. Uses an in-memory channel layer unless --redis is given. The
+load-test users and their messages are deleted afterwards.
+
+Usage:
+    python manage.py chat_load_test                         # 50 clients x 20 messages
+    python manage.py chat_load_test --clients 200 --messages 5 --redis
+"""
+import asyncio
+import statistics
+import time
+
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from django.test import override_settings
+
+from dashboard import chat
+from dashboard.models import ChatMessage
+
+USERNAME_PREFIX = 'chat_load_'
+
+
+class Command(BaseCommand):
+    help = 'Load-test the websocket chat pipeline with concurrent in-process clients'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--clients', type=int, default=50)
+        parser.add_argument('--messages', type=int, default=20, help='Messages sent by each client')
+        parser.add_argument('--redis', action='store_true', help='Use the configured channel layer instead of in-memory')
+
+    def handle(self, *args, **options):
+        clients, messages = options['clients'], options['messages']
+        User.objects.filter(username__startswith=USERNAME_PREFIX).delete()
+        User.objects.bulk_create([User(username=f'{USERNAME_PREFIX}{n}') for n in range(clients)])
+        users = list(User.objects.filter(username__startswith=USERNAME_PREFIX))
+
+        layers = settings.CHANNEL_LAYERS if options['redis'] else {
+            'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer', 'CONFIG': {'capacity': clients * messages + 100}},
+        }
+        try:
+            with override_settings(CHANNEL_LAYERS=layers):
+                elapsed, latencies, flushes = async_to_sync(self.run)(users, messages)
+            stored = ChatMessage.objects.filter(sender__in=users).count()
+        finally:
+            User.objects.filter(username__startswith=USERNAME_PREFIX).delete()
+
+        sent = clients * messages
+        latencies.sort()
+        self.stdout.write(f'  {clients} clients x {messages} messages = {sent} sent, {len(latencies)} deliveries')
+        self.stdout.write(f'  {elapsed:.3f}s  {sent / elapsed:,.0f} msg/s in  {len(latencies) / elapsed:,.0f} deliveries/s out')
+        self.stdout.write(
+            f'  latency p50 {statistics.median(latencies) * 1000:.1f} ms'
+            f'  p95 {latencies[int(len(latencies) * 0.95) - 1] * 1000:.1f} ms  max {latencies[-1] * 1000:.1f} ms'
+        )
+        self.stdout.write(f'  {stored} messages stored in {flushes} bulk writes')
+
+    async def run(self, users, messages):
+        from channels.routing import URLRouter
+        from channels.testing import WebsocketCommunicator
+        from dashboard.routing import websocket_urlpatterns
+
+        app = URLRouter(websocket_urlpatterns)
+        communicators = []
+        for user in users:
+            communicator = WebsocketCommunicator(app, '/ws/chat/global/')
+            communicator.scope['user'] = user
+            await communicator.connect()
+            communicators.append(communicator)
+
+        sent_at = {}
+        latencies = []
+        expected = len(users) * messages
+
+        async def talk(n, communicator):
+            for i in range(messages):
+                text = f'{n}:{i}'
+                sent_at[text] = time.perf_counter()
+                await communicator.send_json_to({'message': text})
+                await asyncio.sleep(0)
+
+        async def listen(communicator):
+            for _ in range(expected):
+                event = await communicator.receive_json_from(timeout=60)
+                latencies.append(time.perf_counter() - sent_at[event['message']])
+
+        started = time.perf_counter()
+        await asyncio.gather(*(listen(c) for c in communicators), *(talk(n, c) for n, c in enumerate(communicators)))
+        elapsed = time.perf_counter() - started
+
+        writer = chat.writer()
+        if writer.timer:
+            writer.timer.cancel()
+            writer.timer = None
+        await writer.flush()
+        for communicator in communicators:
+            await communicator.disconnect()
+        return elapsed, latencies, writer.flushes
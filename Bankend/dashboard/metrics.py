@@ -0,0 +1,342 @@
+"""
+Dashboard metrics layer.
+
+Each dashboard is made of metric blocks. A block is computed once, stored in the
+shared cache as a snapshot and served to every poller until it is older than its
+TTL or a model it depends on changes (signals bump the block's version on commit).
+A stale snapshot is still served to concurrent readers while a single request,
+holding a short cache lock, recomputes it. Celery beat keeps all blocks warm so
+polling requests normally only read snapshots.
+"""
+import datetime
+import time
+
+from django.core.cache import cache
+from django.db.models import Sum, F, DecimalField
+from django.db.models.functions import TruncMonth
+from django.utils import timezone
+
+SNAPSHOT_KEY = 'dashboard:snapshot:{}'
+VERSION_KEY = 'dashboard:version:{}'
+LOCK_KEY = 'dashboard:lock:{}'
+LOCK_TIMEOUT = 60
+
+
+class MetricBlock:
+    def __init__(self, name, compute, ttl, depends_on):
+        self.name = name
+        self.compute = compute
+        self.ttl = ttl
+        self.depends_on = depends_on  # 'app_label.ModelName' labels
+
+
+# ---------------------------------------------------------------- CEO blocks
+
+def compute_revenue_trends():
+    """Invoice revenue for the last 6 months in one grouped query."""
+    from invoices.models import Invoice
+
+    month_start = timezone.now().date().replace(day=1)
+    targets = [month_start - datetime.timedelta(days=i * 30) for i in range(5, -1, -1)]
+
+    totals = {
+        (row['month'].year, row['month'].month): row['total']
+        for row in Invoice.objects.filter(created_at__date__gte=targets[0].replace(day=1))
+        .annotate(month=TruncMonth('created_at'))
+        .values('month')
+        .annotate(total=Sum('grand_total'))
+        .order_by()
+    }
+    return [
+        {"month": target.strftime('%b'), "amount": float(totals.get((target.year, target.month)) or 0)}
+        for target in targets
+    ]
+
+
+def compute_burn_rate():
+    from finance.models import VoucherDetail
+
+    today = timezone.now().date()
+    expense_total = VoucherDetail.objects.filter(
+        voucher__status='POSTED',
+        account__category='EXPENSE',
+        voucher__date__gte=today - datetime.timedelta(days=30)
+    ).aggregate(Sum('debit'))['debit__sum'] or 0
+    return float(expense_total)
+
+
+def compute_crm_funnel():
+    from bookings.models import Booking
+    from invoices.models import Invoice
+    from leads.models import Lead
+
+    month_start = timezone.now().date().replace(day=1)
+    total_leads = Lead.objects.filter(created_at__gte=month_start).count()
+    booking_conversions = Booking.objects.filter(created_at__gte=month_start, related_lead__isnull=False).count()
+    job_conversions = Invoice.objects.filter(created_at__gte=month_start, job_card__related_lead__isnull=False).count()
+
+    return {
+        "leads": total_leads,
+        "bookings": booking_conversions,
+        "sales": job_conversions,
+        "lead_to_booking_rate": round((booking_conversions / total_leads * 100), 1) if total_leads > 0 else 0,
+        "booking_to_sale_rate": round((job_conversions / booking_conversions * 100), 1) if booking_conversions > 0 else 0
+    }
+
+
+def compute_retention():
+    from leads.services_retention import RetentionService
+
+    candidates = RetentionService.get_retention_candidates()
+    return {"top": candidates[:10], "count": len(candidates)}
+
+
+def compute_capacity():
+    from hr.models import Employee, SalarySlip
+    from stock.models import StockItem
+
+    today = timezone.now().date()
+    total_payroll = SalarySlip.objects.filter(month=today.strftime('%Y-%m')).aggregate(Sum('net_salary'))['net_salary__sum'] or 0
+    inventory_value = StockItem.objects.all().aggregate(
+        total=Sum(F('current_stock') * F('unit_cost'), output_field=DecimalField())
+    )['total'] or 0
+    return {
+        "employee_count": Employee.objects.filter(is_active=True).count(),
+        "payroll_burden": float(total_payroll),
+        "inventory_valuation": float(inventory_value),
+    }
+
+
+# --------------------------------------------------------- Management blocks
+
+def compute_management_overview():
+    from hr.models import Employee
+    from invoices.models import Invoice
+    from locations.models import Branch
+
+    month_start = timezone.now().date().replace(day=1)
+    month_invoices = Invoice.objects.filter(created_at__date__gte=month_start)
+
+    total_revenue = month_invoices.aggregate(Sum('grand_total'))['grand_total__sum'] or 0
+    revenue_by_branch = {
+        row['branch']: row['total']
+        for row in month_invoices.values('branch').annotate(total=Sum('grand_total')).order_by()
+    }
+
+    branches_data = []
+    for branch in Branch.objects.filter(is_active=True):
+        revenue = revenue_by_branch.get(branch.id) or 0
+
+        # Determine status based on some threshold if needed
+        status = "On Target"
+        if revenue > 500000: # Example logic
+            status = "Exceeding"
+        elif revenue < 5000:
+            status = "Behind"
+
+        branches_data.append({
+            "name": branch.name,
+            "revenue": float(revenue),
+            "status": status,
+            "growth": "+0%" # Placeholder for trend analysis
+        })
+
+    return {
+        "totalRevenue": float(total_revenue),
+        "activeEmployeeCount": Employee.objects.filter(is_active=True).count(),
+        "branchesCount": len(branches_data),
+        "branches": branches_data,
+    }
+
+
+# -------------------------------------------------------------- Sales blocks
+
+def compute_sales_pipeline():
+    from django.db.models import Count, Q
+    from leads.models import Lead
+
+    first_day_this_month = timezone.now().replace(day=1, hour=0, minute=0, second=0, microsecond=0)
+    leads = Lead.objects.aggregate(
+        total=Count('id'),
+        new_this_month=Count('id', filter=Q(created_at__gte=first_day_this_month)),
+        active=Count('id', filter=~Q(status__in=['LOST', 'CONVERTED'])),
+        processed=Count('id', filter=Q(status__in=['CONVERTED', 'LOST'])),
+        converted=Count('id', filter=Q(status='CONVERTED')),
+        value=Sum('estimated_value', filter=~Q(status='LOST')),
+    )
+    processed = leads['processed']
+    return {
+        'pipeline': {
+            'total_leads': leads['total'],
+            'active_leads': leads['active'],
+            'new_this_month': leads['new_this_month'],
+            'value': leads['value'] or 0
+        },
+        'conversion_rate': round((leads['converted'] / processed * 100) if processed > 0 else 0, 1),
+    }
+
+
+def compute_sales_leaderboard():
+    from django.db.models import Count, Q
+    from job_cards.models import JobCard
+    from leads.models import Lead
+
+    # Note: JobCard uses 'service_advisor' (str) and Lead uses 'assigned_to__user__first_name' (str)
+    revenue_by_advisor = JobCard.objects.values('service_advisor').annotate(
+        total_revenue=Sum('net_amount'),
+        jobs_count=Count('id')
+    ).order_by('-total_revenue')
+
+    leaderboard = {}
+    for entry in revenue_by_advisor:
+        name = entry['service_advisor'] or 'Unknown'
+        name = name.strip()
+        if not name: continue
+
+        if name not in leaderboard:
+            leaderboard[name] = {'name': name, 'revenue': 0, 'leads': 0, 'conversions': 0}
+
+        leaderboard[name]['revenue'] += float(entry['total_revenue'] or 0)
+        leaderboard[name]['jobs_count'] = entry['jobs_count']
+
+    leads_by_advisor = Lead.objects.values('assigned_to__user__first_name', 'assigned_to__user__last_name').annotate(
+        total_leads=Count('id'),
+        converted=Count('id', filter=Q(status='CONVERTED'))
+    )
+
+    for entry in leads_by_advisor:
+        fname = entry['assigned_to__user__first_name'] or ''
+        lname = entry['assigned_to__user__last_name'] or ''
+        name = f"{fname} {lname}".strip() or 'Unassigned'
+
+        if name not in leaderboard:
+            leaderboard[name] = {'name': name, 'revenue': 0, 'leads': 0, 'conversions': 0}
+
+        leaderboard[name]['leads'] += entry['total_leads']
+        leaderboard[name]['conversions'] += entry['converted']
+
+    final_leaderboard = []
+    for data in leaderboard.values():
+        total = data.get('leads', 0)
+        conv = data.get('conversions', 0)
+        data['conversion_rate'] = round((conv / total * 100) if total > 0 else 0, 1)
+        final_leaderboard.append(data)
+
+    final_leaderboard.sort(key=lambda x: x['revenue'], reverse=True)
+    return final_leaderboard[:10]
+
+
+def compute_sales_trends():
+    from django.db.models import Count
+    from job_cards.models import JobCard
+    from leads.models import Lead
+
+    six_months_ago = timezone.now() - datetime.timedelta(days=180)
+
+    revenue_trend_qs = JobCard.objects.filter(date__gte=six_months_ago)\
+        .annotate(month=TruncMonth('date'))\
+        .values('month')\
+        .annotate(total=Sum('net_amount'))\
+        .order_by('month')
+
+    leads_trend_qs = Lead.objects.filter(created_at__gte=six_months_ago)\
+        .annotate(month=TruncMonth('created_at'))\
+        .values('month')\
+        .annotate(count=Count('id'))\
+        .order_by('month')
+
+    trends_map = {}
+    for r in revenue_trend_qs:
+        m = r['month'].strftime('%b')
+        if m not in trends_map: trends_map[m] = {'name': m, 'revenue': 0, 'leads': 0}
+        trends_map[m]['revenue'] = float(r['total'])
+
+    for l in leads_trend_qs:
+        m = l['month'].strftime('%b')
+        if m not in trends_map: trends_map[m] = {'name': m, 'revenue': 0, 'leads': 0}
+        trends_map[m]['leads'] = l['count']
+
+    return list(trends_map.values())
+
+
+BLOCKS = {block.name: block for block in [
+    MetricBlock('ceo.revenue_trends', compute_revenue_trends, 900, ['invoices.Invoice']),
+    MetricBlock('ceo.burn_rate', compute_burn_rate, 900, ['finance.VoucherDetail']),
+    MetricBlock('ceo.crm_funnel', compute_crm_funnel, 300, ['leads.Lead', 'bookings.Booking', 'invoices.Invoice']),
+    MetricBlock('ceo.retention', compute_retention, 3600, [
+        'ppf_warranty.PPFWarrantyRegistration', 'ceramic_warranty.CeramicWarrantyRegistration',
+    ]),
+    MetricBlock('ceo.capacity', compute_capacity, 900, ['hr.Employee', 'hr.SalarySlip']),
+    MetricBlock('management.overview', compute_management_overview, 300, [
+        'invoices.Invoice', 'hr.Employee', 'locations.Branch',
+    ]),
+    MetricBlock('sales.pipeline', compute_sales_pipeline, 300, ['leads.Lead']),
+    MetricBlock('sales.leaderboard', compute_sales_leaderboard, 600, ['job_cards.JobCard', 'leads.Lead']),
+    MetricBlock('sales.trends', compute_sales_trends, 900, ['job_cards.JobCard', 'leads.Lead']),
+]}
+
+
+def blocks_depending_on(model_label):
+    return [name for name, block in BLOCKS.items() if model_label in block.depends_on]
+
+
+class DashboardMetrics:
+    @staticmethod
+    def invalidate(names):
+        """Bump block versions so their snapshots are recomputed on next read."""
+        for name in names:
+            key = VERSION_KEY.format(name)
+            if not cache.add(key, 1, timeout=None):
+                try:
+                    cache.incr(key)
+                except ValueError:
+                    cache.set(key, 1, timeout=None)
+
+    @staticmethod
+    def refresh(name, version=None):
+        """Recompute a block and store its snapshot. Returns the snapshot."""
+        block = BLOCKS[name]
+        if version is None:
+            version = cache.get(VERSION_KEY.format(name), 0)
+        snapshot = {'data': block.compute(), 'computed_at': time.time(), 'version': version}
+        # Keep the snapshot well past its TTL so stale data can be served while refreshing
+        cache.set(SNAPSHOT_KEY.format(name), snapshot, timeout=block.ttl * 10)
+        return snapshot
+
+    @staticmethod
+    def get_blocks(names):
+        """
+        Returns ({name: data}, {name: freshness}) for the requested blocks.
+        Snapshots and versions are fetched in one cache round-trip.
+        """
+        stored = cache.get_many(
+            [SNAPSHOT_KEY.format(n) for n in names] + [VERSION_KEY.format(n) for n in names]
+        )
+        now = time.time()
+        data, freshness = {}, {}
+
+        for name in names:
+            block = BLOCKS[name]
+            snapshot = stored.get(SNAPSHOT_KEY.format(name))
+            version = stored.get(VERSION_KEY.format(name), 0)
+            is_stale = snapshot is None or snapshot['version'] != version or now - snapshot['computed_at'] > block.ttl
+
+            if is_stale:
+                lock = LOCK_KEY.format(name)
+                if cache.add(lock, 1, timeout=LOCK_TIMEOUT) or snapshot is None:
+                    # This request refreshes; concurrent pollers keep reading the old snapshot
+                    try:
+                        snapshot = DashboardMetrics.refresh(name, version)
+                        is_stale = False
+                    finally:
+                        cache.delete(lock)
+
+            data[name] = snapshot['data']
+            freshness[name] = {
+                'computed_at': datetime.datetime.fromtimestamp(snapshot['computed_at'], tz=datetime.timezone.utc).isoformat(),
+                'age_seconds': round(max(0.0, time.time() - snapshot['computed_at']), 1),
+                'ttl_seconds': block.ttl,
+                'stale': is_stale,
+            }
+
+        return data, freshness
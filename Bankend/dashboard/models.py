@@ -31,10 +31,14 @@ class ChatMessage(models.Model):
     
     text = models.TextField()
     is_system = models.BooleanField(default=False)
-    created_at = models.DateTimeField(auto_now_add=True)
+    # Set when the message is received: websocket messages are broadcast
+    # before they are written (dashboard.chat), and uid ties the two together
+    uid = models.UUIDField(null=True, blank=True, unique=True, editable=False)
+    created_at = models.DateTimeField(default=timezone.now)
 
     class Meta:
         ordering = ['created_at']
+        indexes = [models.Index(fields=['trip', 'created_at', 'id'], name='chat_history_idx')]
 
     def __str__(self):
         return f"{self.sender.get_full_name() or self.sender.username}: {self.text[:50]}"
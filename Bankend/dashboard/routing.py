@@ -4,4 +4,6 @@ from . import consumers
 websocket_urlpatterns = [
     re_path(r'ws/chat/global/$', consumers.GlobalChatConsumer.as_asgi()),
     re_path(r'ws/chat/trip/(?P<trip_id>\d+)/$', consumers.TripChatConsumer.as_asgi()),
+    re_path(r'ws/jobs/$', consumers.JobBoardConsumer.as_asgi()),
+    re_path(r'ws/jobs/(?P<branch_id>\d+)/$', consumers.JobBoardConsumer.as_asgi()),
 ]
@@ -12,8 +12,8 @@ class ChatMessageSerializer(serializers.ModelSerializer):
 
     class Meta:
         model = ChatMessage
-        fields = ['id', 'sender', 'sender_name', 'receiver', 'receiver_name', 'trip', 'text', 'is_system', 'created_at']
-        read_only_fields = ['sender']
+        fields = ['id', 'uid', 'sender', 'sender_name', 'receiver', 'receiver_name', 'trip', 'text', 'is_system', 'created_at']
+        read_only_fields = ['sender', 'uid', 'created_at']
 
     def get_sender_name(self, obj):
         return obj.sender.get_full_name() or obj.sender.username
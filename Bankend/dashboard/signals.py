@@ -0,0 +1,18 @@
+from django.apps import apps
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from .metrics import BLOCKS, DashboardMetrics, blocks_depending_on
+
+
+def invalidate_dashboard_blocks(sender, **kwargs):
+    names = blocks_depending_on(sender._meta.label)
+    if names:
+        transaction.on_commit(lambda: DashboardMetrics.invalidate(names))
+
+
+def connect_dashboard_invalidation():
+    labels = {label for block in BLOCKS.values() for label in block.depends_on}
+    for label in labels:
+        model = apps.get_model(label)
+        post_save.connect(invalidate_dashboard_blocks, sender=model, dispatch_uid=f'dashboard_save_{label}')
+        post_delete.connect(invalidate_dashboard_blocks, sender=model, dispatch_uid=f'dashboard_delete_{label}')
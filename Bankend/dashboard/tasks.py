@@ -0,0 +1,17 @@
+from celery import shared_task
+from .metrics import BLOCKS, DashboardMetrics
+import logging
+
+logger = logging.getLogger(__name__)
+
+@shared_task
+def refresh_dashboard_metrics():
+    """Recompute every dashboard block so polling requests only read snapshots."""
+    refreshed = 0
+    for name in BLOCKS:
+        try:
+            DashboardMetrics.refresh(name)
+            refreshed += 1
+        except Exception as e:
+            logger.error(f"Dashboard block {name} failed to refresh: {e}")
+    return refreshed
@@ -0,0 +1,222 @@
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from core.testing import app_queries
+from leads.models import Lead
+from dashboard.metrics import BLOCKS, DashboardMetrics
+
+
+class DashboardMetricsTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_superuser('ceo'))
+
+    def test_polling_reads_snapshots(self):
+        for url in ['/api/dashboard/api/ceo/analytics/', '/api/dashboard/api/management/stats/', '/api/dashboard/api/sales/']:
+            first = self.client.get(url)
+            self.assertEqual(first.status_code, 200)
+            with CaptureQueriesContext(connection) as ctx:
+                second = self.client.get(url)
+            self.assertEqual(app_queries(ctx), [], url)
+            self.assertTrue(all(not block['stale'] for block in second.json()['freshness'].values()))
+
+    def test_model_change_invalidates_dependent_blocks_only(self):
+        DashboardMetrics.get_blocks(['sales.pipeline', 'ceo.burn_rate'])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Lead.objects.create(customer_name='Walk-in', phone='0500000000', source='WALKIN', estimated_value=250)
+
+        with CaptureQueriesContext(connection) as ctx:
+            data, freshness = DashboardMetrics.get_blocks(['sales.pipeline', 'ceo.burn_rate'])
+        self.assertEqual(data['sales.pipeline']['pipeline']['total_leads'], 1)
+        self.assertTrue(app_queries(ctx))  # pipeline recomputed
+        self.assertFalse(any('finance_voucherdetail' in q['sql'] for q in ctx.captured_queries))
+
+    def test_concurrent_reader_gets_stale_snapshot_while_refresh_runs(self):
+        DashboardMetrics.get_blocks(['sales.pipeline'])
+        DashboardMetrics.invalidate(['sales.pipeline'])
+        cache.add('dashboard:lock:sales.pipeline', 1)  # another request is refreshing
+
+        with CaptureQueriesContext(connection) as ctx:
+            _, freshness = DashboardMetrics.get_blocks(['sales.pipeline'])
+        self.assertTrue(freshness['sales.pipeline']['stale'])
+        self.assertEqual(app_queries(ctx), [])
+
+    def test_every_block_computes(self):
+        for name in BLOCKS:
+            self.assertIn('data', DashboardMetrics.refresh(name))
+
+
+@override_settings(
+    CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}},
+    JOB_BOARD_REPLAY_LIMIT=3,
+)
+class JobBoardConsumerTests(TestCase):
+    def setUp(self):
+        from datetime import date
+        from job_cards.models import JobCard
+        from locations.models import Branch
+
+        self.user = User.objects.create_user('advisor')
+        self.branches = [
+            Branch.objects.create(name=name, code=name, address='', contact_email='a@b.ae', contact_phone='')
+            for name in ('DXB', 'SHJ')
+        ]
+        self.job = JobCard.objects.create(job_card_number='JC-1', date=date(2025, 3, 1), customer_name='Sam',
+                                          phone='', branch=self.branches[0])
+
+    def change(self, **fields):
+        with self.captureOnCommitCallbacks(execute=True):
+            for name, value in fields.items():
+                setattr(self.job, name, value)
+            self.job.save()
+
+    async def connect(self, path):
+        from channels.testing import WebsocketCommunicator
+        from channels.routing import URLRouter
+        from dashboard.routing import websocket_urlpatterns
+
+        communicator = WebsocketCommunicator(URLRouter(websocket_urlpatterns), path)
+        communicator.scope['user'] = self.user
+        connected, _ = await communicator.connect()
+        self.assertTrue(connected)
+        return communicator
+
+    async def test_branch_deltas_and_resume(self):
+        from channels.db import database_sync_to_async
+        change = database_sync_to_async(self.change)
+
+        await change(status='IN_PROGRESS')
+        dubai = await self.connect(f'/ws/jobs/{self.branches[0].pk}/')
+        sharjah = await self.connect(f'/ws/jobs/{self.branches[1].pk}/')
+        hello = await dubai.receive_json_from()
+        self.assertEqual(hello['type'], 'hello')
+        await sharjah.receive_json_from()
+
+        await change(assigned_bay='Bay 3')
+        await change(customer_name='Samira')  # not a board field: nothing published
+        event = await dubai.receive_json_from()
+        self.assertEqual(event['seq'], hello['seq'] + 1)
+        self.assertEqual(event['job'], {
+            'id': self.job.pk, 'number': 'JC-1', 'branch': self.branches[0].pk, 'status': 'IN_PROGRESS',
+            'bay': 'Bay 3', 'booth': None, 'technician': None, 'deleted': False,
+        })
+        self.assertTrue(await dubai.receive_nothing())
+        self.assertTrue(await sharjah.receive_nothing())
+
+        # A client that saw only the first event catches up
+        late = await self.connect('/ws/jobs/')
+        await late.receive_json_from()
+        await late.send_json_to({'action': 'resume', 'seq': hello['seq'] - 1})
+        replayed = [await late.receive_json_from() for _ in range(2)]
+        self.assertEqual([e['job']['bay'] for e in replayed], ['', 'Bay 3'])
+
+        for bay in ('Bay 4', 'Bay 5', 'Bay 6'):
+            await change(assigned_bay=bay)
+        await late.send_json_to({'action': 'resume', 'seq': 0})
+        messages = [await late.receive_json_from() for _ in range(4)]
+        self.assertEqual(messages[-1]['type'], 'reset')  # 5 missed events > JOB_BOARD_REPLAY_LIMIT
+
+        for communicator in (dubai, sharjah, late):
+            await communicator.disconnect()
+
+
+@override_settings(
+    CHANNEL_LAYERS={'default': {'BACKEND': 'channels.layers.InMemoryChannelLayer'}},
+    CHAT_FLUSH_INTERVAL_MS=60_000,
+)
+class ChatPipelineTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('dispatcher', first_name='Dana')
+
+    async def test_messages_are_broadcast_then_written_in_one_batch(self):
+        from channels.db import database_sync_to_async
+        from channels.routing import URLRouter
+        from channels.testing import WebsocketCommunicator
+        from dashboard import chat
+        from dashboard.models import ChatMessage
+        from dashboard.routing import websocket_urlpatterns
+
+        clients = []
+        for _ in range(2):
+            communicator = WebsocketCommunicator(URLRouter(websocket_urlpatterns), '/ws/chat/global/')
+            communicator.scope['user'] = self.user
+            self.assertTrue((await communicator.connect())[0])
+            clients.append(communicator)
+        sender, listener = clients
+
+        for text in ('one', 'two', 'three'):
+            await sender.send_json_to({'message': text})
+        events = [await listener.receive_json_from() for _ in range(3)]
+        self.assertEqual([e['message'] for e in events], ['one', 'two', 'three'])
+        self.assertEqual(events[0]['sender_name'], 'Dana')
+        for _ in range(3):
+            await sender.receive_json_from()  # its own broadcasts
+        self.assertTrue(await sender.receive_nothing())  # lets the consumer hand the last message over
+
+        stored = database_sync_to_async(lambda: list(ChatMessage.objects.order_by('created_at').values_list('uid', 'text')))
+        self.assertEqual(await stored(), [])  # still buffered
+        writer = chat.writer()
+        writer.timer.cancel()
+        writer.timer = None
+        await writer.flush()
+        self.assertEqual(writer.flushes, 1)
+        self.assertEqual([(str(uid), text) for uid, text in await stored()], [(e['uid'], e['message']) for e in events])
+
+        for communicator in clients:
+            await communicator.disconnect()
+
+    def test_history_is_keyset_paginated_newest_first(self):
+        from datetime import timedelta
+        from django.utils import timezone
+        from dashboard.models import ChatMessage
+        from pick_and_drop.models import PickAndDrop
+
+        start = timezone.now()
+        ChatMessage.objects.bulk_create([
+            ChatMessage(sender=self.user, text=f'm{n}', created_at=start + timedelta(seconds=n)) for n in range(5)
+        ])
+        client = APIClient()
+        client.force_authenticate(self.user)
+
+        first = client.get('/api/dashboard/chat/history/', {'page_size': 2}).json()
+        self.assertEqual([m['text'] for m in first['results']], ['m4', 'm3'])
+        second = client.get(first['next']).json()
+        self.assertEqual([m['text'] for m in second['results']], ['m2', 'm1'])
+
+        trip = PickAndDrop.objects.create(customer_name='Sam', phone='', license_plate='A 1', pickup_location='X',
+                                          drop_off_location='Y', scheduled_time=start)
+        self.assertEqual(client.get('/api/dashboard/chat/history/', {'trip': trip.pk}).status_code, 404)
+
+
+class ChatWriteFailureTests(TransactionTestCase):
+    """Foreign keys are checked at commit, so these run outside a test transaction."""
+
+    def setUp(self):
+        self.user = User.objects.create_user('dispatcher', first_name='Dana')
+
+    def test_a_bad_message_is_dropped_alone(self):
+        from dashboard import chat
+        from dashboard.models import ChatMessage
+
+        messages = [chat.build_message(self.user, text, trip_id)[0]
+                    for text, trip_id in (('one', None), ('lost trip', 999999), ('three', None))]
+        self.assertEqual(chat.write_messages(messages), [])
+        self.assertEqual(list(ChatMessage.objects.order_by('created_at').values_list('text', flat=True)), ['one', 'three'])
+
+    def test_transient_errors_keep_the_batch_for_retry(self):
+        from unittest import mock
+        from django.db import OperationalError
+        from dashboard import chat
+        from dashboard.models import ChatMessage
+
+        messages = [chat.build_message(self.user, text)[0] for text in ('one', 'two')]
+        with mock.patch.object(ChatMessage.objects, 'bulk_create', side_effect=OperationalError('server closed')):
+            self.assertEqual(chat.write_messages(messages), messages)
+        self.assertEqual(chat.write_messages(messages), [])
+        self.assertEqual(ChatMessage.objects.count(), 2)
@@ -1,14 +1,24 @@
 from rest_framework import viewsets, status
 from rest_framework.decorators import action
 from rest_framework.response import Response
+from rest_framework.pagination import CursorPagination
 from rest_framework.permissions import IsAuthenticated
 from django.contrib.auth.models import User
+from .chat import can_access_trip
 from .models import ChatMessage
 from .serializers import ChatMessageSerializer
 
 
 from core.permissions import IsManager, IsAdminOrOwner, IsTechnician
 
+class ChatHistoryPagination(CursorPagination):
+    """Scrollback pages, newest first; follow `next` for older messages."""
+    ordering = ('-created_at', '-id')
+    page_size = 50
+    page_size_query_param = 'page_size'
+    max_page_size = 200
+
+
 class ChatMessageViewSet(viewsets.ModelViewSet):
     serializer_class = ChatMessageSerializer
     permission_classes = [IsAuthenticated]
@@ -65,3 +75,18 @@ class ChatMessageViewSet(viewsets.ModelViewSet):
         )
         serializer = self.get_serializer(messages.order_by('created_at'), many=True)
         return Response(serializer.data)
+
+    @action(detail=False, methods=['get'])
+    def history(self, request):
+        """Keyset-paginated room history: the global chat, or ?trip=<id>."""
+        trip_id = request.query_params.get('trip')
+        if trip_id:
+            if not trip_id.isdigit() or not can_access_trip(request.user, int(trip_id)):
+                return Response({"error": "Trip not found"}, status=status.HTTP_404_NOT_FOUND)
+            messages = ChatMessage.objects.filter(trip_id=trip_id)
+        else:
+            messages = ChatMessage.objects.filter(trip__isnull=True, receiver__isnull=True)
+
+        paginator = ChatHistoryPagination()
+        page = paginator.paginate_queryset(messages.select_related('sender', 'receiver'), request, view=self)
+        return paginator.get_paginated_response(self.get_serializer(page, many=True).data)
@@ -0,0 +1,38 @@
+"""
+Rebuild or verify the materialized LedgerBalance table against finance_voucherdetail.
+
+Usage:
+    python manage.py rebuild_ledger_balances            # full rebuild
+    python manage.py rebuild_ledger_balances --verify   # report drift only
+"""
+from django.core.management.base import BaseCommand, CommandError
+from finance.services import LedgerService
+
+
+class Command(BaseCommand):
+    help = 'Rebuild or verify per-account, per-period ledger balances'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verify',
+            action='store_true',
+            help='Compare materialized balances with a full recompute without writing',
+        )
+
+    def handle(self, *args, **options):
+        if options['verify']:
+            mismatches = LedgerService.verify_balances()
+            if not mismatches:
+                self.stdout.write(self.style.SUCCESS('✅ Ledger balances match a full recompute.'))
+                return
+
+            for (account_id, period, branch_id), expected, actual in sorted(mismatches, key=str):
+                self.stdout.write(
+                    f"  account={account_id} period={period:%Y-%m} branch={branch_id}: "
+                    f"expected Dr {expected[0]} / Cr {expected[1]}, found Dr {actual[0]} / Cr {actual[1]}"
+                )
+            raise CommandError(f'{len(mismatches)} ledger balance rows are out of date. Run without --verify to rebuild.')
+
+        self.stdout.write('Rebuilding ledger balances...')
+        rows = LedgerService.rebuild_balances()
+        self.stdout.write(self.style.SUCCESS(f'✅ Rebuilt {rows} ledger balance rows.'))
@@ -0,0 +1,64 @@
+# Generated by Django 5.1.15 on 2026-10-18 18:19
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Sum
+from django.db.models.functions import TruncMonth
+
+
+def populate_ledger_balances(apps, schema_editor):
+    VoucherDetail = apps.get_model('finance', 'VoucherDetail')
+    LedgerBalance = apps.get_model('finance', 'LedgerBalance')
+    Account = apps.get_model('finance', 'Account')
+
+    rows = VoucherDetail.objects.filter(voucher__status='POSTED').annotate(
+        period=TruncMonth('voucher__date')
+    ).values('account_id', 'period', 'voucher__branch_id').annotate(
+        debit=Sum('debit'), credit=Sum('credit')
+    ).order_by()
+
+    per_account = {}
+    balances = []
+    for row in rows:
+        debit, credit = row['debit'] or 0, row['credit'] or 0
+        balances.append(LedgerBalance(
+            account_id=row['account_id'], period=row['period'], branch_id=row['voucher__branch_id'],
+            debit=debit, credit=credit,
+        ))
+        acc_debit, acc_credit = per_account.get(row['account_id'], (0, 0))
+        per_account[row['account_id']] = (acc_debit + debit, acc_credit + credit)
+    LedgerBalance.objects.bulk_create(balances, batch_size=1000)
+
+    for account in Account.objects.filter(pk__in=per_account):
+        debit, credit = per_account[account.pk]
+        category = (account.category or '').upper()
+        account.balance = debit - credit if category.startswith(('ASSET', 'EXPENSE')) else credit - debit
+        account.save(update_fields=['balance'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance', '0012_fixedasset_linkingaccount'),
+        ('locations', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LedgerBalance',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('period', models.DateField(help_text='First day of the month')),
+                ('debit', models.DecimalField(decimal_places=2, default=0.0, max_digits=15)),
+                ('credit', models.DecimalField(decimal_places=2, default=0.0, max_digits=15)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('account', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='ledger_balances', to='finance.account')),
+                ('branch', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='locations.branch')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['period', 'account'], name='finance_led_period_45ece1_idx')],
+                'unique_together': {('account', 'period', 'branch')},
+            },
+        ),
+        migrations.RunPython(populate_ledger_balances, migrations.RunPython.noop),
+    ]
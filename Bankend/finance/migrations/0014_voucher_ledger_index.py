@@ -0,0 +1,17 @@
+# Generated by Django 5.1.15 on 2026-10-18 18:21
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance', '0013_ledgerbalance'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='voucher',
+            index=models.Index(fields=['status', 'date', 'created_at'], name='finance_vou_status_e336ee_idx'),
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 5.1.15 on 2026-10-18 21:54
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def merge_duplicate_unassigned_rows(apps, schema_editor):
+    # unique_together never covered NULL branches, so racing postings could split a month
+    LedgerBalance = apps.get_model('finance', 'LedgerBalance')
+    duplicates = LedgerBalance.objects.filter(branch__isnull=True).values('account_id', 'period').annotate(
+        rows=Count('id')
+    ).filter(rows__gt=1).order_by()
+    for dup in duplicates:
+        rows = list(LedgerBalance.objects.filter(
+            account_id=dup['account_id'], period=dup['period'], branch__isnull=True
+        ).order_by('id'))
+        keep = rows[0]
+        keep.debit = sum(row.debit for row in rows)
+        keep.credit = sum(row.credit for row in rows)
+        keep.save(update_fields=['debit', 'credit'])
+        LedgerBalance.objects.filter(pk__in=[row.pk for row in rows[1:]]).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('finance', '0014_voucher_ledger_index'),
+        ('locations', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AlterUniqueTogether(
+            name='ledgerbalance',
+            unique_together=set(),
+        ),
+        migrations.AlterField(
+            model_name='ledgerbalance',
+            name='branch',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='locations.branch'),
+        ),
+        migrations.RunPython(merge_duplicate_unassigned_rows, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='ledgerbalance',
+            constraint=models.UniqueConstraint(fields=('account', 'period', 'branch'), name='ledger_balance_unique_branch'),
+        ),
+        migrations.AddConstraint(
+            model_name='ledgerbalance',
+            constraint=models.UniqueConstraint(condition=models.Q(('branch__isnull', True)), fields=('account', 'period'), name='ledger_balance_unique_no_branch'),
+        ),
+    ]
@@ -1,4 +1,5 @@
 from django.db import models
+from core.models import NoAudit, TrackedFieldsMixin
 
 class AccountCategory(models.Model):
     name = models.CharField(max_length=100) # Asset, Liability, etc.
@@ -64,7 +65,7 @@ class LinkingAccount(models.Model):
     def __str__(self):
         return f"{self.get_module_display()} -> {self.account.name}"
 
-class Voucher(models.Model):
+class Voucher(TrackedFieldsMixin, models.Model):
     VOUCHER_TYPES = [
         ('JOURNAL', 'Journal Voucher'),
         ('PAYMENT', 'Payment Voucher'),
@@ -97,6 +98,15 @@ class Voucher(models.Model):
     
     branch = models.ForeignKey('locations.Branch', on_delete=models.SET_NULL, null=True, blank=True)
 
+    # What finance.signals needs to reverse a posting without re-reading the row
+    tracked_fields = ('status', 'date', 'branch')
+
+    class Meta:
+        indexes = [
+            # General Ledger keyset ordering
+            models.Index(fields=['status', 'date', 'created_at']),
+        ]
+
     @property
     def total_amount(self):
         from django.db.models import Sum
@@ -105,16 +115,46 @@ class Voucher(models.Model):
     def __str__(self):
         return f"{self.voucher_number} ({self.get_voucher_type_display()})"
 
-class VoucherDetail(models.Model):
+class VoucherDetail(TrackedFieldsMixin, models.Model):
     voucher = models.ForeignKey(Voucher, on_delete=models.CASCADE, related_name='details')
     account = models.ForeignKey(Account, on_delete=models.PROTECT, related_name='voucher_details')
     debit = models.DecimalField(max_digits=12, decimal_places=2, default=0.00)
     credit = models.DecimalField(max_digits=12, decimal_places=2, default=0.00)
     description = models.CharField(max_length=255, blank=True)
-    
+
+    tracked_fields = ('voucher', 'account', 'debit', 'credit')
+
     def __str__(self):
         return f"{self.account.name}: Dr {self.debit} | Cr {self.credit}"
 
+class LedgerBalance(NoAudit):
+    """
+    Materialized debit/credit totals of POSTED vouchers per account, month and branch.
+    Maintained incrementally by finance.signals; rebuild with `manage.py rebuild_ledger_balances`.
+    """
+    account = models.ForeignKey(Account, on_delete=models.CASCADE, related_name='ledger_balances')
+    period = models.DateField(help_text="First day of the month")
+    branch = models.ForeignKey('locations.Branch', on_delete=models.SET_NULL, null=True, blank=True)
+    debit = models.DecimalField(max_digits=15, decimal_places=2, default=0.00)
+    credit = models.DecimalField(max_digits=15, decimal_places=2, default=0.00)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(fields=['account', 'period', 'branch'], name='ledger_balance_unique_branch'),
+            # NULLs never collide in the constraint above, so branch-less rows need their own
+            models.UniqueConstraint(
+                fields=['account', 'period'], condition=models.Q(branch__isnull=True),
+                name='ledger_balance_unique_no_branch',
+            ),
+        ]
+        indexes = [
+            models.Index(fields=['period', 'account']),
+        ]
+
+    def __str__(self):
+        return f"{self.account_id} @ {self.period:%Y-%m}: Dr {self.debit} | Cr {self.credit}"
+
 class Commission(models.Model):
     COMMISSION_STATUS = [
         ('ACCRUED', 'Accrued (Unpaid)'),
@@ -1,9 +1,19 @@
-from datetime import date
+import binascii
+import json
+from base64 import urlsafe_b64encode, urlsafe_b64decode
+from datetime import date, datetime
 from django.db import transaction
 from django.utils import timezone
-from django.db.models import Sum
+from django.db import IntegrityError
+from django.db.models import Sum, F, Q, Case, When, Value, DecimalField
+from django.db.models.functions import TruncMonth
+from django.utils.dateparse import parse_date
+from django.core.serializers.json import DjangoJSONEncoder
 from datetime import timedelta
-from .models import Account, Budget, Voucher, VoucherDetail
+from decimal import Decimal
+from operator import itemgetter
+from core.exports import Column, stream_csv
+from .models import Account, Budget, Voucher, VoucherDetail, LedgerBalance
 
 class FinanceService:
     @staticmethod
@@ -24,3 +34,333 @@ class FinanceService:
             'budgets': [],
             'accounts_count': Account.objects.count()
         }
+
+
+
+def month_start(day):
+    return day.replace(day=1)
+
+
+def next_month(day):
+    return (day.replace(day=28) + timedelta(days=4)).replace(day=1)
+
+
+def _as_date(value):
+    if value is None or isinstance(value, date):
+        return value
+    return parse_date(str(value))
+
+
+class LedgerService:
+    """
+    Per-account debit/credit totals over POSTED vouchers.
+
+    Whole months are read from the materialized LedgerBalance table; only the
+    partial months at either edge of a window touch finance_voucherdetail, so
+    reads cost the same however long the history is.
+    """
+
+    # Categories whose natural balance is debit - credit; everything else is credit - debit
+    DEBIT_NORMAL = ('ASSET', 'EXPENSE')
+
+    @staticmethod
+    def account_totals(start=None, end=None, accounts=None, branch=None):
+        """
+        start/end bound voucher__date (either may be omitted for an open window).
+        accounts optionally restricts the result to an Account queryset or id list.
+        Returns {account_id: {'debit': Decimal, 'credit': Decimal}}; accounts with
+        no posted activity are absent.
+        """
+        start_d, end_d = _as_date(start), _as_date(end)
+        if (start and not start_d) or (end and not end_d):
+            # Unparseable bounds: let the database validate them as before
+            return LedgerService._detail_totals(LedgerService._window(start, end), accounts, branch)
+
+        # Whole months covered by the window
+        body_from = None if start_d is None else (start_d if start_d.day == 1 else next_month(start_d))
+        if end_d is None:
+            body_to = None
+        elif (end_d + timedelta(days=1)).day == 1:
+            body_to = month_start(end_d)
+        else:
+            body_to = month_start(month_start(end_d) - timedelta(days=1))
+
+        if body_from and body_to and body_from > body_to:
+            return LedgerService._detail_totals(LedgerService._window(start_d, end_d), accounts, branch)
+
+        balances = LedgerBalance.objects.all()
+        if body_from:
+            balances = balances.filter(period__gte=body_from)
+        if body_to:
+            balances = balances.filter(period__lte=body_to)
+        if accounts is not None:
+            balances = balances.filter(account__in=accounts)
+        if branch is not None:
+            balances = balances.filter(branch=branch)
+        rows = balances.values('account_id').annotate(debit=Sum('debit'), credit=Sum('credit')).order_by()
+        totals = {
+            row['account_id']: {'debit': row['debit'] or 0, 'credit': row['credit'] or 0}
+            for row in rows
+        }
+
+        # Partial months at the edges
+        edges = []
+        if start_d and start_d < body_from:
+            edges.append(Q(voucher__date__gte=start_d, voucher__date__lt=body_from))
+        if end_d and end_d >= next_month(body_to):
+            edges.append(Q(voucher__date__gte=next_month(body_to), voucher__date__lte=end_d))
+        if edges:
+            window = edges[0] if len(edges) == 1 else edges[0] | edges[1]
+            for account_id, entry in LedgerService._detail_totals(window, accounts, branch).items():
+                merged = totals.setdefault(account_id, {'debit': 0, 'credit': 0})
+                merged['debit'] += entry['debit']
+                merged['credit'] += entry['credit']
+
+        return totals
+
+    @staticmethod
+    def _window(start, end):
+        window = Q()
+        if start:
+            window &= Q(voucher__date__gte=start)
+        if end:
+            window &= Q(voucher__date__lte=end)
+        return window
+
+    @staticmethod
+    def _detail_totals(window, accounts=None, branch=None):
+        details = VoucherDetail.objects.filter(window, voucher__status='POSTED')
+        if accounts is not None:
+            details = details.filter(account__in=accounts)
+        if branch is not None:
+            details = details.filter(voucher__branch=branch)
+
+        rows = details.values('account_id').annotate(
+            debit=Sum('debit'), credit=Sum('credit')
+        ).order_by()
+
+        return {
+            row['account_id']: {'debit': row['debit'] or 0, 'credit': row['credit'] or 0}
+            for row in rows
+        }
+
+    @staticmethod
+    def totals_for(totals, account):
+        """(debit, credit) for an account from an account_totals() result."""
+        entry = totals.get(account.id)
+        if not entry:
+            return 0, 0
+        return entry['debit'], entry['credit']
+
+    @staticmethod
+    def apply(account_id, voucher_date, branch_id, debit, credit, sign=1):
+        """
+        Add (sign=1) or reverse (sign=-1) a posted amount on the running balances:
+        the (account, month, branch) LedgerBalance row and Account.balance.
+        Uses F() updates so concurrent postings never lose increments.
+        """
+        debit = Decimal(debit or 0) * sign
+        credit = Decimal(credit or 0) * sign
+        if not debit and not credit:
+            return
+
+        with transaction.atomic():
+            LedgerService._add_to_balance(account_id, month_start(voucher_date), branch_id, debit, credit)
+            Account.objects.filter(pk=account_id).update(balance=F('balance') + LedgerService._natural_delta(debit, credit))
+
+    @staticmethod
+    def _add_to_balance(account_id, period, branch_id, debit, credit):
+        balance = LedgerBalance.objects.filter(account_id=account_id, period=period, branch_id=branch_id)
+        if not balance.update(debit=F('debit') + debit, credit=F('credit') + credit):
+            try:
+                with transaction.atomic():
+                    LedgerBalance.objects.create(
+                        account_id=account_id, period=period, branch_id=branch_id,
+                        debit=debit, credit=credit,
+                    )
+            except IntegrityError:
+                # Lost the race to create the row; it exists now
+                balance.update(debit=F('debit') + debit, credit=F('credit') + credit)
+
+    @staticmethod
+    def release_branch(branch_id):
+        """
+        Fold a branch's balances into the branch-less rows before the branch is
+        deleted, mirroring Voucher.branch being set to NULL. Account.balance is
+        unaffected.
+        """
+        with transaction.atomic():
+            rows = LedgerBalance.objects.select_for_update().filter(branch_id=branch_id)
+            for row in rows.values('account_id', 'period', 'debit', 'credit'):
+                LedgerService._add_to_balance(row['account_id'], row['period'], None, row['debit'], row['credit'])
+            rows.delete()
+
+    @staticmethod
+    def apply_voucher(voucher_id, voucher_date, branch_id, sign=1):
+        """Apply or reverse every detail line of a voucher, one update per account."""
+        lines = VoucherDetail.objects.filter(voucher_id=voucher_id).values('account_id').annotate(
+            debit=Sum('debit'), credit=Sum('credit')
+        ).order_by()
+        for line in lines:
+            LedgerService.apply(line['account_id'], voucher_date, branch_id, line['debit'], line['credit'], sign)
+
+    @staticmethod
+    def _natural_delta(debit, credit):
+        is_debit_normal = Q()
+        for category in LedgerService.DEBIT_NORMAL:
+            is_debit_normal |= Q(category__istartswith=category)
+        output = DecimalField(max_digits=15, decimal_places=2)
+        return Case(
+            When(is_debit_normal, then=Value(debit - credit, output_field=output)),
+            default=Value(credit - debit, output_field=output),
+            output_field=output,
+        )
+
+    @staticmethod
+    def expected_balances():
+        """Full recompute of the materialized rows from finance_voucherdetail."""
+        rows = VoucherDetail.objects.filter(voucher__status='POSTED').annotate(
+            period=TruncMonth('voucher__date')
+        ).values('account_id', 'period', 'voucher__branch_id').annotate(
+            debit=Sum('debit'), credit=Sum('credit')
+        ).order_by()
+        return {
+            (row['account_id'], row['period'], row['voucher__branch_id']): (row['debit'] or 0, row['credit'] or 0)
+            for row in rows
+        }
+
+    @staticmethod
+    def verify_balances():
+        """
+        Compare LedgerBalance against a full recompute.
+        Returns a list of (key, expected, actual) tuples for every mismatch.
+        """
+        expected = LedgerService.expected_balances()
+        actual = {
+            (row.account_id, row.period, row.branch_id): (row.debit, row.credit)
+            for row in LedgerBalance.objects.all()
+        }
+        mismatches = []
+        for key in set(expected) | set(actual):
+            exp = expected.get(key, (0, 0))
+            act = actual.get(key, (0, 0))
+            if exp[0] != act[0] or exp[1] != act[1]:
+                mismatches.append((key, exp, act))
+        return mismatches
+
+    @staticmethod
+    def rebuild_balances():
+        """Replace LedgerBalance and Account.balance with a full recompute. Returns rows written."""
+        expected = LedgerService.expected_balances()
+        with transaction.atomic():
+            LedgerBalance.objects.all().delete()
+            LedgerBalance.objects.bulk_create([
+                LedgerBalance(account_id=account_id, period=period, branch_id=branch_id, debit=debit, credit=credit)
+                for (account_id, period, branch_id), (debit, credit) in expected.items()
+            ], batch_size=1000)
+
+            Account.objects.update(balance=0)
+            per_account = {}
+            for (account_id, _, _), (debit, credit) in expected.items():
+                acc_debit, acc_credit = per_account.get(account_id, (0, 0))
+                per_account[account_id] = (acc_debit + debit, acc_credit + credit)
+            for account_id, (debit, credit) in per_account.items():
+                Account.objects.filter(pk=account_id).update(balance=LedgerService._natural_delta(debit, credit))
+        return len(expected)
+
+
+class GeneralLedgerService:
+    """
+    Row source for the General Ledger: posted voucher lines newest first,
+    read with .values()/.iterator() so memory stays flat for any range.
+    """
+
+    ORDERING = ('-voucher__date', '-voucher__created_at', '-id')
+    FIELDS = (
+        'id', 'voucher__date', 'voucher__created_at', 'voucher__voucher_number', 'account__name',
+        'description', 'voucher__narration', 'debit', 'credit', 'voucher__reference_number',
+    )
+    # Columns of ?stream=csv and the background export
+    COLUMNS = [
+        Column('id', itemgetter('id')),
+        Column('date', itemgetter('voucher__date')),
+        Column('voucher_number', itemgetter('voucher__voucher_number')),
+        Column('account_name', itemgetter('account__name')),
+        Column('narration', lambda values: values['description'] or values['voucher__narration']),
+        Column('debit', itemgetter('debit')),
+        Column('credit', itemgetter('credit')),
+        Column('reference', itemgetter('voucher__reference_number')),
+        Column('department', lambda values: 'OPERATIONS'),
+    ]
+
+    @staticmethod
+    def queryset(start=None, end=None, account_id=None):
+        details = VoucherDetail.objects.filter(voucher__status='POSTED')
+
+        if start and end:
+            details = details.filter(voucher__date__range=[start, end])
+        if account_id:
+            details = details.filter(account_id=account_id)
+
+        return details.order_by(*GeneralLedgerService.ORDERING).values(*GeneralLedgerService.FIELDS)
+
+    @staticmethod
+    def to_row(values):
+        return {
+            'id': values['id'],
+            'date': values['voucher__date'],
+            'voucher_number': values['voucher__voucher_number'],
+            'account_name': values['account__name'],
+            'narration': values['description'] or values['voucher__narration'],
+            'debit': float(values['debit']),
+            'credit': float(values['credit']),
+            'reference': values['voucher__reference_number'],
+            'department': 'OPERATIONS'  # Placeholder for migration
+        }
+
+    @staticmethod
+    def encode_cursor(values):
+        payload = [values['voucher__date'].isoformat(), values['voucher__created_at'].isoformat(), values['id']]
+        return urlsafe_b64encode(json.dumps(payload).encode()).decode()
+
+    @staticmethod
+    def decode_cursor(cursor):
+        """Returns (date, created_at, id) or raises ValueError for a malformed cursor."""
+        try:
+            day, created_at, pk = json.loads(urlsafe_b64decode(cursor.encode()))
+            return date.fromisoformat(day), datetime.fromisoformat(created_at), int(pk)
+        except (TypeError, ValueError, binascii.Error) as e:
+            raise ValueError(f"Invalid cursor: {e}")
+
+    @staticmethod
+    def page(details, cursor=None, page_size=500):
+        """
+        Keyset page strictly after `cursor` in ledger order.
+        Returns (rows, next_cursor); next_cursor is None on the last page.
+        """
+        if cursor:
+            day, created_at, pk = GeneralLedgerService.decode_cursor(cursor)
+            details = details.filter(
+                Q(voucher__date__lt=day)
+                | Q(voucher__date=day, voucher__created_at__lt=created_at)
+                | Q(voucher__date=day, voucher__created_at=created_at, id__lt=pk)
+            )
+
+        values = list(details[:page_size + 1])
+        next_cursor = GeneralLedgerService.encode_cursor(values[page_size - 1]) if len(values) > page_size else None
+        return [GeneralLedgerService.to_row(v) for v in values[:page_size]], next_cursor
+
+    @staticmethod
+    def stream_ndjson(details, chunk_size=2000):
+        for values in details.iterator(chunk_size=chunk_size):
+            yield json.dumps(GeneralLedgerService.to_row(values), cls=DjangoJSONEncoder) + '\n'
+
+    @staticmethod
+    def stream_csv(details):
+        return stream_csv(GeneralLedgerService.COLUMNS, details)
+
+
+def general_ledger_export(params):
+    """Background export (core.export_jobs): the rows of ?stream=csv."""
+    details = GeneralLedgerService.queryset(params.get('start_date'), params.get('end_date'), params.get('account_id'))
+    return 'general_ledger', GeneralLedgerService.COLUMNS, details
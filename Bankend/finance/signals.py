@@ -0,0 +1,93 @@
+from django.db.models.signals import pre_save, post_save, pre_delete, post_delete
+from django.dispatch import receiver
+from .models import Voucher, VoucherDetail
+from .services import LedgerService
+
+# Keep LedgerBalance / Account.balance in step with POSTED vouchers.
+# Note: queryset.update()/bulk_create bypass these; `manage.py rebuild_ledger_balances` repairs drift.
+
+# The pre_save snapshots read the tracked values (TrackedFieldsMixin); the row
+# is only queried for instances that were not loaded from the database.
+
+def voucher_posting(voucher):
+    """The voucher's status, date and branch as stored in the database."""
+    if voucher.previous('status') is None:  # row is gone
+        return None
+    return {
+        'status': voucher.previous('status'),
+        'date': voucher.previous('date'),
+        'branch_id': voucher.previous('branch'),
+    }
+
+@receiver(pre_save, sender=Voucher)
+def snapshot_voucher_posting(sender, instance, **kwargs):
+    instance._ledger_previous = None
+    if instance.pk:
+        instance._ledger_previous = voucher_posting(instance)
+
+@receiver(post_save, sender=Voucher)
+def sync_voucher_posting(sender, instance, created, **kwargs):
+    previous = getattr(instance, '_ledger_previous', None)
+    if created or not previous:
+        # Details are attached after creation and posted line by line
+        return
+
+    was_posted = previous['status'] == 'POSTED'
+    is_posted = instance.status == 'POSTED'
+    moved = previous['date'] != instance.date or previous['branch_id'] != instance.branch_id
+
+    if was_posted and (not is_posted or moved):
+        LedgerService.apply_voucher(instance.pk, previous['date'], previous['branch_id'], sign=-1)
+    if is_posted and (not was_posted or moved):
+        LedgerService.apply_voucher(instance.pk, instance.date, instance.branch_id)
+
+@receiver(pre_save, sender=VoucherDetail)
+def snapshot_voucher_detail(sender, instance, **kwargs):
+    instance._ledger_previous = None
+    if not instance.pk:
+        return
+    voucher_id = instance.previous('voucher')
+    if voucher_id is None:  # row is gone
+        return
+    if voucher_id == instance.voucher_id:
+        posting = voucher_posting(instance.voucher)
+    else:
+        # Moved to another voucher: the old one is not loaded
+        posting = Voucher.objects.filter(pk=voucher_id).values('status', 'date', 'branch_id').first()
+    instance._ledger_previous = {
+        'account_id': instance.previous('account'),
+        'debit': instance.previous('debit'),
+        'credit': instance.previous('credit'),
+        'voucher__status': posting and posting['status'],
+        'voucher__date': posting and posting['date'],
+        'voucher__branch_id': posting and posting['branch_id'],
+    }
+
+@receiver(post_save, sender=VoucherDetail)
+def sync_voucher_detail(sender, instance, created, **kwargs):
+    previous = getattr(instance, '_ledger_previous', None)
+    if previous and previous['voucher__status'] == 'POSTED':
+        LedgerService.apply(
+            previous['account_id'], previous['voucher__date'], previous['voucher__branch_id'],
+            previous['debit'], previous['credit'], sign=-1
+        )
+
+    voucher = instance.voucher
+    if voucher.status == 'POSTED':
+        LedgerService.apply(instance.account_id, voucher.date, voucher.branch_id, instance.debit, instance.credit)
+
+@receiver(post_delete, sender=VoucherDetail)
+def reverse_voucher_detail(sender, instance, **kwargs):
+    # Re-read the voucher: on cascade deletes the cached instance may be mid-delete
+    voucher = Voucher.objects.filter(pk=instance.voucher_id).values('status', 'date', 'branch_id').first()
+    if voucher and voucher['status'] == 'POSTED':
+        LedgerService.apply(
+            instance.account_id, voucher['date'], voucher['branch_id'],
+            instance.debit, instance.credit, sign=-1
+        )
+
+def release_branch_balances(sender, instance, **kwargs):
+    # Vouchers of a deleted branch become branch-less; move their balances with them
+    LedgerService.release_branch(instance.pk)
+
+pre_delete.connect(release_branch_balances, sender='locations.Branch', dispatch_uid='ledger-release-branch')
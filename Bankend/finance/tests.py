@@ -1,3 +1,298 @@
+import csv
+import json
+from datetime import date
+from decimal import Decimal
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import IntegrityError, connection, transaction
+from django.db.models import Sum
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from core.testing import app_queries
+from locations.models import Branch
+
+from .models import Account, LedgerBalance, Voucher, VoucherDetail
+from .services import LedgerService
+
+
+class LedgerFixtureMixin:
+    """Builds a chart of accounts with posted and draft vouchers across two months."""
+
+    def make_ledger(self, accounts_per_category):
+        self.accounts = []
+        code = 1000
+        for category in ['ASSET', 'LIABILITY', 'EQUITY', 'INCOME', 'EXPENSE']:
+            for i in range(accounts_per_category):
+                code += 1
+                name = f"{category.title()} {i}"
+                if category == 'LIABILITY' and i == 0:
+                    name = 'Output VAT'
+                if category == 'ASSET' and i == 0:
+                    name = 'Input VAT'
+                self.accounts.append(Account.objects.create(code=str(code), name=name, category=category))
+
+        number = 0
+        for voucher_date, status in [
+            (date(2025, 1, 10), 'POSTED'),
+            (date(2025, 2, 5), 'POSTED'),
+            (date(2025, 2, 20), 'DRAFT'),
+        ]:
+            for idx, acc in enumerate(self.accounts):
+                number += 1
+                voucher = Voucher.objects.create(
+                    voucher_number=f"JV-{number}", voucher_type='JOURNAL',
+                    date=voucher_date, status=status,
+                )
+                amount = Decimal(idx + 1) * Decimal('10.25')
+                VoucherDetail.objects.create(voucher=voucher, account=acc, debit=amount)
+                VoucherDetail.objects.create(voucher=voucher, account=self.accounts[-1 - idx], credit=amount)
+
+    def reference_totals(self, acc, start=None, end=None):
+        qs = VoucherDetail.objects.filter(account=acc, voucher__status='POSTED')
+        if start:
+            qs = qs.filter(voucher__date__gte=start)
+        if end:
+            qs = qs.filter(voucher__date__lte=end)
+        agg = qs.aggregate(debit=Sum('debit'), credit=Sum('credit'))
+        return agg['debit'] or 0, agg['credit'] or 0
+
+
+class LedgerServiceTests(LedgerFixtureMixin, TestCase):
+    def setUp(self):
+        self.make_ledger(3)
+
+    def test_account_totals_match_per_account_aggregates(self):
+        totals = LedgerService.account_totals('2025-02-01', '2025-02-28')
+        for acc in self.accounts:
+            self.assertEqual(
+                LedgerService.totals_for(totals, acc),
+                self.reference_totals(acc, '2025-02-01', '2025-02-28'),
+            )
+
+    def test_account_totals_as_of(self):
+        totals = LedgerService.account_totals(end='2025-01-31')
+        for acc in self.accounts:
+            self.assertEqual(LedgerService.totals_for(totals, acc), self.reference_totals(acc, end='2025-01-31'))
+
+    def test_account_totals_with_partial_months(self):
+        for start, end in [('2025-01-05', '2025-02-10'), ('2025-01-15', '2025-01-20'), (None, '2025-02-10'), ('2025-01-11', None)]:
+            totals = LedgerService.account_totals(start, end)
+            for acc in self.accounts:
+                self.assertEqual(LedgerService.totals_for(totals, acc), self.reference_totals(acc, start, end))
+
+
+class LedgerBalanceMaintenanceTests(LedgerFixtureMixin, TestCase):
+    def setUp(self):
+        self.make_ledger(2)
+
+    def assertBalancesCurrent(self):
+        self.assertEqual(LedgerService.verify_balances(), [])
+
+    def test_posting_maintains_balances(self):
+        self.assertTrue(LedgerBalance.objects.exists())
+        self.assertBalancesCurrent()
+
+    def test_status_transitions_apply_and_reverse(self):
+        draft = Voucher.objects.filter(status='DRAFT').first()
+        draft.status = 'POSTED'
+        draft.save()
+        self.assertBalancesCurrent()
+
+        posted = Voucher.objects.filter(status='POSTED').first()
+        posted.status = 'CANCELLED'
+        posted.save()
+        self.assertBalancesCurrent()
+
+    def test_moving_posted_voucher_to_another_month(self):
+        posted = Voucher.objects.filter(status='POSTED', date=date(2025, 1, 10)).first()
+        posted.date = date(2025, 3, 1)
+        posted.save()
+        self.assertBalancesCurrent()
+
+    def test_detail_edit_and_delete(self):
+        detail = VoucherDetail.objects.filter(voucher__status='POSTED').first()
+        detail.debit = Decimal('999.99')
+        detail.account = self.accounts[0]
+        detail.save()
+        self.assertBalancesCurrent()
+
+        Voucher.objects.filter(status='POSTED').first().delete()
+        self.assertBalancesCurrent()
+
+    def test_moving_detail_to_another_voucher(self):
+        detail = VoucherDetail.objects.filter(voucher__status='POSTED').first()
+        detail.voucher = Voucher.objects.filter(status='DRAFT').first()
+        detail.save()
+        self.assertBalancesCurrent()
+
+    def test_saves_do_not_reread_the_row(self):
+        voucher = Voucher.objects.filter(status='POSTED').first()
+        detail = VoucherDetail.objects.select_related('voucher').filter(voucher__status='POSTED').exclude(voucher=voucher).first()
+        with CaptureQueriesContext(connection) as ctx:
+            voucher.status = 'CANCELLED'
+            voucher.save()
+            detail.debit = Decimal('999.99')
+            detail.save()
+        selects = [q['sql'] for q in ctx.captured_queries if q['sql'].startswith('SELECT')]
+        self.assertFalse([sql for sql in selects if 'WHERE "finance_voucher"."id" =' in sql], selects)
+        self.assertFalse([sql for sql in selects if 'WHERE "finance_voucherdetail"."id" =' in sql], selects)
+        self.assertBalancesCurrent()
+
+    def test_account_balance_follows_natural_side(self):
+        asset = Account.objects.create(code='9001', name='Cash', category='ASSET')
+        income = Account.objects.create(code='9002', name='Sales', category='INCOME')
+        voucher = Voucher.objects.create(voucher_number='RV-1', voucher_type='RECEIPT', date=date(2025, 3, 3), status='POSTED')
+        VoucherDetail.objects.create(voucher=voucher, account=asset, debit=Decimal('100.00'))
+        VoucherDetail.objects.create(voucher=voucher, account=income, credit=Decimal('100.00'))
+
+        asset.refresh_from_db()
+        income.refresh_from_db()
+        self.assertEqual(asset.balance, Decimal('100.00'))
+        self.assertEqual(income.balance, Decimal('100.00'))
+
+    def test_deleting_branch_folds_balances_into_unassigned_rows(self):
+        branch = Branch.objects.create(name='Deira', code='DRA')
+        moved = list(Voucher.objects.filter(status='POSTED', date=date(2025, 1, 10)).values_list('pk', flat=True)[:2])
+        Voucher.objects.filter(pk__in=moved).update(branch=branch)
+        call_command('rebuild_ledger_balances', stdout=StringIO())
+        self.assertTrue(LedgerBalance.objects.filter(branch=branch).exists())
+        self.assertTrue(LedgerBalance.objects.filter(branch__isnull=True, period=date(2025, 1, 1)).exists())
+        before = LedgerService.account_totals()
+
+        branch.delete()
+
+        self.assertFalse(LedgerBalance.objects.exclude(branch__isnull=True).exists())
+        self.assertEqual(LedgerService.account_totals(), before)
+        self.assertBalancesCurrent()
+
+    def test_one_unassigned_row_per_account_and_month(self):
+        row = LedgerBalance.objects.filter(branch__isnull=True).first()
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            LedgerBalance.objects.create(account_id=row.account_id, period=row.period, debit=1)
+
+        LedgerService.apply(row.account_id, row.period, None, Decimal('5.00'), 0)
+        self.assertEqual(LedgerBalance.objects.filter(account_id=row.account_id, period=row.period).count(), 1)
+        LedgerService.apply(row.account_id, row.period, None, Decimal('5.00'), 0, sign=-1)
+        self.assertBalancesCurrent()
+
+    def test_rebuild_and_verify_command(self):
+        LedgerBalance.objects.update(debit=0)
+        with self.assertRaises(CommandError):
+            call_command('rebuild_ledger_balances', '--verify', stdout=StringIO())
+
+        call_command('rebuild_ledger_balances', stdout=StringIO())
+        call_command('rebuild_ledger_balances', '--verify', stdout=StringIO())
+        self.assertBalancesCurrent()
+
+
+class FinancialReportTests(LedgerFixtureMixin, TestCase):
+    params = {'start_date': '2025-02-01', 'end_date': '2025-02-28'}
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user('accountant'))
+
+    def get(self, report):
+        response = self.client.get(f'/api/finance/reports/{report}/', self.params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_reports_match_per_account_aggregates(self):
+        self.make_ledger(3)
+        start, end = self.params['start_date'], self.params['end_date']
+
+        pl = self.get('profit_loss')
+        expected_income = sum(float(c - d) for d, c in (
+            self.reference_totals(a, start, end) for a in self.accounts if a.category == 'INCOME'))
+        expected_expense = sum(float(d - c) for d, c in (
+            self.reference_totals(a, start, end) for a in self.accounts if a.category == 'EXPENSE'))
+        self.assertAlmostEqual(pl['total_income'], expected_income)
+        self.assertAlmostEqual(pl['total_expense'], expected_expense)
+
+        bs = self.get('balance_sheet')
+        expected_assets = sum(float(d - c) for d, c in (
+            self.reference_totals(a, end=end) for a in self.accounts if a.category == 'ASSET'))
+        self.assertAlmostEqual(bs['total_assets'], expected_assets)
+
+        tb = self.get('trial_balance')
+        expected_rows = [
+            (a.code, float(d), float(c)) for a in sorted(self.accounts, key=lambda a: a.code)
+            for d, c in [self.reference_totals(a, end=end)] if d or c
+        ]
+        self.assertEqual([(r['code'], r['debit'], r['credit']) for r in tb['accounts']], expected_rows)
+        self.assertAlmostEqual(tb['totals']['difference'], 0)
+
+        vat = self.get('vat_report')
+        input_vat = next(a for a in self.accounts if a.name == 'Input VAT')
+        self.assertAlmostEqual(vat['total_input'], float(self.reference_totals(input_vat, start, end)[0]))
+
+    def test_query_count_is_constant_as_chart_grows(self):
+        """Benchmark: report cost must not scale with the number of accounts."""
+        counts = {}
+        for size in (2, 20):
+            VoucherDetail.objects.all().delete()
+            Voucher.objects.all().delete()
+            Account.objects.all().delete()
+            self.make_ledger(size)
+            for report in ('profit_loss', 'balance_sheet', 'trial_balance', 'vat_report'):
+                with CaptureQueriesContext(connection) as ctx:
+                    self.get(report)
+                counts.setdefault(report, []).append(len(app_queries(ctx)))
+
+        for report, (small, large) in counts.items():
+            self.assertEqual(small, large, f"{report} issued {small} queries for 10 accounts but {large} for 100")
+
+
+class GeneralLedgerTests(LedgerFixtureMixin, TestCase):
+    url = '/api/finance/vouchers/ledger/'
+
+    def setUp(self):
+        self.make_ledger(3)
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_superuser('controller'))
+        self.expected_ids = list(
+            VoucherDetail.objects.filter(voucher__status='POSTED')
+            .order_by('-voucher__date', '-voucher__created_at', '-id')
+            .values_list('id', flat=True)
+        )
+
+    def test_keyset_pages_cover_range_in_order(self):
+        ids, cursor, page_sizes = [], None, []
+        while True:
+            params = {'page_size': 7}
+            if cursor:
+                params['cursor'] = cursor
+            with CaptureQueriesContext(connection) as ctx:
+                body = self.client.get(self.url, params).json()
+            page_sizes.append(len(ctx.captured_queries))
+            ids += [row['id'] for row in body['results']]
+            cursor = body['next_cursor']
+            if not cursor:
+                break
+
+        self.assertEqual(ids, self.expected_ids)
+        self.assertEqual(len(set(page_sizes)), 1)
+
+    def test_invalid_cursor(self):
+        self.assertEqual(self.client.get(self.url, {'cursor': 'not-a-cursor'}).status_code, 400)
+
+    def test_ndjson_stream(self):
+        response = self.client.get(self.url, {'stream': 'ndjson'})
+        self.assertTrue(response.streaming)
+        lines = b''.join(response.streaming_content).decode().splitlines()
+        self.assertEqual([json.loads(line)['id'] for line in lines], self.expected_ids)
 
-# Create your tests here.
+    def test_csv_stream(self):
+        response = self.client.get(self.url, {'stream': 'csv', 'start_date': '2025-02-01', 'end_date': '2025-02-28'})
+        self.assertTrue(response.streaming)
+        rows = list(csv.reader(b''.join(response.streaming_content).decode().splitlines()))
+        self.assertEqual(rows[0][0], 'id')
+        self.assertEqual(
+            len(rows) - 1,
+            VoucherDetail.objects.filter(voucher__status='POSTED', voucher__date__month=2).count(),
+        )
@@ -1,13 +1,13 @@
 from rest_framework import viewsets
 from rest_framework.permissions import IsAuthenticated
 from core.permissions import IsAdminOrOwner, HasModulePermission
-from .models import Account, AccountCategory, Budget, Voucher, VoucherDetail, Commission, FixedAsset
+from .models import Account, AccountCategory, Budget, Voucher, Commission, FixedAsset
 from .serializers import (
     AccountSerializer, AccountCategorySerializer, BudgetSerializer, 
     VoucherSerializer, CommissionSerializer, FixedAssetSerializer,
     AccountGroupSerializer
 )
-from .services import FinanceService
+from .services import FinanceService, LedgerService, GeneralLedgerService
 from rest_framework.views import APIView
 
 class FixedAssetViewSet(viewsets.ModelViewSet):
@@ -37,6 +37,7 @@ class BudgetViewSet(viewsets.ModelViewSet):
 from rest_framework.decorators import action
 from rest_framework.response import Response
 from django.db.models import Sum
+from django.http import StreamingHttpResponse
 from django.utils import timezone
 from datetime import timedelta
 from invoices.models import Invoice
@@ -50,36 +51,41 @@ class VoucherViewSet(viewsets.ModelViewSet):
     @action(detail=False, methods=['get'])
     def ledger(self, request):
         """
-        Flattened list of voucher details for the General Ledger.
+        Flattened list of voucher details for the General Ledger, newest first.
+
+        JSON responses are keyset pages: {'results': [...], 'next_cursor': ...};
+        pass next_cursor back as ?cursor= for the following page (page_size <= 5000).
+        ?stream=ndjson or ?stream=csv streams the whole range instead.
         """
         start = request.query_params.get('start_date')
         end = request.query_params.get('end_date')
         account_id = request.query_params.get('account_id')
-        
-        details = VoucherDetail.objects.filter(voucher__status='POSTED')
-        
-        if start and end:
-            details = details.filter(voucher__date__range=[start, end])
-        if account_id:
-            details = details.filter(account_id=account_id)
-            
-        details = details.select_related('voucher', 'account').order_by('-voucher__date', '-voucher__created_at')
-        
-        data = []
-        for d in details:
-            data.append({
-                'id': d.id,
-                'date': d.voucher.date,
-                'voucher_number': d.voucher.voucher_number,
-                'account_name': d.account.name,
-                'narration': d.description or d.voucher.narration,
-                'debit': float(d.debit),
-                'credit': float(d.credit),
-                'reference': d.voucher.reference_number,
-                'department': 'OPERATIONS' # Placeholder for migration
-            })
-            
-        return Response(data)
+
+        details = GeneralLedgerService.queryset(start, end, account_id)
+
+        stream = request.query_params.get('stream')
+        if stream == 'ndjson':
+            return StreamingHttpResponse(GeneralLedgerService.stream_ndjson(details), content_type='application/x-ndjson')
+        if stream == 'csv':
+            response = StreamingHttpResponse(GeneralLedgerService.stream_csv(details), content_type='text/csv')
+            response['Content-Disposition'] = 'attachment; filename="general_ledger.csv"'
+            return response
+        if stream:
+            return Response({"error": "stream must be 'ndjson' or 'csv'"}, status=400)
+
+        try:
+            page_size = min(int(request.query_params.get('page_size', 500)), 5000)
+            if page_size < 1:
+                raise ValueError
+            results, next_cursor = GeneralLedgerService.page(details, request.query_params.get('cursor'), page_size)
+        except ValueError:
+            return Response({"error": "Invalid cursor or page_size"}, status=400)
+
+        return Response({
+            'results': results,
+            'next_cursor': next_cursor,
+            'page_size': page_size,
+        })
 
 class CommissionViewSet(viewsets.ModelViewSet):
     module_name = 'Finance'
@@ -136,7 +142,8 @@ class FinancialReportViewSet(viewsets.ViewSet):
         start, end = self._get_dates(request)
         
         # Get Income and Expense accounts
-        accounts = Account.objects.filter(category__in=['INCOME', 'EXPENSE']).select_related('group')
+        accounts = Account.objects.filter(category__in=['INCOME', 'EXPENSE'])
+        totals = LedgerService.account_totals(start, end, accounts=accounts)
         
         report_data = {
             'income': [],
@@ -147,15 +154,7 @@ class FinancialReportViewSet(viewsets.ViewSet):
         }
 
         for acc in accounts:
-            # Sum VoucherDetails for this account in range
-            details = VoucherDetail.objects.filter(
-                account=acc,
-                voucher__date__range=[start, end],
-                voucher__status='POSTED'
-            ).aggregate(debit=Sum('debit'), credit=Sum('credit'))
-
-            debit = details['debit'] or 0
-            credit = details['credit'] or 0
+            debit, credit = LedgerService.totals_for(totals, acc)
             
             # Income = Credit - Debit, Expense = Debit - Credit
             balance = (credit - debit) if acc.category == 'INCOME' else (debit - credit)
@@ -166,7 +165,7 @@ class FinancialReportViewSet(viewsets.ViewSet):
                 'id': acc.id,
                 'code': acc.code,
                 'name': acc.name,
-                'group': acc.group.name if acc.group else 'Uncategorized',
+                'group': 'Uncategorized',  # Account has no group relation yet
                 'balance': float(balance)
             }
 
@@ -184,7 +183,9 @@ class FinancialReportViewSet(viewsets.ViewSet):
     def balance_sheet(self, request):
         start, end = self._get_dates(request)
         
-        accounts = Account.objects.filter(category__in=['ASSET', 'LIABILITY', 'EQUITY']).select_related('group')
+        accounts = Account.objects.filter(category__in=['ASSET', 'LIABILITY', 'EQUITY'])
+        # For Balance Sheet, we usually want the cumulative balance up to 'end' date
+        totals = LedgerService.account_totals(end=end, accounts=accounts)
         
         report_data = {
             'assets': [],
@@ -196,15 +197,7 @@ class FinancialReportViewSet(viewsets.ViewSet):
         }
 
         for acc in accounts:
-            # For Balance Sheet, we usually want the cumulative balance up to 'end' date
-            details = VoucherDetail.objects.filter(
-                account=acc,
-                voucher__date__lte=end,
-                voucher__status='POSTED'
-            ).aggregate(debit=Sum('debit'), credit=Sum('credit'))
-
-            debit = details['debit'] or 0
-            credit = details['credit'] or 0
+            debit, credit = LedgerService.totals_for(totals, acc)
             
             # Asset = Debit - Credit, Liability/Equity = Credit - Debit
             balance = (debit - credit) if acc.category == 'ASSET' else (credit - debit)
@@ -215,7 +208,7 @@ class FinancialReportViewSet(viewsets.ViewSet):
                 'id': acc.id,
                 'code': acc.code,
                 'name': acc.name,
-                'group': acc.group.name if acc.group else 'Uncategorized',
+                'group': 'Uncategorized',  # Account has no group relation yet
                 'balance': float(balance)
             }
 
@@ -235,20 +228,14 @@ class FinancialReportViewSet(viewsets.ViewSet):
     def trial_balance(self, request):
         start, end = self._get_dates(request)
         accounts = Account.objects.all().order_by('code')
+        totals = LedgerService.account_totals(end=end)
         
         report_data = []
         total_debit = 0
         total_credit = 0
 
         for acc in accounts:
-            details = VoucherDetail.objects.filter(
-                account=acc,
-                voucher__date__lte=end,
-                voucher__status='POSTED'
-            ).aggregate(debit=Sum('debit'), credit=Sum('credit'))
-
-            debit = details['debit'] or 0
-            credit = details['credit'] or 0
+            debit, credit = LedgerService.totals_for(totals, acc)
             
             if debit == 0 and credit == 0: continue
 
@@ -276,6 +263,7 @@ class FinancialReportViewSet(viewsets.ViewSet):
         
         # Identify VAT accounts (usually Input VAT and Output VAT)
         vat_accounts = Account.objects.filter(name__icontains='VAT')
+        totals = LedgerService.account_totals(start, end, accounts=vat_accounts)
         
         report_data = {
             'input_vat': [], # Debit balance (Purchases)
@@ -286,14 +274,9 @@ class FinancialReportViewSet(viewsets.ViewSet):
         }
 
         for acc in vat_accounts:
-            details = VoucherDetail.objects.filter(
-                account=acc,
-                voucher__date__range=[start, end],
-                voucher__status='POSTED'
-            ).aggregate(debit=Sum('debit'), credit=Sum('credit'))
-
-            debit = float(details['debit'] or 0)
-            credit = float(details['credit'] or 0)
+            debit, credit = LedgerService.totals_for(totals, acc)
+            debit = float(debit)
+            credit = float(credit)
             
             if debit == 0 and credit == 0: continue
 
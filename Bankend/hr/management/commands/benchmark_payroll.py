@@ -0,0 +1,163 @@
+"""
+Benchmark the bulk payroll engine against the per-employee calculation on
+synthetic data. Everything runs inside a transaction that is rolled back.
+
+Usage:
+    python manage.py benchmark_payroll                      # 500 and 5,000 employees
+    python manage.py benchmark_payroll --employees 200 --skip-legacy
+"""
+import random
+import time
+from datetime import timedelta
+from decimal import Decimal
+
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Sum
+
+from attendance.models import Attendance
+from attendance.services import AttendanceRollupService
+from hr.models import Bonus, Employee, EmployeeDeduction, SalarySlip
+from hr.services import PayrollService
+
+COMPARED_FIELDS = ['bonuses', 'deductions', 'overtime_hours', 'overtime_amount',
+                   'total_additions', 'total_deductions', 'net_salary']
+
+
+class _Rollback(Exception):
+    pass
+
+
+def legacy_payroll_cycle(month_str):
+    """The original per-employee loop, kept as the benchmark baseline."""
+    from finance.models import Commission
+
+    start, end = PayrollService.month_bounds(month_str)
+    with transaction.atomic():
+        for emp in Employee.objects.filter(is_active=True):
+            in_month = {'employee': emp, 'date__gte': start, 'date__lt': end}
+            bonus_total = Bonus.objects.filter(**in_month).aggregate(total=Sum('amount'))['total'] or Decimal('0.00')
+            deduction_total = EmployeeDeduction.objects.filter(**in_month).aggregate(total=Sum('amount'))['total'] or Decimal('0.00')
+            commission_total = Commission.objects.filter(
+                status='ACCRUED', **in_month
+            ).aggregate(total=Sum('amount'))['total'] or Decimal('0.00')
+            slip, _ = SalarySlip.objects.update_or_create(
+                employee=emp,
+                month=month_str,
+                defaults={
+                    'basic_salary': emp.basic_salary,
+                    'allowances': emp.housing_allowance + emp.transport_allowance,
+                    'bonuses': bonus_total,
+                    'deductions': deduction_total,
+                    'commissions_earned': commission_total,
+                    'payment_status': 'PENDING',
+                },
+            )
+            # Summed from the raw rows, as calculate_salary() did before the AttendanceMonth
+            # roll-up, so comparisons pin the roll-up to the source records
+            hours = Attendance.objects.filter(employee=emp, date__gte=start, date__lt=end).aggregate(
+                total_logged=Sum('total_hours'), total_ot=Sum('overtime_hours'),
+            )
+            slip.apply_attendance_totals(hours['total_logged'], hours['total_ot'])
+            slip.save()
+
+
+class Command(BaseCommand):
+    help = 'Time bulk payroll generation at several headcounts (rolled back afterwards)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--employees', type=int, nargs='+', default=[500, 5000])
+        parser.add_argument('--month', default='2025-01')
+        parser.add_argument('--skip-legacy', action='store_true',
+                            help='Only time the bulk engine (the per-employee loop is slow at 5,000)')
+
+    def handle(self, *args, **options):
+        for size in options['employees']:
+            try:
+                with transaction.atomic():
+                    self.bench(size, options['month'], options['skip_legacy'])
+                    raise _Rollback
+            except _Rollback:
+                pass
+
+    def seed(self, size, month_str):
+        rng = random.Random(size)
+        start, _ = PayrollService.month_bounds(month_str)
+        users = User.objects.bulk_create(
+            [User(username=f'payroll-bench-{size}-{i}') for i in range(size)], batch_size=1000
+        )
+        employees = Employee.objects.bulk_create([
+            Employee(
+                user=user, employee_id=f'PB{size}-{i}', pin_code=f'{i:06d}', role='Technician',
+                date_joined=start, salary_type=rng.choice(['MONTHLY', 'MONTHLY', 'DAILY', 'HOURLY']),
+                basic_salary=Decimal(rng.randint(1500, 9000)), housing_allowance=Decimal(rng.randint(0, 1500)),
+                transport_allowance=Decimal(rng.randint(0, 500)),
+            )
+            for i, user in enumerate(users)
+        ], batch_size=1000)
+
+        # Attendance.date is auto_now_add, so each day is inserted (dated today) and then moved
+        for day in range(22):
+            rows = []
+            for emp in employees:
+                hours = Decimal(rng.choice(['8.00', '10.00', '11.50', '12.25']))
+                rows.append(Attendance(employee=emp, total_hours=hours, overtime_hours=max(hours - 10, Decimal('0.00'))))
+            Attendance.objects.bulk_create(rows, batch_size=2000)
+            Attendance.objects.filter(pk__in=[row.pk for row in rows]).update(date=start + timedelta(days=day))
+        # bulk_create/update() bypass the AttendanceMonth roll-up payroll reads
+        AttendanceRollupService.rebuild()
+
+        bonuses, deductions = [], []
+        for emp in employees:
+            if rng.random() < 0.3:
+                bonuses.append(Bonus(employee=emp, amount=Decimal(rng.randint(50, 500)), date=start, reason='bench'))
+            if rng.random() < 0.2:
+                deductions.append(EmployeeDeduction(
+                    employee=emp, deduction_type='Advance', amount=Decimal(rng.randint(20, 300)), date=start, reason='bench'
+                ))
+        Bonus.objects.bulk_create(bonuses)
+        EmployeeDeduction.objects.bulk_create(deductions)
+
+    def timed(self, fn):
+        queries = []
+
+        def count(execute, sql, params, many, context):
+            queries.append(1)
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(count):
+            started = time.perf_counter()
+            fn()
+            elapsed = time.perf_counter() - started
+        return elapsed, len(queries)
+
+    def snapshot(self, month_str):
+        return {
+            row[0]: row[1:] for row in
+            SalarySlip.objects.filter(month=month_str).values_list('employee_id', *COMPARED_FIELDS)
+        }
+
+    def bench(self, size, month_str, skip_legacy):
+        self.stdout.write(f'Seeding {size} employees...')
+        self.seed(size, month_str)
+        results = []
+
+        if not skip_legacy:
+            results.append(('per-employee loop', *self.timed(lambda: legacy_payroll_cycle(month_str))))
+            legacy = self.snapshot(month_str)
+            SalarySlip.objects.filter(month=month_str).delete()
+
+        results.append(('bulk engine (create)', *self.timed(lambda: PayrollService.run(month_str))))
+        results.append(('bulk engine (refresh)', *self.timed(lambda: PayrollService.run(month_str))))
+        results.append(('bulk engine (dry run)', *self.timed(lambda: PayrollService.run(month_str, dry_run=True))))
+
+        for label, elapsed, queries in results:
+            self.stdout.write(f'  {size:>6} employees  {label:<24} {elapsed:8.3f}s  {queries:>7} queries')
+
+        if not skip_legacy:
+            bulk = self.snapshot(month_str)
+            if bulk != legacy:
+                mismatched = [emp for emp in legacy if legacy[emp] != bulk.get(emp)]
+                raise CommandError(f'{len(mismatched)} slips differ from the per-employee calculation.')
+            self.stdout.write(self.style.SUCCESS(f'✅ {size} slips identical to the per-employee calculation.'))
@@ -1,8 +1,10 @@
+from datetime import date
 from django.db import models
 from django.utils import timezone
 from django.db.models.functions import Now
 from django.contrib.auth.models import User
 from locations.models import Branch
+from core.models import TrackedFieldsMixin
 
 class MaritalStatus(models.Model):
     name = models.CharField(max_length=50, unique=True)
@@ -44,7 +46,10 @@ class Company(models.Model):
 #     def __str__(self):
 #         return self.name
 
-class Employee(models.Model):
+class Employee(TrackedFieldsMixin, models.Model):
+    # user: caches keyed by user (attendance's user -> employee mapping) drop the old user's entry too
+    tracked_fields = ('user',)
+
     user = models.OneToOneField(User, on_delete=models.CASCADE, related_name='hr_profile')
     employee_id = models.CharField(max_length=20, unique=True)
     company = models.ForeignKey(Company, on_delete=models.SET_NULL, null=True, blank=True, related_name='employees')
@@ -228,7 +233,9 @@ class ModulePermission(models.Model):
 
     def __str__(self):
         return f'{self.employee.full_name} - {self.module_name}'
-class SalarySlip(models.Model):
+class SalarySlip(TrackedFieldsMixin, models.Model):
+    tracked_fields = ('payment_status',)
+
     employee = models.ForeignKey(Employee, on_delete=models.CASCADE, related_name='salary_slips')
     month = models.CharField(max_length=7, help_text="Format: YYYY-MM")
     basic_salary = models.DecimalField(max_digits=10, decimal_places=2)
@@ -252,23 +259,26 @@ class SalarySlip(models.Model):
     is_sent = models.BooleanField(default=False)
 
     def calculate_salary(self):
-        from attendance.models import Attendance
-        from django.db.models import Sum
+        from attendance.models import AttendanceMonth
         
-        # 1. Fetch Attendance for the Month
-        attendance_qs = Attendance.objects.filter(
-            employee=self.employee, 
-            date__month=int(self.month.split('-')[1]),
-            date__year=int(self.month.split('-')[0])
-        )
+        # 1. The month's attendance totals (maintained incrementally by Attendance.save)
+        year, month = int(self.month.split('-')[0]), int(self.month.split('-')[1])
+        totals = AttendanceMonth.objects.filter(
+            employee=self.employee, period=date(year, month, 1)
+        ).values('total_hours', 'overtime_hours').first() or {}
         
         # 2. Aggregates
-        agg = attendance_qs.aggregate(
-            total_logged=Sum('total_hours'),
-            total_ot=Sum('overtime_hours')
-        )
-        total_hours = float(agg['total_logged'] or 0)
-        total_ot = float(agg['total_ot'] or 0)
+        self.apply_attendance_totals(totals.get('total_hours'), totals.get('overtime_hours'))
+        self.save()
+
+    def apply_attendance_totals(self, total_logged, total_ot):
+        """
+        Computes overtime, totals and net salary from the month's attendance sums.
+        Shared by calculate_salary() and the bulk payroll engine so both produce
+        identical figures. Does not save.
+        """
+        total_hours = float(total_logged or 0)
+        total_ot = float(total_ot or 0)
         
         # 3. Rate Logic
         if self.employee.salary_type == 'DAILY' or self.employee.salary_type == 'HOURLY':
@@ -298,7 +308,6 @@ class SalarySlip(models.Model):
         self.total_deductions = deductions_total
         
         self.net_salary = earnings - deductions_total
-        self.save()
 
     def save(self, *args, **kwargs):
         if not self.net_salary:
@@ -306,8 +315,7 @@ class SalarySlip(models.Model):
         
         # Detect status change to PAID
         if self.pk:
-            old_instance = SalarySlip.objects.get(pk=self.pk)
-            if old_instance.payment_status != 'PAID' and self.payment_status == 'PAID':
+            if self.previous('payment_status') != 'PAID' and self.payment_status == 'PAID':
                 self.record_expense_transaction()
         elif self.payment_status == 'PAID':
             super().save(*args, **kwargs)
@@ -1,68 +1,148 @@
 from datetime import date
 from django.db import transaction
+from django.db.models import F
 from django.utils import timezone
 from decimal import Decimal
 from .models import Employee, Payroll, SalarySlip, HRAttendance
 
-class HRService:
+class PayrollService:
+    """
+    Set-based payroll: every per-employee input for the month is read with one
+    grouped query (attendance from the AttendanceMonth roll-up), slips are computed in memory with SalarySlip.apply_attendance_totals
+    (the same formulas as calculate_salary) and written with bulk_create/bulk_update.
+    """
+    SLIP_FIELDS = [
+        'basic_salary', 'allowances', 'bonuses', 'deductions', 'commissions_earned',
+        'payment_status', 'overtime_hours', 'overtime_amount', 'total_additions',
+        'total_deductions', 'net_salary',
+    ]
+    BATCH_SIZE = 500
+
     @staticmethod
-    def generate_payroll_cycle(month_str=None):
-        """
-        Logic to calculate and generate SalarySlips for all active employees.
-        month_str format: 'YYYY-MM'
-        """
+    def month_bounds(month_str):
+        year, month = int(month_str.split('-')[0]), int(month_str.split('-')[1])
+        start = date(year, month, 1)
+        end = date(year + 1, 1, 1) if month == 12 else date(year, month + 1, 1)
+        return start, end
+
+    @staticmethod
+    def _grouped_sums(queryset, **sums):
+        """{employee_id: {name: total}} from one GROUP BY employee_id query."""
         from django.db.models import Sum
+        rows = queryset.order_by().values('employee_id').annotate(
+            **{name: Sum(field) for name, field in sums.items()}
+        )
+        return {row.pop('employee_id'): row for row in rows}
+
+    @staticmethod
+    def collect_inputs(month_str):
+        """Bonus, deduction, commission and attendance totals for the month, keyed by employee id."""
+        from attendance.models import AttendanceMonth
         from finance.models import Commission
         from .models import Bonus, EmployeeDeduction
 
-        today = timezone.now().date()
-        if not month_str:
-            month_str = today.strftime('%Y-%m-%d')[:7]
-        
-        month_date = date(int(month_str.split('-')[0]), int(month_str.split('-')[1]), 1)
-        employees = Employee.objects.filter(is_active=True)
-        processed_count = 0
+        start, end = PayrollService.month_bounds(month_str)
+        in_month = {'date__gte': start, 'date__lt': end}
+        return {
+            'bonuses': PayrollService._grouped_sums(Bonus.objects.filter(**in_month), total='amount'),
+            'deductions': PayrollService._grouped_sums(EmployeeDeduction.objects.filter(**in_month), total='amount'),
+            'commissions': PayrollService._grouped_sums(
+                Commission.objects.filter(status='ACCRUED', **in_month), total='amount'
+            ),
+            # Already one row per employee: the roll-up Attendance.save maintains
+            'attendance': {
+                row.pop('employee_id'): row for row in AttendanceMonth.objects.filter(period=start).values(
+                    'employee_id', total_logged=F('total_hours'), total_ot=F('overtime_hours'),
+                )
+            },
+        }
+
+    @staticmethod
+    def build_slips(month_str, employees, inputs, existing):
+        """
+        Returns (to_create, to_update) SalarySlip instances with all figures computed.
+        `existing` maps employee_id to that employee's current slip for the month.
+        """
+        zero = Decimal('0.00')
+        no_attendance = {'total_logged': None, 'total_ot': None}
+        to_create, to_update = [], []
+
+        for emp in employees:
+            slip = existing.get(emp.pk)
+            if slip is None:
+                slip = SalarySlip(employee=emp, month=month_str)
+                to_create.append(slip)
+            else:
+                slip.employee = emp
+                to_update.append(slip)
+
+            slip.basic_salary = emp.basic_salary
+            slip.allowances = emp.housing_allowance + emp.transport_allowance
+            slip.bonuses = inputs['bonuses'].get(emp.pk, {}).get('total') or zero
+            slip.deductions = inputs['deductions'].get(emp.pk, {}).get('total') or zero
+            slip.commissions_earned = inputs['commissions'].get(emp.pk, {}).get('total') or zero
+            slip.payment_status = 'PENDING'
 
+            attendance = inputs['attendance'].get(emp.pk, no_attendance)
+            slip.apply_attendance_totals(attendance['total_logged'], attendance['total_ot'])
+            # Mirrors the fallback in SalarySlip.save(), which bulk writes bypass
+            if not slip.net_salary:
+                slip.net_salary = (float(slip.basic_salary) + float(slip.allowances)) - float(slip.deductions)
+
+        return to_create, to_update
+
+    @staticmethod
+    def run(month_str, dry_run=False):
+        """
+        Generates or refreshes the month's SalarySlips for all active employees.
+        With dry_run=True nothing is written; the computed slips are returned either way.
+        """
         with transaction.atomic():
-            for emp in employees:
-                # 1. Aggregate Bonuses for the month
-                bonus_total = Bonus.objects.filter(
-                    employee=emp, 
-                    date__month=month_date.month, 
-                    date__year=month_date.year
-                ).aggregate(total=Sum('amount'))['total'] or Decimal('0.00')
-
-                # 2. Aggregate Deductions for the month
-                deduction_total = EmployeeDeduction.objects.filter(
-                    employee=emp, 
-                    date__month=month_date.month, 
-                    date__year=month_date.year
-                ).aggregate(total=Sum('amount'))['total'] or Decimal('0.00')
-
-                # 3. Aggregate Commissions for the month
-                commission_total = Commission.objects.filter(
-                    employee=emp,
-                    date__month=month_date.month,
-                    date__year=month_date.year,
-                    status='ACCRUED' # Only process unpaid commissions
-                ).aggregate(total=Sum('amount'))['total'] or Decimal('0.00')
-
-                # 4. Create or Update SalarySlip
-                slip, created = SalarySlip.objects.update_or_create(
-                    employee=emp,
-                    month=month_str,
-                    defaults={
-                        'basic_salary': emp.basic_salary,
-                        'allowances': emp.housing_allowance + emp.transport_allowance,
-                        'bonuses': bonus_total,
-                        'deductions': deduction_total,
-                        'commissions_earned': commission_total,
-                        'payment_status': 'PENDING'
-                    }
+            employees = list(Employee.objects.filter(is_active=True).select_related('user').order_by('pk'))
+            inputs = PayrollService.collect_inputs(month_str)
+
+            existing_qs = SalarySlip.objects.filter(month=month_str, employee__is_active=True).order_by('pk')
+            if not dry_run:
+                existing_qs = existing_qs.select_for_update()
+            existing = {}
+            for slip in existing_qs:
+                if slip.employee_id in existing:
+                    raise SalarySlip.MultipleObjectsReturned(
+                        f"Employee {slip.employee_id} has more than one salary slip for {month_str}."
+                    )
+                existing[slip.employee_id] = slip
+
+            to_create, to_update = PayrollService.build_slips(month_str, employees, inputs, existing)
+            if not dry_run:
+                SalarySlip.objects.bulk_create(to_create, batch_size=PayrollService.BATCH_SIZE)
+                SalarySlip.objects.bulk_update(
+                    to_update, PayrollService.SLIP_FIELDS, batch_size=PayrollService.BATCH_SIZE
                 )
+        return to_create + to_update
+
+    @staticmethod
+    def preview(slips):
+        return [
+            {
+                'employee': slip.employee_id,
+                'employee_name': slip.employee.full_name,
+                'month': slip.month,
+                'is_new': slip.pk is None,
+                **{field: round(float(getattr(slip, field)), 2) for field in PayrollService.SLIP_FIELDS
+                   if field != 'payment_status'},
+            }
+            for slip in slips
+        ]
 
-                # 5. Trigger Internal Calculation (Attendance based)
-                slip.calculate_salary()
-                processed_count += 1
-                
-        return processed_count
+
+class HRService:
+    @staticmethod
+    def generate_payroll_cycle(month_str=None, dry_run=False):
+        """
+        Logic to calculate and generate SalarySlips for all active employees.
+        month_str format: 'YYYY-MM'
+        Returns the number of slips processed (see PayrollService.run for the slips).
+        """
+        if not month_str:
+            month_str = timezone.now().date().strftime('%Y-%m-%d')[:7]
+        return len(PayrollService.run(month_str, dry_run=dry_run))
@@ -1,3 +1,131 @@
+import os
+from datetime import date, timedelta
+from decimal import Decimal
+from io import StringIO
+from unittest import skipUnless
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import connection
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from attendance.models import Attendance
+from attendance.services import AttendanceRollupService
+from finance.models import Commission
+from job_cards.models import JobCard
+from .management.commands.benchmark_payroll import COMPARED_FIELDS, legacy_payroll_cycle
+from .models import Bonus, Employee, EmployeeDeduction, SalarySlip
+from .services import PayrollService
+
+MONTH = '2025-03'
+
+
+class PayrollFixtureMixin:
+    def make_employee(self, n, salary_type='MONTHLY', basic='6000.00', active=True):
+        user = User.objects.create_user(f'payroll-{n}')
+        return Employee.objects.create(
+            user=user, employee_id=f'P-{n}', pin_code=f'{n:06d}', role='Technician',
+            date_joined=date(2024, 1, 1), salary_type=salary_type, basic_salary=Decimal(basic),
+            housing_allowance=Decimal('1000.00'), transport_allowance=Decimal('333.33'), is_active=active,
+        )
+
+    def add_attendance(self, emp, day, hours, overtime):
+        row = Attendance.objects.create(employee=emp, total_hours=Decimal(hours), overtime_hours=Decimal(overtime))
+        # date is auto_now_add; moving it with update() bypasses the roll-up, so recompute it
+        Attendance.objects.filter(pk=row.pk).update(date=day)
+        AttendanceRollupService.rebuild()
+
+    def make_payroll_data(self, count):
+        start = date(2025, 3, 1)
+        job = JobCard.objects.create(job_card_number='JC-PAY', date=start, customer_name='C', phone='1')
+        types = ['MONTHLY', 'DAILY', 'HOURLY']
+        self.employees = []
+        for n in range(count):
+            emp = self.make_employee(n, types[n % 3], basic=f'{2000 + n * 137}.45')
+            self.employees.append(emp)
+            for day in range(n % 4 + 1):
+                self.add_attendance(emp, start + timedelta(days=day), f'{9 + day}.75', f'{day * 0.5:.2f}')
+            # Outside the month: must be ignored
+            self.add_attendance(emp, date(2025, 2, 28), '10.00', '3.00')
+            if n % 2:
+                Bonus.objects.create(employee=emp, amount=Decimal('150.10'), date=start, reason='Target')
+                Bonus.objects.create(employee=emp, amount=Decimal('49.95'), date=date(2025, 3, 31), reason='Target')
+            if n % 3 == 0:
+                EmployeeDeduction.objects.create(
+                    employee=emp, deduction_type='Advance', amount=Decimal('75.50'), date=start, reason='Advance'
+                )
+            Commission.objects.bulk_create([
+                Commission(employee=emp, job_card=job, amount=Decimal('12.34')),
+                Commission(employee=emp, job_card=job, amount=Decimal('99.00'), status='PAID'),
+            ])
+        Commission.objects.update(date=start)
+        self.make_employee(999, active=False)
+
+
+class PayrollEngineTests(PayrollFixtureMixin, TestCase):
+    def setUp(self):
+        self.make_payroll_data(7)
+
+    def snapshot(self):
+        return {
+            row[0]: row[1:] for row in
+            SalarySlip.objects.filter(month=MONTH).values_list('employee_id', 'payment_status', *COMPARED_FIELDS)
+        }
+
+    def test_creates_slips_identical_to_per_employee_calculation(self):
+        legacy_payroll_cycle(MONTH)
+        expected = self.snapshot()
+        SalarySlip.objects.all().delete()
+
+        PayrollService.run(MONTH)
+        self.assertEqual(self.snapshot(), expected)
+        self.assertEqual(len(expected), len(self.employees))
+
+    def test_refreshes_existing_slips_identically(self):
+        PayrollService.run(MONTH)
+        # Existing slips keep their late deductions and lose any PAID status, as before
+        SalarySlip.objects.filter(employee=self.employees[0]).update(late_deductions=Decimal('40.00'), payment_status='PAID')
+        Bonus.objects.create(employee=self.employees[0], amount=Decimal('10.00'), date=date(2025, 3, 5), reason='Late')
+
+        legacy_payroll_cycle(MONTH)
+        expected = self.snapshot()
+        SalarySlip.objects.filter(employee=self.employees[0]).update(net_salary=0, total_deductions=0)
+
+        PayrollService.run(MONTH)
+        self.assertEqual(self.snapshot(), expected)
+        self.assertEqual(SalarySlip.objects.filter(month=MONTH).count(), len(self.employees))
+
+    def test_dry_run_writes_nothing(self):
+        slips = PayrollService.run(MONTH, dry_run=True)
+        self.assertEqual(len(slips), len(self.employees))
+        self.assertFalse(SalarySlip.objects.exists())
+
+        preview = PayrollService.preview(slips)
+        PayrollService.run(MONTH)
+        stored = {s.employee_id: s for s in SalarySlip.objects.filter(month=MONTH)}
+        for row in preview:
+            self.assertTrue(row['is_new'])
+            self.assertAlmostEqual(row['net_salary'], float(stored[row['employee']].net_salary), places=2)
+
+    def test_query_count_is_independent_of_headcount(self):
+        with CaptureQueriesContext(connection) as small:
+            PayrollService.run(MONTH)
+
+        SalarySlip.objects.all().delete()
+        for n in range(7, 40):
+            emp = self.make_employee(n)
+            self.add_attendance(emp, date(2025, 3, 2), '8.00', '0.00')
+        with CaptureQueriesContext(connection) as large:
+            PayrollService.run(MONTH)
+
+        self.assertEqual(len(small.captured_queries), len(large.captured_queries))
+
 
-# Create your tests here.
+@skipUnless(os.environ.get('RUN_BENCHMARKS'), 'set RUN_BENCHMARKS=1 to run the payroll benchmark')
+class PayrollBenchmarkTests(TestCase):
+    def test_benchmark_at_500_and_5000_employees(self):
+        out = StringIO()
+        call_command('benchmark_payroll', '--employees', '500', '5000', stdout=out)
+        self.assertIn('500 slips identical', out.getvalue())
+        self.assertIn('5000 slips identical', out.getvalue())
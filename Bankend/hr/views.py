@@ -16,7 +16,8 @@ from .serializers import (
     SalarySlipSerializer, EmployeeDocumentSerializer, WarningLetterSerializer, NotificationSerializer,
     BonusSerializer
 )
-from .services import HRService
+from .services import HRService, PayrollService
+from attendance.services import ClockService
 from .services_performance import PerformanceService
 
 class PerformanceViewSet(viewsets.ViewSet):
@@ -177,8 +178,17 @@ class PayrollViewSet(viewsets.ModelViewSet):
 
     @action(detail=False, methods=['post'])
     def generate_payroll_cycle(self, request):
-        month = request.data.get('month')
+        month = request.data.get('month') or timezone.now().date().strftime('%Y-%m')
+        dry_run = str(request.data.get('dry_run', '')).lower() in ('1', 'true', 'yes')
         try:
+            if dry_run:
+                slips = PayrollService.run(month, dry_run=True)
+                return Response({
+                    "dry_run": True,
+                    "month": month,
+                    "processed": len(slips),
+                    "slips": PayrollService.preview(slips),
+                })
             processed_count = HRService.generate_payroll_cycle(month)
             return Response({
                 "message": f"Successfully processed payroll for {processed_count} employees.",
@@ -211,9 +221,8 @@ class HRAttendanceViewSet(viewsets.ModelViewSet):
         if not request.user.is_authenticated:
             return Response({"error": "Auth required"}, status=status.HTTP_401_UNAUTHORIZED)
 
-        try:
-            employee = request.user.hr_profile
-        except Employee.DoesNotExist:
+        employee_id = ClockService.employee_id_for(request.user)
+        if employee_id is None:
             return Response(
                 {"error": "No employee profile found for this user. Please contact HR."},
                 status=status.HTTP_400_BAD_REQUEST
@@ -221,7 +230,7 @@ class HRAttendanceViewSet(viewsets.ModelViewSet):
 
         today = timezone.now().date()
         attendance, created = HRAttendance.objects.get_or_create(
-            employee=employee,
+            employee_id=employee_id,
             date=today,
             defaults={'clock_in': timezone.now().time()}
         )
@@ -239,9 +248,8 @@ class HRAttendanceViewSet(viewsets.ModelViewSet):
         if not request.user.is_authenticated:
             return Response({"error": "Auth required"}, status=status.HTTP_401_UNAUTHORIZED)
 
-        try:
-            employee = request.user.hr_profile
-        except Employee.DoesNotExist:
+        employee_id = ClockService.employee_id_for(request.user)
+        if employee_id is None:
             return Response(
                 {"error": "No employee profile found for this user. Please contact HR."},
                 status=status.HTTP_400_BAD_REQUEST
@@ -249,7 +257,7 @@ class HRAttendanceViewSet(viewsets.ModelViewSet):
 
         today = timezone.now().date()
         try:
-            attendance = HRAttendance.objects.get(employee=employee, date=today)
+            attendance = HRAttendance.objects.get(employee_id=employee_id, date=today)
 
             if attendance.clock_out:
                 return Response(
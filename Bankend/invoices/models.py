@@ -1,8 +1,11 @@
 from django.db import models
 from job_cards.models import JobCard
 from locations.models import Branch
+from core.models import TrackedFieldsMixin
+
+class Invoice(TrackedFieldsMixin, models.Model):
+    tracked_fields = ('payment_status',)
 
-class Invoice(models.Model):
     ORDER_STATUS_CHOICES = [
         ('PAID', 'Paid'),
         ('PENDING', 'Pending'),
@@ -75,8 +78,7 @@ class Invoice(models.Model):
         
         # Detect payment status change to PAID for revenue recording
         if self.pk:
-            old_instance = Invoice.objects.get(pk=self.pk)
-            if old_instance.payment_status != 'PAID' and self.payment_status == 'PAID':
+            if self.previous('payment_status') != 'PAID' and self.payment_status == 'PAID':
                 self.record_revenue_transaction()
             self.update_workshop_diary()
         elif self.payment_status == 'PAID':
@@ -1,8 +1,7 @@
 from django.db.models.signals import post_save
 from django.dispatch import receiver
 from .models import Invoice
-from notifications.models import NotificationLog
-from notifications.tasks import send_whatsapp_message, send_sms_message
+from notifications.outbox import enqueue
 import logging
 
 logger = logging.getLogger(__name__)
@@ -30,16 +29,7 @@ def notify_invoice_generation(sender, instance, created, **kwargs):
                 f"View your portal at https://srv1306978.hstgr.cloud/portal for details!"
             )
             
-            # 1. Create Notification Log
-            whatsapp_log = NotificationLog.objects.create(
-                recipient=phone,
-                notification_type='WHATSAPP',
-                message=message,
-                content_object=instance
-            )
-            # 2. Queue the task
-            send_whatsapp_message.delay(whatsapp_log.id)
-            
+            enqueue(instance, 'created', phone, message)
             logger.info(f"Queued WhatsApp notification for Invoice {invoice_number}")
         else:
             logger.warning(f"No phone number linked to Invoice {invoice_number}, skipping notification.")
@@ -0,0 +1,99 @@
+"""
+Real-time job board.
+
+When a job card is created, deleted, or changes status, bay, booth or
+technician, a compact delta is stored as a JobBoardEvent after the
+transaction commits and fanned out to the Channels groups of its branch and
+of the all-branches board (dashboard.consumers.JobBoardConsumer):
+
+    {"type": "job", "seq": 812, "job": {"id": 5, "number": "JC-5", "branch": 2,
+     "status": "IN_PROGRESS", "bay": "Bay 3", "booth": 1, "technician": 7,
+     "deleted": false}}
+
+seq is the event id. On connect the server sends {"type": "hello", "seq":
+<latest>}, after which a fresh client loads the job list. A reconnecting
+client sends {"action": "resume", "seq": <last seen>} and gets every later
+event of its board replayed, or {"type": "reset"} when the gap is too large
+(or pruned) and it should reload the list. Live events can overlap the
+replay, so clients skip any seq they have already applied.
+"""
+import logging
+from datetime import timedelta
+
+from asgiref.sync import async_to_sync
+from channels.layers import get_channel_layer
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from .models import JobBoardEvent
+
+logger = logging.getLogger(__name__)
+
+BOARD_FIELDS = ('status', 'assigned_bay', 'current_booth', 'assigned_technician')
+
+
+def group_name(branch_id=None):
+    return f'jobs_branch_{branch_id}' if branch_id else 'jobs_all'
+
+
+def delta(job, deleted=False):
+    return {
+        'id': job.pk,
+        'number': job.job_card_number,
+        'branch': job.branch_id,
+        'status': job.status,
+        'bay': job.assigned_bay,
+        'booth': job.current_booth_id,
+        'technician': job.assigned_technician_id,
+        'deleted': deleted,
+    }
+
+
+def event_message(event):
+    return {'type': 'job', 'seq': event.pk, 'job': event.payload}
+
+
+def job_changed(job, created=False, deleted=False):
+    """Publishes the job's delta once the current transaction commits (post_save/post_delete hook)."""
+    if not (created or deleted or any(job.has_changed(field) for field in BOARD_FIELDS)):
+        return
+    payload = delta(job, deleted)
+    transaction.on_commit(lambda: publish(payload))
+
+
+def publish(payload):
+    try:
+        event = JobBoardEvent.objects.create(branch_id=payload['branch'], job_card_id=payload['id'], payload=payload)
+        layer = get_channel_layer()
+        message = {'type': 'job.event', 'event': event_message(event)}
+        groups = {group_name(), group_name(payload['branch'])}
+        for group in groups:
+            async_to_sync(layer.group_send)(group, message)
+    except Exception as e:
+        # The change is committed; a client that misses this event catches up on resume
+        logger.error(f"Job board publish failed for job card {payload['id']}: {e}")
+
+
+def latest_seq():
+    return JobBoardEvent.objects.order_by('-pk').values_list('pk', flat=True).first() or 0
+
+
+def replay(branch_id, seq):
+    """Events after `seq` for the board, or None when the client should reload instead."""
+    limit = getattr(settings, 'JOB_BOARD_REPLAY_LIMIT', 500)
+    events = JobBoardEvent.objects.filter(pk__gt=seq).order_by('pk')
+    if branch_id:
+        events = events.filter(branch_id=branch_id)
+    oldest = JobBoardEvent.objects.order_by('pk').values_list('pk', flat=True).first()
+    if oldest is not None and seq < oldest - 1:
+        return None  # pruned events may have been missed
+    events = list(events[:limit + 1])
+    if len(events) > limit:
+        return None
+    return [event_message(event) for event in events]
+
+
+def prune_events():
+    hours = getattr(settings, 'JOB_BOARD_EVENT_TTL_HOURS', 24)
+    return JobBoardEvent.objects.filter(created_at__lt=timezone.now() - timedelta(hours=hours)).delete()[0]
@@ -3,8 +3,12 @@ from customers.models import Customer
 from locations.models import Branch
 from decimal import Decimal
 import uuid
+from core.models import NoAudit, TrackedFieldsMixin
+
+class JobCard(TrackedFieldsMixin, models.Model):
+    # Job board fields (job_cards.board) are tracked so unrelated saves publish nothing
+    tracked_fields = ('status', 'assigned_bay', 'current_booth', 'assigned_technician')
 
-class JobCard(models.Model):
     STATUS_CHOICES = [
         ('RECEIVED', 'Received (Reception)'),
         ('IN_PROGRESS', 'In Process (Workshop)'),
@@ -139,12 +143,7 @@ class JobCard(models.Model):
             from django.utils import timezone
             self.sla_clock_start = timezone.now()
             
-        old_status = None
-        if self.pk:
-            try:
-                old_status = JobCard.objects.get(pk=self.pk).status
-            except JobCard.DoesNotExist:
-                pass
+        old_status = self.previous('status')
         
         super().save(*args, **kwargs)
         
@@ -159,38 +158,10 @@ class JobCard(models.Model):
             self.sync_to_finance()
 
     def sync_to_finance(self):
-        from finance.models import Transaction, Account, Commission
-        
-        # 1. Revenue Recognition
-        revenue_account, _ = Account.objects.get_or_create(
-            code='4001',
-            defaults={'name': 'Workshop Service Revenue', 'category': 'REVENUE'}
-        )
-        
-        Transaction.objects.create(
-            account=revenue_account,
-            department='OPERATIONS',
-            amount=self.net_amount,
-            transaction_type='CREDIT',
-            description=f"Revenue: Job #{self.job_card_number} | {self.customer_name}",
-            reference=self.job_card_number
-        )
-
-        # 2. VAT Recognition (Output VAT)
-        if self.vat_amount > 0:
-            vat_account, _ = Account.objects.get_or_create(
-                code='2050',
-                defaults={'name': 'VAT Payable (Output)', 'category': 'LIABILITY'}
-            )
-            Transaction.objects.create(
-                account=vat_account,
-                amount=self.vat_amount,
-                transaction_type='CREDIT', # Liability increases with Credit
-                description=f"VAT Output: Job #{self.job_card_number}",
-                reference=self.job_card_number
-            )
+        # Revenue and output VAT are recognised from the invoice (Invoice.record_revenue_transaction)
+        from finance.models import Commission
 
-        # 3. Commission Accrual
+        # Commission Accrual
         if not self.commission_applied:
             # Advisor Commission
             if self.service_advisor and self.service_advisor.commission_rate > 0:
@@ -329,3 +300,17 @@ class JobCardRemark(models.Model):
 
     def __str__(self):
         return f"Remark on {self.job_card.job_card_number} by {self.added_by}"
+
+
+class JobBoardEvent(NoAudit):
+    """
+    One job board delta (job_cards.board). The id is the sequence number clients
+    resume from; rows are pruned after JOB_BOARD_EVENT_TTL_HOURS.
+    """
+    branch = models.ForeignKey(Branch, on_delete=models.CASCADE, null=True, blank=True, related_name='+')
+    job_card_id = models.PositiveIntegerField()
+    payload = models.JSONField()
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['branch', 'id'], name='job_board_event_branch_idx')]
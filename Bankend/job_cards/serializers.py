@@ -11,7 +11,37 @@ class JobCardTaskSerializer(serializers.ModelSerializer):
         model = JobCardTask
         fields = '__all__'
 
-class JobCardSerializer(serializers.ModelSerializer):
+# Large free-text columns (base64 signature, long notes) left out of list responses
+HEAVY_TEXT_FIELDS = ('signature_data', 'initial_inspection_notes', 'checklist_remarks', 'feedback_notes')
+
+# Columns loaded (via .only()) for the slim ?view=summary list
+SUMMARY_FIELDS = (
+    'id', 'job_card_number', 'status', 'date', 'branch', 'customer_name', 'phone',
+    'registration_number', 'plate_emirate', 'plate_code', 'brand', 'model', 'color',
+    'net_amount', 'is_released', 'created_at',
+)
+
+
+class InvoiceSummaryMixin:
+    def get_invoice(self, obj):
+        # JobCardViewSet annotates the invoice columns onto the job card row
+        if hasattr(obj, 'invoice_ref_id'):
+            if obj.invoice_ref_id is None:
+                return None
+            return {
+                'id': obj.invoice_ref_id,
+                'payment_status': obj.invoice_ref_status,
+                'invoice_number': obj.invoice_ref_number
+            }
+        if hasattr(obj, 'invoice'):
+            return {
+                'id': obj.invoice.id,
+                'payment_status': obj.invoice.payment_status,
+                'invoice_number': obj.invoice.invoice_number
+            }
+        return None
+
+class JobCardSerializer(InvoiceSummaryMixin, serializers.ModelSerializer):
     photos = JobCardPhotoSerializer(many=True, read_only=True)
     tasks = JobCardTaskSerializer(many=True, read_only=True)
     checklists = serializers.SlugRelatedField(many=True, read_only=True, slug_field='checklist_number')
@@ -58,14 +88,20 @@ class JobCardSerializer(serializers.ModelSerializer):
             
         return super().create(validated_data)
 
-    def get_invoice(self, obj):
-        if hasattr(obj, 'invoice'):
-            return {
-                'id': obj.invoice.id,
-                'payment_status': obj.invoice.payment_status,
-                'invoice_number': obj.invoice.invoice_number
-            }
-        return None
+class JobCardListSerializer(JobCardSerializer):
+    """Full list rows without HEAVY_TEXT_FIELDS (deferred in the list query)."""
+    class Meta(JobCardSerializer.Meta):
+        fields = None
+        exclude = HEAVY_TEXT_FIELDS
+
+class JobCardSummarySerializer(InvoiceSummaryMixin, serializers.ModelSerializer):
+    """Slim rows for boards and pickers; no nested relations."""
+    status_display = serializers.CharField(source='get_status_display', read_only=True)
+    invoice = serializers.SerializerMethodField()
+
+    class Meta:
+        model = JobCard
+        fields = SUMMARY_FIELDS + ('status_display', 'invoice')
 
 class ServiceSerializer(serializers.ModelSerializer):
     category_name = serializers.ReadOnlyField(source='category.name')
@@ -0,0 +1,8 @@
+from celery import shared_task
+
+
+@shared_task(ignore_result=True)
+def prune_job_board_events():
+    """Drops job board events older than JOB_BOARD_EVENT_TTL_HOURS."""
+    from .board import prune_events
+    return prune_events()
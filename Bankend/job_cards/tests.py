@@ -0,0 +1,180 @@
+import csv
+from datetime import date
+from decimal import Decimal
+
+from django.apps import apps
+from django.contrib.auth.models import User
+from django.contrib.contenttypes.models import ContentType
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+
+from rest_framework.test import APIClient
+
+from checklists.models import Checklist
+from core.testing import AppQueriesMixin
+from finance.models import Commission, Voucher
+from hr.models import Employee
+from invoices.models import Invoice
+from notifications.models import NotificationOutbox
+from .models import JobCard, JobCardPhoto, JobCardTask
+
+
+class JobCardLifecycleQueryTests(TestCase):
+    """Exact query budgets for each status transition; saves must not re-read the job card."""
+
+    def setUp(self):
+        self.technician = Employee.objects.create(
+            user=User.objects.create_user('tech'), employee_id='T-1', pin_code='111111', role='Technician',
+            date_joined=date(2024, 1, 1), commission_rate=Decimal('0.00'),
+        )
+        self.technician.refresh_from_db()
+        # Warm the ContentType cache so counts don't depend on test order
+        ContentType.objects.get_for_models(*apps.get_models())
+
+    def save_and_capture(self, job, status):
+        job.status = status
+        with CaptureQueriesContext(connection) as ctx:
+            job.save()
+        self.assertFalse(
+            [q for q in ctx.captured_queries if q['sql'].startswith('SELECT') and 'job_cards_jobcard' in q['sql']],
+            f"saving {status} re-read the job card",
+        )
+        return len(ctx.captured_queries)
+
+    def test_full_lifecycle_query_counts(self):
+        job = JobCard.objects.create(
+            job_card_number='JC-100', date=date(2025, 3, 1), customer_name='Alex', phone='0500000000',
+            total_amount=Decimal('1000.00'), vat_amount=Decimal('50.00'), net_amount=Decimal('1050.00'),
+            assigned_technician=self.technician,
+        )
+        job = JobCard.objects.get(pk=job.pk)
+
+        counts = {status: self.save_and_capture(job, status)
+                  for status in ['IN_PROGRESS', 'READY', 'INVOICED', 'CLOSED']}
+        self.assertEqual(counts, {
+            'IN_PROGRESS': 1,  # UPDATE
+            'READY': 2,        # UPDATE, outbox message
+            'INVOICED': 1,     # UPDATE
+            # UPDATE, outbox message, technician commission (employee, insert, user,
+            # employee update), commission_applied UPDATE
+            'CLOSED': 7,
+        })
+
+        # Saving again in the same state triggers nothing
+        self.assertEqual(self.save_and_capture(job, 'CLOSED'), 1)
+        self.assertEqual(NotificationOutbox.objects.filter(object_id=job.pk).count(), 2)
+        self.assertEqual(Commission.objects.filter(job_card=job).count(), 1)
+        # Revenue is posted by the invoice, not by closing the job
+        self.assertFalse(Voucher.objects.filter(reference_number='JC-100').exists())
+
+
+class JobCardListQueryTests(AppQueriesMixin, TestCase):
+    """The job card list costs the same number of queries however many cards it returns."""
+    url = '/api/job-cards/api/jobs/'
+
+    def setUp(self):
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user('advisor'))
+        self.created = 0
+
+    def add_cards(self, n):
+        for _ in range(n):
+            self.created += 1
+            number = f'JC-{self.created}'
+            job = JobCard.objects.create(
+                job_card_number=number, date=date(2025, 3, 1), customer_name='Sam', phone='',
+                signature_data='data:image/png;base64,' + 'A' * 5000,
+            )
+            JobCardPhoto.objects.create(job_card=job, image='job_card_photos/front.jpg')
+            JobCardTask.objects.create(job_card=job, description='Polish')
+            Checklist.objects.create(
+                job_card=job, checklist_number=f'CL-{self.created}', vehicle_brand='X', vehicle_model='Y',
+                registration_number='1', technician_name='T', date=date(2025, 3, 1), vin='V',
+            )
+            if self.created % 2:
+                Invoice.objects.create(job_card=job, invoice_number=f'INV-{number}', date=date(2025, 3, 1),
+                                       customer_name='Sam', items='', total_amount=100, vat_amount=5,
+                                       grand_total=105)
+
+    def get(self, queries, **params):
+        with self.assertNumAppQueries(queries):
+            response = self.client.get(self.url, params)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_query_count_is_constant(self):
+        # job cards (with invoice joined), photos, tasks, checklists
+        self.add_cards(3)
+        self.assertEqual(len(self.get(4)), 3)
+        self.add_cards(9)
+        rows = self.get(4)
+        self.assertEqual(len(rows), 12)
+        self.assertEqual(len(self.get(1, view='summary')), 12)
+        self.assertEqual(len(self.get(4, view='full')), 12)
+
+        by_number = {row['job_card_number']: row for row in rows}
+        self.assertEqual(by_number['JC-1']['invoice']['invoice_number'], 'INV-JC-1')
+        self.assertIsNone(by_number['JC-2']['invoice'])
+        self.assertEqual(by_number['JC-1']['checklists'], ['CL-1'])
+        self.assertEqual(len(by_number['JC-1']['photos']), 1)
+        self.assertNotIn('signature_data', by_number['JC-1'])
+
+    def test_cursor_pagination_is_opt_in(self):
+        self.add_cards(5)
+        first = self.get(4, page_size=3)
+        self.assertEqual([r['job_card_number'] for r in first['results']], ['JC-5', 'JC-4', 'JC-3'])
+        second = self.client.get(first['next']).json()
+        self.assertEqual([r['job_card_number'] for r in second['results']], ['JC-2', 'JC-1'])
+        self.assertIsNone(second['next'])
+
+
+class WorkshopDiaryExportTests(AppQueriesMixin, TestCase):
+    def setUp(self):
+        salesman = Employee.objects.create(
+            user=User.objects.create_user('sales', first_name='Rami', last_name='K'), employee_id='S-1',
+            pin_code='222222', role='Sales', date_joined=date(2024, 1, 1),
+        )
+        for n, status in enumerate(['RECEIVED', 'CLOSED', 'CLOSED'], 1):
+            JobCard.objects.create(
+                job_card_number=f'JC-{n}', date=date(2025, 3, n), customer_name=f'A&B {n}', phone='',
+                status=status, salesman=salesman, net_amount=Decimal('105.00'),
+            )
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_user('manager'))
+
+    def download(self, url, queries, **params):
+        with self.assertNumAppQueries(queries):
+            response = self.client.get(url, params)
+            body = b''.join(response.streaming_content) if response.streaming else response.content
+        self.assertEqual(response.status_code, 200)
+        return response, body
+
+    def test_legacy_xls_streams_filtered_rows_in_one_query(self):
+        response, body = self.download('/api/job-cards/export/excel/', 1, status='CLOSED')
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="WorkShopDiaryReport.xls"')
+        html = body.decode()
+        self.assertIn('<th style=\'background-color:#5cb85c; color:white;\'>JobCardNo</th>', html)
+        self.assertIn('<td>A&amp;B 3</td>', html)
+        self.assertIn('<td>Rami K (S-1)</td>', html)
+        self.assertNotIn('JC-1<', html)
+        self.assertLess(html.index('JC-3'), html.index('JC-2'))
+
+    def test_report_exports_match_report_filters(self):
+        _, body = self.download('/reports/api/workshop-diary/', 1, export='csv', status='CLOSED')
+        rows = list(csv.reader(body.decode().splitlines()))
+        self.assertEqual(rows[0][:3], ['Number', 'Date', 'Customer'])
+        self.assertEqual([r[0] for r in rows[1:]], ['JC-3', 'JC-2'])
+
+        response = self.client.get('/reports/api/workshop-diary/', {'status': 'CLOSED'})
+        self.assertEqual([e['number'] for e in response.json()['entries']], ['JC-3', 'JC-2'])
+
+        self.assertEqual(self.client.get('/reports/api/invoice-book/', {'export': 'pdf'}).status_code, 400)
+
+    def test_xlsx_export(self):
+        from io import BytesIO
+        from openpyxl import load_workbook
+        _, body = self.download('/reports/api/workshop-diary/', 1, export='xlsx')
+        sheet = load_workbook(BytesIO(body)).active
+        self.assertEqual(sheet.max_row, 4)
+        self.assertEqual(sheet['A2'].value, 'JC-3')
@@ -1,5 +1,5 @@
 from django.conf import settings
-from notifications.models import NotificationLog
+from notifications.outbox import enqueue
 
 
 def _get_portal_url(job_card):
@@ -10,7 +10,8 @@ def _get_portal_url(job_card):
 
 def trigger_job_notification(job_card):
     """
-    Triggers WhatsApp + SMS notifications for the customer on each status change.
+    Queues WhatsApp + SMS notifications for the customer on each status change
+    (at most once per job card, status and channel).
     """
     portal_url = _get_portal_url(job_card)
     name = job_card.customer_name
@@ -51,31 +52,9 @@ def trigger_job_notification(job_card):
         ),
     }
 
-    from notifications.tasks import send_whatsapp_message, send_sms_message
-
     msg = status_messages.get(job_card.status)
-    if not msg:
+    if not msg or not job_card.phone:
         return
 
-    # Create logs and trigger tasks
-    # WhatsApp
-    wa_log = NotificationLog.objects.create(
-        recipient=job_card.phone,
-        notification_type='WHATSAPP',
-        subject=f"Job Update: {job_card.get_status_display()}",
-        message=msg,
-        content_object=job_card,
-        status='QUEUED'
-    )
-    send_whatsapp_message.delay(wa_log.id)
-
-    # SMS
-    sms_log = NotificationLog.objects.create(
-        recipient=job_card.phone,
-        notification_type='SMS',
-        subject=f"Job Update: {job_card.get_status_display()}",
-        message=msg,
-        content_object=job_card,
-        status='QUEUED'
-    )
-    send_sms_message.delay(sms_log.id)
+    enqueue(job_card, job_card.status, job_card.phone, msg, channels=('WHATSAPP', 'SMS'),
+            subject=f"Job Update: {job_card.get_status_display()}")
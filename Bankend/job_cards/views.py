@@ -1,6 +1,6 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib import messages
-from django.http import JsonResponse, HttpResponse
+from django.http import JsonResponse
 from .models import JobCard, JobCardPhoto, JobCardTask, ServiceCategory, Service
 from .forms import (
     JobCardReceptionForm, JobCardEstimationForm, 
@@ -11,11 +11,13 @@ from rest_framework.decorators import action
 from rest_framework.response import Response
 from rest_framework.views import APIView
 from rest_framework.permissions import AllowAny
+from core.pagination import OptInCursorPagination
 from locations.filters import BranchFilterBackend
 from core.permissions import IsAdminOrOwner
 from .serializers import (
     JobCardSerializer, JobCardTaskSerializer, JobCardPhotoSerializer, 
-    ServiceCategorySerializer, ServiceSerializer, WarrantyClaimSerializer
+    ServiceCategorySerializer, ServiceSerializer, WarrantyClaimSerializer,
+    JobCardListSerializer, JobCardSummarySerializer, HEAVY_TEXT_FIELDS, SUMMARY_FIELDS
 )
 from .models import (
     JobCard, JobCardPhoto, JobCardTask, ServiceCategory, Service, WarrantyClaim
@@ -117,63 +119,72 @@ def create_invoice_from_job(request, pk):
 def export_jobs_excel(request):
     """
     Universally exports jobs in the EXACT legacy WorkShopDiaryReport.xls HTML table format requested by user.
+    Accepts the workshop diary report filters; ?export=csv|xlsx for other formats.
     """
-    jobs = JobCard.objects.all().order_by('-created_at')
-    
-    html = ["<table border='1'>"]
-    # Exact legacy column headers required
-    html.append("<tr>")
-    cols = ['JobCardNo', 'JDate', 'CustName', 'VehicleNo', 'Advisor', 'JStatus', 'Remark', 
-            'Insurance', 'Category', 'SalesMan', 'DriverName', 'LeadDource', 'OrderType', 'OrgName', 'TotalAmt']
-    for c in cols:
-        html.append(f"<th style='background-color:#5cb85c; color:white;'>{c}</th>")
-    html.append("</tr>")
-    
-    for job in jobs:
-        html.append("<tr>")
-        html.append(f"<td>{job.job_card_number}</td>")
-        html.append(f"<td>{job.date.strftime('%d/%m/%Y') if job.date else ''}</td>")
-        html.append(f"<td>{job.customer_name or ''}</td>")
-        
-        plate = f"{job.plate_emirate or ''} {job.plate_code or ''} {job.registration_number or ''}".strip()
-        html.append(f"<td>{plate}</td>")
-        
-        html.append(f"<td>{job.service_advisor_legacy or 'RAVIT ADHIR'}</td>")
-        html.append(f"<td>{job.get_status_display()}</td>")
-        html.append(f"<td>{job.job_description or ''}</td>")
-        html.append(f"<td></td>") # Insurance
-        html.append(f"<td>{job.job_category or 'Regular'}</td>")
-        html.append(f"<td>{job.salesman or 'RAVIT'}</td>")
-        html.append(f"<td>{job.driver or '--Select--'}</td>")
-        html.append(f"<td>--Select--</td>") # LeadDource
-        html.append(f"<td>{job.order_type or ''}</td>") # OrderType
-        html.append(f"<td>ELITE SHINE CAR POLISH SERVICES LLC(BRANCH)</td>") # OrgName
-        html.append(f"<td>{job.net_amount or '0.00'}</td>")
-        html.append("</tr>")
-        
-    html.append("</table>")
-    
-    response = HttpResponse("\n".join(html), content_type='application/vnd.ms-excel')
-    response['Content-Disposition'] = 'attachment; filename="WorkShopDiaryReport.xls"'
-    return response
+    from core.exports import export_response
+    from reports.exports import legacy_workshop_diary_queryset, LEGACY_WORKSHOP_DIARY_COLUMNS
+
+    try:
+        return export_response(
+            request.GET.get('export', 'xls'), 'WorkShopDiaryReport',
+            LEGACY_WORKSHOP_DIARY_COLUMNS, legacy_workshop_diary_queryset(request.GET),
+        )
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+
+class JobCardCursorPagination(OptInCursorPagination):
+    ordering = ('-created_at', '-id')
 
 class JobCardViewSet(viewsets.ModelViewSet):
+    """
+    List views (?view=):
+        (default)  all columns except HEAVY_TEXT_FIELDS, nested photos/tasks/checklists
+        summary    SUMMARY_FIELDS only, no nested relations
+        full       every column, as returned by retrieve
+    """
     module_name = 'Operations'
     serializer_class = JobCardSerializer
     filter_backends = [BranchFilterBackend]
+    pagination_class = JobCardCursorPagination
+
+    def list_view(self):
+        return self.request.query_params.get('view') if self.action == 'list' else None
+
+    def get_serializer_class(self):
+        view = self.list_view()
+        if view == 'summary':
+            return JobCardSummarySerializer
+        if self.action == 'list' and view != 'full':
+            return JobCardListSerializer
+        return JobCardSerializer
 
     def get_queryset(self):
-        queryset = JobCard.objects.all().order_by('-created_at')
+        from django.db.models import F, Prefetch
+        from checklists.models import Checklist
+
+        # Invoice columns ride on the job card row (LEFT JOIN) instead of one query per card
+        queryset = JobCard.objects.annotate(
+            invoice_ref_id=F('invoice__id'),
+            invoice_ref_number=F('invoice__invoice_number'),
+            invoice_ref_status=F('invoice__payment_status'),
+        ).order_by('-created_at', '-id')
+
+        view = self.list_view()
+        if view == 'summary':
+            queryset = queryset.only(*SUMMARY_FIELDS)
+        elif self.action in ('list', 'retrieve', 'update', 'partial_update'):
+            queryset = queryset.prefetch_related(
+                'photos', 'tasks',
+                Prefetch('checklists', queryset=Checklist.objects.only('id', 'job_card_id', 'checklist_number')),
+            )
+            if self.action == 'list' and view != 'full':
+                queryset = queryset.defer(*HEAVY_TEXT_FIELDS)
         
-        # Search by Name/Phone
+        # Search by Name/Phone/Number/Plate (search index, see core.search)
         q = self.request.query_params.get('q')
         if q:
-            from django.db.models import Q
-            queryset = queryset.filter(
-                Q(customer_name__icontains=q) | 
-                Q(phone__icontains=q) |
-                Q(job_card_number__icontains=q)
-            )
+            from core.search import filter_queryset
+            queryset = filter_queryset(queryset, q)
             
         # Date Range Filter
         start_date = self.request.query_params.get('start_date')
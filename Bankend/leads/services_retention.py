@@ -2,74 +2,43 @@ from django.utils import timezone
 from datetime import timedelta
 from ceramic_warranty.models import CeramicWarrantyRegistration
 from ppf_warranty.models import PPFWarrantyRegistration
-from django.db.models import Q
 
 class RetentionService:
+    # How far ahead of the due date customers are contacted
+    LOOKAHEAD_DAYS = 30
+
     @staticmethod
     def get_retention_candidates():
         """
-        Identify customers who are due for Ceramic/PPF inspections or maintenance.
+        Identify customers who are due (or overdue) for Ceramic/PPF maintenance or
+        inspections within the next LOOKAHEAD_DAYS, soonest first.
         Criteria:
         1. Ceramic: 1 year after installation_date if m1_date is null, etc.
         2. PPF: 1 year after installation_date if checkup dates are null.
+        Uses the indexed retention_due_date kept by ServiceScheduleMixin, so the
+        cost grows with the number of candidates rather than all warranties sold.
         """
         today = timezone.now().date()
-        six_months_ago = today - timedelta(days=180) # Minimum threshold
-        
-        candidates = []
-
-        # 1. Ceramic Candidates
-        ceramic_registrations = CeramicWarrantyRegistration.objects.filter(
-            installation_date__lte=today - timedelta(days=330) # ~11 months ago
-        )
-
-        for reg in ceramic_registrations:
-            due_date = None
-            service_type = "Ceramic Maintenance"
-            
-            if not reg.m1_date:
-                due_date = reg.installation_date + timedelta(days=365)
-            elif not reg.m2_date:
-                due_date = reg.installation_date + timedelta(days=730)
-            elif not reg.m3_date:
-                due_date = reg.installation_date + timedelta(days=1095)
-                
-            if due_date and due_date <= today + timedelta(days=30):
-                candidates.append({
-                    'id': f"CER-{reg.id}",
-                    'customer_name': reg.full_name,
-                    'phone': reg.contact_number,
-                    'vehicle': f"{reg.vehicle_brand} {reg.vehicle_model}",
-                    'last_service': reg.installation_date,
-                    'due_type': service_type,
-                    'due_date': due_date,
-                    'is_overdue': due_date < today
-                })
+        horizon = today + timedelta(days=RetentionService.LOOKAHEAD_DAYS)
+        fields = ('id', 'full_name', 'contact_number', 'vehicle_brand', 'vehicle_model',
+                  'installation_date', 'retention_due_date')
 
-        # 2. PPF Candidates
-        ppf_registrations = PPFWarrantyRegistration.objects.filter(
-            installation_date__lte=today - timedelta(days=330)
-        )
-
-        for reg in ppf_registrations:
-            due_date = None
-            service_type = "PPF Annual Inspection"
-
-            if not reg.first_checkup_date:
-                due_date = reg.installation_date + timedelta(days=365)
-            elif not reg.second_checkup_date:
-                due_date = reg.installation_date + timedelta(days=730)
-            
-            if due_date and due_date <= today + timedelta(days=30):
-                candidates.append({
-                    'id': f"PPF-{reg.id}",
-                    'customer_name': reg.full_name,
-                    'phone': reg.contact_number,
-                    'vehicle': f"{reg.vehicle_brand} {reg.vehicle_model}",
-                    'last_service': reg.installation_date,
-                    'due_type': service_type,
-                    'due_date': due_date,
-                    'is_overdue': due_date < today
-                })
+        sources = [
+            (CeramicWarrantyRegistration, 'CER', "Ceramic Maintenance"),
+            (PPFWarrantyRegistration, 'PPF', "PPF Annual Inspection"),
+        ]
+        candidates = []
+        for model, prefix, service_type in sources:
+            due = model.objects.filter(retention_due_date__lte=horizon).only(*fields)
+            candidates.extend({
+                'id': f"{prefix}-{reg.id}",
+                'customer_name': reg.full_name,
+                'phone': reg.contact_number,
+                'vehicle': f"{reg.vehicle_brand} {reg.vehicle_model}",
+                'last_service': reg.installation_date,
+                'due_type': service_type,
+                'due_date': reg.retention_due_date,
+                'is_overdue': reg.retention_due_date < today
+            } for reg in due)
 
         return sorted(candidates, key=lambda x: x['due_date'])
@@ -1,6 +1,9 @@
 from django.db import models
 from django.contrib.contenttypes.models import ContentType
 from django.contrib.contenttypes.fields import GenericForeignKey
+from django.utils import timezone
+
+from core.models import NoAudit
 
 class NotificationLog(models.Model):
     NOTIFICATION_TYPES = [
@@ -24,3 +27,41 @@ class NotificationLog(models.Model):
     
     def __str__(self):
         return f"{self.notification_type} to {self.recipient} at {self.sent_at}"
+
+
+class NotificationOutbox(NoAudit):
+    """
+    A message waiting to be sent (notifications.outbox). Rows are written in the
+    same transaction as the change that caused them and drained in batches;
+    dedup_key makes each (object, event, channel) message go out once.
+    """
+    STATUS_CHOICES = [
+        ('PENDING', 'Pending'),
+        ('SENDING', 'Sending'),
+        ('SENT', 'Sent'),
+        ('FAILED', 'Failed'),
+    ]
+
+    dedup_key = models.CharField(max_length=255, unique=True)
+    channel = models.CharField(max_length=20, choices=NotificationLog.NOTIFICATION_TYPES)
+    recipient = models.CharField(max_length=255)
+    subject = models.CharField(max_length=255, blank=True)
+    message = models.TextField()
+
+    content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE, null=True, blank=True)
+    object_id = models.PositiveIntegerField(null=True, blank=True)
+    content_object = GenericForeignKey('content_type', 'object_id')
+
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='PENDING')
+    attempts = models.PositiveSmallIntegerField(default=0)
+    # Earliest next send; while SENDING, when the claim is presumed dead
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [models.Index(fields=['status', 'next_attempt_at'], name='notification_outbox_due_idx')]
+
+    def __str__(self):
+        return f"{self.channel} to {self.recipient} ({self.status})"
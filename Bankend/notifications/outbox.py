@@ -0,0 +1,165 @@
+"""
+Notification outbox.
+
+enqueue() adds messages to NotificationOutbox inside the caller's transaction,
+keyed by (object, event, channel), so an event that fires twice still sends
+once. After commit a single drain task is scheduled, debounced through the
+cache so a burst of changes costs one broker message; the every-minute beat
+drain picks up retries and anything a lost task missed. If the broker cannot
+accept the task (or NOTIFICATIONS_ASYNC is False) the outbox is drained
+in-process.
+
+drain() claims due rows per channel in batches, sends each batch through
+NOTIFICATION_TRANSPORT within NOTIFICATION_RATE_LIMITS (messages per minute,
+shared by all workers via the cache) and writes a NotificationLog for every
+message sent or given up on. Failures are retried with exponential backoff,
+up to NOTIFICATION_MAX_ATTEMPTS.
+"""
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
+from django.db import transaction
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .models import NotificationLog, NotificationOutbox
+
+logger = logging.getLogger(__name__)
+
+DRAIN_SCHEDULED_KEY = 'notifications:drain-scheduled'
+# A SENDING row whose claim is older than this belonged to a worker that died
+CLAIM_SECONDS = 600
+
+
+def setting(name, default):
+    return getattr(settings, name, default)
+
+
+def dedup_key(obj, event, channel):
+    return f"{obj._meta.label_lower}:{obj.pk}:{event}:{channel}"
+
+
+def enqueue(obj, event, recipient, message, channels=('WHATSAPP',), subject=''):
+    """Queues `message` to `recipient` on each channel unless (obj, event, channel) was queued before."""
+    content_type = ContentType.objects.get_for_model(obj)
+    NotificationOutbox.objects.bulk_create([
+        NotificationOutbox(
+            dedup_key=dedup_key(obj, event, channel), channel=channel, recipient=recipient,
+            subject=subject, message=message, content_type=content_type, object_id=obj.pk,
+        )
+        for channel in channels
+    ], ignore_conflicts=True)
+    transaction.on_commit(schedule_drain)
+
+
+def schedule_drain():
+    if setting('NOTIFICATIONS_ASYNC', True):
+        delay = setting('NOTIFICATION_DRAIN_DELAY_SECONDS', 5)
+        if not cache.add(DRAIN_SCHEDULED_KEY, True, delay + 60):
+            return  # a drain is already on its way
+        from .tasks import drain_notification_outbox
+        try:
+            drain_notification_outbox.apply_async(countdown=delay, retry=False)
+            return
+        except Exception as e:
+            logger.warning(f"Notification broker unavailable, draining the outbox in-process: {e}")
+    drain()
+
+
+def _rate_key(channel):
+    return f"notifications:rate:{channel}:{timezone.now():%Y%m%d%H%M}"
+
+
+def reserve(channel, wanted):
+    """How many of `wanted` sends fit in this minute's budget for `channel`; the rest are not reserved."""
+    limit = setting('NOTIFICATION_RATE_LIMITS', {}).get(channel)
+    if limit is None:
+        return wanted
+    key = _rate_key(channel)
+    cache.add(key, 0, 120)
+    try:
+        used = cache.incr(key, wanted)
+    except ValueError:  # the window expired in between
+        cache.set(key, wanted, 120)
+        used = wanted
+    granted = max(0, min(wanted, limit - (used - wanted)))
+    release(channel, wanted - granted)
+    return granted
+
+
+def release(channel, unused):
+    if unused and channel in setting('NOTIFICATION_RATE_LIMITS', {}):
+        try:
+            cache.decr(_rate_key(channel), unused)
+        except ValueError:
+            pass
+
+
+def claim(channel, limit):
+    now = timezone.now()
+    with transaction.atomic():
+        batch = list(NotificationOutbox.objects.select_for_update(skip_locked=True).filter(
+            channel=channel, status='PENDING', next_attempt_at__lte=now,
+        ).order_by('next_attempt_at', 'pk')[:limit])
+        NotificationOutbox.objects.filter(pk__in=[message.pk for message in batch]).update(
+            status='SENDING', next_attempt_at=now + timedelta(seconds=CLAIM_SECONDS),
+        )
+    return batch
+
+
+def backoff(attempts):
+    return timedelta(seconds=setting('NOTIFICATION_RETRY_BASE_SECONDS', 60) * 2 ** (attempts - 1))
+
+
+def deliver(transport, channel, batch):
+    """Sends one claimed batch and records the outcome; returns the number sent."""
+    try:
+        results = transport.send(channel, batch)
+    except Exception as e:
+        logger.exception(f"{channel} transport failed for {len(batch)} messages")
+        results = {message.pk: str(e) for message in batch}
+
+    now = timezone.now()
+    max_attempts = setting('NOTIFICATION_MAX_ATTEMPTS', 5)
+    logs = []
+    for message in batch:
+        message.attempts += 1
+        message.last_error = results.get(message.pk, 'No result from transport') or ''
+        if not message.last_error:
+            message.status, message.sent_at = 'SENT', now
+        elif message.attempts >= max_attempts:
+            message.status = 'FAILED'
+            logger.error(f"Giving up on {channel} message {message.pk} after {message.attempts} attempts: {message.last_error}")
+        else:
+            message.status, message.next_attempt_at = 'PENDING', now + backoff(message.attempts)
+            continue
+        logs.append(NotificationLog(
+            recipient=message.recipient, notification_type=channel, subject=message.subject,
+            message=message.message, content_type_id=message.content_type_id, object_id=message.object_id,
+            status=message.status,
+        ))
+    NotificationOutbox.objects.bulk_update(batch, ['status', 'attempts', 'next_attempt_at', 'last_error', 'sent_at'])
+    NotificationLog.objects.bulk_create(logs)
+    return sum(message.status == 'SENT' for message in batch)
+
+
+def drain(batch_size=None):
+    """Sends every due message the rate limits allow; returns the number sent."""
+    cache.delete(DRAIN_SCHEDULED_KEY)
+    batch_size = batch_size or setting('NOTIFICATION_BATCH_SIZE', 50)
+    NotificationOutbox.objects.filter(status='SENDING', next_attempt_at__lt=timezone.now()).update(status='PENDING')
+    transport = import_string(setting('NOTIFICATION_TRANSPORT', 'notifications.transports.TwilioTransport'))()
+
+    sent = 0
+    for channel, _ in NotificationLog.NOTIFICATION_TYPES:
+        while True:
+            allowed = reserve(channel, batch_size)
+            batch = claim(channel, allowed) if allowed else []
+            release(channel, allowed - len(batch))
+            if not batch:
+                break
+            sent += deliver(transport, channel, batch)
+    return sent
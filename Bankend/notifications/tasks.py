@@ -9,6 +9,14 @@ import logging
 
 logger = logging.getLogger(__name__)
 
+@shared_task(ignore_result=True)
+def drain_notification_outbox():
+    """Sends due outbox messages in rate-limited batches (see notifications.outbox)."""
+    from .outbox import drain
+    return drain()
+
+# The per-message tasks below only serve messages queued before the outbox existed
+
 @shared_task
 def send_whatsapp_message(log_id):
     """Worker task to send WhatsApp message and update log."""
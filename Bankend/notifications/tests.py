@@ -1,3 +1,66 @@
-from django.test import TestCase
+from datetime import date
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.utils import timezone
+
+from job_cards.models import JobCard
+from .models import NotificationLog, NotificationOutbox
+from .outbox import drain, enqueue
+from .transports import LocalTransport
+
+
+@override_settings(
+    NOTIFICATIONS_ASYNC=True,
+    NOTIFICATION_TRANSPORT='notifications.transports.LocalTransport',
+    NOTIFICATION_RATE_LIMITS={'WHATSAPP': 3},
+    NOTIFICATION_BATCH_SIZE=2,
+    NOTIFICATION_MAX_ATTEMPTS=2,
+)
+class NotificationOutboxTests(TestCase):
+    def setUp(self):
+        cache.clear()  # the rate limit counts sends per minute, across tests too
+        LocalTransport.sent = []
+        self.apply_async = mock.patch('notifications.tasks.drain_notification_outbox.apply_async').start()
+        self.addCleanup(mock.patch.stopall)
+        self.jobs = [
+            JobCard.objects.create(job_card_number=f'JC-{n}', date=date(2025, 3, 1), customer_name='Sam', phone=f'05000000{n}')
+            for n in range(1, 5)
+        ]
+
+    def test_events_are_deduplicated_and_share_one_drain_task(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            for job in self.jobs:
+                job.status = 'READY'
+                job.save()
+                job.save()
+                enqueue(job, 'READY', job.phone, 'Ready again')  # same (job, status, channel)
+        self.assertEqual(NotificationOutbox.objects.filter(status='PENDING').count(), 4)
+        self.apply_async.assert_called_once_with(countdown=5, retry=False)
+
+    def test_drain_batches_within_the_rate_limit(self):
+        for job in self.jobs:
+            enqueue(job, 'READY', job.phone, f'{job.job_card_number} is ready', channels=('WHATSAPP', 'SMS'))
+
+        self.assertEqual(drain(), 7)  # 3 WhatsApp this minute, all 4 SMS (no limit)
+        self.assertEqual(NotificationOutbox.objects.filter(channel='WHATSAPP', status='PENDING').count(), 1)
+        self.assertEqual(NotificationLog.objects.filter(status='SENT').count(), 7)
+        self.assertEqual(len(LocalTransport.sent), 7)
+
+    def test_failures_back_off_then_give_up(self):
+        enqueue(self.jobs[0], 'READY', '0500000001', 'Ready')
+        with mock.patch.object(LocalTransport, 'send', return_value={}) as send:
+            self.assertEqual(drain(), 0)
+            message = NotificationOutbox.objects.get()
+            self.assertEqual((message.status, message.attempts), ('PENDING', 1))
+            self.assertGreater(message.next_attempt_at, timezone.now())
+
+            drain()  # not due yet
+            self.assertEqual(send.call_count, 1)
+
+            NotificationOutbox.objects.update(next_attempt_at=timezone.now())
+            drain()
+        message.refresh_from_db()
+        self.assertEqual((message.status, message.attempts), ('FAILED', 2))
+        self.assertEqual(NotificationLog.objects.get().status, 'FAILED')
@@ -0,0 +1,45 @@
+"""
+Delivery backends for the notification outbox, selected by NOTIFICATION_TRANSPORT.
+
+A transport's send(channel, messages) gets a batch of NotificationOutbox rows
+for one channel and returns {row id: None if sent, else an error string}.
+"""
+from django.conf import settings
+from django.core.mail import get_connection, send_mail
+
+from core.twilio_utils import get_twilio_client, send_sms, send_whatsapp
+
+
+class TwilioTransport:
+    """WhatsApp and SMS through Twilio (one client per batch), email through Django's mail backend."""
+
+    def send(self, channel, messages):
+        if channel == 'EMAIL':
+            return self.send_email(messages)
+        send = send_whatsapp if channel == 'WHATSAPP' else send_sms
+        client = get_twilio_client()
+        return {
+            message.pk: None if send(message.recipient, message.message, client=client) else 'Twilio did not accept the message'
+            for message in messages
+        }
+
+    def send_email(self, messages):
+        results = {}
+        with get_connection() as connection:
+            for message in messages:
+                try:
+                    send_mail(message.subject, message.message, settings.DEFAULT_FROM_EMAIL, [message.recipient],
+                              connection=connection)
+                    results[message.pk] = None
+                except Exception as e:
+                    results[message.pk] = str(e)
+        return results
+
+
+class LocalTransport:
+    """Records messages in LocalTransport.sent instead of sending them (tests and local development)."""
+    sent = []
+
+    def send(self, channel, messages):
+        self.sent.extend(messages)
+        return {message.pk: None for message in messages}
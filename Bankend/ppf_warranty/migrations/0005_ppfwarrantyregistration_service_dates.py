@@ -0,0 +1,23 @@
+# Generated by Django 5.1.15 on 2026-10-18 19:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('ppf_warranty', '0004_ppfwarrantyregistration_expiry_date_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='ppfwarrantyregistration',
+            name='last_service_date',
+            field=models.DateField(blank=True, editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name='ppfwarrantyregistration',
+            name='next_due_date',
+            field=models.DateField(blank=True, db_index=True, editable=False, null=True),
+        ),
+    ]
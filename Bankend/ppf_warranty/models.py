@@ -4,8 +4,15 @@ import uuid
 import qrcode
 from io import BytesIO
 from django.core.files import File
+from core.models import ServiceScheduleMixin
+
+class PPFWarrantyRegistration(ServiceScheduleMixin, models.Model):
+    service_date_fields = (
+        'first_checkup_date', 'second_checkup_date', 'third_checkup_date',
+        'fourth_checkup_date', 'fifth_checkup_date',
+    )
+    retention_schedule = (('first_checkup_date', 365), ('second_checkup_date', 730))
 
-class PPFWarrantyRegistration(models.Model):
     BRANCH_CHOICES = [
         ('DXB', 'Dubai'),
         ('AUH', 'Abu Dhabi'),
@@ -68,6 +75,11 @@ class PPFWarrantyRegistration(models.Model):
     fourth_checkup_notes = models.TextField(null=True, blank=True)
     fifth_checkup_date = models.DateField(null=True, blank=True)
     fifth_checkup_notes = models.TextField(null=True, blank=True)
+
+    # Derived from the checkup dates (ServiceScheduleMixin)
+    last_service_date = models.DateField(null=True, blank=True, editable=False)
+    next_due_date = models.DateField(null=True, blank=True, editable=False, db_index=True)
+    retention_due_date = models.DateField(null=True, blank=True, editable=False, db_index=True)
     
     signature_data = models.TextField(null=True, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
@@ -9,6 +9,7 @@ from rest_framework.permissions import AllowAny
 from .models import PPFWarrantyRegistration
 from .forms import PPFWarrantyRegistrationForm
 from .serializers import PPFWarrantySerializer
+from core.pagination import DueDatePagination
 
 def ppf_warranty_create(request):
     if request.method == 'POST':
@@ -128,30 +129,25 @@ class PPFWarrantyViewSet(viewsets.ModelViewSet):
 
     @action(detail=False, methods=['get'])
     def due_for_checkup(self, request):
-        """Get warranties due for checkup (no checkup in last 6 months)"""
-        from datetime import timedelta
-        six_months_ago = timezone.now().date() - timedelta(days=180)
-
-        due_list = []
-        for warranty in self.queryset:
-            # Find the latest checkup date
-            checkup_dates = [
-                warranty.first_checkup_date, warranty.second_checkup_date,
-                warranty.third_checkup_date, warranty.fourth_checkup_date,
-                warranty.fifth_checkup_date
-            ]
-            valid_dates = [d for d in checkup_dates if d]
-            last_checkup = max(valid_dates) if valid_dates else warranty.installation_date
-
-            if last_checkup and last_checkup < six_months_ago:
-                due_list.append({
-                    'id': warranty.id,
-                    'customer': warranty.full_name,
-                    'contact': warranty.contact_number,
-                    'vehicle': f'{warranty.vehicle_brand} {warranty.vehicle_model}',
-                    'license_plate': warranty.license_plate,
-                    'last_checkup': last_checkup,
-                    'days_overdue': (timezone.now().date() - last_checkup).days - 180
-                })
+        """Get warranties due for checkup (no checkup in last 6 months); ?page_size= pages the list"""
+        today = timezone.now().date()
+        due = self.queryset.filter(next_due_date__lt=today).order_by('next_due_date', 'id').only(
+            'id', 'full_name', 'contact_number', 'vehicle_brand', 'vehicle_model', 'license_plate',
+            'last_service_date', 'next_due_date',
+        )
+        paginator = DueDatePagination()
+        page = paginator.paginate_queryset(due, request, view=self)
+
+        due_list = [{
+            'id': warranty.id,
+            'customer': warranty.full_name,
+            'contact': warranty.contact_number,
+            'vehicle': f'{warranty.vehicle_brand} {warranty.vehicle_model}',
+            'license_plate': warranty.license_plate,
+            'last_checkup': warranty.last_service_date,
+            'days_overdue': (today - warranty.next_due_date).days
+        } for warranty in (due if page is None else page)]
 
+        if page is not None:
+            return paginator.get_paginated_response(due_list)
         return Response(due_list)
@@ -0,0 +1,203 @@
+"""
+Querysets and export columns for the workshop diary, invoice book and payroll
+reports. The JSON report endpoints and the file exports share the same
+filters, so a download always matches what the report screen shows.
+"""
+from core.exports import Column
+
+
+def _selected(value):
+    return value and value != 'ALL'
+
+
+# ---------------------------------------------------------------- Workshop diary
+
+def workshop_diary_queryset(params, ordering=('-date',)):
+    """Job cards matching the WorkshopDiaryReportView filters."""
+    from job_cards.models import JobCard
+
+    jobs = JobCard.objects.select_related('service_advisor__user').order_by(*ordering)
+
+    start_date = params.get('start_date')
+    end_date = params.get('end_date')
+    if start_date and end_date:
+        jobs = jobs.filter(date__range=[start_date, end_date])
+    if _selected(params.get('advisor')):
+        jobs = jobs.filter(service_advisor_id=params['advisor'])
+    if _selected(params.get('status')):
+        jobs = jobs.filter(status=params['status'])
+    if _selected(params.get('branch')):
+        jobs = jobs.filter(branch_id=params['branch'])
+    if params.get('plate_no'):
+        jobs = jobs.filter(registration_number__icontains=params['plate_no'])
+
+    search_query = params.get('search')
+    if search_query:
+        from core.search import filter_queryset
+        jobs = filter_queryset(jobs, search_query)
+    return jobs
+
+
+def advisor_name(job):
+    if job.service_advisor:
+        return job.service_advisor.full_name
+    return job.service_advisor_legacy
+
+
+WORKSHOP_DIARY_COLUMNS = [
+    Column('Number', lambda j: j.job_card_number),
+    Column('Date', lambda j: j.date),
+    Column('Customer', lambda j: j.customer_name),
+    Column('Vehicle', lambda j: f"{j.brand} {j.model} ({j.registration_number})"),
+    Column('Status', lambda j: j.get_status_display()),
+    Column('Advisor', advisor_name),
+    Column('VAT', lambda j: j.vat_amount),
+    Column('Net Amount', lambda j: j.net_amount),
+]
+
+
+def legacy_workshop_diary_queryset(params):
+    """Rows for the legacy WorkShopDiaryReport.xls layout (newest job cards first)."""
+    return workshop_diary_queryset(params, ordering=('-created_at',)).select_related(
+        'salesman__user', 'driver__user'
+    )
+
+
+# Exact legacy WorkShopDiaryReport.xls columns and defaults
+LEGACY_WORKSHOP_DIARY_COLUMNS = [
+    Column('JobCardNo', lambda j: j.job_card_number),
+    Column('JDate', lambda j: j.date.strftime('%d/%m/%Y') if j.date else ''),
+    Column('CustName', lambda j: j.customer_name or ''),
+    Column('VehicleNo', lambda j: f"{j.plate_emirate or ''} {j.plate_code or ''} {j.registration_number or ''}".strip()),
+    Column('Advisor', lambda j: j.service_advisor_legacy or 'RAVIT ADHIR'),
+    Column('JStatus', lambda j: j.get_status_display()),
+    Column('Remark', lambda j: j.job_description or ''),
+    Column('Insurance', lambda j: ''),
+    Column('Category', lambda j: j.job_category or 'Regular'),
+    Column('SalesMan', lambda j: j.salesman or 'RAVIT'),
+    Column('DriverName', lambda j: j.driver or '--Select--'),
+    Column('LeadDource', lambda j: '--Select--'),
+    Column('OrderType', lambda j: j.order_type or ''),
+    Column('OrgName', lambda j: 'ELITE SHINE CAR POLISH SERVICES LLC(BRANCH)'),
+    Column('TotalAmt', lambda j: j.net_amount or '0.00'),
+]
+
+
+# ------------------------------------------------------------------ Invoice book
+
+def invoice_book_queryset(params):
+    from invoices.models import Invoice
+
+    invoices = Invoice.objects.all().order_by('-date')
+    start_date = params.get('start_date')
+    end_date = params.get('end_date')
+    if start_date and end_date:
+        invoices = invoices.filter(date__range=[start_date, end_date])
+    return invoices
+
+
+INVOICE_BOOK_COLUMNS = [
+    Column('Number', lambda i: i.invoice_number),
+    Column('Date', lambda i: i.date),
+    Column('Customer', lambda i: i.customer_name),
+    Column('Status', lambda i: i.payment_status),
+    Column('VAT', lambda i: i.vat_amount),
+    Column('Grand Total', lambda i: i.grand_total),
+]
+
+
+# ----------------------------------------------------------------------- Payroll
+
+def _department(employee):
+    return employee.department.name if employee.department else 'N/A'
+
+
+def salary_slip_queryset(params):
+    from hr.models import SalarySlip
+
+    year = params.get('year')
+    slips = SalarySlip.objects.filter(month__startswith=f"{year}-" if year else "").select_related(
+        'employee__user', 'employee__department', 'employee__bank_details'
+    ).order_by('month', 'employee__employee_id')
+    if params.get('month'):
+        slips = slips.filter(month__contains=f"-{str(params['month']).zfill(2)}")
+    if params.get('department'):
+        slips = slips.filter(employee__department_id=params['department'])
+    return slips
+
+
+# Hours above a standard 9-hour day count as overtime
+STANDARD_DAY_HOURS = 9
+
+
+def overtime_queryset(params):
+    from hr.models import HRAttendance
+
+    attendance = HRAttendance.objects.filter(total_hours__gt=STANDARD_DAY_HOURS).select_related(
+        'employee__user', 'employee__department'
+    ).order_by('date', 'employee__employee_id')
+    if params.get('year'):
+        attendance = attendance.filter(date__year=params['year'])
+    if params.get('month'):
+        attendance = attendance.filter(date__month=params['month'])
+    if params.get('department'):
+        attendance = attendance.filter(employee__department_id=params['department'])
+    return attendance
+
+
+def _bank(slip, attr):
+    bank = getattr(slip.employee, 'bank_details', None)
+    return getattr(bank, attr) if bank else 'N/A'
+
+
+PAYROLL_EXPORTS = {
+    'slips': (salary_slip_queryset, [
+        Column('Month', lambda s: s.month),
+        Column('Employee ID', lambda s: s.employee.employee_id),
+        Column('Name', lambda s: s.employee.full_name),
+        Column('Department', lambda s: _department(s.employee)),
+        Column('Basic', lambda s: s.basic_salary),
+        Column('Allowances', lambda s: s.allowances),
+        Column('OT Amount', lambda s: s.overtime_amount),
+        Column('Bonuses', lambda s: s.bonuses),
+        Column('Deductions', lambda s: s.total_deductions),
+        Column('Net Salary', lambda s: s.net_salary),
+        Column('Status', lambda s: s.payment_status),
+    ]),
+    'overtime': (overtime_queryset, [
+        Column('Date', lambda a: a.date),
+        Column('Employee', lambda a: a.employee.full_name),
+        Column('Department', lambda a: _department(a.employee)),
+        Column('Clock In', lambda a: a.clock_in),
+        Column('Clock Out', lambda a: a.clock_out),
+        Column('Total Hours', lambda a: a.total_hours),
+        Column('OT Hours', lambda a: round(float(a.total_hours) - STANDARD_DAY_HOURS, 2)),
+    ]),
+    'bank': (salary_slip_queryset, [
+        Column('Employee ID', lambda s: s.employee.employee_id),
+        Column('Name', lambda s: s.employee.full_name),
+        Column('Bank', lambda s: _bank(s, 'bank_name')),
+        Column('IBAN', lambda s: _bank(s, 'iban')),
+        Column('Account No', lambda s: _bank(s, 'account_number')),
+        Column('Net Salary', lambda s: s.net_salary),
+    ]),
+}
+
+
+# --------------------------------------------------- Background export builders
+# Registered in core.export_jobs.EXPORT_REPORTS: params -> (filename, columns, queryset)
+
+def workshop_diary_export(params):
+    return 'workshop_diary', WORKSHOP_DIARY_COLUMNS, workshop_diary_queryset(params)
+
+
+def invoice_book_export(params):
+    return 'invoice_book', INVOICE_BOOK_COLUMNS, invoice_book_queryset(params)
+
+
+def payroll_export(params):
+    export_type = params.get('type')
+    if export_type not in PAYROLL_EXPORTS:
+        raise ValueError(f"Invalid payroll export type {export_type!r}")
+    queryset_for, columns = PAYROLL_EXPORTS[export_type]
+    return f"payroll_export_{export_type}_{params.get('year')}_{params.get('month')}", columns, queryset_for(params)
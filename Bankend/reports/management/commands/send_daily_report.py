@@ -2,6 +2,7 @@ from django.core.management.base import BaseCommand
 from django.utils import timezone
 from hr.models import Employee
 from attendance.models import Attendance
+from attendance.services import AttendanceRollupService
 from django.conf import settings
 
 class Command(BaseCommand):
@@ -11,21 +12,24 @@ class Command(BaseCommand):
         today = timezone.now().date()
         self.stdout.write(f"Generating Daily Attendance Report for {today}...")
 
-        # 1. Fetch Data
-        all_employees = Employee.objects.filter(is_active=True)
-        attendance_records = Attendance.objects.filter(date=today)
+        # 1. Fetch Data (names come from the joined user rows, month-to-date lateness from the roll-up)
+        all_employees = list(Employee.objects.filter(is_active=True).select_related('user'))
+        attendance_records = list(Attendance.objects.filter(date=today).select_related('employee__user'))
         
-        present_qs = attendance_records.filter(status__in=['PRESENT', 'LATE', 'HALF_DAY'])
-        late_qs = attendance_records.filter(status='LATE')
+        present_records = [att for att in attendance_records if att.status in ('PRESENT', 'LATE', 'HALF_DAY')]
+        late_records = [att for att in attendance_records if att.status == 'LATE']
         
-        present_ids = present_qs.values_list('employee_id', flat=True)
-        absent_employees = all_employees.exclude(id__in=present_ids)
+        present_ids = {att.employee_id for att in present_records}
+        absent_employees = [emp for emp in all_employees if emp.pk not in present_ids]
+        month_totals = AttendanceRollupService.month_totals(
+            today.replace(day=1), [att.employee_id for att in late_records]
+        ) if late_records else {}
 
         # 2. Stats
-        total_staff = all_employees.count()
-        present_count = present_qs.count()
-        absent_count = absent_employees.count()
-        late_count = late_qs.count()
+        total_staff = len(all_employees)
+        present_count = len(present_records)
+        absent_count = len(absent_employees)
+        late_count = len(late_records)
 
         # 3. Compose Message
         report_lines = [
@@ -48,8 +52,10 @@ class Command(BaseCommand):
 
         if late_count > 0:
             report_lines.append("\n*Late Arrivals:*")
-            for att in late_qs:
-                report_lines.append(f"- {att.employee.full_name} ({att.check_in_time.strftime('%H:%M')})")
+            for att in late_records:
+                month = month_totals.get(att.employee_id)
+                times_late = f", {month.days_late}x late this month" if month else ""
+                report_lines.append(f"- {att.employee.full_name} ({att.check_in_time.strftime('%H:%M')}{times_late})")
 
         final_message = "\n".join(report_lines)
 
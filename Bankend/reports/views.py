@@ -2,7 +2,7 @@ from django.shortcuts import render
 from django.db import models
 from rest_framework.views import APIView
 from rest_framework.response import Response
-from rest_framework import status
+from rest_framework import permissions, status
 from django.core.management import call_command
 from django.utils import timezone
 from io import StringIO
@@ -24,7 +24,8 @@ class PayrollReportView(APIView):
     Filters: month, year, department, employee.
     """
     def get(self, request):
-        from hr.models import SalarySlip, Employee, Department
+        from hr.models import SalarySlip
+        from attendance.models import AttendanceMonth
         from django.db.models import Sum, Count, Avg
         
         month = request.query_params.get('month')
@@ -32,19 +33,24 @@ class PayrollReportView(APIView):
         dept_id = request.query_params.get('department')
         emp_id = request.query_params.get('employee')
         
-        # Base QuerySet
+        # Base QuerySets
         slips = SalarySlip.objects.all()
+        attendance = AttendanceMonth.objects.all()
         
         if year:
             slips = slips.filter(month__startswith=str(year))
+            attendance = attendance.filter(period__year=year) if str(year).isdigit() else attendance.none()
         if month:
             # month expected as 1-12 or 01-12
             month_fmt = f"-{month.zfill(2)}"
             slips = slips.filter(month__contains=month_fmt)
+            attendance = attendance.filter(period__month=month) if month.isdigit() else attendance.none()
         if dept_id:
             slips = slips.filter(employee__department_id=dept_id)
+            attendance = attendance.filter(employee__department_id=dept_id)
         if emp_id:
             slips = slips.filter(employee_id=emp_id)
+            attendance = attendance.filter(employee_id=emp_id)
             
         # Aggregations
         summary = slips.aggregate(
@@ -54,24 +60,32 @@ class PayrollReportView(APIView):
             avg_salary=Avg('net_salary'),
             employee_count=Count('employee', distinct=True)
         )
+        # Attendance from the per-employee monthly roll-up, not the daily rows
+        attendance_summary = attendance.aggregate(
+            days_present=Sum('days_present'),
+            days_late=Sum('days_late'),
+            total_hours=Sum('total_hours'),
+            overtime_hours=Sum('overtime_hours'),
+        )
         
         # Dept Breakdown if dept not filtered
         dept_breakdown = []
         if not dept_id:
-            depts = Department.objects.all()
-            for d in depts:
-                dept_slips = slips.filter(employee__department=d)
-                if dept_slips.exists():
-                    dept_breakdown.append({
-                        'id': d.id,
-                        'name': d.name,
-                        'total_cost': dept_slips.aggregate(Sum('net_salary'))['net_salary__sum'],
-                        'headcount': dept_slips.count()
-                    })
+            rows = slips.filter(employee__department__isnull=False).values(
+                'employee__department_id', 'employee__department__name'
+            ).annotate(total_cost=Sum('net_salary'), headcount=Count('id')).order_by('employee__department_id')
+            for row in rows:
+                dept_breakdown.append({
+                    'id': row['employee__department_id'],
+                    'name': row['employee__department__name'],
+                    'total_cost': row['total_cost'],
+                    'headcount': row['headcount']
+                })
 
         return Response({
             'filters': {'month': month, 'year': year, 'dept': dept_id, 'emp': emp_id},
             'summary': summary,
+            'attendance': attendance_summary,
             'department_breakdown': dept_breakdown,
             'slips_count': slips.count()
         })
@@ -133,52 +147,32 @@ class YearlyPLReportView(APIView):
             'departmental_performance': dept_stats
         })
 
+def _export_or_none(request, filename, columns, queryset):
+    """File download when ?export=csv|xls|xlsx is given, else None for the JSON report."""
+    from core.exports import export_response
+
+    fmt = request.query_params.get('export')
+    if not fmt:
+        return None
+    try:
+        return export_response(fmt, filename, columns, queryset)
+    except ValueError as e:
+        return Response({'error': str(e)}, status=400)
+
 class WorkshopDiaryReportView(APIView):
     """
     Detailed Audit log of all Job Cards within a date range.
+    ?export=csv|xls|xlsx streams the same rows as a file.
     """
     def get(self, request):
-        from job_cards.models import JobCard
-        from django.db.models import Count, Sum, Q
-
-        start_date = request.query_params.get('start_date')
-        end_date = request.query_params.get('end_date')
-        advisor_id = request.query_params.get('advisor')
-        status = request.query_params.get('status')
-        branch_id = request.query_params.get('branch')
-        plate_no = request.query_params.get('plate_no')
-        search_query = request.query_params.get('search')
-        
-        jobs = JobCard.objects.all().order_by('-date')
-        
-        # Date Range Filter
-        if start_date and end_date:
-            jobs = jobs.filter(date__range=[start_date, end_date])
-            
-        # Advisor Filter
-        if advisor_id and advisor_id != 'ALL':
-            jobs = jobs.filter(service_advisor_id=advisor_id)
-
-        # Status Filter
-        if status and status != 'ALL':
-            jobs = jobs.filter(status=status)
-
-        # Branch Filter
-        if branch_id and branch_id != 'ALL':
-            jobs = jobs.filter(branch_id=branch_id)
+        from django.db.models import Count, Sum
+        from .exports import workshop_diary_queryset, advisor_name, WORKSHOP_DIARY_COLUMNS
 
-        # Plate Number Filter
-        if plate_no:
-            jobs = jobs.filter(registration_number__icontains=plate_no)
+        jobs = workshop_diary_queryset(request.query_params)
 
-        # General Search Filter
-        if search_query:
-            jobs = jobs.filter(
-                Q(job_card_number__icontains=search_query) |
-                Q(customer_name__icontains=search_query) |
-                Q(registration_number__icontains=search_query) |
-                Q(vin__icontains=search_query)
-            )
+        export = _export_or_none(request, 'workshop_diary', WORKSHOP_DIARY_COLUMNS, jobs)
+        if export is not None:
+            return export
         
         summary = jobs.aggregate(
             total_jobs=Count('id'),
@@ -186,25 +180,16 @@ class WorkshopDiaryReportView(APIView):
             total_vat=Sum('vat_amount')
         )
 
-        job_data = []
-        for j in jobs:
-            # Safe advisor name resolution
-            advisor_name = j.service_advisor_legacy
-            if j.service_advisor:
-                advisor_name = f"{j.service_advisor.first_name} {j.service_advisor.last_name}"
-            elif hasattr(j, 'advisor') and j.advisor: # Handle potential direct foreign key if named 'advisor'
-                 advisor_name = f"{j.advisor.first_name} {j.advisor.last_name}"
-
-            job_data.append({
-                'id': j.id,
-                'number': j.job_card_number,
-                'date': j.date,
-                'customer': j.customer_name,
-                'asset': f"{j.brand} {j.model} ({j.registration_number})",
-                'status': j.status,
-                'net_amount': j.net_amount,
-                'advisor': advisor_name
-            })
+        job_data = [{
+            'id': j.id,
+            'number': j.job_card_number,
+            'date': j.date,
+            'customer': j.customer_name,
+            'asset': f"{j.brand} {j.model} ({j.registration_number})",
+            'status': j.status,
+            'net_amount': j.net_amount,
+            'advisor': advisor_name(j)
+        } for j in jobs.iterator(chunk_size=2000)]
 
         return Response({
             'summary': summary,
@@ -214,17 +199,17 @@ class WorkshopDiaryReportView(APIView):
 class InvoiceBookReportView(APIView):
     """
     Detailed log of all Invoices within a date range.
+    ?export=csv|xls|xlsx streams the same rows as a file.
     """
     def get(self, request):
-        from invoices.models import Invoice
         from django.db.models import Sum, Count
+        from .exports import invoice_book_queryset, INVOICE_BOOK_COLUMNS
 
-        start_date = request.query_params.get('start_date')
-        end_date = request.query_params.get('end_date')
-        
-        invoices = Invoice.objects.all().order_by('-date')
-        if start_date and end_date:
-            invoices = invoices.filter(date__range=[start_date, end_date])
+        invoices = invoice_book_queryset(request.query_params)
+
+        export = _export_or_none(request, 'invoice_book', INVOICE_BOOK_COLUMNS, invoices)
+        if export is not None:
+            return export
             
         summary = invoices.aggregate(
             total_invoices=Count('id'),
@@ -234,113 +219,52 @@ class InvoiceBookReportView(APIView):
             paid_count=Count('id', filter=models.Q(payment_status='PAID'))
         )
 
-        entries = []
-        for inv in invoices:
-            entries.append({
-                'id': inv.id,
-                'number': inv.invoice_number,
-                'date': inv.date,
-                'customer': inv.customer_name,
-                'status': inv.payment_status,
-                'grand_total': inv.grand_total,
-                'vat_amount': inv.vat_amount
-            })
+        entries = [{
+            'id': inv.id,
+            'number': inv.invoice_number,
+            'date': inv.date,
+            'customer': inv.customer_name,
+            'status': inv.payment_status,
+            'grand_total': inv.grand_total,
+            'vat_amount': inv.vat_amount
+        } for inv in invoices.only(
+            'id', 'invoice_number', 'date', 'customer_name', 'payment_status', 'grand_total', 'vat_amount'
+        ).iterator(chunk_size=2000)]
+
+        return Response({
+            'summary': summary,
+            'entries': entries
+        })
 
 class PayrollExportView(APIView):
     """
-    Handles CSV exports for Payroll Data.
+    Handles file exports for Payroll Data (CSV by default, ?export=xlsx|xls).
     Types: 'slips', 'overtime', 'bank'
+    Every employee's slips and bank details: staff only, as SalarySlipViewSet
+    shows other employees' slips only to staff.
     """
+    permission_classes = [permissions.IsAdminUser]
+
     def get(self, request):
-        import csv
-        from django.http import HttpResponse
-        from hr.models import SalarySlip, HRAttendance, Employee
+        from core.exports import export_response
+        from .exports import PAYROLL_EXPORTS
         
         export_type = request.query_params.get('type')
+        if export_type not in PAYROLL_EXPORTS:
+            return Response({'error': 'Invalid export type'}, status=400)
+
         month = request.query_params.get('month')
         year = request.query_params.get('year')
-        dept_id = request.query_params.get('department')
-        
-        response = HttpResponse(content_type='text/csv')
-        response['Content-Disposition'] = f'attachment; filename="payroll_export_{export_type}_{year}_{month}.csv"'
-        
-        writer = csv.writer(response)
-        
-        if export_type == 'slips':
-            writer.writerow(['Month', 'Employee ID', 'Name', 'Department', 'Basic', 'Allowances', 'OT Amount', 'Bonuses', 'Deductions', 'Net Salary', 'Status'])
-            slips = SalarySlip.objects.filter(month__startswith=f"{year}-" if year else "")
-            if month:
-                 month_fmt = f"-{str(month).zfill(2)}"
-                 slips = slips.filter(month__contains=month_fmt)
-            if dept_id:
-                slips = slips.filter(employee__department_id=dept_id)
-                
-            for slip in slips:
-                writer.writerow([
-                    slip.month,
-                    slip.employee.employee_id,
-                    slip.employee.full_name,
-                    slip.employee.department.name if slip.employee.department else 'N/A',
-                    slip.basic_salary,
-                    slip.allowances,
-                    slip.overtime_amount,
-                    slip.bonuses,
-                    slip.total_deductions,
-                    slip.net_salary,
-                    slip.payment_status
-                ])
-                
-        elif export_type == 'overtime':
-            writer.writerow(['Date', 'Employee', 'Department', 'Clock In', 'Clock Out', 'Total Hours', 'OT Hours'])
-            # Filter attendance
-            attendance = HRAttendance.objects.all()
-            if year:
-                attendance = attendance.filter(date__year=year)
-            if month:
-                attendance = attendance.filter(date__month=month)
-            if dept_id:
-                attendance = attendance.filter(employee__department_id=dept_id)
-            
-            # Only show records with OT > 0
-            attendance = attendance.filter(total_hours__gt=9) # Assuming > 9 is OT, strictly logic might vary but generic check
-            
-            for att in attendance:
-                ot_hours = float(att.total_hours) - 9 if float(att.total_hours) > 9 else 0
-                if ot_hours > 0:
-                    writer.writerow([
-                        att.date,
-                        att.employee.full_name,
-                        att.employee.department.name if att.employee.department else 'N/A',
-                        att.clock_in,
-                        att.clock_out,
-                        att.total_hours,
-                        round(ot_hours, 2)
-                    ])
-
-        elif export_type == 'bank':
-            writer.writerow(['Employee ID', 'Name', 'Bank', 'IBAN', 'Account No', 'Net Salary'])
-            slips = SalarySlip.objects.filter(month__startswith=f"{year}-" if year else "")
-            if month:
-                 month_fmt = f"-{str(month).zfill(2)}"
-                 slips = slips.filter(month__contains=month_fmt)
-            if dept_id:
-                slips = slips.filter(employee__department_id=dept_id)
-            
-            for slip in slips:
-                bank = getattr(slip.employee, 'bank_details', None)
-                writer.writerow([
-                    slip.employee.employee_id,
-                    slip.employee.full_name,
-                    bank.bank_name if bank else 'N/A',
-                    bank.iban if bank else 'N/A',
-                    bank.account_number if bank else 'N/A',
-                    slip.net_salary
-                ])
-                
-        else:
-            return Response({'error': 'Invalid export type'}, status=400)
-            
-        return response
+        queryset_for, columns = PAYROLL_EXPORTS[export_type]
+        try:
+            return export_response(
+                request.query_params.get('export', 'csv'),
+                f"payroll_export_{export_type}_{year}_{month}",
+                columns,
+                queryset_for(request.query_params),
+            )
+        except ValueError as e:
+            return Response({'error': str(e)}, status=400)
 
 class EmployeeReportView(APIView):
     """
@@ -0,0 +1,203 @@
+"""
+Stock forecasting and reorder planning.
+
+plan() forecasts every stock item of a branch (or all branches) at once: one
+grouped query yields daily APPROVED consumption (OUT movements) over the last
+STOCK_FORECAST_LOOKBACK_DAYS complete days, cached per branch for the day, and
+the rates, days of cover, reorder points and order quantities are computed as
+NumPy arrays. Per item:
+
+    daily rate      mean of the last 30 days, or exponentially smoothed
+                    (method='ewma', STOCK_SMOOTHING_ALPHA)
+    seasonal        optional day-of-week factors, so the lead time and cover
+                    demand follow the item's weekly pattern
+    safety stock    max(safety_level, z * daily std * sqrt(lead time))
+    reorder point   lead time demand + safety stock
+    suggested qty   up to reorder point + STOCK_COVER_DAYS of demand, once
+                    stock plus open purchase orders falls to the reorder point
+
+draft_purchase_orders() turns the suggestions into DRAFT purchase orders, one
+per supplier (the supplier an item was last ordered from). Open orders count
+as stock, so running it again does not order twice.
+"""
+import datetime
+import math
+import uuid
+from decimal import Decimal
+
+import numpy as np
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import PurchaseOrder, PurchaseOrderItem, StockItem, StockMovement
+
+METHODS = ('average', 'ewma')
+RECENT_DAYS = 30
+NO_CONSUMPTION_DAYS = 999
+OPEN_PO_STATUSES = ('DRAFT', 'SENT', 'RECEIVED')
+
+
+def setting(name, default):
+    return getattr(settings, name, default)
+
+
+def consumption_rows(branch_id, start, end):
+    """[(item id, day index from start, quantity)] for OUT consumption on days start..end-1."""
+    tz = timezone.get_current_timezone()
+    movements = StockMovement.objects.filter(
+        type='OUT', status='APPROVED',
+        date__gte=datetime.datetime.combine(start, datetime.time.min, tz),
+        date__lt=datetime.datetime.combine(end, datetime.time.min, tz),
+    )
+    if branch_id:
+        movements = movements.filter(item__branch_id=branch_id)
+    daily = movements.annotate(day=TruncDate('date')).values('item_id', 'day').annotate(used=Sum('quantity')).order_by()
+    return [(row['item_id'], (row['day'] - start).days, float(row['used'])) for row in daily]
+
+
+def cached_consumption(branch_id, start, end, use_cache=True):
+    key = f"stock_forecast:consumption:{branch_id or 'all'}:{start}:{end}"
+    rows = cache.get(key) if use_cache else None
+    if rows is None:
+        rows = consumption_rows(branch_id, start, end)
+        cache.set(key, rows, setting('STOCK_FORECAST_CACHE_SECONDS', 3600))
+    return rows
+
+
+def on_order_quantities(item_ids):
+    open_items = PurchaseOrderItem.objects.filter(
+        item_id__in=item_ids, purchase_order__status__in=OPEN_PO_STATUSES,
+    ).values('item_id').annotate(outstanding=Sum(F('quantity') - F('received_quantity'))).order_by()
+    return {row['item_id']: max(float(row['outstanding']), 0.0) for row in open_items}
+
+
+def weekday_factors(usage, start):
+    """Each item's mean consumption per weekday relative to its overall mean (1 where it has none)."""
+    weekdays = (np.arange(usage.shape[1]) + start.weekday()) % 7
+    overall = usage.mean(axis=1, keepdims=True)
+    by_day = np.stack([usage[:, weekdays == day].mean(axis=1) for day in range(7)], axis=1)
+    return np.divide(by_day, overall, out=np.ones_like(by_day), where=overall > 0)
+
+
+def horizon_demand(rate, factors, first_day, days):
+    """Demand over `days` days starting at first_day, following the weekday factors when given."""
+    if factors is None:
+        return rate * days
+    upcoming = [(first_day + datetime.timedelta(days=offset)).weekday() for offset in range(days)]
+    return rate * factors[:, upcoming].sum(axis=1)
+
+
+def plan(branch_id=None, method='average', seasonal=False, today=None, use_cache=True):
+    """One forecast row per stock item (see module docstring)."""
+    if method not in METHODS:
+        raise ValueError(f"method must be one of: {', '.join(METHODS)}")
+    today = today or timezone.localdate()
+    lookback = setting('STOCK_FORECAST_LOOKBACK_DAYS', 90)
+    lead_time = setting('STOCK_LEAD_TIME_DAYS', 7)
+    cover_days = setting('STOCK_COVER_DAYS', 30)
+    start = today - datetime.timedelta(days=lookback)
+
+    items = StockItem.objects.order_by('pk')
+    if branch_id:
+        items = items.filter(branch_id=branch_id)
+    items = list(items.values('id', 'name', 'sku', 'category', 'unit', 'current_stock', 'safety_level', 'unit_cost', 'branch_id'))
+    if not items:
+        return []
+
+    row_of = {item['id']: row for row, item in enumerate(items)}
+    usage = np.zeros((len(items), lookback))
+    used = [(row_of[item_id], day, quantity)
+            for item_id, day, quantity in cached_consumption(branch_id, start, today, use_cache) if item_id in row_of]
+    if used:
+        rows, days, quantities = zip(*used)
+        np.add.at(usage, (list(rows), list(days)), quantities)
+
+    stock = np.array([float(item['current_stock']) for item in items])
+    safety_level = np.array([float(item['safety_level']) for item in items])
+    on_order_by_item = on_order_quantities(list(row_of))
+    on_order = np.array([on_order_by_item.get(item['id'], 0.0) for item in items])
+
+    if method == 'ewma':
+        alpha = setting('STOCK_SMOOTHING_ALPHA', 0.3)
+        weights = alpha * (1 - alpha) ** np.arange(lookback)[::-1]
+        rate = usage @ (weights / weights.sum())
+    else:
+        rate = usage[:, -RECENT_DAYS:].sum(axis=1) / RECENT_DAYS
+    factors = weekday_factors(usage, start) if seasonal else None
+
+    lead_demand = horizon_demand(rate, factors, today, lead_time)
+    cover_demand = horizon_demand(rate, factors, today + datetime.timedelta(days=lead_time), cover_days)
+    safety_stock = np.maximum(safety_level, setting('STOCK_SERVICE_LEVEL_Z', 1.65) * usage.std(axis=1) * math.sqrt(lead_time))
+    reorder_point = lead_demand + safety_stock
+    position = stock + on_order
+    suggested = np.where(position <= reorder_point, np.ceil(np.maximum(reorder_point + cover_demand - position, 0)), 0)
+    days_remaining = np.where(rate > 0, np.trunc(stock / np.where(rate > 0, rate, 1)), NO_CONSUMPTION_DAYS)
+
+    forecasts = []
+    for row, item in enumerate(items):
+        days_left = int(days_remaining[row])
+        forecasts.append({
+            'id': item['id'], 'name': item['name'], 'sku': item['sku'], 'category': item['category'],
+            'unit': item['unit'], 'branch': item['branch_id'],
+            'current_stock': float(stock[row]),
+            'safety_level': float(safety_level[row]),
+            'on_order': float(on_order[row]),
+            'used_30_days': round(float(usage[row, -RECENT_DAYS:].sum()), 2),
+            'used_lookback': round(float(usage[row].sum()), 2),
+            'daily_rate': round(float(rate[row]), 3),
+            'days_remaining': days_left,
+            'projected_stock_out': today + datetime.timedelta(days=min(days_left, 365)),
+            'reorder_point': round(float(reorder_point[row]), 2),
+            'suggested_quantity': float(suggested[row]),
+            'unit_cost': float(item['unit_cost']),
+            'status': "CRITICAL" if days_left < 7 else "WARNING" if days_left < 30 else "OK",
+        })
+    return forecasts
+
+
+def last_suppliers(item_ids):
+    """{item id: supplier id} from each item's most recent purchase order."""
+    suppliers = {}
+    for item_id, supplier_id in PurchaseOrderItem.objects.filter(item_id__in=item_ids).order_by(
+        'item_id', '-purchase_order__order_date', '-pk',
+    ).values_list('item_id', 'purchase_order__supplier_id'):
+        suppliers.setdefault(item_id, supplier_id)
+    return suppliers
+
+
+def draft_purchase_orders(branch_id=None, default_supplier=None, **options):
+    """Creates DRAFT purchase orders for the suggested quantities; returns (orders, items without a supplier)."""
+    today = timezone.localdate()
+    wanted = [row for row in plan(branch_id, today=today, use_cache=False, **options) if row['suggested_quantity'] > 0]
+    suppliers = last_suppliers([row['id'] for row in wanted])
+
+    lines_by_supplier, skipped = {}, []
+    for row in wanted:
+        supplier_id = suppliers.get(row['id'], default_supplier)
+        if supplier_id is None:
+            skipped.append(row)
+        else:
+            lines_by_supplier.setdefault(supplier_id, []).append(row)
+
+    orders = []
+    with transaction.atomic():
+        for supplier_id, rows in lines_by_supplier.items():
+            order = PurchaseOrder.objects.create(
+                po_number=f"PO-{uuid.uuid4().hex[:8].upper()}", supplier_id=supplier_id, status='DRAFT',
+                order_date=today, expected_date=today + datetime.timedelta(days=setting('STOCK_LEAD_TIME_DAYS', 7)),
+                notes='Drafted by the reorder planner',
+            )
+            lines = []
+            for row in rows:
+                quantity, unit_cost = Decimal(str(row['suggested_quantity'])), Decimal(str(row['unit_cost']))
+                lines.append(PurchaseOrderItem(purchase_order=order, item_id=row['id'], quantity=quantity,
+                                               unit_cost=unit_cost, total_cost=quantity * unit_cost))
+            PurchaseOrderItem.objects.bulk_create(lines)
+            order.total_amount = sum(line.total_cost for line in lines)
+            order.save(update_fields=['total_amount'])
+            orders.append(order)
+    return orders, skipped
@@ -0,0 +1,198 @@
+"""
+Stock ledger: APPROVED StockMovements are the record of every stock change,
+StockItem.current_stock their running total.
+
+apply() adds movements to their items' stock in the database itself
+(UPDATE ... SET current_stock = current_stock + delta, one statement for any
+number of items), so concurrent approvals cannot overwrite each other.
+post() inserts a batch of movements with bulk_create and applies the approved
+ones in the same transaction: a whole transfer or PO receipt costs a constant
+number of queries; receive_purchase_order() books any number of PO lines
+that way. `manage.py reconcile_stock` compares current_stock with the
+movement totals and can rebuild it.
+"""
+from collections import defaultdict
+from decimal import Decimal, InvalidOperation
+
+from django.db import connection, transaction
+from django.db.models import Case, DecimalField, F, Sum, Value, When
+
+from .models import PurchaseOrder, StockItem, StockMovement
+
+INBOUND = ('IN', 'ICT_IN', 'ADJ')
+OUTBOUND = ('OUT', 'ICT_OUT')
+STOCK_FIELD = DecimalField(max_digits=10, decimal_places=2)
+
+
+def signed_quantity(movement_type, quantity):
+    if movement_type in INBOUND:
+        return quantity
+    if movement_type in OUTBOUND:
+        return -quantity
+    return Decimal('0')
+
+
+def deltas(movements):
+    """{item id: net stock change} of the approved movements."""
+    totals = defaultdict(Decimal)
+    for movement in movements:
+        if movement.status == 'APPROVED':
+            totals[movement.item_id] += signed_quantity(movement.type, movement.quantity)
+    return {item_id: delta for item_id, delta in totals.items() if delta}
+
+
+def adjust(changes):
+    """Adds {item id: delta} to current_stock in one UPDATE."""
+    if not changes:
+        return 0
+    items = StockItem.objects.filter(pk__in=changes)
+    if len(changes) == 1:
+        [delta] = changes.values()
+        return items.update(current_stock=F('current_stock') + Value(delta, output_field=STOCK_FIELD))
+    with transaction.atomic():
+        if connection.features.has_select_for_update:
+            # Lock in primary key order so two multi-item updates cannot deadlock
+            list(items.select_for_update().order_by('pk').values_list('pk', flat=True))
+        return items.update(current_stock=F('current_stock') + Case(
+            *[When(pk=item_id, then=Value(delta, output_field=STOCK_FIELD)) for item_id, delta in changes.items()],
+            default=Value(Decimal('0'), output_field=STOCK_FIELD), output_field=STOCK_FIELD,
+        ))
+
+
+def apply(movements):
+    """Applies approved movements to stock; loaded item instances see the change too."""
+    changes = deltas(movements)
+    adjust(changes)
+    for movement in movements:
+        item = movement._state.fields_cache.get('item')
+        if item is not None and item.pk in changes:
+            # An item built in memory still holds the field's float default
+            item.current_stock = Decimal(str(item.current_stock)) + changes.pop(item.pk)
+
+
+def create_all(model, objects):
+    """bulk_create that records the audit events post_save would have (bulk_create sends no signals)."""
+    from core import audit
+    from core.signals import build_event, is_audited
+
+    created = model.objects.bulk_create(objects)
+    if is_audited(model):
+        for obj in created:
+            audit.record_event(build_event(obj, 'CREATE'))
+    return created
+
+
+def update_all(objects, fields):
+    """bulk_update that records the audit events post_save would have."""
+    from core import audit
+    from core.signals import build_event, is_audited
+
+    if not objects:
+        return
+    model = type(objects[0])
+    model.objects.bulk_update(objects, fields)
+    if is_audited(model):
+        for obj in objects:
+            audit.record_event(build_event(obj, 'UPDATE', audit.field_changes(obj)))
+            audit.take_snapshot(obj)
+
+
+def post(movements):
+    """Inserts movements in one statement and applies the approved ones; returns them with their pks."""
+    with transaction.atomic():
+        created = create_all(StockMovement, movements)
+        adjust(deltas(created))
+    return created
+
+
+def receive_purchase_order(order, lines, status='APPROVED', recorded_by=''):
+    """
+    Books received quantities against a purchase order in one transaction.
+
+    lines: [{'item_id': PO line id, 'quantity': ...}] or {'sku': ...} instead
+    of item_id. Raises ValueError for unknown lines or quantities that are not
+    positive numbers. Returns the IN movements.
+    """
+    with transaction.atomic():
+        order = PurchaseOrder.objects.select_for_update().get(pk=order.pk)
+        if order.status in ('COMPLETED', 'CANCELLED'):
+            raise ValueError(f"PO is already {order.get_status_display().lower()}")
+        po_lines = list(order.items.select_related('item').order_by('pk'))
+        by_id = {line.pk: line for line in po_lines}
+        by_sku = {line.item.sku: line for line in po_lines if line.item.sku}
+
+        received = {}
+        for entry in lines:
+            line = by_id.get(_int_or_none(entry.get('item_id'))) if entry.get('item_id') is not None \
+                else by_sku.get(entry.get('sku'))
+            if line is None:
+                raise ValueError(f"Not on {order.po_number}: {entry.get('item_id') or entry.get('sku')}")
+            try:
+                quantity = Decimal(str(entry.get('quantity')))
+            except InvalidOperation:
+                quantity = None
+            if quantity is None or not quantity.is_finite() or quantity <= 0:
+                raise ValueError(f"Invalid quantity for {line.item.name}: {entry.get('quantity')}")
+            received[line] = received.get(line, Decimal('0')) + quantity
+        if not received:
+            raise ValueError("No lines to receive")
+
+        for line, quantity in received.items():
+            line.received_quantity += quantity
+        update_all(list(received), ['received_quantity'])
+        movements = post([
+            StockMovement(item=line.item, type='IN', status=status, quantity=quantity, purchase_order=order,
+                          reason=f"Received against {order.po_number}", recorded_by=recorded_by)
+            for line, quantity in received.items()
+        ])
+
+        order.status = 'COMPLETED' if all(line.received_quantity >= line.quantity for line in po_lines) else 'RECEIVED'
+        order.save(update_fields=['status'])
+    return movements
+
+
+def _int_or_none(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return None
+
+
+def ledger_totals(items):
+    """{item id: sum of its approved movements} for the given StockItem queryset."""
+    signed = Case(
+        When(type__in=INBOUND, then=F('quantity')),
+        When(type__in=OUTBOUND, then=-F('quantity')),
+        default=Value(Decimal('0')), output_field=STOCK_FIELD,
+    )
+    totals = StockMovement.objects.filter(item__in=items, status='APPROVED').values('item_id').annotate(
+        total=Sum(signed),
+    ).order_by()
+    return {row['item_id']: row['total'] or Decimal('0') for row in totals}
+
+
+def discrepancies(items=None):
+    """[(item, ledger total)] for items whose current_stock differs from their movements."""
+    items = StockItem.objects.all() if items is None else items
+    totals = ledger_totals(items)
+    found = []
+    for item in items.only('id', 'name', 'sku', 'current_stock').order_by('pk'):
+        total = totals.get(item.pk, Decimal('0')).quantize(Decimal('0.01'))
+        if item.current_stock != total:
+            found.append((item, total))
+    return found
+
+
+def reconcile(items=None):
+    """Rebuilds current_stock from the movements for every item that drifted; returns the drifted items."""
+    items = StockItem.objects.all() if items is None else items
+    with transaction.atomic():
+        if connection.features.has_select_for_update:
+            list(items.select_for_update().order_by('pk').values_list('pk', flat=True))
+        found = discrepancies(items)
+        if found:
+            StockItem.objects.filter(pk__in=[item.pk for item, _ in found]).update(current_stock=Case(
+                *[When(pk=item.pk, then=Value(total, output_field=STOCK_FIELD)) for item, total in found],
+                output_field=STOCK_FIELD,
+            ))
+    return found
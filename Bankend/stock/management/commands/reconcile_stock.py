@@ -0,0 +1,46 @@
+"""
+Rebuild or verify StockItem.current_stock against the APPROVED stock movements
+(stock.ledger). Stock entered directly on an item (opening balances, admin
+edits) has no movement and is lost on rebuild: record it as an ADJ movement
+first.
+
+Usage:
+    python manage.py reconcile_stock                        # rebuild drifted items
+    python manage.py reconcile_stock --verify               # report drift only
+    python manage.py reconcile_stock --branch 2 --verify
+"""
+from django.core.management.base import BaseCommand, CommandError
+
+from stock import ledger
+from stock.models import StockItem
+
+
+class Command(BaseCommand):
+    help = 'Rebuild or verify stock levels from the stock movement ledger'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--branch', type=int, help='Only items of this branch id')
+        parser.add_argument(
+            '--verify',
+            action='store_true',
+            help='Compare stock levels with the movement totals without writing',
+        )
+
+    def handle(self, *args, **options):
+        items = StockItem.objects.all()
+        if options['branch']:
+            items = items.filter(branch_id=options['branch'])
+
+        if options['verify']:
+            drifted = ledger.discrepancies(items)
+            if not drifted:
+                self.stdout.write(self.style.SUCCESS('✅ Stock levels match the movement ledger.'))
+                return
+            for item, total in drifted:
+                self.stdout.write(f"  {item.sku or item.pk} {item.name}: stock {item.current_stock}, ledger {total}")
+            raise CommandError(f'{len(drifted)} stock items are out of balance. Run without --verify to rebuild.')
+
+        drifted = ledger.reconcile(items)
+        for item, total in drifted:
+            self.stdout.write(f"  {item.sku or item.pk} {item.name}: {item.current_stock} -> {total}")
+        self.stdout.write(self.style.SUCCESS(f'✅ Rebuilt {len(drifted)} stock items.'))
@@ -0,0 +1,20 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('stock', '0007_stockitem_branch_alter_stockmovement_type_and_more'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='stockitem',
+            name='sku',
+            field=models.CharField(blank=True, max_length=100, null=True),
+        ),
+        migrations.AddConstraint(
+            model_name='stockitem',
+            constraint=models.UniqueConstraint(fields=('branch', 'sku'), name='stock_item_unique_branch_sku'),
+        ),
+    ]
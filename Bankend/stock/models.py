@@ -1,4 +1,5 @@
-from django.db import models
+from django.db import models, transaction
+from core.models import TrackedFieldsMixin
 
 class StockItem(models.Model):
     CATEGORIES = [
@@ -10,7 +11,7 @@ class StockItem(models.Model):
         ('OTHER', 'Other Consumables'),
     ]
     name = models.CharField(max_length=255)
-    sku = models.CharField(max_length=100, unique=True, blank=True, null=True)
+    sku = models.CharField(max_length=100, blank=True, null=True)
     category = models.CharField(max_length=20, choices=CATEGORIES)
     unit = models.CharField(max_length=50, default='Units') # Meters, Bottles, etc.
     current_stock = models.DecimalField(max_digits=10, decimal_places=2, default=0.00)
@@ -25,11 +26,19 @@ class StockItem(models.Model):
     rack = models.CharField(max_length=50, blank=True)
     bin = models.CharField(max_length=50, blank=True)
 
+    class Meta:
+        # The same SKU is stocked in every branch; transfers match items by it
+        constraints = [
+            models.UniqueConstraint(fields=['branch', 'sku'], name='stock_item_unique_branch_sku'),
+        ]
+
     def __str__(self):
         branch_prefix = f"[{self.branch.code}] " if self.branch else ""
         return f"{branch_prefix}{self.name} ({self.category})"
 
-class StockMovement(models.Model):
+class StockMovement(TrackedFieldsMixin, models.Model):
+    tracked_fields = ('status',)
+
     TYPES = [
         ('IN', 'Restock (Purchase)'),
         ('OUT', 'Consumption (Job)'),
@@ -54,40 +63,33 @@ class StockMovement(models.Model):
     recorded_by = models.CharField(max_length=255, blank=True)
 
     def save(self, *args, **kwargs):
-        is_new = self.pk is None
-        old_status = None
-        
-        if not is_new:
-            try:
-                old_instance = StockMovement.objects.get(pk=self.pk)
-                old_status = old_instance.status
-            except StockMovement.DoesNotExist:
-                pass
+        from . import ledger
 
-        super().save(*args, **kwargs)
-
-        # Logic: Only adjust stock if status is APPROVED
-        # Case 1: New record created as APPROVED (e.g. by Admin)
-        # Case 2: Existing record changed from NON-APPROVED to APPROVED
-        
-        should_adjust = False
-        if is_new and self.status == 'APPROVED':
-            should_adjust = True
-        elif not is_new and old_status != 'APPROVED' and self.status == 'APPROVED':
-            should_adjust = True
-            
-        if should_adjust:
-            if self.type in ['IN', 'ICT_IN', 'ADJ']:
-                self.item.current_stock += self.quantity
-            elif self.type in ['OUT', 'ICT_OUT']:
-                self.item.current_stock -= self.quantity
-            
-            self.item.save()
+        is_new = self.pk is None
+        # Only APPROVED movements count towards stock: a new record created as
+        # APPROVED (e.g. by an admin) or an existing one changed to APPROVED
+        if is_new:
+            with transaction.atomic():
+                super().save(*args, **kwargs)
+                ledger.apply([self])
+            return
+        if self.previous('status') == 'APPROVED' or self.status != 'APPROVED':
+            super().save(*args, **kwargs)
+            return
+        with transaction.atomic():
+            # Claim the approval in the database: of two concurrent approvals
+            # of the same movement only one updates the row and moves stock
+            claimed = StockMovement.objects.filter(pk=self.pk).exclude(status='APPROVED').update(status='APPROVED')
+            super().save(*args, **kwargs)
+            if claimed:
+                ledger.apply([self])
 
     def __str__(self):
         return f"{self.type} - {self.quantity} {self.item.name}"
 
-class StockTransfer(models.Model):
+class StockTransfer(TrackedFieldsMixin, models.Model):
+    tracked_fields = ('status',)
+
     STATUS_CHOICES = [
         ('PENDING', 'Pending Transfer'),
         ('TRANSIT', 'In Transit'),
@@ -102,58 +104,55 @@ class StockTransfer(models.Model):
     notes = models.TextField(blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
-    def save(self, *args, **kwargs):
+    def save(self, *args, recorded_by='', **kwargs):
         is_new = self.pk is None
-        old_status = None
-        if not is_new:
-            old_status = StockTransfer.objects.get(pk=self.pk).status
-            
-        super().save(*args, **kwargs)
-        
-        # Automation Logic: Create StockMovements based on status change
-        if not is_new:
-            # 1. Status changed to TRANSIT -> Create ICT_OUT from source branch
-            if old_status != 'TRANSIT' and self.status == 'TRANSIT':
-                for detail in self.items.all():
-                    from .models import StockMovement
-                    StockMovement.objects.create(
-                        item=detail.item,
-                        type='ICT_OUT',
-                        status='APPROVED',
-                        quantity=detail.quantity,
-                        transfer=self,
-                        reason=f"Auto-generated from Transfer {self.transfer_number}"
-                    )
-            
-            # 2. Status changed to COMPLETED -> Create ICT_IN for destination branch
-            elif old_status != 'COMPLETED' and self.status == 'COMPLETED':
-                for detail in self.items.all():
-                    from .models import StockItem, StockMovement
-                    # Find or create equivalent item in destination branch
-                    dest_item = StockItem.objects.filter(
-                        branch=self.to_branch,
-                        sku=detail.item.sku
-                    ).first()
-                    
-                    if not dest_item:
-                        # Create new stock record in destination branch if missing
-                        dest_item = StockItem.objects.create(
-                            branch=self.to_branch,
-                            name=detail.item.name,
-                            sku=detail.item.sku,
-                            category=detail.item.category,
-                            unit=detail.item.unit,
-                            unit_cost=detail.item.unit_cost
-                        )
-                    
-                    StockMovement.objects.create(
-                        item=dest_item,
-                        type='ICT_IN',
-                        status='APPROVED',
-                        quantity=detail.quantity,
-                        transfer=self,
-                        reason=f"Auto-generated from Transfer {self.transfer_number}"
-                    )
+        old_status = self.previous('status')
+
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            if not is_new:
+                self.post_movements(old_status, recorded_by)
+
+    def post_movements(self, old_status, recorded_by=''):
+        """Automation Logic: Create StockMovements based on status change, inserted and applied to stock in one batch."""
+        from . import ledger
+        reason = f"Auto-generated from Transfer {self.transfer_number}"
+
+        # 1. Status changed to TRANSIT -> Create ICT_OUT from source branch
+        if old_status != 'TRANSIT' and self.status == 'TRANSIT':
+            ledger.post([
+                StockMovement(item=detail.item, type='ICT_OUT', status='APPROVED', quantity=detail.quantity,
+                              transfer=self, reason=reason, recorded_by=recorded_by)
+                for detail in self.items.select_related('item')
+            ])
+
+        # 2. Status changed to COMPLETED -> Create ICT_IN for destination branch
+        elif old_status != 'COMPLETED' and self.status == 'COMPLETED':
+            details = list(self.items.select_related('item'))
+            ledger.post([
+                StockMovement(item=dest_item, type='ICT_IN', status='APPROVED', quantity=detail.quantity,
+                              transfer=self, reason=reason, recorded_by=recorded_by)
+                for detail, dest_item in zip(details, self.destination_items(details))
+            ])
+
+    def destination_items(self, details):
+        """The destination branch's item for each detail, matched by SKU; missing ones are created in one batch."""
+        from . import ledger
+        by_sku = {item.sku: item for item in StockItem.objects.filter(
+            branch=self.to_branch, sku__in={detail.item.sku for detail in details if detail.item.sku},
+        )}
+        missing = {}
+        for detail in details:
+            source = detail.item
+            if source.sku not in by_sku and source.pk not in missing:
+                # Create new stock record in destination branch if missing
+                missing[source.pk] = StockItem(
+                    branch=self.to_branch, name=source.name, sku=source.sku, category=source.category,
+                    unit=source.unit, unit_cost=source.unit_cost, safety_level=source.safety_level,
+                )
+        ledger.create_all(StockItem, list(missing.values()))
+        by_sku.update((item.sku, item) for item in missing.values() if item.sku)
+        return [by_sku.get(detail.item.sku) or missing[detail.item.pk] for detail in details]
 
     def __str__(self):
         return f"{self.transfer_number} ({self.from_branch.code} -> {self.to_branch.code})"
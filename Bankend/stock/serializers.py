@@ -15,6 +15,19 @@ class StockItemSerializer(serializers.ModelSerializer):
     class Meta:
         model = StockItem
         fields = '__all__'
+        # SKUs are unique per branch; checked in validate() since both fields are optional
+        validators = []
+
+    def validate(self, attrs):
+        branch = attrs.get('branch', getattr(self.instance, 'branch', None))
+        sku = attrs.get('sku', getattr(self.instance, 'sku', None))
+        if sku:
+            clashes = StockItem.objects.filter(branch=branch, sku=sku)
+            if self.instance is not None:
+                clashes = clashes.exclude(pk=self.instance.pk)
+            if clashes.exists():
+                raise serializers.ValidationError({'sku': 'An item with this SKU already exists in this branch.'})
+        return attrs
 
 class StockMovementSerializer(serializers.ModelSerializer):
     item_name = serializers.ReadOnlyField(source='item.name')
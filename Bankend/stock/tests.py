@@ -0,0 +1,299 @@
+import datetime
+import threading
+from contextlib import nullcontext
+from decimal import Decimal
+from io import StringIO
+
+from django.contrib.auth.models import User
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from core.testing import AppQueriesMixin
+from locations.models import Branch
+from . import ledger
+from .forecasting import plan, weekday_factors
+from .models import PurchaseOrder, PurchaseOrderItem, StockItem, StockMovement, StockTransfer, StockTransferItem, Supplier
+
+
+@override_settings(STOCK_LEAD_TIME_DAYS=7, STOCK_COVER_DAYS=30, STOCK_SERVICE_LEVEL_Z=1.65)
+class ForecastingTests(AppQueriesMixin, TestCase):
+    def setUp(self):
+        cache.clear()
+        self.today = timezone.localdate()
+        self.branches = [Branch.objects.create(name=code, code=code) for code in ('DXB', 'SHJ')]
+        self.film = self.item('Film', 'PPF', branch=self.branches[0])
+        self.wax = self.item('Wax', 'POLISH', branch=self.branches[0])
+        self.soap = self.item('Soap', 'CLEANING', branch=self.branches[1])
+        # Film: 3 a day for the last 30 days; soap: 1 a day
+        for days_ago in range(1, 31):
+            self.consume(self.film, 3, days_ago)
+            self.consume(self.soap, 1, days_ago)
+        self.consume(self.film, 100, 0)  # today's usage counts from tomorrow
+        StockItem.objects.filter(pk=self.film.pk).update(current_stock=20)
+        StockItem.objects.filter(pk=self.soap.pk).update(current_stock=500)
+
+    def item(self, name, category, **fields):
+        return StockItem.objects.create(name=name, sku=name.upper(), category=category, current_stock=0,
+                                        safety_level=10, unit_cost=Decimal('4.00'), **fields)
+
+    def consume(self, item, quantity, days_ago):
+        movement = StockMovement.objects.create(item=item, type='OUT', quantity=quantity, status='APPROVED')
+        StockMovement.objects.filter(pk=movement.pk).update(date=timezone.now() - datetime.timedelta(days=days_ago))
+
+    def test_forecast_queries_do_not_grow_with_items(self):
+        with self.assertNumAppQueries(3):
+            rows = {row['name']: row for row in plan()}
+        self.assertEqual(rows['Film']['daily_rate'], 3.0)
+        self.assertEqual(rows['Film']['days_remaining'], 6)
+        self.assertEqual(rows['Film']['status'], 'CRITICAL')
+        self.assertEqual(rows['Wax']['days_remaining'], 999)
+        self.assertEqual(rows['Soap']['days_remaining'], 500)
+
+        for n in range(20):
+            self.item(f'Extra {n}', 'OTHER', branch=self.branches[0])
+        # Consumption is cached per branch for the day: items and open orders only
+        with self.assertNumAppQueries(2):
+            self.assertEqual(len(plan()), 23)
+        self.assertEqual([row['name'] for row in plan(self.branches[1].pk)], ['Soap'])
+
+    def test_reorder_point_and_draft_orders(self):
+        supplier = Supplier.objects.create(name='Film Co')
+        old = PurchaseOrder.objects.create(po_number='PO-OLD', supplier=supplier, status='COMPLETED',
+                                           order_date=self.today - datetime.timedelta(days=60))
+        PurchaseOrderItem.objects.create(purchase_order=old, item=self.film, quantity=50, received_quantity=50,
+                                         unit_cost=Decimal('4.00'))
+
+        film = next(row for row in plan() if row['name'] == 'Film')
+        # The safety level (10) exceeds z * std * sqrt(lead time) (~6.2)
+        self.assertEqual(film['reorder_point'], 3 * 7 + 10)
+        self.assertEqual(film['suggested_quantity'], 3 * 7 + 10 + 3 * 30 - 20)
+
+        client = APIClient()
+        client.force_authenticate(User.objects.create_superuser('planner'))
+        response = client.post('/api/stock/api/items/draft_purchase_orders/', {'branch': self.branches[0].pk}, format='json')
+        self.assertEqual(response.status_code, 201)
+        [order] = response.json()['purchase_orders']
+        # Never ordered before and no default supplier given
+        self.assertEqual([row['name'] for row in response.json()['skipped']], ['Wax'])
+        self.assertEqual(order['status'], 'DRAFT')
+        self.assertEqual(order['supplier'], supplier.pk)
+        line = PurchaseOrderItem.objects.get(purchase_order_id=order['id'])
+        self.assertEqual((line.item_id, line.quantity, line.total_cost), (self.film.pk, Decimal('101'), Decimal('404')))
+
+        # The open draft counts as stock: nothing more to order
+        response = client.post('/api/stock/api/items/draft_purchase_orders/', {'branch': self.branches[0].pk}, format='json')
+        self.assertEqual(response.json()['purchase_orders'], [])
+        reorder = client.get('/api/stock/api/items/reorder_plan/', {'branch': self.branches[0].pk}).json()
+        self.assertEqual([row['name'] for row in reorder['items']], ['Wax'])
+        self.assertEqual(client.get('/api/stock/api/items/forecast_stock/', {'method': 'median'}).status_code, 400)
+        response = client.post('/api/stock/api/items/draft_purchase_orders/', {'supplier': 'abc'}, format='json')
+        self.assertEqual(response.status_code, 400)
+
+    def test_smoothing_and_weekday_factors(self):
+        self.consume(self.wax, 30, 1)
+        rows = {row['name']: row for row in plan(method='ewma')}
+        # Yesterday's burst dominates the smoothed rate but not the 30-day mean
+        self.assertAlmostEqual(rows['Wax']['daily_rate'], 30 * 0.3, places=1)
+        self.assertEqual(next(row for row in plan() if row['name'] == 'Wax')['daily_rate'], 1.0)
+
+        import numpy as np
+        monday = datetime.date(2025, 3, 3)
+        usage = np.array([[7.0 if day % 7 == 0 else 0.0 for day in range(28)], [0.0] * 28])
+        factors = weekday_factors(usage, monday)
+        self.assertEqual(factors[0].tolist(), [7.0, 0, 0, 0, 0, 0, 0])
+        self.assertEqual(factors[1].tolist(), [1.0] * 7)
+
+    def test_inventory_stats_is_one_grouped_query(self):
+        client = APIClient()
+        client.force_authenticate(User.objects.create_superuser('auditor'))
+        response = client.get('/api/stock/api/items/inventory_stats/', {'branch': self.branches[0].pk})
+        body = response.json()
+        self.assertEqual(body['total_items'], 2)
+        self.assertEqual(body['total_value'], 80.0)
+        self.assertEqual(body['low_stock_count'], 1)
+        self.assertEqual([row['label'] for row in body['category_breakdown']], ['Paint Protection Film', 'Polishing Materials'])
+
+
+class StockLedgerTests(TestCase):
+    def setUp(self):
+        self.branches = [Branch.objects.create(name=code, code=code) for code in ('DXB', 'SHJ')]
+        self.film = StockItem.objects.create(name='Film', sku='FILM', category='PPF', branch=self.branches[0])
+        self.wax = StockItem.objects.create(name='Wax', sku='WAX', category='POLISH', branch=self.branches[0])
+        for item in (self.film, self.wax):
+            StockMovement.objects.create(item=item, type='IN', quantity=100, status='APPROVED')
+
+    def stock(self, item):
+        return StockItem.objects.get(pk=item.pk).current_stock
+
+    def test_approvals_from_stale_instances_are_not_lost(self):
+        pending = [StockMovement.objects.create(item=self.film, type='OUT', quantity=quantity) for quantity in (5, 7)]
+        # Each approval loaded the item before the other one was saved
+        loaded = [StockMovement.objects.select_related('item').get(pk=movement.pk) for movement in pending]
+        for movement in loaded:
+            movement.status = 'APPROVED'
+            movement.save()
+        self.assertEqual(self.stock(self.film), Decimal('88'))
+
+        # The same movement approved twice moves stock once
+        duplicate = StockMovement.objects.create(item=self.film, type='IN', quantity=10)
+        first, second = StockMovement.objects.get(pk=duplicate.pk), StockMovement.objects.get(pk=duplicate.pk)
+        first.status = second.status = 'APPROVED'
+        first.save()
+        second.save()
+        self.assertEqual(self.stock(self.film), Decimal('98'))
+
+    def test_transfer_posts_its_movements_in_one_batch(self):
+        transfer = StockTransfer.objects.create(transfer_number='TR-1', from_branch=self.branches[0],
+                                                to_branch=self.branches[1], date=datetime.date(2025, 3, 3))
+        StockTransferItem.objects.create(transfer=transfer, item=self.film, quantity=10)
+        StockTransferItem.objects.create(transfer=transfer, item=self.wax, quantity=4)
+
+        client = APIClient()
+        client.force_authenticate(User.objects.create_superuser('storekeeper'))
+        self.assertEqual(client.post(f'/api/stock/api/transfers/{transfer.pk}/commence_transfer/').status_code, 200)
+        movements = StockMovement.objects.filter(transfer=transfer)
+        self.assertEqual(sorted(movements.values_list('type', 'quantity')), [('ICT_OUT', 4), ('ICT_OUT', 10)])
+        self.assertEqual(set(movements.values_list('recorded_by', flat=True)), {'storekeeper'})
+        self.assertEqual((self.stock(self.film), self.stock(self.wax)), (Decimal('90'), Decimal('96')))
+        self.assertEqual(ledger.discrepancies(), [])
+
+    def test_reconcile_command(self):
+        StockItem.objects.filter(pk=self.film.pk).update(current_stock=3)
+        StockMovement.objects.create(item=self.wax, type='ADJ', quantity=-20, status='APPROVED')
+        self.assertEqual([(item.pk, total) for item, total in ledger.discrepancies()], [(self.film.pk, Decimal('100'))])
+        with self.assertRaises(CommandError):
+            call_command('reconcile_stock', '--verify', stdout=StringIO())
+
+        call_command('reconcile_stock', stdout=StringIO())
+        call_command('reconcile_stock', '--verify', stdout=StringIO())
+        self.assertEqual((self.stock(self.film), self.stock(self.wax)), (Decimal('100'), Decimal('80')))
+
+
+class BatchReceiptTests(TestCase):
+    def setUp(self):
+        self.dxb, self.shj = [Branch.objects.create(name=code, code=code) for code in ('DXB', 'SHJ')]
+        self.supplier = Supplier.objects.create(name='Film Co')
+        self.client = APIClient()
+        self.client.force_authenticate(User.objects.create_superuser('storekeeper'))
+        # The audit trail looks content types up once per process; keep that out of the counts
+        ContentType.objects.get_for_models(StockItem, StockMovement, StockTransfer, PurchaseOrder, PurchaseOrderItem)
+
+    def items(self, count, branch=None, prefix='SKU'):
+        return [StockItem.objects.create(name=f'Item {n}', sku=f'{prefix}-{n}', category='PPF', branch=branch or self.dxb)
+                for n in range(count)]
+
+    def order(self, items):
+        order = PurchaseOrder.objects.create(po_number=f'PO-{len(items)}', supplier=self.supplier, status='SENT',
+                                             order_date=datetime.date(2025, 3, 3))
+        for item in items:
+            PurchaseOrderItem.objects.create(purchase_order=order, item=item, quantity=10, unit_cost=Decimal('2.00'))
+        return order
+
+    def receive(self, order, lines):
+        return self.client.post(f'/api/stock/api/purchase-orders/{order.pk}/receive_items/', {'lines': lines}, format='json')
+
+    def transfer(self, items, number):
+        transfer = StockTransfer.objects.create(transfer_number=number, from_branch=self.dxb, to_branch=self.shj,
+                                                date=datetime.date(2025, 3, 3))
+        for item in items:
+            StockTransferItem.objects.create(transfer=transfer, item=item, quantity=3)
+        return transfer
+
+    def test_receipt_queries_do_not_grow_with_lines(self):
+        small, large = self.order(self.items(2, prefix='S')), self.order(self.items(6, prefix='L'))
+        counts = []
+        for order in (small, large):
+            lines = [{'item_id': line.pk, 'quantity': 10} for line in order.items.all()]
+            lines[0] = {'sku': order.items.first().item.sku, 'quantity': 4}
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(self.receive(order, lines).status_code, 200)
+            counts.append(len(queries))
+        self.assertEqual(counts[0], counts[1])
+
+        large.refresh_from_db()
+        self.assertEqual(large.status, 'RECEIVED')
+        first, *rest = large.items.select_related('item').order_by('pk')
+        self.assertEqual((first.received_quantity, first.item.current_stock), (Decimal('4'), Decimal('4')))
+        self.assertEqual({(line.received_quantity, line.item.current_stock) for line in rest}, {(Decimal('10'), Decimal('10'))})
+
+        response = self.client.post(f'/api/stock/api/purchase-orders/{large.pk}/receive_item/',
+                                    {'item_id': first.pk, 'quantity': 6}, format='json')
+        self.assertEqual(response.status_code, 200)
+        large.refresh_from_db()
+        self.assertEqual(large.status, 'COMPLETED')
+        self.assertEqual(StockMovement.objects.filter(purchase_order=large, status='APPROVED').count(), 7)
+        self.assertEqual(ledger.discrepancies(), [])
+
+    def test_invalid_receipt_changes_nothing(self):
+        order = self.order(self.items(2))
+        line = order.items.first()
+        for lines in ([{'item_id': line.pk, 'quantity': 5}, {'sku': 'NOPE', 'quantity': 1}],
+                      [{'item_id': line.pk, 'quantity': -5}], [{'item_id': line.pk, 'quantity': 'ten'}], []):
+            self.assertEqual(self.receive(order, lines).status_code, 400)
+        self.assertEqual(self.receive(order, 'all').status_code, 400)
+        self.assertFalse(StockMovement.objects.exists())
+        self.assertEqual(PurchaseOrderItem.objects.filter(received_quantity__gt=0).count(), 0)
+
+    def test_transfer_queries_do_not_grow_and_match_destination_items_by_sku(self):
+        counts = []
+        for number, size in (('TR-1', 2), ('TR-2', 5)):
+            items = self.items(size, prefix=number)
+            StockItem.objects.filter(pk__in=[item.pk for item in items]).update(current_stock=50)
+            # The destination already stocks the first item
+            StockItem.objects.create(name='Item 0', sku=items[0].sku, category='PPF', branch=self.shj)
+            transfer = self.transfer(items, number)
+            with CaptureQueriesContext(connection) as queries:
+                for step in ('commence_transfer', 'receive_transfer'):
+                    self.assertEqual(self.client.post(f'/api/stock/api/transfers/{transfer.pk}/{step}/').status_code, 200)
+            counts.append(len(queries))
+            self.assertEqual(self.client.post(f'/api/stock/api/transfers/{transfer.pk}/receive_transfer/').status_code, 400)
+
+            source = StockItem.objects.filter(branch=self.dxb, sku__startswith=number)
+            destination = StockItem.objects.filter(branch=self.shj, sku__startswith=number)
+            self.assertEqual(set(source.values_list('current_stock', flat=True)), {Decimal('47')})
+            self.assertEqual(destination.count(), size)
+            self.assertEqual(set(destination.values_list('current_stock', flat=True)), {Decimal('3')})
+        self.assertEqual(counts[0], counts[1])
+
+
+class StockLedgerConcurrencyTests(TransactionTestCase):
+    def test_parallel_approvals(self):
+        branch = Branch.objects.create(name='DXB', code='DXB')
+        items = [StockItem.objects.create(name=name, sku=name, category='PPF', branch=branch) for name in ('A', 'B')]
+        pending = [StockMovement.objects.create(item=items[n % 2], type='IN', quantity=1) for n in range(40)]
+        transfers = [StockMovement(item=item, type='OUT', quantity=2, status='APPROVED') for item in items]
+        start = threading.Barrier(8)
+        # SQLite's shared in-memory test database raises on a lock conflict instead of
+        # waiting, so writers take turns per statement as a busy timeout would make them
+        writes = threading.Lock() if connection.vendor == 'sqlite' else nullcontext()
+
+        def approve(movements):
+            start.wait()
+            try:
+                for movement in movements:
+                    movement.status = 'APPROVED'
+                    with writes:
+                        movement.save()
+                with writes:
+                    ledger.post([StockMovement(item=movement.item, type=movement.type, quantity=movement.quantity,
+                                               status=movement.status) for movement in transfers])
+            finally:
+                connection.close()
+
+        # Two threads per slice: every movement is approved twice, concurrently
+        threads = [threading.Thread(target=approve, args=([StockMovement.objects.select_related('item').get(pk=m.pk)
+                                                          for m in pending[n::4]],)) for n in list(range(4)) * 2]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        self.assertEqual([StockItem.objects.get(pk=item.pk).current_stock for item in items], [Decimal('4'), Decimal('4')])
+        self.assertEqual(ledger.discrepancies(), [])
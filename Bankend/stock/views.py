@@ -1,8 +1,10 @@
 from django.shortcuts import render, redirect, get_object_or_404
 from rest_framework import viewsets
+from core import permission_matrix
 from core.permissions import IsAdminOrOwner
 from rest_framework.decorators import action
 from rest_framework.response import Response
+from django.db import transaction
 from django.db.models import Sum, F
 from django.contrib import messages
 from .models import (
@@ -11,17 +13,15 @@ from .models import (
     StockTransfer, StockTransferItem
 )
 from .forms import StockFormForm
+from . import ledger
 from finance.models import Voucher, VoucherDetail, LinkingAccount, Account
 import uuid
-import datetime
-from django.utils import timezone
 from .serializers import (
     StockFormSerializer, StockItemSerializer, StockMovementSerializer,
     SupplierSerializer, PurchaseOrderSerializer, PurchaseOrderItemSerializer,
     PurchaseInvoiceSerializer, PurchaseReturnSerializer,
     StockTransferSerializer, StockTransferItemSerializer
 )
-from decimal import Decimal
 
 class PurchaseInvoiceViewSet(viewsets.ModelViewSet):
     module_name = 'Inventory'
@@ -89,65 +89,102 @@ class StockItemViewSet(viewsets.ModelViewSet):
 
     @action(detail=False, methods=['get'])
     def inventory_stats(self, request):
+        from django.db.models import Count, Q
         branch_id = request.query_params.get('branch')
         items = StockItem.objects.all()
         if branch_id: items = items.filter(branch_id=branch_id)
-        
-        total_value = items.aggregate(value=Sum(F('current_stock') * F('unit_cost')))['value'] or 0
-        low_stock_count = items.filter(current_stock__lte=F('safety_level')).count()
-        
+
+        # One grouped query instead of an aggregate and a count per category
+        rows = {row['category']: row for row in items.values('category').annotate(
+            count=Count('id'),
+            value=Sum(F('current_stock') * F('unit_cost')),
+            low=Count('id', filter=Q(current_stock__lte=F('safety_level'))),
+        ).order_by()}
+
         breakdown = []
         for cat, label in StockItem.CATEGORIES:
-            cat_items = items.filter(category=cat)
-            count = cat_items.count()
-            if count > 0:
-                cat_value = cat_items.aggregate(val=Sum(F('current_stock') * F('unit_cost')))['val'] or 0
-                breakdown.append({'label': label, 'count': count, 'value': float(cat_value)})
+            row = rows.get(cat)
+            if row and row['count'] > 0:
+                breakdown.append({'label': label, 'count': row['count'], 'value': float(row['value'] or 0)})
 
         return Response({
-            'total_value': float(total_value),
-            'low_stock_count': low_stock_count,
-            'total_items': items.count(),
+            'total_value': float(sum(row['value'] or 0 for row in rows.values())),
+            'low_stock_count': sum(row['low'] for row in rows.values()),
+            'total_items': sum(row['count'] for row in rows.values()),
             'category_breakdown': breakdown
         })
 
+    def _plan_options(self, params):
+        return {
+            'method': params.get('method', 'average'),
+            # str(): a JSON body may send true/1 rather than a query string
+            'seasonal': str(params.get('seasonal')) in ('1', 'true', 'True'),
+        }
+
     @action(detail=False, methods=['get'])
     def forecast_stock(self, request):
-        branch_id = request.query_params.get('branch')
-        today = timezone.now().date()
-        thirty_days_ago = today - datetime.timedelta(days=30)
-        
-        items = StockItem.objects.all()
-        if branch_id: items = items.filter(branch_id=branch_id)
-        
-        forecasts = []
-        for item in items:
-            total_used = StockMovement.objects.filter(
-                item=item, type='OUT', date__gte=thirty_days_ago, status='APPROVED'
-            ).aggregate(Sum('quantity'))['quantity__sum'] or 0
-            
-            daily_rate = float(total_used) / 30.0
-            days_remaining = 999
-            if daily_rate > 0:
-                days_remaining = int(float(item.current_stock) / daily_rate)
-            
-            projected_date = today + datetime.timedelta(days=min(days_remaining, 365))
-
-            if days_remaining < 60 or item.current_stock <= item.safety_level:
-                forecasts.append({
-                    "id": item.id, "name": item.name, "sku": item.sku,
-                    "current_stock": float(item.current_stock),
-                    "days_remaining": days_remaining,
-                    "projected_stock_out": projected_date,
-                    "status": "CRITICAL" if days_remaining < 7 else "WARNING" if days_remaining < 30 else "OK"
-                })
+        """?branch=&method=average|ewma&seasonal=1 (see stock.forecasting)."""
+        from .forecasting import plan
+        try:
+            rows = plan(request.query_params.get('branch'), **self._plan_options(request.query_params))
+        except ValueError as e:
+            return Response({"error": str(e)}, status=400)
 
+        forecasts = [row for row in rows if row['days_remaining'] < 60 or row['current_stock'] <= row['safety_level']]
         return Response({
             "forecasts": sorted(forecasts, key=lambda x: x['days_remaining']),
             "critical_count": len([f for f in forecasts if f['status'] == "CRITICAL"]),
             "recommendations": [f['name'] for f in forecasts if f['status'] != "OK"][:5]
         })
 
+    @action(detail=False, methods=['get'])
+    def reorder_plan(self, request):
+        """Items due for reordering with suggested quantities; same parameters as forecast_stock."""
+        from .forecasting import plan
+        try:
+            rows = plan(request.query_params.get('branch'), **self._plan_options(request.query_params))
+        except ValueError as e:
+            return Response({"error": str(e)}, status=400)
+
+        to_order = [row for row in rows if row['suggested_quantity'] > 0]
+        return Response({
+            "items": sorted(to_order, key=lambda x: x['days_remaining']),
+            "total_cost": round(sum(row['suggested_quantity'] * row['unit_cost'] for row in to_order), 2),
+        })
+
+    @action(detail=False, methods=['post'])
+    def draft_purchase_orders(self, request):
+        """
+        POST {"branch", "supplier", "method", "seasonal"}: DRAFT purchase orders for the
+        reorder plan, one per supplier. `supplier` is used for items never ordered before.
+        """
+        from .forecasting import draft_purchase_orders
+        supplier = request.data.get('supplier')
+        if supplier:
+            try:
+                supplier = int(supplier)
+            except (TypeError, ValueError):
+                return Response({"error": "supplier must be a supplier id"}, status=400)
+            if not Supplier.objects.filter(pk=supplier).exists():
+                return Response({"error": "Unknown supplier"}, status=400)
+        try:
+            orders, skipped = draft_purchase_orders(
+                request.data.get('branch'), supplier, **self._plan_options(request.data),
+            )
+        except ValueError as e:
+            return Response({"error": str(e)}, status=400)
+        return Response({
+            "purchase_orders": PurchaseOrderSerializer(orders, many=True).data,
+            "skipped": [{"id": row['id'], "name": row['name'], "suggested_quantity": row['suggested_quantity']} for row in skipped],
+        }, status=201)
+
+def movement_status(request):
+    """Movements recorded by managers are approved at once; everyone else's wait for approval."""
+    approver = request.user.is_superuser or permission_matrix.role_matches(
+        permission_matrix.matrix_for(request), ['manager', 'admin'],
+    )
+    return 'APPROVED' if approver else 'PENDING'
+
 class StockMovementViewSet(viewsets.ModelViewSet):
     module_name = 'Inventory'
     queryset = StockMovement.objects.all().order_by('-date')
@@ -156,8 +193,7 @@ class StockMovementViewSet(viewsets.ModelViewSet):
 
     def perform_create(self, serializer):
         user = self.request.user
-        status = 'APPROVED' if (user.is_superuser or user.role_name in ['Manager', 'Admin']) else 'PENDING'
-        serializer.save(recorded_by=user.username, status=status)
+        serializer.save(recorded_by=user.username, status=movement_status(self.request))
 
     @action(detail=True, methods=['post'])
     def approve(self, request, pk=None):
@@ -172,47 +208,28 @@ class StockTransferViewSet(viewsets.ModelViewSet):
     serializer_class = StockTransferSerializer
     permission_classes = [IsAdminOrOwner]
 
+    def advance(self, from_status, to_status, recorded_by):
+        """Moves the transfer on under a row lock, so two requests cannot both post its movements."""
+        with transaction.atomic():
+            transfer = StockTransfer.objects.select_for_update().get(pk=self.get_object().pk)
+            if transfer.status != from_status:
+                return False
+            transfer.status = to_status
+            # StockTransfer.save posts the transfer's movements in one batch
+            transfer.save(recorded_by=recorded_by)
+        return True
+
     @action(detail=True, methods=['post'])
     def commence_transfer(self, request, pk=None):
-        transfer = self.get_object()
-        if transfer.status != 'PENDING':
+        if not self.advance('PENDING', 'TRANSIT', request.user.username):
             return Response({"error": "Only PENDING transfers can be commenced"}, status=400)
-        
-        for ti in transfer.items.all():
-            StockMovement.objects.create(
-                item=ti.item, type='ICT_OUT', quantity=ti.quantity,
-                status='APPROVED', transfer=transfer,
-                reason=f"ICT Out: {transfer.transfer_number} to {transfer.to_branch.code}",
-                recorded_by=request.user.username
-            )
-        transfer.status = 'TRANSIT'
-        transfer.save()
         return Response({"status": "Transfer commenced"})
 
     @action(detail=True, methods=['post'])
     def receive_transfer(self, request, pk=None):
-        transfer = self.get_object()
-        if transfer.status != 'TRANSIT':
+        # Missing destination items (matched by SKU) are created
+        if not self.advance('TRANSIT', 'COMPLETED', request.user.username):
             return Response({"error": "Only TRANSIT transfers can be received"}, status=400)
-        
-        for ti in transfer.items.all():
-            source_item = ti.item
-            target_item, created = StockItem.objects.get_or_create(
-                sku=source_item.sku, branch=transfer.to_branch,
-                defaults={
-                    'name': source_item.name, 'category': source_item.category,
-                    'unit': source_item.unit, 'unit_cost': source_item.unit_cost,
-                    'safety_level': source_item.safety_level
-                }
-            )
-            StockMovement.objects.create(
-                item=target_item, type='ICT_IN', quantity=ti.quantity,
-                status='APPROVED', transfer=transfer,
-                reason=f"ICT In: {transfer.transfer_number} from {transfer.from_branch.code}",
-                recorded_by=request.user.username
-            )
-        transfer.status = 'COMPLETED'
-        transfer.save()
         return Response({"status": "Transfer received"})
 
 class StockTransferItemViewSet(viewsets.ModelViewSet):
@@ -234,23 +251,24 @@ class PurchaseOrderViewSet(viewsets.ModelViewSet):
 
     @action(detail=True, methods=['post'])
     def receive_item(self, request, pk=None):
-        po = self.get_object()
-        item_id = request.data.get('item_id')
-        qty = float(request.data.get('quantity', 0))
-        if po.status == 'COMPLETED': return Response({"error": "PO is already completed"}, status=400)
+        return self.receive(request, [{'item_id': request.data.get('item_id'), 'quantity': request.data.get('quantity', 0)}])
+
+    @action(detail=True, methods=['post'])
+    def receive_items(self, request, pk=None):
+        """Receives many lines at once: {"lines": [{"item_id": <PO line id> or "sku": ..., "quantity": ...}]}."""
+        lines = request.data.get('lines')
+        if not isinstance(lines, list) or not all(isinstance(line, dict) for line in lines):
+            return Response({"error": "lines must be a list of {item_id or sku, quantity}"}, status=400)
+        return self.receive(request, lines)
+
+    def receive(self, request, lines):
         try:
-            po_item = po.items.get(id=item_id)
-            po_item.received_quantity += Decimal(str(qty))
-            po_item.save()
-            StockMovement.objects.create(
-                item=po_item.item, type='IN', quantity=Decimal(str(qty)),
-                purchase_order=po, recorded_by=request.user.username
+            movements = ledger.receive_purchase_order(
+                self.get_object(), lines, status=movement_status(request), recorded_by=request.user.username,
             )
-            all_received = all(i.received_quantity >= i.quantity for i in po.items.all())
-            po.status = 'COMPLETED' if all_received else 'RECEIVED'
-            po.save()
-            return Response({"status": "Stock received"})
-        except Exception as e: return Response({"error": str(e)}, status=400)
+        except ValueError as e:
+            return Response({"error": str(e)}, status=400)
+        return Response({"status": "Stock received", "movements": [movement.pk for movement in movements]})
 
 class PurchaseOrderItemViewSet(viewsets.ModelViewSet):
     queryset = PurchaseOrderItem.objects.all()
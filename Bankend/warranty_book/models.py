@@ -3,10 +3,16 @@ from django.contrib.auth.models import User
 from invoices.models import Invoice
 import uuid
 import qrcode
+from datetime import timedelta
 from io import BytesIO
 from django.core.files import File
+from django.utils import timezone
+from core.models import ServiceScheduleMixin
+
+class WarrantyRegistration(ServiceScheduleMixin, models.Model):
+    # No visit columns: inspections fall on each installation anniversary
+    service_interval_days = 365
 
-class WarrantyRegistration(models.Model):
     CATEGORY_CHOICES = [
         ('PPF', 'Paint Protection Film'),
         ('CERAMIC', 'Ceramic Coating'),
@@ -57,6 +63,10 @@ class WarrantyRegistration(models.Model):
     
     # Specifications (Dynamic JSON for category-specific details)
     specifications = models.JSONField(default=dict, blank=True)
+
+    # Annual inspection schedule (ServiceScheduleMixin)
+    last_service_date = models.DateField(null=True, blank=True, editable=False)
+    next_due_date = models.DateField(null=True, blank=True, editable=False, db_index=True)
     
     # Media & Signs
     qr_code = models.ImageField(upload_to='warranty_qr/', blank=True, null=True)
@@ -79,6 +89,25 @@ class WarrantyRegistration(models.Model):
             else:
                 self.expiry_date = self.installation_date + timedelta(days=365 * self.duration_years)
 
+    @classmethod
+    def service_schedule_inputs(cls):
+        return ('installation_date', 'status', 'expiry_date')
+
+    def service_dates(self):
+        """Next anniversary on or after today; none once cancelled, expired or past expiry."""
+        installed = self.service_date('installation_date')
+        if not installed:
+            return None, None
+        if self.status != 'ACTIVE':
+            return installed, None
+        elapsed = (timezone.now().date() - installed).days
+        years = max(1, -(-elapsed // self.service_interval_days))
+        due = installed + timedelta(days=self.service_interval_days * years)
+        expiry = self.service_date('expiry_date')
+        if expiry and due > expiry:
+            due = None
+        return installed, due
+
     def generate_qr_code(self):
         """Generate QR code pointing to the unified warranty portal"""
         from django.conf import settings
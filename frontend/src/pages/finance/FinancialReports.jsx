@@ -20,6 +20,8 @@ const FinancialReports = () => {
     const navigate = useNavigate();
     const [activeTab, setActiveTab] = useState('LEGER'); // LEGER, PL, BS, TB
     const [transactions, setTransactions] = useState([]);
+    const [ledgerCursor, setLedgerCursor] = useState(null);
+    const [loadingMore, setLoadingMore] = useState(false);
     const [loading, setLoading] = useState(true);
     const [reportData, setReportData] = useState(null);
     const [startDate, setStartDate] = useState(new Date(new Date().setDate(1)).toISOString().split('T')[0]);
@@ -46,7 +48,10 @@ const FinancialReports = () => {
 
             const res = await api.get(endpoint);
             setReportData(res.data);
-            if (activeTab === 'LEGER') setTransactions(res.data.results || res.data);
+            if (activeTab === 'LEGER') {
+                setTransactions(res.data.results || res.data);
+                setLedgerCursor(res.data.next_cursor || null);
+            }
         } catch (err) {
             console.error('Error fetching reports data', err);
         } finally {
@@ -58,6 +63,23 @@ const FinancialReports = () => {
         fetchData();
     }, [fetchData]);
 
+    // The ledger is keyset-paginated: append the next page from next_cursor
+    const loadMoreLedger = async () => {
+        if (!ledgerCursor || loadingMore) return;
+        setLoadingMore(true);
+        try {
+            const res = await api.get(`/finance/api/vouchers/ledger/`, {
+                params: { start_date: startDate, end_date: endDate, cursor: ledgerCursor }
+            });
+            setTransactions(prev => [...prev, ...res.data.results]);
+            setLedgerCursor(res.data.next_cursor || null);
+        } catch (err) {
+            console.error('Error fetching more ledger entries', err);
+        } finally {
+            setLoadingMore(false);
+        }
+    };
+
     return (
         <PortfolioPage breadcrumb={`FINANCE // REPORTS // ${activeTab}`}>
             <PrintHeader title={
@@ -116,6 +138,13 @@ const FinancialReports = () => {
                             setFilters={setFilters}
                         />
                     )}
+                    {activeTab === 'LEGER' && ledgerCursor && (
+                        <div className="no-print" style={{ display: 'flex', justifyContent: 'center', marginTop: '30px' }}>
+                            <PortfolioButton variant="secondary" onClick={loadMoreLedger}>
+                                {loadingMore ? 'LOADING...' : 'LOAD MORE ENTRIES'}
+                            </PortfolioButton>
+                        </div>
+                    )}
                     {activeTab === 'PAY_REG' && <RegisterView data={reportData} title="Payment Register" type="PAYMENT" />}
                     {activeTab === 'REC_REG' && <RegisterView data={reportData} title="Receipt Register" type="RECEIPT" />}
                     {activeTab === 'PL' && <ProfitLossView data={reportData} />}